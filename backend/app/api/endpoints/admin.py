@@ -3,9 +3,11 @@ from typing import Literal
 
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.endpoints.auth import get_current_user
-from app.models.database import SessionLocal, get_db
+from app.models.database import get_async_db
 from app.models.enums import AccessSource, AccessStatus, MarketRequestStatus
 from app.models.schemas import BaselineMarket, MarketAccess, MarketRequest
 
@@ -18,8 +20,8 @@ class ApprovePayload(BaseModel):
 
 
 @router.post("/baseline/seed")
-async def seed_baseline(current_user=Depends(get_current_user), db: SessionLocal = Depends(get_db)):
-    existing = db.query(BaselineMarket).count()
+async def seed_baseline(current_user=Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    existing = await db.scalar(select(func.count()).select_from(BaselineMarket))
     if existing:
         return {"status": "noop", "count": existing}
     sample_markets = [
@@ -45,7 +47,7 @@ async def seed_baseline(current_user=Depends(get_current_user), db: SessionLocal
                 seeded_at=datetime.utcnow(),
             )
         )
-    db.commit()
+    await db.commit()
     return {"status": "seeded", "count": 10}
 
 
@@ -54,16 +56,16 @@ async def approve_request(
     request_id: str,
     payload: ApprovePayload,
     current_user=Depends(get_current_user),
-    db: SessionLocal = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    req = db.query(MarketRequest).filter(MarketRequest.id == request_id).first()
+    req = await db.scalar(select(MarketRequest).where(MarketRequest.id == request_id))
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
     req.status = MarketRequestStatus.APPROVED.value
     req.reviewer_id = payload.reviewer_id or str(current_user.id)
     req.reviewed_at = datetime.utcnow()
     req.notes = payload.notes
-    db.commit()
+    await db.commit()
     return req
 
 
@@ -72,14 +74,14 @@ async def reject_request(
     request_id: str,
     payload: ApprovePayload,
     current_user=Depends(get_current_user),
-    db: SessionLocal = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    req = db.query(MarketRequest).filter(MarketRequest.id == request_id).first()
+    req = await db.scalar(select(MarketRequest).where(MarketRequest.id == request_id))
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
     req.status = MarketRequestStatus.REJECTED.value
     req.reviewer_id = payload.reviewer_id or str(current_user.id)
     req.reviewed_at = datetime.utcnow()
     req.notes = payload.notes
-    db.commit()
+    await db.commit()
     return req
@@ -1,19 +1,25 @@
-from fastapi import APIRouter, HTTPException, Query, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Query, Depends
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
+import uuid
 
+from app.core.analysis_queue import enqueue_analysis, job_status
+from app.core.analysis_writer import pack_details
+from app.core.opportunities import top_opportunities
 from app.core.analyzers.ensemble import ensemble_analyzer
 from app.core.analyzers.sentiment import sentiment_analyzer
 from app.core.analyzers.statistical import statistical_analyzer
 from app.core.analyzers.ml_models import ml_models_analyzer
 from app.core.kalshi_client import kalshi_client
-from app.models.database import get_db, SessionLocal
-from app.models.schemas import Market, AnalysisResult
+from app.models.database import get_async_db, get_async_read_db
+from app.models.schemas import Market, AnalysisResult, AnalysisJob
 from app.models.enums import AnalyzerType
 from app.api.endpoints.auth import get_current_user
 from app.models.schemas import User
+from app.utils.config import settings
 
 router = APIRouter()
 
@@ -67,56 +73,38 @@ class PerformanceMetricsResponse(BaseModel):
     average_confidence: float
     last_updated: datetime
 
+def _enqueue_refresh(db, market_ids: List[str], user_id, force_refresh: bool) -> Dict[str, Any]:
+    job = enqueue_analysis(db, market_ids, user_id, force_refresh)
+    return job_status(db, job.id)
+
+def _owned_job_status(db, job_id: uuid.UUID, user_id) -> Optional[Dict[str, Any]]:
+    job = db.get(AnalysisJob, job_id)
+    if job is None or (job.user_id is not None and job.user_id != user_id):
+        return None
+    return job_status(db, job_id)
+
 @router.post("/refresh", response_model=Dict[str, Any])
 async def refresh_analysis(
     request: AnalysisRequest,
-    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: SessionLocal = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Trigger new analysis for specified markets"""
+    """Queue new analysis for specified markets"""
     try:
-        logger.info(f"Starting analysis refresh for {len(request.market_ids)} markets")
-
-        # Validate market IDs
-        valid_markets = []
-        for market_id in request.market_ids:
-            try:
-                # Check if market exists
-                market_data = kalshi_client.get_market_details(market_id)
-                valid_markets.append({
-                    'id': market_id,
-                    'title': market_data['title'],
-                    'subtitle': market_data.get('subtitle', ''),
-                    'category': market_data.get('category', 'other')
-                })
-            except Exception as e:
-                logger.warning(f"Invalid market ID {market_id}: {str(e)}")
-                continue
-
-        if not valid_markets:
-            raise HTTPException(
-                status_code=400,
-                detail="No valid market IDs provided"
-            )
+        logger.info(f"Queuing analysis refresh for {len(request.market_ids)} markets")
 
-        # Queue background analysis task
-        background_tasks.add_task(
-            _analyze_markets_background,
-            valid_markets,
-            request.force_refresh,
-            str(current_user.id)
-        )
+        # Market details are fetched by the worker; unknown markets fail there
+        status = await db.run_sync(_enqueue_refresh, request.market_ids, current_user.id, request.force_refresh)
 
         return {
-            "message": f"Analysis queued for {len(valid_markets)} markets",
-            "market_ids": [m['id'] for m in valid_markets],
-            "estimated_time_minutes": len(valid_markets) * 2,  # Rough estimate
+            "message": f"Analysis queued for {status['total']} markets",
+            "job_id": status['job_id'],
+            "status_url": f"/api/analysis/jobs/{status['job_id']}",
+            "market_ids": [m['market_id'] for m in status['markets']],
+            "deduplicated": [m['market_id'] for m in status['markets'] if m['deduplicated']],
             "refresh_type": "forced" if request.force_refresh else "cached"
         }
 
-    except HTTPException:
-        raise
     except Exception as e:
         logger.error(f"Error queuing analysis refresh: {str(e)}")
         raise HTTPException(
@@ -124,67 +112,17 @@ async def refresh_analysis(
             detail="Failed to queue analysis refresh"
         )
 
-async def _analyze_markets_background(markets: List[Dict], force_refresh: bool, user_id: str):
-    """Background task to analyze markets"""
-    try:
-        logger.info(f"Background analysis started for {len(markets)} markets")
-
-        for market in markets:
-            try:
-                # Perform ensemble analysis
-                result = await ensemble_analyzer.analyze_market_ensemble(
-                    market_id=market['id'],
-                    market_title=market['title'],
-                    market_subtitle=market['subtitle'],
-                    market_category=market['category']
-                )
-
-                # Save results to database
-                db = SessionLocal()
-                try:
-                    # Save ensemble result
-                    ensemble_analysis = AnalysisResult(
-                        market_id=market['id'],
-                        analyzer_type='ensemble',
-                        prediction=result['ensemble_prediction'],
-                        confidence=result['confidence'],
-                        details={
-                            'signal_classification': result['signal_classification'],
-                            'individual_results': result['individual_results'],
-                            'dynamic_weights': result['dynamic_weights'],
-                            'user_id': user_id
-                        },
-                        timestamp=datetime.utcnow()
-                    )
-                    db.add(ensemble_analysis)
-
-                    # Save individual analyzer results
-                    for analyzer_name, analyzer_result in result['individual_results'].items():
-                        individual_analysis = AnalysisResult(
-                            market_id=market['id'],
-                            analyzer_type=analyzer_name,
-                            prediction=analyzer_result['score'],
-                            confidence=analyzer_result['confidence'],
-                            details=analyzer_result['details'],
-                            timestamp=datetime.utcnow()
-                        )
-                        db.add(individual_analysis)
-
-                    db.commit()
-
-                finally:
-                    db.close()
-
-                logger.debug(f"Analysis completed for market {market['id']}")
-
-            except Exception as e:
-                logger.error(f"Error analyzing market {market['id']}: {str(e)}")
-                continue
-
-        logger.info(f"Background analysis completed for {len(markets)} markets")
-
-    except Exception as e:
-        logger.error(f"Error in background analysis: {str(e)}")
+@router.get("/jobs/{job_id}", response_model=Dict[str, Any])
+async def get_analysis_job(
+    job_id: uuid.UUID,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Progress of a queued analysis refresh"""
+    status = await db.run_sync(_owned_job_status, job_id, current_user.id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Analysis job not found")
+    return status
 
 @router.get("/opportunities", response_model=List[OpportunityResponse])
 async def get_trading_opportunities(
@@ -193,95 +131,36 @@ async def get_trading_opportunities(
     min_prediction: float = Query(10.0, ge=-100, le=100, description="Minimum prediction threshold"),
     limit: int = Query(20, ge=1, le=100, description="Maximum number of opportunities"),
     current_user: User = Depends(get_current_user),
-    db: SessionLocal = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get ranked trading opportunities based on analysis results"""
     try:
         logger.info(f"Fetching trading opportunities - category: {category}, min_confidence: {min_confidence}")
 
-        # Get recent analysis results from database
-        recent_cutoff = datetime.utcnow() - timedelta(hours=6)  # Last 6 hours
-
-        query = db.query(AnalysisResult).filter(
-            AnalysisResult.analyzer_type == 'ensemble',
-            AnalysisResult.confidence >= min_confidence,
-            AnalysisResult.timestamp >= recent_cutoff
+        recent_cutoff = datetime.utcnow() - timedelta(hours=settings.OPPORTUNITY_MAX_AGE_HOURS)
+        rows = await db.run_sync(
+            top_opportunities, recent_cutoff, min_confidence=min_confidence, min_prediction=min_prediction,
+            category=category, limit=limit
         )
 
-        if category:
-            # Join with Market table to filter by category
-            query = query.join(Market).filter(Market.category == category)
-
-        results = query.order_by(AnalysisResult.confidence.desc()).limit(limit * 2).all()  # Get more than needed for filtering
-
-        opportunities = []
-        for result in results:
-            try:
-                # Get market information
-                market = db.query(Market).filter(Market.market_id == result.market_id).first()
-                if not market:
-                    continue
-
-                # Filter by prediction threshold
-                if abs(result.prediction) < min_prediction:
-                    continue
-
-                # Get current market price
-                try:
-                    price_info = kalshi_client.get_market_price(result.market_id)
-                    current_price = float(price_info.get('price', 0))
-                    volume = int(price_info.get('volume', 0))
-                except:
-                    current_price = None
-                    volume = None
-
-                # Calculate expected value (simplified)
-                expected_value = result.prediction * 0.01 * (result.confidence / 100.0)
-
-                # Calculate risk score
-                risk_score = max(0, 100 - result.confidence + abs(result.prediction) * 0.5)
-
-                # Generate recommendation
-                if result.prediction > 15 and result.confidence > 75:
-                    recommendation = "Strong Buy"
-                elif result.prediction > 8 and result.confidence > 65:
-                    recommendation = "Buy"
-                elif result.prediction < -15 and result.confidence > 75:
-                    recommendation = "Strong Sell"
-                elif result.prediction < -8 and result.confidence > 65:
-                    recommendation = "Sell"
-                else:
-                    recommendation = "Hold"
-
-                # Get individual predictions from details
-                individual_predictions = result.details.get('individual_results', {})
-
-                opportunity = OpportunityResponse(
-                    market_id=result.market_id,
-                    market_title=market.title,
-                    category=market.category,
-                    ensemble_prediction=result.prediction,
-                    confidence=result.confidence,
-                    signal_classification=result.details.get('signal_classification', 'hold'),
-                    expected_value=expected_value,
-                    current_price=current_price,
-                    volume=volume,
-                    individual_predictions=individual_predictions,
-                    risk_score=risk_score,
-                    recommendation=recommendation,
-                    last_updated=result.timestamp
-                )
-
-                opportunities.append(opportunity)
-
-            except Exception as e:
-                logger.error(f"Error processing opportunity for market {result.market_id}: {str(e)}")
-                continue
-
-        # Sort by expected value and confidence
-        opportunities.sort(key=lambda x: (x.expected_value * x.confidence), reverse=True)
-
-        return opportunities[:limit]
+        return [
+            OpportunityResponse(
+                market_id=str(row.market_id),
+                market_title=row.market_title,
+                category=row.category,
+                ensemble_prediction=float(row.ensemble_prediction),
+                confidence=float(row.confidence),
+                signal_classification=row.signal_classification or 'hold',
+                expected_value=float(row.expected_value),
+                current_price=float(row.current_price) if row.current_price is not None else None,
+                volume=row.volume,
+                individual_predictions=row.individual_predictions or {},
+                risk_score=float(row.risk_score),
+                recommendation=row.recommendation,
+                last_updated=row.analyzed_at
+            )
+            for row in rows
+        ]
 
     except Exception as e:
         logger.error(f"Error fetching trading opportunities: {str(e)}")
@@ -295,7 +174,7 @@ async def get_market_analysis(
     market_id: str,
     analyzer: Optional[str] = Query(None, description="Specific analyzer (sentiment, statistical, ml_models, ensemble)"),
     current_user: User = Depends(get_current_user),
-    db: SessionLocal = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get analysis for a specific market"""
     try:
@@ -386,11 +265,11 @@ async def get_market_analysis(
                 analyzer_type=analyzer or 'ensemble',
                 prediction=analysis_data.get('ensemble_prediction') or analysis_data.get('sentiment_score') or analysis_data.get('statistical_score', 0),
                 confidence=analysis_data['confidence'],
-                details=analysis_data,
-                timestamp=datetime.utcnow()
+                timestamp=datetime.utcnow(),
+                **pack_details(analysis_data)
             )
             db.add(analysis_record)
-            db.commit()
+            await db.commit()
         except Exception as e:
             logger.warning(f"Failed to save analysis to database: {str(e)}")
 
@@ -405,92 +284,93 @@ async def get_market_analysis(
             detail=f"Failed to fetch analysis for market {market_id}"
         )
 
+def _analysis_summary(db, start_time: datetime, category: Optional[str]) -> AnalysisSummaryResponse:
+    # Get recent ensemble analyses
+    query = db.query(AnalysisResult).filter(
+        AnalysisResult.analyzer_type == 'ensemble',
+        AnalysisResult.timestamp >= start_time
+    )
+
+    if category:
+        query = query.join(Market).filter(Market.category == category)
+
+    analyses = query.all()
+
+    if not analyses:
+        return AnalysisSummaryResponse(
+            total_markets_analyzed=0,
+            successful_analyses=0,
+            failed_analyses=0,
+            average_confidence=0.0,
+            bullish_signals=0,
+            bearish_signals=0,
+            neutral_signals=0,
+            top_opportunities=[],
+            analysis_time_seconds=0.0
+        )
+
+    # Calculate summary metrics
+    successful_analyses = len([a for a in analyses if a.confidence > 0])
+    failed_analyses = len(analyses) - successful_analyses
+    avg_confidence = sum(a.confidence for a in analyses) / len(analyses)
+
+    # Count signals
+    bullish_signals = len([a for a in analyses if a.prediction > 5])
+    bearish_signals = len([a for a in analyses if a.prediction < -5])
+    neutral_signals = len(analyses) - bullish_signals - bearish_signals
+
+    # Get top opportunities
+    top_analyses = sorted(analyses, key=lambda x: x.confidence * abs(x.prediction), reverse=True)[:5]
+
+    top_opportunities = []
+    for analysis in top_analyses:
+        try:
+            market = db.query(Market).filter(Market.market_id == analysis.market_id).first()
+            if market:
+                expected_value = analysis.prediction * 0.01 * (analysis.confidence / 100.0)
+
+                opportunity = OpportunityResponse(
+                    market_id=analysis.market_id,
+                    market_title=market.title,
+                    category=market.category,
+                    ensemble_prediction=analysis.prediction,
+                    confidence=analysis.confidence,
+                    signal_classification=analysis.payload.get('signal_classification', 'hold'),
+                    expected_value=expected_value,
+                    individual_predictions=analysis.payload.get('individual_results', {}),
+                    risk_score=max(0, 100 - analysis.confidence + abs(analysis.prediction) * 0.5),
+                    recommendation="Analyze" if abs(analysis.prediction) > 10 else "Hold",
+                    last_updated=analysis.timestamp
+                )
+                top_opportunities.append(opportunity)
+        except Exception as e:
+            logger.error(f"Error processing top opportunity: {str(e)}")
+            continue
+
+    return AnalysisSummaryResponse(
+        total_markets_analyzed=len(analyses),
+        successful_analyses=successful_analyses,
+        failed_analyses=failed_analyses,
+        average_confidence=avg_confidence,
+        bullish_signals=bullish_signals,
+        bearish_signals=bearish_signals,
+        neutral_signals=neutral_signals,
+        top_opportunities=top_opportunities,
+        analysis_time_seconds=0.0  # Would track actual analysis time
+    )
+
 @router.get("/summary/recent", response_model=AnalysisSummaryResponse)
 async def get_recent_analysis_summary(
     hours: int = Query(24, ge=1, le=168, description="Hours to look back"),
     category: Optional[str] = Query(None, description="Filter by category"),
     current_user: User = Depends(get_current_user),
-    db: SessionLocal = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get summary of recent analysis results"""
     try:
         logger.info(f"Fetching analysis summary for last {hours} hours")
 
-        start_time = datetime.utcnow() - timedelta(hours=hours)
-
-        # Get recent ensemble analyses
-        query = db.query(AnalysisResult).filter(
-            AnalysisResult.analyzer_type == 'ensemble',
-            AnalysisResult.timestamp >= start_time
-        )
-
-        if category:
-            query = query.join(Market).filter(Market.category == category)
-
-        analyses = query.all()
-
-        if not analyses:
-            return AnalysisSummaryResponse(
-                total_markets_analyzed=0,
-                successful_analyses=0,
-                failed_analyses=0,
-                average_confidence=0.0,
-                bullish_signals=0,
-                bearish_signals=0,
-                neutral_signals=0,
-                top_opportunities=[],
-                analysis_time_seconds=0.0
-            )
-
-        # Calculate summary metrics
-        successful_analyses = len([a for a in analyses if a.confidence > 0])
-        failed_analyses = len(analyses) - successful_analyses
-        avg_confidence = sum(a.confidence for a in analyses) / len(analyses)
-
-        # Count signals
-        bullish_signals = len([a for a in analyses if a.prediction > 5])
-        bearish_signals = len([a for a in analyses if a.prediction < -5])
-        neutral_signals = len(analyses) - bullish_signals - bearish_signals
-
-        # Get top opportunities
-        top_analyses = sorted(analyses, key=lambda x: x.confidence * abs(x.prediction), reverse=True)[:5]
-
-        top_opportunities = []
-        for analysis in top_analyses:
-            try:
-                market = db.query(Market).filter(Market.market_id == analysis.market_id).first()
-                if market:
-                    expected_value = analysis.prediction * 0.01 * (analysis.confidence / 100.0)
-
-                    opportunity = OpportunityResponse(
-                        market_id=analysis.market_id,
-                        market_title=market.title,
-                        category=market.category,
-                        ensemble_prediction=analysis.prediction,
-                        confidence=analysis.confidence,
-                        signal_classification=analysis.details.get('signal_classification', 'hold'),
-                        expected_value=expected_value,
-                        individual_predictions=analysis.details.get('individual_results', {}),
-                        risk_score=max(0, 100 - analysis.confidence + abs(analysis.prediction) * 0.5),
-                        recommendation="Analyze" if abs(analysis.prediction) > 10 else "Hold",
-                        last_updated=analysis.timestamp
-                    )
-                    top_opportunities.append(opportunity)
-            except Exception as e:
-                logger.error(f"Error processing top opportunity: {str(e)}")
-                continue
-
-        return AnalysisSummaryResponse(
-            total_markets_analyzed=len(analyses),
-            successful_analyses=successful_analyses,
-            failed_analyses=failed_analyses,
-            average_confidence=avg_confidence,
-            bullish_signals=bullish_signals,
-            bearish_signals=bearish_signals,
-            neutral_signals=neutral_signals,
-            top_opportunities=top_opportunities,
-            analysis_time_seconds=0.0  # Would track actual analysis time
-        )
+        return await db.run_sync(_analysis_summary, datetime.utcnow() - timedelta(hours=hours), category)
 
     except Exception as e:
         logger.error(f"Error fetching analysis summary: {str(e)}")
@@ -530,30 +410,31 @@ async def get_analyzer_performance(
             detail="Failed to fetch performance metrics"
         )
 
+def _clear_analysis_results(db, market_id: Optional[str]) -> int:
+    if market_id:
+        # Clear cache for specific market
+        query = db.query(AnalysisResult).filter(AnalysisResult.market_id == market_id)
+    else:
+        # Clear all cache (older than 24 hours)
+        query = db.query(AnalysisResult).filter(AnalysisResult.timestamp < datetime.utcnow() - timedelta(hours=24))
+    deleted_count = query.delete()
+    db.commit()
+    return deleted_count
+
 @router.delete("/cache")
 async def clear_analysis_cache(
     market_id: Optional[str] = Query(None, description="Specific market ID to clear, or all if not provided"),
     current_user: User = Depends(get_current_user),
-    db: SessionLocal = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Clear analysis cache for specific market or all markets"""
     try:
+        deleted_count = await db.run_sync(_clear_analysis_results, market_id)
         if market_id:
-            # Clear cache for specific market
-            deleted_count = db.query(AnalysisResult).filter(
-                AnalysisResult.market_id == market_id
-            ).delete()
             message = f"Cleared cache for market {market_id}"
         else:
-            # Clear all cache (older than 24 hours)
-            cutoff = datetime.utcnow() - timedelta(hours=24)
-            deleted_count = db.query(AnalysisResult).filter(
-                AnalysisResult.timestamp < cutoff
-            ).delete()
             message = f"Cleared {deleted_count} old analysis records"
 
-        db.commit()
-
         logger.info(f"Cache cleared: {message}")
 
         return {
@@ -563,7 +444,7 @@ async def clear_analysis_cache(
 
     except Exception as e:
         logger.error(f"Error clearing analysis cache: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail="Failed to clear analysis cache"
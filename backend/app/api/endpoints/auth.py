@@ -1,19 +1,20 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Tuple
 from datetime import datetime, timedelta
+import uuid
 import jwt
-from passlib.context import CryptContext
 from loguru import logger
 
+from app.core.auth_cache import auth_cache, principal_from_user, token_id, user_from_principal
+from app.core.password_hashing import HashingOverloaded, password_hasher
 from app.models.database import get_db, SessionLocal
 from app.models.schemas import User, UserSession
 from app.utils.config import settings
 
 router = APIRouter()
 security = HTTPBearer()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # Pydantic models
 class UserLogin(BaseModel):
@@ -48,13 +49,26 @@ class PasswordUpdate(BaseModel):
     new_password: str
 
 # Helper functions
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+def _hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is busy, please retry",
+        headers={"Retry-After": "1"},
+    )
+
+async def verify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password off the event loop; also returns a new hash if the stored one is below BCRYPT_ROUNDS"""
+    try:
+        return await password_hasher.verify_and_update(plain_password, hashed_password)
+    except HashingOverloaded:
+        raise _hashing_busy()
 
-def get_password_hash(password: str) -> str:
-    """Hash a password"""
-    return pwd_context.hash(password)
+async def get_password_hash(password: str) -> str:
+    """Hash a password off the event loop"""
+    try:
+        return await password_hasher.hash(password)
+    except HashingOverloaded:
+        raise _hashing_busy()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
@@ -64,7 +78,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(hours=24)
 
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm="HS256")
     return encoded_jwt
 
@@ -84,19 +98,33 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         if user_id is None:
             raise credentials_exception
 
-        # Get user from database
-        user = db.query(User).filter(User.id == user_id).first()
-        if user is None:
-            raise credentials_exception
+        # Cached principal for this token, else the user and a live session from the database
+        jti = token_id(payload, credentials.credentials)
+        principal = auth_cache.get(user_id, jti)
+        if principal is None:
+            user = (
+                db.query(User)
+                .join(UserSession, UserSession.user_id == User.id)
+                .filter(
+                    User.id == user_id,
+                    UserSession.token == credentials.credentials,
+                    UserSession.expires_at > datetime.utcnow()
+                )
+                .first()
+            )
+            if user is None:
+                raise credentials_exception
+            principal = principal_from_user(user)
+            auth_cache.set(user_id, jti, principal, payload.get("exp"))
 
         # Check if user is active
-        if not user.is_active:
+        if not principal['is_active']:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Inactive user"
             )
 
-        return user
+        return user_from_principal(principal)
 
     except jwt.PyJWTError:
         raise HTTPException(
@@ -125,7 +153,7 @@ async def register(user_data: UserRegister, db: SessionLocal = Depends(get_db)):
             )
 
         # Create new user
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await get_password_hash(user_data.password)
         new_user = User(
             email=user_data.email,
             hashed_password=hashed_password,
@@ -193,7 +221,8 @@ async def login(user_credentials: UserLogin, db: SessionLocal = Depends(get_db))
             )
 
         # Verify password
-        if not verify_password(user_credentials.password, user.hashed_password):
+        verified, upgraded_hash = await verify_password(user_credentials.password, user.hashed_password)
+        if not verified:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid email or password"
@@ -213,6 +242,10 @@ async def login(user_credentials: UserLogin, db: SessionLocal = Depends(get_db))
             expires_delta=access_token_expires
         )
 
+        # Stored hash is below the current cost factor; save the rehash with the session
+        if upgraded_hash:
+            user.hashed_password = upgraded_hash
+
         # Save user session
         user_session = UserSession(
             user_id=user.id,
@@ -254,6 +287,7 @@ async def logout(current_user: User = Depends(get_current_user),
         # Invalidate user sessions
         db.query(UserSession).filter(UserSession.user_id == current_user.id).delete()
         db.commit()
+        auth_cache.invalidate_user(current_user.id)
 
         logger.info(f"User logged out: {current_user.email}")
 
@@ -294,15 +328,17 @@ async def update_profile(
                 detail=f"Invalid risk profile. Must be one of: {list(settings.RISK_PROFILES.keys())}"
             )
 
-        # Update user profile
-        current_user.risk_profile = risk_profile
+        # Update user profile; current_user is a cached copy, so change the stored row
+        user = db.get(User, current_user.id)
+        user.risk_profile = risk_profile
         if kalshi_api_key is not None:
-            current_user.kalshi_api_key = kalshi_api_key
+            user.kalshi_api_key = kalshi_api_key
         if kalshi_private_key is not None:
-            current_user.kalshi_private_key = kalshi_private_key
+            user.kalshi_private_key = kalshi_private_key
 
-        current_user.updated_at = datetime.utcnow()
+        user.updated_at = datetime.utcnow()
         db.commit()
+        auth_cache.invalidate_user(current_user.id)
 
         logger.info(f"User profile updated: {current_user.email}")
 
@@ -326,24 +362,27 @@ async def change_password(
 ):
     """Change user password"""
     try:
-        # Verify current password
-        if not verify_password(password_data.current_password, current_user.hashed_password):
+        # Verify current password against the stored row; current_user is a cached copy
+        user = db.get(User, current_user.id)
+        verified, _ = await verify_password(password_data.current_password, user.hashed_password)
+        if not verified:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Current password is incorrect"
             )
 
         # Hash new password
-        new_hashed_password = get_password_hash(password_data.new_password)
+        new_hashed_password = await get_password_hash(password_data.new_password)
 
         # Update password
-        current_user.hashed_password = new_hashed_password
-        current_user.updated_at = datetime.utcnow()
+        user.hashed_password = new_hashed_password
+        user.updated_at = datetime.utcnow()
         db.commit()
 
         # Invalidate all user sessions (force re-login)
         db.query(UserSession).filter(UserSession.user_id == current_user.id).delete()
         db.commit()
+        auth_cache.invalidate_user(current_user.id)
 
         logger.info(f"Password changed for user: {current_user.email}")
 
@@ -397,6 +436,7 @@ async def revoke_all_sessions(current_user: User = Depends(get_current_user),
         # Delete all user sessions
         deleted_count = db.query(UserSession).filter(UserSession.user_id == current_user.id).delete()
         db.commit()
+        auth_cache.invalidate_user(current_user.id)
 
         logger.info(f"All sessions revoked for user: {current_user.email}")
 
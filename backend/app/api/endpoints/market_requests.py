@@ -3,9 +3,10 @@ from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.endpoints.auth import get_current_user
-from app.models.database import SessionLocal, get_db
+from app.models.database import get_async_db
 from app.models.enums import MarketRequestStatus
 from app.models.schemas import MarketRequest
 
@@ -19,7 +20,7 @@ class MarketRequestPayload(BaseModel):
 
 
 @router.post("/")
-async def create_request(payload: MarketRequestPayload, current_user=Depends(get_current_user), db: SessionLocal = Depends(get_db)):
+async def create_request(payload: MarketRequestPayload, current_user=Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     if not payload.market_ticker and not payload.query_text:
         raise HTTPException(status_code=400, detail="Ticker or query_text required")
     request = MarketRequest(
@@ -31,6 +32,6 @@ async def create_request(payload: MarketRequestPayload, current_user=Depends(get
         created_at=datetime.utcnow(),
     )
     db.add(request)
-    db.commit()
-    db.refresh(request)
+    await db.commit()
+    await db.refresh(request)
     return request
@@ -1,18 +1,26 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends, Response
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timedelta
 from loguru import logger
+from sqlalchemy import case, func
+from sqlalchemy.ext.asyncio import AsyncSession
+import uuid
 
+from app.core.catalog_sync import current_catalog_version
 from app.core.kalshi_client import kalshi_client
-from app.models.database import get_db, SessionLocal
-from app.models.schemas import Market, MarketPrice, MarketAccess
+from app.core.market_search import market_search_index
+from app.models.database import get_async_db, get_db, SessionLocal
+from app.models.schemas import Market, MarketPrice, MarketAccess, MarketSeries
 from app.models.enums import MarketCategory, MarketStatus
 from app.api.endpoints.auth import get_current_user
 from app.models.schemas import User
+from app.utils.pagination import keyset_page
 
 router = APIRouter()
 
+MAX_SEARCH_FILTER_HITS = 1000
+
 # Pydantic models
 class MarketResponse(BaseModel):
     market_id: str
@@ -53,103 +61,95 @@ class MarketSeriesResponse(BaseModel):
     markets_count: int
     active_markets: int
 
+def _latest_prices(db, market_ids) -> dict:
+    """Latest stored (price, volume) per market in one grouped query"""
+    if not market_ids:
+        return {}
+    latest = (
+        db.query(func.max(MarketPrice.id).label('id'))
+        .filter(MarketPrice.market_id.in_(market_ids))
+        .group_by(MarketPrice.market_id)
+        .subquery()
+    )
+    rows = db.query(MarketPrice).join(latest, MarketPrice.id == latest.c.id).all()
+    return {row.market_id: (float(row.price), row.volume) for row in rows}
+
+
+def _market_responses(db, markets: List[Market], user_id) -> List[MarketResponse]:
+    market_ids = [market.market_id for market in markets]
+    prices = _latest_prices(db, market_ids)
+    access_rows = db.query(MarketAccess).filter(
+        MarketAccess.user_id == user_id,
+        MarketAccess.market_ticker.in_([str(market_id) for market_id in market_ids])
+    ).all() if market_ids else []
+    access_by_market = {access.market_ticker: access for access in access_rows}
+
+    responses = []
+    for market in markets:
+        current_price, volume = prices.get(market.market_id, (None, None))
+        access = access_by_market.get(str(market.market_id))
+        responses.append(MarketResponse(
+            market_id=str(market.market_id),
+            title=market.title,
+            category=market.category,
+            subtitle=market.subtitle,
+            settle_date=market.settle_date,
+            status=market.status or 'unknown',
+            current_price=current_price,
+            volume=volume,
+            created_at=market.created_at,
+            updated_at=market.updated_at,
+            access_status=access.status if access else None,
+            can_track=bool(access and access.status == 'active')
+        ))
+    return responses
+
+
+def _market_page(db, category, status, search, limit, offset, cursor, user_id):
+    """One page of the catalog as responses, with the next cursor and the catalog version"""
+    query = db.query(Market)
+    if category:
+        query = query.filter(Market.category == category)
+    if status:
+        query = query.filter(Market.status == status)
+    if search:
+        # The index is warmed by market_search_refresh_job; before that, search finds nothing
+        hits = market_search_index.search(search, category=category, limit=MAX_SEARCH_FILTER_HITS)
+        query = query.filter(Market.market_id.in_([uuid.UUID(hit.document.market_id) for hit in hits]))
+
+    markets, next_cursor = keyset_page(query, Market.created_at, Market.market_id, limit, cursor,
+                                       id_type=uuid.UUID, offset=offset)
+    return _market_responses(db, markets, user_id), next_cursor, current_catalog_version(db)
+
+
 @router.get("/", response_model=List[MarketResponse])
 async def get_markets(
+    response: Response,
     category: Optional[str] = Query(None, description="Filter by market category"),
     status: Optional[str] = Query(None, description="Filter by market status"),
     limit: int = Query(50, ge=1, le=1000, description="Maximum number of markets to return"),
-    offset: int = Query(0, ge=0, description="Offset for pagination"),
+    offset: int = Query(0, ge=0, description="Offset for pagination (ignored when cursor is set)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
     search: Optional[str] = Query(None, description="Search term in market titles"),
     current_user: User = Depends(get_current_user),
-    db: SessionLocal = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get list of available markets with optional filtering"""
+    """Get list of available markets from the synced catalog with optional filtering"""
     try:
         logger.info(f"Fetching markets - category: {category}, status: {status}, limit: {limit}")
 
-        # Get markets from Kalshi API
-        kalshi_markets = kalshi_client.get_markets(
-            category=category,
-            status=status,
-            limit=limit,
-            offset=offset
+        saved_markets, next_cursor, catalog_version = await db.run_sync(
+            _market_page, category, status, search, limit, offset, cursor, current_user.id
         )
-
-        # If search term provided, filter results
-        if search:
-            search_lower = search.lower()
-            kalshi_markets = [
-                market for market in kalshi_markets
-                if search_lower in market.get('title', '').lower() or
-                   search_lower in market.get('subtitle', '').lower()
-            ]
-
-        # Save markets to database if not exists
-        saved_markets = []
-        for market_data in kalshi_markets[:limit]:
-            try:
-                # Check if market already exists
-                existing_market = db.query(Market).filter(
-                    Market.market_id == market_data['id']
-                ).first()
-
-                if not existing_market:
-                    # Create new market record
-                    new_market = Market(
-                        market_id=market_data['id'],
-                        title=market_data['title'],
-                        category=market_data.get('category', 'other'),
-                        subtitle=market_data.get('subtitle'),
-                        settle_date=datetime.fromisoformat(market_data['resolve_time']) if market_data.get('resolve_time') else None,
-                        created_at=datetime.utcnow(),
-                        updated_at=datetime.utcnow()
-                    )
-                    db.add(new_market)
-                    db.commit()
-                    db.refresh(new_market)
-                    existing_market = new_market
-                else:
-                    # Update existing market
-                    existing_market.updated_at = datetime.utcnow()
-                    db.commit()
-
-                # Get current price
-                try:
-                    price_info = kalshi_client.get_market_price(market_data['id'])
-                    current_price = float(price_info.get('price', 0))
-                    volume = int(price_info.get('volume', 0))
-                except Exception as e:
-                    logger.warning(f"Failed to get price for market {market_data['id']}: {str(e)}")
-                    current_price = None
-                    volume = None
-
-                access = db.query(MarketAccess).filter(
-                    MarketAccess.user_id == current_user.id,
-                    MarketAccess.market_ticker == existing_market.market_id
-                ).first()
-
-                saved_markets.append(MarketResponse(
-                    market_id=existing_market.market_id,
-                    title=existing_market.title,
-                    category=existing_market.category,
-                    subtitle=existing_market.subtitle,
-                    settle_date=existing_market.settle_date,
-                    status=market_data.get('status', 'unknown'),
-                    current_price=current_price,
-                    volume=volume,
-                    created_at=existing_market.created_at,
-                    updated_at=existing_market.updated_at,
-                    access_status=access.status if access else None,
-                    can_track=bool(access and access.status == 'active')
-                ))
-
-            except Exception as e:
-                logger.error(f"Error saving market {market_data.get('id', 'unknown')}: {str(e)}")
-                continue
+        response.headers["X-Catalog-Version"] = str(catalog_version)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
 
         logger.info(f"Returned {len(saved_markets)} markets")
         return saved_markets
 
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching markets: {str(e)}")
         raise HTTPException(
@@ -157,8 +157,48 @@ async def get_markets(
             detail="Failed to fetch markets"
         )
 
+@router.get("/search")
+async def search_markets(
+    query: str = Query(..., min_length=2, description="Search query"),
+    category: Optional[str] = Query(None, description="Filter by category"),
+    limit: int = Query(20, ge=1, le=100, description="Maximum results"),
+    current_user: User = Depends(get_current_user)
+):
+    """Search markets by title or subtitle; empty until the search index has loaded"""
+    try:
+        hits = market_search_index.search(query, category=category, limit=limit)
+        results = [
+            MarketResponse(
+                market_id=hit.document.market_id,
+                title=hit.document.title,
+                category=hit.document.category,
+                subtitle=hit.document.subtitle,
+                settle_date=hit.document.settle_date,
+                status=hit.document.status or 'unknown',
+                current_price=hit.document.current_price,
+                volume=hit.document.volume,
+                created_at=hit.document.created_at or datetime.utcnow(),
+                updated_at=hit.document.updated_at or datetime.utcnow()
+            )
+            for hit in hits
+        ]
+
+        return {
+            "query": query,
+            "results": results,
+            "total_results": len(results),
+            "category_filter": category
+        }
+
+    except Exception as e:
+        logger.error(f"Error searching markets: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to search markets"
+        )
+
 @router.get("/{market_id}", response_model=MarketDetailResponse)
-async def get_market_detail(
+def get_market_detail(
     market_id: str,
     include_history: bool = Query(False, description="Include price history"),
     history_days: int = Query(30, ge=1, le=365, description="Days of history to include"),
@@ -268,13 +308,12 @@ async def get_market_detail(
         )
 
 @router.get("/{market_id}/history", response_model=MarketHistoryResponse)
-async def get_market_history(
+def get_market_history(
     market_id: str,
     start_date: Optional[datetime] = Query(None, description="Start date for history"),
     end_date: Optional[datetime] = Query(None, description="End date for history"),
     interval: str = Query("1h", description="Data interval (1m, 5m, 1h, 1d)"),
-    current_user: User = Depends(get_current_user),
-    db: SessionLocal = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """Get historical price data for a market"""
     try:
@@ -348,28 +387,51 @@ async def get_market_price(
             detail=f"Failed to fetch market price for {market_id}"
         )
 
+def _series_list(db, category):
+    query = db.query(MarketSeries)
+    if category:
+        query = query.filter(MarketSeries.category == category)
+    series_rows = query.order_by(MarketSeries.series_ticker).all()
+
+    counts = {
+        series_ticker: (int(total), int(active or 0))
+        for series_ticker, total, active in db.query(
+            Market.series_ticker,
+            func.count(Market.market_id),
+            func.sum(case((Market.status == MarketStatus.OPEN.value, 1), else_=0))
+        )
+        .filter(Market.series_ticker.in_([series.series_ticker for series in series_rows]))
+        .group_by(Market.series_ticker)
+        .all()
+    } if series_rows else {}
+
+    series_list = []
+    for series in series_rows:
+        markets_count, active_markets = counts.get(series.series_ticker, (0, 0))
+        series_list.append(MarketSeriesResponse(
+            name=series.title or series.series_ticker,
+            category=series.category or 'other',
+            description=series.description,
+            markets_count=markets_count,
+            active_markets=active_markets
+        ))
+
+    return series_list, current_catalog_version(db)
+
+
 @router.get("/series/list", response_model=List[MarketSeriesResponse])
 async def get_market_series(
+    response: Response,
     category: Optional[str] = Query(None, description="Filter by category"),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get available market series"""
+    """Get available market series from the synced catalog"""
     try:
         logger.info("Fetching market series")
 
-        # Get series from Kalshi API
-        series_data = kalshi_client.get_market_series(category=category)
-
-        series_list = []
-        for series in series_data:
-            series_list.append(MarketSeriesResponse(
-                name=series.get('name', ''),
-                category=series.get('category', 'other'),
-                description=series.get('description'),
-                markets_count=int(series.get('markets_count', 0)),
-                active_markets=int(series.get('active_markets', 0))
-            ))
-
+        series_list, catalog_version = await db.run_sync(_series_list, category)
+        response.headers["X-Catalog-Version"] = str(catalog_version)
         return series_list
 
     except Exception as e:
@@ -399,70 +461,3 @@ async def get_market_categories(current_user: User = Depends(get_current_user)):
             status_code=500,
             detail="Failed to fetch market categories"
         )
-
-@router.get("/search")
-async def search_markets(
-    query: str = Query(..., min_length=2, description="Search query"),
-    category: Optional[str] = Query(None, description="Filter by category"),
-    limit: int = Query(20, ge=1, le=100, description="Maximum results"),
-    current_user: User = Depends(get_current_user),
-    db: SessionLocal = Depends(get_db)
-):
-    """Search markets by title or subtitle"""
-    try:
-        logger.info(f"Searching markets with query: {query}")
-
-        # Get markets and filter by search term
-        all_markets = kalshi_client.get_markets(category=category, limit=500)
-        search_lower = query.lower()
-
-        # Filter markets
-        filtered_markets = []
-        for market in all_markets:
-            title = market.get('title', '').lower()
-            subtitle = market.get('subtitle', '').lower()
-
-            if search_lower in title or search_lower in subtitle:
-                filtered_markets.append(market)
-
-            if len(filtered_markets) >= limit:
-                break
-
-        # Convert to response format
-        results = []
-        for market_data in filtered_markets:
-            try:
-                # Get current price
-                price_info = kalshi_client.get_market_price(market_data['id'])
-                current_price = float(price_info.get('price', 0))
-                volume = int(price_info.get('volume', 0))
-            except:
-                current_price = None
-                volume = None
-
-            results.append(MarketResponse(
-                market_id=market_data['id'],
-                title=market_data['title'],
-                category=market_data.get('category', 'other'),
-                subtitle=market_data.get('subtitle'),
-                settle_date=datetime.fromisoformat(market_data['resolve_time']) if market_data.get('resolve_time') else None,
-                status=market_data.get('status', 'unknown'),
-                current_price=current_price,
-                volume=volume,
-                created_at=datetime.utcnow(),  # Would get from DB in production
-                updated_at=datetime.utcnow()
-            ))
-
-        return {
-            "query": query,
-            "results": results,
-            "total_results": len(results),
-            "category_filter": category
-        }
-
-    except Exception as e:
-        logger.error(f"Error searching markets: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail="Failed to search markets"
-        )
\ No newline at end of file
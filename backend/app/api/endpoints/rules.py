@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.endpoints.auth import get_current_user
-from app.models.database import SessionLocal, get_db
+from app.models.database import get_async_db
 from app.models.schemas import UserRules
 
 router = APIRouter()
@@ -20,24 +22,24 @@ class RulePayload(BaseModel):
 
 
 @router.get("/")
-async def get_rules(current_user=Depends(get_current_user), db: SessionLocal = Depends(get_db)):
-    rules = db.query(UserRules).filter(UserRules.user_id == current_user.id).first()
+async def get_rules(current_user=Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    rules = await db.scalar(select(UserRules).where(UserRules.user_id == current_user.id))
     if not rules:
         rules = UserRules(user_id=current_user.id)
         db.add(rules)
-        db.commit()
-        db.refresh(rules)
+        await db.commit()
+        await db.refresh(rules)
     return rules
 
 
 @router.put("/")
-async def update_rules(payload: RulePayload, current_user=Depends(get_current_user), db: SessionLocal = Depends(get_db)):
-    rules = db.query(UserRules).filter(UserRules.user_id == current_user.id).first()
+async def update_rules(payload: RulePayload, current_user=Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    rules = await db.scalar(select(UserRules).where(UserRules.user_id == current_user.id))
     if not rules:
         rules = UserRules(user_id=current_user.id)
         db.add(rules)
     for field, value in payload.dict(exclude_unset=True).items():
         setattr(rules, field, value)
-    db.commit()
-    db.refresh(rules)
+    await db.commit()
+    await db.refresh(rules)
     return rules
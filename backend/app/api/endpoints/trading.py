@@ -1,18 +1,24 @@
-from fastapi import APIRouter, HTTPException, Query, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Query, Depends, BackgroundTasks, Response
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 import asyncio
+import uuid
 from loguru import logger
 
 from app.core.portfolio import portfolio_manager, TradeExecution
 from app.core.risk_manager import risk_manager, TradeRiskAssessment
 from app.core.kalshi_client import kalshi_client
-from app.models.database import get_db, SessionLocal
+from app.core.pnl_ledger import record_fill, side_price
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.database import get_async_db, get_async_read_db, SessionLocal
 from app.models.schemas import Trade, Position, Market
 from app.models.enums import TradeSide, TradeStatus
 from app.api.endpoints.auth import get_current_user
+from app.core.risk_events import publish_risk_event
 from app.models.schemas import User
+from app.utils.pagination import keyset_page
 
 router = APIRouter()
 
@@ -84,13 +90,47 @@ class RiskAssessmentResponse(BaseModel):
     recommendations: List[str]
     user_risk_profile: str
 
+class BatchRiskAssessmentRequest(BaseModel):
+    candidates: List[RiskAssessmentRequest] = Field(..., min_length=1, max_length=500, description="Candidate trades")
+    greedy: bool = Field(False, description="Allocate capital across candidates in order under cumulative limits")
+
+class BatchRiskAssessmentItem(BaseModel):
+    market_id: str
+    side: str
+    requested_count: int
+    recommended_count: int
+    kelly_size_percent: float
+    approved: bool
+    risk_level: str
+    risk_score: float
+    position_size: float
+    max_loss: float
+    risk_checks: List[Dict[str, Any]]
+    recommendations: List[str]
+
+class BatchRiskAssessmentResponse(BaseModel):
+    assessments: List[BatchRiskAssessmentItem]
+    approved_count: int
+    greedy: bool
+    user_risk_profile: str
+
+class AllocationCandidate(BaseModel):
+    market_id: str
+    price: Optional[float] = Field(None, gt=0, lt=1, description="Yes price (uses market price if not specified)")
+    probability: Optional[float] = Field(None, ge=0, le=1, description="Probability the market settles yes")
+    ensemble_prediction: Optional[float] = Field(None, ge=-100, le=100, description="Ensemble score used when probability is not given")
+    confidence: Optional[float] = Field(None, ge=0, le=100, description="Ensemble confidence")
+
+class PortfolioAllocationRequest(BaseModel):
+    candidates: List[AllocationCandidate] = Field(..., min_length=1, max_length=500)
+
 @router.post("/orders", response_model=OrderResponse)
 async def place_order(
     order: OrderRequest,
     background_tasks: BackgroundTasks,
     auto_risk_check: bool = Query(True, description="Perform automatic risk assessment"),
     current_user: User = Depends(get_current_user),
-    db: SessionLocal = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Place a new trading order with optional risk assessment"""
     try:
@@ -124,14 +164,17 @@ async def place_order(
         risk_assessment = None
         if auto_risk_check:
             try:
-                risk_assessment_result = risk_manager.assess_trade_risk(
+                # The tail-risk simulation is CPU bound; keep it off the event loop
+                risk_assessment_result = await asyncio.to_thread(
+                    risk_manager.assess_trade_risk,
                     market_id=order.market_id,
                     side=order.side,
                     count=order.count,
                     price=order.price,
                     expected_return=order.expected_return,
                     win_probability=order.win_probability,
-                    user_risk_profile=current_user.risk_profile
+                    user_risk_profile=current_user.risk_profile,
+                    user_id=current_user.id
                 )
 
                 # Convert to dict for response
@@ -186,17 +229,7 @@ async def place_order(
 
         # Save trade to database
         try:
-            new_trade = Trade(
-                market_id=order.market_id,
-                side=order.side,
-                count=order.count,
-                price=order.price,
-                status=TradeStatus.PENDING,  # Will be updated by background task
-                created_at=trade_execution.executed_at
-            )
-            db.add(new_trade)
-            db.commit()
-            db.refresh(new_trade)
+            new_trade = await db.run_sync(_save_trade, order, trade_execution.executed_at)
 
             # Update trade execution with database ID
             trade_execution.trade_id = str(new_trade.id)
@@ -209,7 +242,8 @@ async def place_order(
         background_tasks.add_task(
             _monitor_trade_status,
             str(new_trade.id) if 'new_trade' in locals() else trade_execution.trade_id,
-            order.market_id
+            order.market_id,
+            current_user.id
         )
 
         # Update risk manager
@@ -240,7 +274,31 @@ async def place_order(
             detail=f"Failed to place order: {str(e)}"
         )
 
-async def _monitor_trade_status(trade_id: str, market_id: str):
+def _save_trade(db, order: OrderRequest, created_at: datetime) -> Trade:
+    trade = Trade(
+        market_id=order.market_id,
+        side=order.side,
+        count=order.count,
+        price=order.price,
+        status=TradeStatus.PENDING,  # Will be updated by background task
+        created_at=created_at
+    )
+    db.add(trade)
+    db.commit()
+    db.refresh(trade)
+    return trade
+
+def _positions_opened_at(db, position_ids: List[str]) -> Dict[str, datetime]:
+    """Trade creation time per position id, in one query"""
+    rows = (
+        db.query(Position.id, Trade.created_at)
+        .join(Trade, Position.trade_id == Trade.id)
+        .filter(Position.id.in_([uuid.UUID(str(position_id)) for position_id in position_ids]))
+        .all()
+    ) if position_ids else []
+    return {str(position_id): created_at for position_id, created_at in rows}
+
+async def _monitor_trade_status(trade_id: str, market_id: str, user_id=None):
     """Background task to monitor trade status and create position"""
     try:
         logger.info(f"Monitoring trade status for {trade_id}")
@@ -269,6 +327,33 @@ async def _monitor_trade_status(trade_id: str, market_id: str):
                 db.add(new_position)
                 db.commit()
 
+                # Record the fill in the ledger and today's spend
+                if user_id is not None:
+                    record_fill(
+                        db, user_id, str(trade.market_id), trade.count,
+                        side_price(trade.side, trade.price), now=trade.filled_at
+                    )
+
+                # Add the position to the in-memory book and let the risk
+                # monitor pick up the new exposure right away
+                portfolio_manager.register_position(
+                    position_id=new_position.id,
+                    market_id=str(trade.market_id),
+                    side=trade.side,
+                    count=trade.count,
+                    price=float(trade.price),
+                    opened_at=trade.created_at,
+                    market_title=trade.market.title if trade.market else None,
+                    category=trade.market.category if trade.market else None
+                )
+                publish_risk_event('fill', str(trade.market_id), {
+                    'position_id': new_position.id,
+                    'side': trade.side,
+                    'count': trade.count,
+                    'price': float(trade.price),
+                    'category': trade.market.category if trade.market else None
+                })
+
                 logger.info(f"Trade {trade_id} filled and position created")
 
         finally:
@@ -283,7 +368,7 @@ async def get_positions(
     risk_level: Optional[str] = Query(None, description="Filter by risk level"),
     limit: int = Query(50, ge=1, le=500, description="Maximum positions to return"),
     current_user: User = Depends(get_current_user),
-    db: SessionLocal = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get current open positions"""
     try:
@@ -307,15 +392,13 @@ async def get_positions(
         # Apply limit
         filtered_positions = filtered_positions[:limit]
 
+        # Get created_at from database
+        opened_at = await db.run_sync(_positions_opened_at, [p.position_id for p in filtered_positions])
+
         # Convert to response format
         positions_response = []
         for position in filtered_positions:
             try:
-                # Get created_at from database
-                db_position = db.query(Position).filter(
-                    Position.id == position.position_id
-                ).first()
-
                 positions_response.append(PositionResponse(
                     position_id=position.position_id,
                     market_id=position.market_id,
@@ -329,7 +412,7 @@ async def get_positions(
                     unrealized_pnl_percent=position.unrealized_pnl_percent,
                     duration_hours=position.duration_hours,
                     risk_level=position.risk_level,
-                    created_at=db_position.trade.created_at if db_position else datetime.utcnow(),
+                    created_at=opened_at.get(str(position.position_id)) or datetime.utcnow(),
                     updated_at=datetime.utcnow()
                 ))
 
@@ -350,7 +433,7 @@ async def get_positions(
 async def get_position_detail(
     position_id: str,
     current_user: User = Depends(get_current_user),
-    db: SessionLocal = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get detailed information for a specific position"""
     try:
@@ -370,7 +453,7 @@ async def get_position_detail(
             )
 
         # Get additional details from database
-        db_position = db.query(Position).filter(Position.id == position_id).first()
+        opened_at = await db.run_sync(_positions_opened_at, [position_id])
 
         return PositionResponse(
             position_id=position.position_id,
@@ -385,7 +468,7 @@ async def get_position_detail(
             unrealized_pnl_percent=position.unrealized_pnl_percent,
             duration_hours=position.duration_hours,
             risk_level=position.risk_level,
-            created_at=db_position.trade.created_at if db_position else datetime.utcnow(),
+            created_at=opened_at.get(str(position.position_id)) or datetime.utcnow(),
             updated_at=datetime.utcnow()
         )
 
@@ -402,15 +485,14 @@ async def get_position_detail(
 async def close_position(
     position_id: str,
     reason: str = Query("manual", description="Reason for closing position"),
-    current_user: User = Depends(get_current_user),
-    db: SessionLocal = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """Close a specific position"""
     try:
         logger.info(f"Closing position {position_id}: {reason}")
 
         # Close position through portfolio manager
-        close_result = await portfolio_manager.close_position(position_id, reason)
+        close_result = await portfolio_manager.close_position(position_id, reason, user_id=current_user.id)
 
         if not close_result:
             raise HTTPException(
@@ -418,13 +500,6 @@ async def close_position(
                 detail=f"Position {position_id} not found or could not be closed"
             )
 
-        # Update position in database
-        position = db.query(Position).filter(Position.id == position_id).first()
-        if position:
-            # Mark position as closed (simplified - would track closing trade properly)
-            position.updated_at = datetime.utcnow()
-            db.commit()
-
         return {
             "message": f"Position {position_id} closed successfully",
             "position_id": position_id,
@@ -444,52 +519,39 @@ async def close_position(
 
 @router.get("/history", response_model=List[TradeResponse])
 async def get_trade_history(
+    response: Response,
     start_date: Optional[datetime] = Query(None, description="Start date filter"),
     end_date: Optional[datetime] = Query(None, description="End date filter"),
     status: Optional[str] = Query(None, description="Filter by trade status"),
     market_id: Optional[str] = Query(None, description="Filter by market"),
     limit: int = Query(100, ge=1, le=1000, description="Maximum trades to return"),
-    offset: int = Query(0, ge=0, description="Offset for pagination"),
+    offset: int = Query(0, ge=0, description="Offset for pagination (ignored when cursor is set)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
     current_user: User = Depends(get_current_user),
-    db: SessionLocal = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get trading history"""
     try:
-        logger.info(f"Fetching trade history - limit: {limit}, offset: {offset}")
+        logger.info(f"Fetching trade history - limit: {limit}, cursor: {cursor is not None}, offset: {offset}")
 
-        # Build query
-        query = db.query(Trade).join(Market)
-
-        if start_date:
-            query = query.filter(Trade.created_at >= start_date)
-        if end_date:
-            query = query.filter(Trade.created_at <= end_date)
-        if status:
-            query = query.filter(Trade.status == status)
-        if market_id:
-            query = query.filter(Trade.market_id == market_id)
-
-        # Order by creation date (newest first) and apply pagination
-        trades = query.order_by(Trade.created_at.desc()).offset(offset).limit(limit).all()
+        rows, next_cursor = await db.run_sync(
+            _trade_history_page, start_date, end_date, status, market_id, limit, offset, cursor
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
 
         # Convert to response format
         trade_responses = []
-        for trade in trades:
-            # Calculate realized P&L for closed positions
+        for trade, market_title, unrealized_pnl in rows:
+            # This is simplified - proper P&L calculation would consider closing price
             realized_pnl = None
-            if trade.status == TradeStatus.FILLED:
-                try:
-                    position = db.query(Position).filter(Position.trade_id == trade.id).first()
-                    if position and position.unrealized_pnl is not None:
-                        # This is simplified - proper P&L calculation would consider closing price
-                        realized_pnl = position.unrealized_pnl
-                except:
-                    pass
+            if trade.status == TradeStatus.FILLED and unrealized_pnl is not None:
+                realized_pnl = unrealized_pnl
 
             trade_responses.append(TradeResponse(
                 trade_id=str(trade.id),
-                market_id=trade.market_id,
-                market_title=trade.market.title if trade.market else "Unknown Market",
+                market_id=str(trade.market_id),
+                market_title=market_title or "Unknown Market",
                 side=trade.side,
                 count=trade.count,
                 price=float(trade.price),
@@ -502,6 +564,8 @@ async def get_trade_history(
 
         return trade_responses
 
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching trade history: {str(e)}")
         raise HTTPException(
@@ -509,6 +573,26 @@ async def get_trade_history(
             detail="Failed to fetch trade history"
         )
 
+def _trade_history_page(db, start_date, end_date, status, market_id, limit, offset, cursor):
+    # Trade, market title and position P&L in a single round trip
+    query = (
+        db.query(Trade, Market.title, Position.unrealized_pnl)
+        .join(Market, Trade.market_id == Market.market_id)
+        .outerjoin(Position, Position.trade_id == Trade.id)
+    )
+
+    if start_date:
+        query = query.filter(Trade.created_at >= start_date)
+    if end_date:
+        query = query.filter(Trade.created_at <= end_date)
+    if status:
+        query = query.filter(Trade.status == status)
+    if market_id:
+        query = query.filter(Trade.market_id == market_id)
+
+    # Newest first on (created_at, id), backed by idx_trades_created_id
+    return keyset_page(query, Trade.created_at, Trade.id, limit, cursor, id_type=uuid.UUID, offset=offset)
+
 @router.get("/portfolio/metrics")
 async def get_portfolio_metrics(current_user: User = Depends(get_current_user)):
     """Get comprehensive portfolio performance metrics"""
@@ -563,12 +647,13 @@ async def get_portfolio_performance(
         )
 
 @router.get("/portfolio/allocation")
-async def get_portfolio_allocation(current_user: User = Depends(get_current_user)):
+async def get_portfolio_allocation(current_user: User = Depends(get_current_user),
+                                   db: AsyncSession = Depends(get_async_read_db)):
     """Get portfolio allocation by market category"""
     try:
         logger.info("Fetching portfolio allocation")
 
-        allocation = portfolio_manager.get_portfolio_allocation()
+        allocation = await db.run_sync(portfolio_manager.get_portfolio_allocation)
 
         return allocation
 
@@ -599,15 +684,17 @@ async def assess_trade_risk(
                     detail="Failed to get market price"
                 )
 
-        # Perform risk assessment
-        risk_assessment = risk_manager.assess_trade_risk(
+        # Perform risk assessment off the event loop (runs the tail-risk simulation)
+        risk_assessment = await asyncio.to_thread(
+            risk_manager.assess_trade_risk,
             market_id=request.market_id,
             side=request.side,
             count=request.count,
             price=request.price,
             expected_return=request.expected_return,
             win_probability=request.win_probability,
-            user_risk_profile=current_user.risk_profile
+            user_risk_profile=current_user.risk_profile,
+            user_id=current_user.id
         )
 
         return RiskAssessmentResponse(
@@ -638,6 +725,128 @@ async def assess_trade_risk(
             detail="Failed to perform risk assessment"
         )
 
+def _candidate_prices(candidates) -> Dict[str, float]:
+    """Current price of each distinct market among candidates that came without one"""
+    prices = {}
+    for market_id in dict.fromkeys(candidate.market_id for candidate in candidates if candidate.price is None):
+        try:
+            prices[market_id] = float(kalshi_client.get_market_price(market_id).get('price', 0.5))
+        except Exception:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to get market price for {market_id}"
+            )
+    return prices
+
+@router.post("/risk/assess/batch", response_model=BatchRiskAssessmentResponse)
+async def assess_trade_risk_batch(
+    request: BatchRiskAssessmentRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Assess many candidate trades against one portfolio snapshot"""
+    try:
+        logger.info(f"Performing batch risk assessment for {len(request.candidates)} candidates")
+
+        prices = await asyncio.to_thread(_candidate_prices, request.candidates)
+        candidates = []
+        for candidate in request.candidates:
+            candidates.append({
+                'market_id': candidate.market_id,
+                'side': candidate.side.value,
+                'count': candidate.count,
+                'price': candidate.price if candidate.price is not None else prices[candidate.market_id],
+                'expected_return': candidate.expected_return,
+                'win_probability': candidate.win_probability
+            })
+
+        # Off the event loop: the candidates share one tail-risk simulation
+        results = await asyncio.to_thread(
+            risk_manager.assess_trades_batch,
+            candidates,
+            user_risk_profile=current_user.risk_profile,
+            greedy=request.greedy,
+            user_id=current_user.id
+        )
+
+        assessments = [
+            BatchRiskAssessmentItem(
+                market_id=result.market_id,
+                side=result.side,
+                requested_count=result.requested_count,
+                recommended_count=result.recommended_count,
+                kelly_size_percent=result.kelly_size_percent,
+                approved=result.assessment.approved,
+                risk_level=result.assessment.risk_level.value,
+                risk_score=result.assessment.risk_score,
+                position_size=result.assessment.position_size,
+                max_loss=result.assessment.max_loss,
+                risk_checks=[
+                    {
+                        'passed': check.passed,
+                        'level': check.level.value,
+                        'message': check.message,
+                        'details': check.details
+                    }
+                    for check in result.assessment.risk_checks
+                ],
+                recommendations=result.assessment.recommendations
+            )
+            for result in results
+        ]
+
+        return BatchRiskAssessmentResponse(
+            assessments=assessments,
+            approved_count=sum(item.approved for item in assessments),
+            greedy=request.greedy,
+            user_risk_profile=current_user.risk_profile
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error performing batch risk assessment: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to perform batch risk assessment"
+        )
+
+@router.post("/risk/optimize")
+async def optimize_portfolio_allocation(
+    request: PortfolioAllocationRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Jointly size a set of simultaneous opportunities with portfolio-level Kelly"""
+    try:
+        logger.info(f"Optimizing portfolio allocation for {len(request.candidates)} candidates")
+
+        prices = await asyncio.to_thread(_candidate_prices, request.candidates)
+        candidates = [
+            {**candidate.model_dump(),
+             'price': candidate.price if candidate.price is not None else prices[candidate.market_id]}
+            for candidate in request.candidates
+        ]
+
+        # Off the event loop: the scenario matrix and gradient ascent take up to the solver's time budget
+        result = await asyncio.to_thread(
+            risk_manager.optimize_portfolio_allocation,
+            candidates,
+            user_risk_profile=current_user.risk_profile,
+            user_id=current_user.id
+        )
+        if not result:
+            raise HTTPException(status_code=500, detail="Failed to optimize portfolio allocation")
+
+        return result
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error optimizing portfolio allocation: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to optimize portfolio allocation"
+        )
+
 @router.get("/risk/metrics")
 async def get_risk_metrics(current_user: User = Depends(get_current_user)):
     """Get current risk management metrics"""
@@ -655,6 +864,21 @@ async def get_risk_metrics(current_user: User = Depends(get_current_user)):
             detail="Failed to fetch risk metrics"
         )
 
+@router.get("/risk/simulation")
+async def get_risk_simulation(current_user: User = Depends(get_current_user)):
+    """Get Monte Carlo VaR and expected shortfall for open positions"""
+    try:
+        logger.info("Simulating portfolio tail risk")
+
+        return await asyncio.to_thread(risk_manager.simulate_portfolio_risk)
+
+    except Exception as e:
+        logger.error(f"Error simulating portfolio risk: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to simulate portfolio risk"
+        )
+
 @router.post("/risk/emergency-stop")
 async def toggle_emergency_stop(
     active: bool = Query(..., description="Activate or deactivate emergency stop"),
@@ -4,10 +4,12 @@ from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.endpoints.auth import get_current_user
 from app.core.watchlist import add_to_watchlist, remove_from_watchlist, watchlist_payload
-from app.models.database import SessionLocal, get_db
+from app.models.database import get_async_db, get_async_read_db
 from app.models.schemas import DecisionReceipt, WatchlistOverride, Watchlist
 from app.models.enums import DecisionReason
 
@@ -32,8 +34,8 @@ class OverridePayload(BaseModel):
 
 
 @router.get("/", response_model=List[WatchlistEntry])
-async def list_watchlist(current_user=Depends(get_current_user), db: SessionLocal = Depends(get_db)):
-    return watchlist_payload(db, current_user.id)
+async def list_watchlist(current_user=Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(watchlist_payload, current_user.id)
 
 
 @router.post("/{market_ticker}")
@@ -41,10 +43,10 @@ async def track_market(
     market_ticker: str,
     alerts_enabled: bool = True,
     current_user=Depends(get_current_user),
-    db: SessionLocal = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     try:
-        entry = add_to_watchlist(db, current_user.id, market_ticker, None, alerts_enabled)
+        entry = await db.run_sync(add_to_watchlist, current_user.id, market_ticker, None, alerts_enabled)
         return {"market_ticker": entry.market_ticker, "expires_at": entry.expires_at}
     except PermissionError:
         raise HTTPException(status_code=403, detail="Access not granted for this market")
@@ -56,21 +58,19 @@ async def track_market(
 async def untrack_market(
     market_ticker: str,
     current_user=Depends(get_current_user),
-    db: SessionLocal = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    remove_from_watchlist(db, current_user.id, market_ticker)
+    await db.run_sync(remove_from_watchlist, current_user.id, market_ticker)
     return {"status": "removed"}
 
 
 @router.get("/{market_ticker}/override", response_model=OverridePayload)
-async def get_override(market_ticker: str, current_user=Depends(get_current_user), db: SessionLocal = Depends(get_db)):
-    override = (
-        db.query(WatchlistOverride)
-        .filter(
+async def get_override(market_ticker: str, current_user=Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    override = await db.scalar(
+        select(WatchlistOverride).where(
             WatchlistOverride.user_id == current_user.id,
             WatchlistOverride.market_ticker == market_ticker,
         )
-        .first()
     )
     if not override:
         raise HTTPException(status_code=404, detail="Override not found")
@@ -82,15 +82,13 @@ async def upsert_override(
     market_ticker: str,
     payload: OverridePayload,
     current_user=Depends(get_current_user),
-    db: SessionLocal = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    override = (
-        db.query(WatchlistOverride)
-        .filter(
+    override = await db.scalar(
+        select(WatchlistOverride).where(
             WatchlistOverride.user_id == current_user.id,
             WatchlistOverride.market_ticker == market_ticker,
         )
-        .first()
     )
     if not override:
         override = WatchlistOverride(user_id=current_user.id, market_ticker=market_ticker)
@@ -98,34 +96,31 @@ async def upsert_override(
     for field, value in payload.dict(exclude_unset=True).items():
         setattr(override, field, value)
     override.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(override)
+    await db.commit()
+    await db.refresh(override)
     return override
 
 
 @router.delete("/{market_ticker}/override")
-async def delete_override(market_ticker: str, current_user=Depends(get_current_user), db: SessionLocal = Depends(get_db)):
-    override = (
-        db.query(WatchlistOverride)
-        .filter(
+async def delete_override(market_ticker: str, current_user=Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    override = await db.scalar(
+        select(WatchlistOverride).where(
             WatchlistOverride.user_id == current_user.id,
             WatchlistOverride.market_ticker == market_ticker,
         )
-        .first()
     )
     if override:
-        db.delete(override)
-        db.commit()
+        await db.delete(override)
+        await db.commit()
     return {"status": "deleted"}
 
 
 @router.get("/decision-trace")
-async def decision_trace(current_user=Depends(get_current_user), db: SessionLocal = Depends(get_db)):
-    receipts = (
-        db.query(DecisionReceipt)
-        .filter(DecisionReceipt.user_id == current_user.id)
+async def decision_trace(current_user=Depends(get_current_user), db: AsyncSession = Depends(get_async_read_db)):
+    receipts = await db.scalars(
+        select(DecisionReceipt)
+        .where(DecisionReceipt.user_id == current_user.id)
         .order_by(DecisionReceipt.ts.desc())
         .limit(50)
-        .all()
     )
-    return receipts
+    return receipts.all()
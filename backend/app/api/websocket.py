@@ -8,7 +8,9 @@ from collections import defaultdict
 from loguru import logger
 
 from app.core.kalshi_client import kalshi_client
+from app.core.opportunities import opportunity_prices
 from app.core.portfolio import portfolio_manager
+from app.core.risk_events import publish_risk_event, run_risk_monitor
 from app.core.risk_manager import risk_manager
 from app.models.database import SessionLocal
 from app.models.schemas import Market, Position, Trade
@@ -361,14 +363,25 @@ async def market_data_updater():
         try:
             await asyncio.sleep(60)  # Update every minute
 
-            # Get markets with active subscribers
-            markets_to_update = list(manager.market_subscriptions.keys())[:20]  # Limit to 20 markets
+            # Get markets with active subscribers, plus every market we hold a position in
+            subscribed_markets = list(manager.market_subscriptions.keys())[:20]  # Limit to 20 markets
+            held_markets = [
+                m for m in set(risk_manager.market_positions) | set(portfolio_manager.position_book.markets())
+                if m not in subscribed_markets
+            ]
+            markets_to_update = subscribed_markets + held_markets
 
             for market_id in markets_to_update:
                 try:
                     # Get current market data
                     price_info = kalshi_client.get_market_price(market_id)
 
+                    # Feed the tick to the position book and the risk monitor
+                    if price_info.get('price') is not None:
+                        portfolio_manager.on_price_tick(market_id, float(price_info['price']))
+                        opportunity_prices.on_price_tick(market_id, float(price_info['price']), price_info.get('volume'))
+                        publish_risk_event('price', market_id, {'price': price_info.get('price')})
+
                     # Broadcast to subscribers
                     await manager.broadcast_to_market(market_id, {
                         'type': WebSocketEvent.MARKET_UPDATE.value,
@@ -443,61 +456,33 @@ async def portfolio_updater():
             logger.error(f"Error in portfolio updater: {str(e)}")
             await asyncio.sleep(300)
 
-async def risk_monitor():
-    """Monitor risk metrics and send alerts"""
-    while True:
-        try:
-            await asyncio.sleep(180)  # Check every 3 minutes
-
-            if manager.active_connections:
-                try:
-                    # Get risk metrics
-                    risk_metrics = risk_manager.get_risk_metrics()
-
-                    # Check for risk alerts
-                    alerts = []
-
-                    if risk_metrics.get('current_drawdown', 0) > 10:
-                        alerts.append({
-                            'type': 'drawdown_warning',
-                            'message': f"Portfolio drawdown: {risk_metrics['current_drawdown']:.1f}%",
-                            'severity': 'high' if risk_metrics['current_drawdown'] > 15 else 'medium'
-                        })
-
-                    if risk_metrics.get('daily_pnl', 0) < -risk_metrics.get('portfolio_value', 10000) * 0.02:
-                        alerts.append({
-                            'type': 'daily_loss_warning',
-                            'message': f"Daily loss: ${abs(risk_metrics['daily_pnl']):.2f}",
-                            'severity': 'high'
-                        })
-
-                    if risk_metrics.get('emergency_stop_active', False):
-                        alerts.append({
-                            'type': 'emergency_stop_active',
-                            'message': "Emergency stop is active - all trading halted",
-                            'severity': 'critical'
-                        })
-
-                    # Send alerts if any
-                    if alerts:
-                        message = {
-                            'type': WebSocketEvent.RISK_ALERT.value,
-                            'data': {
-                                'alerts': alerts,
-                                'risk_metrics': risk_metrics,
-                                'timestamp': datetime.utcnow().isoformat()
-                            }
-                        }
-
-                        for user_id in manager.active_connections:
-                            await manager.send_personal_message(user_id, message)
+async def _broadcast_risk_alerts(alerts: List[Dict[str, Any]], risk_metrics: Dict[str, Any],
+                                 trigger: Optional[Dict[str, Any]] = None):
+    """Send risk alerts to all connected users"""
+    metrics = dict(risk_metrics)
+    if isinstance(metrics.get('last_updated'), datetime):
+        metrics['last_updated'] = metrics['last_updated'].isoformat()
+
+    message = {
+        'type': WebSocketEvent.RISK_ALERT.value,
+        'data': {
+            'alerts': alerts,
+            'risk_metrics': metrics,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+    }
+    if trigger:
+        message['data']['trigger'] = {
+            'type': trigger['type'],
+            'market_id': trigger['market_id']
+        }
 
-                except Exception as e:
-                    logger.error(f"Error in risk monitor: {str(e)}")
+    for user_id in list(manager.active_connections):
+        await manager.send_personal_message(user_id, message)
 
-        except Exception as e:
-            logger.error(f"Error in risk monitoring: {str(e)}")
-            await asyncio.sleep(180)
+async def risk_monitor():
+    """Evaluate risk as price ticks and fills arrive and send alerts immediately"""
+    await run_risk_monitor(risk_manager, _broadcast_risk_alerts)
 
 async def heartbeat_checker():
     """Periodically check for dead connections"""
@@ -0,0 +1,438 @@
+"""Durable analysis job queue.
+
+`/api/analysis/refresh` records an `AnalysisJob` with one `AnalysisTask` per
+market and returns. Analysis workers, in dedicated processes or inside the
+API when ANALYSIS_WORKER_IN_PROCESS is set, claim queued tasks with
+`SELECT ... FOR UPDATE SKIP LOCKED`, so any number of workers on any number
+of machines can share the queue without handing out a task twice.
+
+- A market with a queued or running task is not queued again; the new job
+  gets a duplicate task that follows the active one. A partial unique index
+  enforces this, so concurrent refreshes cannot both queue a market.
+- Markets on any active watchlist are claimed first.
+- Each worker runs at most ANALYSIS_WORKER_CONCURRENCY tasks at once.
+- Failed tasks are retried with exponential backoff up to max_attempts.
+- Tasks whose worker stopped heartbeating are returned to the queue, or
+  failed if that lease was their last attempt.
+- A refresh that is not forced reuses an ensemble result younger than
+  ANALYSIS_REUSE_SECONDS instead of analyzing the market again.
+- Results go through the buffered `analysis_writer`; a task is marked done
+  only after the batch holding its rows has been written.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from loguru import logger
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, aliased
+
+from app.core.analysis_writer import AnalysisResultWriter, analysis_writer
+from app.core.catalog_sync import market_uuid
+from app.models.database import SessionLocal
+from app.models.enums import AnalysisTaskStatus
+from app.models.schemas import AnalysisJob, AnalysisResult, AnalysisTask, Watchlist
+from app.utils.config import settings
+
+ACTIVE_STATUSES = (AnalysisTaskStatus.QUEUED.value, AnalysisTaskStatus.RUNNING.value)
+WATCHLIST_PRIORITY = 100
+DEFAULT_PRIORITY = 0
+
+
+def _watched_markets(db: Session, market_ids: Sequence[str], now: datetime) -> set:
+    rows = (
+        db.query(Watchlist.market_ticker)
+        .filter(Watchlist.market_ticker.in_(list(market_ids)), Watchlist.expires_at > now)
+        .distinct()
+        .all()
+    )
+    return {market_ticker for (market_ticker,) in rows}
+
+
+def _insert_queued(db: Session, rows: List[Dict[str, Any]]) -> set:
+    """Insert queued tasks, skipping markets that already have an active one; returns the inserted markets"""
+    if not rows:
+        return set()
+    dialect = sqlite if db.get_bind().dialect.name == 'sqlite' else postgresql
+    statement = (
+        dialect.insert(AnalysisTask.__table__)
+        .values(rows)
+        # The only constraint a fresh row can hit is the unique active-task index
+        .on_conflict_do_nothing()
+        .returning(AnalysisTask.__table__.c.market_id)
+    )
+    return set(db.execute(statement).scalars())
+
+
+def enqueue_analysis(db: Session, market_ids: Sequence[str], user_id=None, force_refresh: bool = False,
+                     priority: Optional[int] = None, now: Optional[datetime] = None) -> AnalysisJob:
+    """
+    Create a job for the markets, reusing any active task per market
+
+    Queued tasks are inserted against the unique active-task index, so two
+    concurrent refreshes of a market cannot both queue it: the loser gets a
+    duplicate task that follows the winner.
+    """
+    now = now or datetime.utcnow()
+    market_ids = list(dict.fromkeys(str(market_id) for market_id in market_ids))
+    watched = _watched_markets(db, market_ids, now)
+    priorities = {
+        market_id: priority if priority is not None else (
+            WATCHLIST_PRIORITY if market_id in watched else DEFAULT_PRIORITY
+        )
+        for market_id in market_ids
+    }
+    try:
+        job = AnalysisJob(user_id=user_id, force_refresh=force_refresh, created_at=now)
+        db.add(job)
+        db.flush()
+
+        pending = market_ids
+        # An active task can finish between the insert and the lookup; such markets are tried again
+        for _ in range(3):
+            inserted = _insert_queued(db, [
+                {
+                    'id': uuid.uuid4(), 'job_id': job.id, 'market_id': market_id,
+                    'status': AnalysisTaskStatus.QUEUED.value, 'priority': priorities[market_id],
+                    'attempts': 0, 'max_attempts': settings.ANALYSIS_TASK_MAX_ATTEMPTS,
+                    'available_at': now, 'created_at': now
+                }
+                for market_id in pending
+            ])
+            pending = [market_id for market_id in pending if market_id not in inserted]
+            if not pending:
+                break
+
+            active = {
+                task.market_id: task
+                for task in db.query(AnalysisTask)
+                .filter(AnalysisTask.market_id.in_(pending), AnalysisTask.status.in_(ACTIVE_STATUSES))
+                .with_for_update()
+                .all()
+            }
+            for market_id, existing in active.items():
+                existing.priority = max(existing.priority, priorities[market_id])
+                db.add(AnalysisTask(
+                    job_id=job.id, market_id=market_id, status=AnalysisTaskStatus.DUPLICATE.value,
+                    priority=priorities[market_id], duplicate_of=existing.id, created_at=now
+                ))
+            pending = [market_id for market_id in pending if market_id not in active]
+            if not pending:
+                break
+        else:
+            raise RuntimeError(f"Could not enqueue analysis for markets {pending}")
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    db.refresh(job)
+    return job
+
+
+def claim_tasks(db: Session, worker_id: str, limit: int, now: Optional[datetime] = None) -> List[AnalysisTask]:
+    """Lock and mark running up to ``limit`` queued tasks, highest priority first"""
+    now = now or datetime.utcnow()
+    if limit <= 0:
+        return []
+    try:
+        tasks = (
+            db.query(AnalysisTask)
+            .filter(
+                AnalysisTask.status == AnalysisTaskStatus.QUEUED.value,
+                AnalysisTask.available_at <= now,
+                AnalysisTask.attempts < AnalysisTask.max_attempts
+            )
+            .order_by(AnalysisTask.priority.desc(), AnalysisTask.created_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        for task in tasks:
+            task.status = AnalysisTaskStatus.RUNNING.value
+            task.attempts += 1
+            task.locked_by = worker_id
+            task.locked_at = now
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return tasks
+
+
+def complete_task(db: Session, task_id, now: Optional[datetime] = None):
+    complete_tasks(db, [task_id], now)
+
+
+def complete_tasks(db: Session, task_ids: Sequence, now: Optional[datetime] = None):
+    if not task_ids:
+        return
+    now = now or datetime.utcnow()
+    db.query(AnalysisTask).filter(AnalysisTask.id.in_(list(task_ids))).update({
+        AnalysisTask.status: AnalysisTaskStatus.DONE.value,
+        AnalysisTask.finished_at: now,
+        AnalysisTask.locked_by: None,
+        AnalysisTask.last_error: None,
+    }, synchronize_session=False)
+    db.commit()
+
+
+def fail_task(db: Session, task_id, error: str, now: Optional[datetime] = None) -> str:
+    """Requeue with backoff, or mark failed once attempts are used up; returns the new status"""
+    now = now or datetime.utcnow()
+    task = db.get(AnalysisTask, task_id)
+    if task is None:
+        return AnalysisTaskStatus.FAILED.value
+    task.last_error = error[:2000]
+    task.locked_by = None
+    if task.attempts < task.max_attempts:
+        backoff = settings.ANALYSIS_RETRY_BACKOFF_SECONDS * 2 ** (task.attempts - 1)
+        task.status = AnalysisTaskStatus.QUEUED.value
+        task.available_at = now + timedelta(seconds=backoff)
+    else:
+        task.status = AnalysisTaskStatus.FAILED.value
+        task.finished_at = now
+    db.commit()
+    return task.status
+
+
+def heartbeat_tasks(db: Session, task_ids: Sequence, now: Optional[datetime] = None):
+    """Extend the lease on tasks a worker is still running"""
+    if not task_ids:
+        return
+    db.query(AnalysisTask).filter(AnalysisTask.id.in_(list(task_ids))).update(
+        {AnalysisTask.locked_at: now or datetime.utcnow()}, synchronize_session=False
+    )
+    db.commit()
+
+
+def requeue_stale(db: Session, now: Optional[datetime] = None) -> int:
+    """
+    Return tasks whose lease expired to the queue; they keep their attempt count
+
+    A task whose expired lease was its last attempt is failed instead.
+    Returns how many leases expired.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(seconds=settings.ANALYSIS_TASK_LEASE_SECONDS)
+    stale = db.query(AnalysisTask).filter(
+        AnalysisTask.status == AnalysisTaskStatus.RUNNING.value, AnalysisTask.locked_at < cutoff
+    )
+    failed = stale.filter(AnalysisTask.attempts >= AnalysisTask.max_attempts).update({
+        AnalysisTask.status: AnalysisTaskStatus.FAILED.value,
+        AnalysisTask.locked_by: None,
+        AnalysisTask.last_error: "Lease expired on the last attempt",
+        AnalysisTask.finished_at: now,
+    }, synchronize_session=False)
+    requeued = stale.filter(AnalysisTask.attempts < AnalysisTask.max_attempts).update({
+        AnalysisTask.status: AnalysisTaskStatus.QUEUED.value,
+        AnalysisTask.locked_by: None,
+        AnalysisTask.available_at: now,
+    }, synchronize_session=False)
+    db.commit()
+    return failed + requeued
+
+
+def job_status(db: Session, job_id) -> Optional[Dict[str, Any]]:
+    """Per-market progress of a job; duplicate tasks report the task they follow"""
+    job = db.get(AnalysisJob, job_id)
+    if job is None:
+        return None
+
+    followed = aliased(AnalysisTask)
+    rows = (
+        db.query(AnalysisTask, followed)
+        .outerjoin(followed, AnalysisTask.duplicate_of == followed.id)
+        .filter(AnalysisTask.job_id == job_id)
+        .order_by(AnalysisTask.priority.desc(), AnalysisTask.created_at)
+        .all()
+    )
+    markets = []
+    counts = {status.value: 0 for status in AnalysisTaskStatus if status != AnalysisTaskStatus.DUPLICATE}
+    for task, original in rows:
+        source = original if original is not None else task
+        counts[source.status] += 1
+        markets.append({
+            'market_id': task.market_id,
+            'status': source.status,
+            'priority': source.priority,
+            'attempts': source.attempts,
+            'deduplicated': original is not None,
+            'last_error': source.last_error,
+            'finished_at': source.finished_at,
+        })
+
+    total = len(markets)
+    finished = counts[AnalysisTaskStatus.DONE.value] + counts[AnalysisTaskStatus.FAILED.value]
+    if finished == total:
+        status = AnalysisTaskStatus.FAILED.value if counts[AnalysisTaskStatus.FAILED.value] == total \
+            else AnalysisTaskStatus.DONE.value
+    elif counts[AnalysisTaskStatus.RUNNING.value] or finished:
+        status = AnalysisTaskStatus.RUNNING.value
+    else:
+        status = AnalysisTaskStatus.QUEUED.value
+
+    return {
+        'job_id': str(job.id),
+        'status': status,
+        'created_at': job.created_at,
+        'force_refresh': job.force_refresh,
+        'total': total,
+        'counts': counts,
+        'progress': finished / total if total else 1.0,
+        'markets': markets,
+    }
+
+
+def queue_depth(db: Session) -> Dict[str, int]:
+    rows = (
+        db.query(AnalysisTask.status, func.count())
+        .filter(AnalysisTask.status.in_(ACTIVE_STATUSES))
+        .group_by(AnalysisTask.status)
+        .all()
+    )
+    return {status: count for status, count in rows}
+
+
+def has_fresh_result(db: Session, market_id: str, now: Optional[datetime] = None) -> bool:
+    """Whether the market has an ensemble result younger than ANALYSIS_REUSE_SECONDS"""
+    since = (now or datetime.utcnow()) - timedelta(seconds=settings.ANALYSIS_REUSE_SECONDS)
+    return db.query(
+        db.query(AnalysisResult).filter(
+            AnalysisResult.market_id == market_uuid(market_id),
+            AnalysisResult.analyzer_type == 'ensemble',
+            AnalysisResult.timestamp >= since
+        ).exists()
+    ).scalar()
+
+
+def _has_fresh_result(market_id: str) -> bool:
+    db = SessionLocal()
+    try:
+        return has_fresh_result(db, market_id)
+    finally:
+        db.close()
+
+
+async def analyze_market(market_id: str, user_id: Optional[str] = None, force_refresh: bool = False):
+    """Fetch market details, run the ensemble and buffer the results for the writer"""
+    from app.core.analyzers.ensemble import ensemble_analyzer
+    from app.core.kalshi_client import kalshi_client
+
+    if not force_refresh and await asyncio.to_thread(_has_fresh_result, market_id):
+        logger.debug(f"Reusing the recent analysis of market {market_id}")
+        return
+
+    market_data = await asyncio.to_thread(kalshi_client.get_market_details, market_id)
+    result = await ensemble_analyzer.analyze_market_ensemble(
+        market_id=market_id,
+        market_title=market_data['title'],
+        market_subtitle=market_data.get('subtitle', ''),
+        market_category=market_data.get('category', 'other')
+    )
+    if result.get('details', {}).get('processing_failed'):
+        raise RuntimeError(result['details'].get('error', 'Analysis failed'))
+
+    analysis_writer.add(market_id, result, user_id)
+
+
+class AnalysisWorker:
+    """Claims queued analysis tasks and runs them with bounded concurrency"""
+
+    def __init__(self, concurrency: Optional[int] = None, poll_seconds: Optional[float] = None,
+                 session_factory=SessionLocal, handler=None, writer: Optional[AnalysisResultWriter] = None):
+        self.concurrency = concurrency or settings.ANALYSIS_WORKER_CONCURRENCY
+        self.poll_seconds = poll_seconds or settings.ANALYSIS_WORKER_POLL_SECONDS
+        self.session_factory = session_factory
+        self.handler = handler or analyze_market
+        self.writer = writer or analysis_writer
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.running: Dict[Any, asyncio.Task] = {}
+        # Tasks whose results are buffered but not yet written
+        self.finished: List[Any] = []
+        self._stopped = False
+
+    def stop(self):
+        self._stopped = True
+
+    def _claim(self) -> List[tuple]:
+        db = self.session_factory()
+        try:
+            requeue_stale(db)
+            heartbeat_tasks(db, list(self.running) + self.finished)
+            tasks = claim_tasks(db, self.worker_id, self.concurrency - len(self.running))
+            return [(task.id, task.market_id, task.job.user_id, task.job.force_refresh) for task in tasks]
+        finally:
+            db.close()
+
+    async def _process(self, task_id, market_id: str, user_id, force_refresh: bool):
+        try:
+            await self.handler(market_id, str(user_id) if user_id else None, bool(force_refresh))
+            self.finished.append(task_id)
+        except Exception as e:
+            db = self.session_factory()
+            try:
+                status = fail_task(db, task_id, str(e))
+            finally:
+                db.close()
+            logger.error(f"Error analyzing market {market_id} ({status}): {str(e)}")
+        finally:
+            self.running.pop(task_id, None)
+
+    def _flush(self, force: bool = False):
+        """Write buffered results, then mark the tasks they came from done in one update"""
+        if not self.finished and not force:
+            return
+        if force or self.writer.due() or not len(self.writer):
+            # Snapshot first: tasks finishing during the flush may have rows it did not take
+            finished = list(self.finished)
+            try:
+                self.writer.flush()
+            except Exception as e:
+                # Rows stay buffered and the tasks stay leased until a later flush succeeds
+                logger.error(f"Error writing analysis results: {str(e)}")
+                return
+            del self.finished[:len(finished)]
+            db = self.session_factory()
+            try:
+                complete_tasks(db, finished)
+            finally:
+                db.close()
+            logger.debug(f"Completed {len(finished)} analysis tasks")
+
+    async def run_once(self) -> int:
+        """Flush finished results, claim into free slots and start the claimed tasks; returns how many started"""
+        await asyncio.to_thread(self._flush)
+        claimed = await asyncio.to_thread(self._claim)
+        for task_id, market_id, user_id, force_refresh in claimed:
+            self.running[task_id] = asyncio.create_task(self._process(task_id, market_id, user_id, force_refresh))
+        return len(claimed)
+
+    async def drain(self):
+        """Wait for every running task to finish and write their results"""
+        while self.running:
+            await asyncio.gather(*list(self.running.values()), return_exceptions=True)
+        await asyncio.to_thread(self._flush, True)
+
+    async def run(self):
+        logger.info(f"Analysis worker {self.worker_id} started with concurrency {self.concurrency}")
+        while not self._stopped:
+            try:
+                started = await self.run_once()
+            except Exception as e:
+                logger.error(f"Analysis worker claim failure: {str(e)}")
+                started = 0
+            if not started:
+                await asyncio.sleep(self.poll_seconds)
+            elif len(self.running) >= self.concurrency:
+                await asyncio.wait(list(self.running.values()), return_when=asyncio.FIRST_COMPLETED)
+        await self.drain()
+
+
+if __name__ == "__main__":
+    asyncio.run(AnalysisWorker().run())
@@ -0,0 +1,149 @@
+"""Buffered writer for AnalysisResult rows.
+
+Analysis workers hand finished results to the writer instead of opening a
+session per market. The writer batches the rows of many markets into one
+multi-row INSERT and updates the opportunity ranking in the same
+transaction. It flushes once ANALYSIS_WRITE_BATCH_SIZE rows are buffered
+or the oldest row is ANALYSIS_WRITE_FLUSH_SECONDS old.
+
+`details` larger than ANALYSIS_DETAILS_INLINE_BYTES, such as the statistical
+indicator arrays, is stored zlib-compressed in `details_blob`, so the bulky
+JSON stays out of the JSON column. Read it back with `AnalysisResult.payload`.
+"""
+from __future__ import annotations
+
+import json
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.core.catalog_sync import market_uuid
+from app.core.opportunities import record_opportunity
+from app.models.database import SessionLocal
+from app.models.schemas import AnalysisResult
+from app.utils.config import settings
+
+
+def pack_details(details: Optional[Dict[str, Any]], inline_bytes: Optional[int] = None) -> Dict[str, Any]:
+    """Column values for a details dict: inline JSON when small, compressed otherwise"""
+    if details is None:
+        return {'details': None, 'details_blob': None}
+    inline_bytes = settings.ANALYSIS_DETAILS_INLINE_BYTES if inline_bytes is None else inline_bytes
+    encoded = json.dumps(details, default=str, separators=(',', ':')).encode()
+    if len(encoded) <= inline_bytes:
+        return {'details': json.loads(encoded), 'details_blob': None}
+    return {'details': None, 'details_blob': zlib.compress(encoded, 6)}
+
+
+def unpack_details(details: Optional[Dict[str, Any]], details_blob: Optional[bytes]) -> Dict[str, Any]:
+    if details_blob is not None:
+        return json.loads(zlib.decompress(details_blob))
+    return details or {}
+
+
+def result_rows(market_id: str, result: Dict[str, Any], user_id: Optional[str] = None,
+                timestamp: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """The ensemble row and one row per analyzer for an ensemble result"""
+    timestamp = timestamp or datetime.utcnow()
+    key = market_uuid(market_id)
+    rows = [{
+        'market_id': key,
+        'analyzer_type': 'ensemble',
+        'prediction': result['ensemble_prediction'],
+        'confidence': result['confidence'],
+        'timestamp': timestamp,
+        **pack_details({
+            'signal_classification': result['signal_classification'],
+            'individual_results': result['individual_results'],
+            'dynamic_weights': result['dynamic_weights'],
+            'user_id': user_id
+        }),
+    }]
+    for analyzer_name, analyzer_result in result['individual_results'].items():
+        rows.append({
+            'market_id': key,
+            'analyzer_type': analyzer_name,
+            'prediction': analyzer_result['score'],
+            'confidence': analyzer_result['confidence'],
+            'timestamp': timestamp,
+            **pack_details(analyzer_result.get('details')),
+        })
+    return rows
+
+
+class AnalysisResultWriter:
+    """Buffers analysis results and writes them in batches"""
+
+    def __init__(self, session_factory=SessionLocal, batch_size: Optional[int] = None,
+                 flush_seconds: Optional[float] = None):
+        self.session_factory = session_factory
+        self.batch_size = batch_size or settings.ANALYSIS_WRITE_BATCH_SIZE
+        self.flush_seconds = settings.ANALYSIS_WRITE_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._rows: List[Dict[str, Any]] = []
+        self._results: Dict[str, Tuple[Dict[str, Any], datetime]] = {}
+        self._oldest: Optional[float] = None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._rows)
+
+    def add(self, market_id: str, result: Dict[str, Any], user_id: Optional[str] = None,
+            timestamp: Optional[datetime] = None):
+        timestamp = timestamp or datetime.utcnow()
+        rows = result_rows(market_id, result, user_id, timestamp)
+        with self._lock:
+            self._rows.extend(rows)
+            # Only the newest result per market feeds the ranking
+            self._results[market_id] = (result, timestamp)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def due(self) -> bool:
+        with self._lock:
+            if not self._rows:
+                return False
+            return len(self._rows) >= self.batch_size or time.monotonic() - self._oldest >= self.flush_seconds
+
+    def _write(self, db: Session, rows: List[Dict[str, Any]], results: Dict[str, Tuple[Dict[str, Any], datetime]]):
+        db.execute(insert(AnalysisResult), rows)
+        for market_id, (result, timestamp) in results.items():
+            record_opportunity(db, market_id, result, timestamp)
+        db.commit()
+
+    def flush(self) -> int:
+        """Write everything buffered in one transaction; rows are kept for retry on failure"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+                results, self._results = self._results, {}
+                self._oldest = None
+            if not rows:
+                return 0
+
+            db = self.session_factory()
+            try:
+                self._write(db, rows, results)
+            except Exception:
+                db.rollback()
+                with self._lock:
+                    self._rows = rows + self._rows
+                    for market_id, value in results.items():
+                        self._results.setdefault(market_id, value)
+                    self._oldest = time.monotonic()
+                raise
+            finally:
+                db.close()
+
+        logger.debug(f"Wrote {len(rows)} analysis rows for {len(results)} markets")
+        return len(rows)
+
+
+analysis_writer = AnalysisResultWriter()
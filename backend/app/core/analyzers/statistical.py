@@ -477,6 +477,45 @@ class StatisticalAnalyzer:
             logger.warning(f"Error calculating confidence: {str(e)}")
             return 50.0
 
+    def score_prices(self, prices: List[float]) -> Tuple[float, float, Dict]:
+        """
+        Score a price series using only the prices given
+
+        Shared by live analysis and the backtester, which passes each
+        point-in-time window so no later price can leak into the score.
+
+        Returns:
+            Tuple of (statistical score, confidence, indicators)
+        """
+        # Calculate technical indicators
+        indicators = {}
+
+        # Basic statistics
+        indicators['current_price'] = prices[-1]
+        indicators['price_change_1d'] = ((prices[-1] - prices[-2]) / prices[-2]) * 100 if len(prices) > 1 else 0
+        indicators['price_change_7d'] = ((prices[-1] - prices[-7]) / prices[-7]) * 100 if len(prices) > 7 else 0
+        indicators['volatility'] = self._calculate_volatility(self._calculate_returns(prices))
+
+        # Technical indicators
+        indicators['rsi'] = self._calculate_rsi(prices)
+        indicators['macd'] = self._calculate_macd(prices)
+        indicators['bollinger_bands'] = self._calculate_bollinger_bands(prices)
+
+        # Statistical patterns
+        indicators['mean_reversion_signal'], indicators['z_score'] = self._detect_mean_reversion(prices)
+        indicators['momentum'] = self._calculate_momentum(prices)
+        indicators['price_patterns'] = self._find_price_patterns(prices)
+        indicators['support_resistance'] = self._calculate_support_resistance(prices)
+
+        # Calculate overall statistical score
+        statistical_score = self._calculate_statistical_score(indicators)
+
+        # Calculate confidence
+        data_quality = min(len(prices) / 30, 1.0)  # Quality based on data points
+        confidence = self._calculate_confidence(indicators, data_quality)
+
+        return statistical_score, confidence, indicators
+
     async def analyze_market_statistical(self, market_id: str, market_title: str = "") -> Dict:
         """
         Perform comprehensive statistical analysis of a market
@@ -519,32 +558,8 @@ class StatisticalAnalyzer:
                 logger.error(f"Error fetching historical data for market {market_id}: {str(e)}")
                 return self._empty_statistical_result(f"Data fetch error: {str(e)}")
 
-            # Calculate technical indicators
-            indicators = {}
-
-            # Basic statistics
-            indicators['current_price'] = prices[-1]
-            indicators['price_change_1d'] = ((prices[-1] - prices[-2]) / prices[-2]) * 100 if len(prices) > 1 else 0
-            indicators['price_change_7d'] = ((prices[-1] - prices[-7]) / prices[-7]) * 100 if len(prices) > 7 else 0
-            indicators['volatility'] = self._calculate_volatility(self._calculate_returns(prices))
-
-            # Technical indicators
-            indicators['rsi'] = self._calculate_rsi(prices)
-            indicators['macd'] = self._calculate_macd(prices)
-            indicators['bollinger_bands'] = self._calculate_bollinger_bands(prices)
-
-            # Statistical patterns
-            indicators['mean_reversion_signal'], indicators['z_score'] = self._detect_mean_reversion(prices)
-            indicators['momentum'] = self._calculate_momentum(prices)
-            indicators['price_patterns'] = self._find_price_patterns(prices)
-            indicators['support_resistance'] = self._calculate_support_resistance(prices)
-
-            # Calculate overall statistical score
-            statistical_score = self._calculate_statistical_score(indicators)
-
-            # Calculate confidence
+            statistical_score, confidence, indicators = self.score_prices(prices)
             data_quality = min(len(prices) / 30, 1.0)  # Quality based on data points
-            confidence = self._calculate_confidence(indicators, data_quality)
 
             # Determine signal classification
             if statistical_score > 15:
@@ -0,0 +1,172 @@
+"""Short-lived cache of authenticated user principals.
+
+`get_current_user` resolves a bearer token to a user and checks that its
+session is still live. The result is cached under (user id, token jti) for
+AUTH_CACHE_TTL_SECONDS, or until the token expires if that is sooner, so
+repeat requests with the same token skip the database. The cache is an
+in-process LRU, optionally backed by Redis (AUTH_CACHE_REDIS_ENABLED) so
+workers share hits. Logout, session revocation, password and profile
+changes invalidate every entry for the user. Other processes' in-process
+entries can stay stale for up to the TTL.
+
+Only non-secret columns are cached. Handlers that change the user or need
+its credentials load it from their session.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+from loguru import logger
+
+from app.models.schemas import User
+from app.utils.config import settings
+
+PRINCIPAL_FIELDS = ('id', 'email', 'risk_profile', 'is_active', 'created_at', 'updated_at')
+
+
+def token_id(payload: Dict[str, Any], token: str) -> str:
+    """The token's jti, or a fingerprint for tokens issued without one"""
+    return payload.get('jti') or hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+def principal_from_user(user: User) -> Dict[str, Any]:
+    principal = {}
+    for field in PRINCIPAL_FIELDS:
+        value = getattr(user, field)
+        if isinstance(value, uuid.UUID):
+            value = str(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        principal[field] = value
+    return principal
+
+
+def user_from_principal(principal: Dict[str, Any]) -> User:
+    """A transient User carrying the cached columns; it is not attached to any session"""
+    values = dict(principal)
+    values['id'] = uuid.UUID(values['id'])
+    for field in ('created_at', 'updated_at'):
+        if values.get(field):
+            values[field] = datetime.fromisoformat(values[field])
+    return User(**values)
+
+
+class AuthCache:
+    """In-process LRU with TTL, with an optional shared Redis tier"""
+
+    def __init__(self, ttl_seconds: Optional[float] = None, max_entries: Optional[int] = None, redis_client=None):
+        self.ttl_seconds = settings.AUTH_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_entries = max_entries or settings.AUTH_CACHE_MAX_ENTRIES
+        self.redis = redis_client
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self._by_user: Dict[str, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _ttl(self, token_expires_at: Optional[float]) -> float:
+        if token_expires_at is None:
+            return self.ttl_seconds
+        return max(0.0, min(self.ttl_seconds, token_expires_at - time.time()))
+
+    def _store_local(self, user_id: str, jti: str, principal: Dict[str, Any], ttl: float):
+        with self._lock:
+            self._entries[(user_id, jti)] = (principal, time.monotonic() + ttl)
+            self._entries.move_to_end((user_id, jti))
+            self._by_user.setdefault(user_id, set()).add(jti)
+            while len(self._entries) > self.max_entries:
+                (old_user, old_jti), _ = self._entries.popitem(last=False)
+                self._forget(old_user, old_jti)
+
+    def _forget(self, user_id: str, jti: str):
+        jtis = self._by_user.get(user_id)
+        if jtis is not None:
+            jtis.discard(jti)
+            if not jtis:
+                del self._by_user[user_id]
+
+    def get(self, user_id: str, jti: str) -> Optional[Dict[str, Any]]:
+        key = (user_id, jti)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                principal, expires = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return principal
+                del self._entries[key]
+                self._forget(user_id, jti)
+
+        if self.redis is not None:
+            try:
+                cached = self.redis.get(f"auth:{user_id}:{jti}")
+                ttl = self.redis.ttl(f"auth:{user_id}:{jti}") if cached else None
+            except Exception as e:
+                logger.error(f"Auth cache Redis read failed: {str(e)}")
+                cached = None
+            if cached:
+                principal = json.loads(cached)
+                self._store_local(user_id, jti, principal, min(self.ttl_seconds, ttl) if ttl and ttl > 0 else 0.0)
+                with self._lock:
+                    self.hits += 1
+                return principal
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, user_id: str, jti: str, principal: Dict[str, Any], token_expires_at: Optional[float] = None):
+        ttl = self._ttl(token_expires_at)
+        if ttl <= 0:
+            return
+        self._store_local(user_id, jti, principal, ttl)
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline()
+                pipe.set(f"auth:{user_id}:{jti}", json.dumps(principal), ex=max(1, int(ttl)))
+                pipe.sadd(f"auth:{user_id}", jti)
+                pipe.expire(f"auth:{user_id}", max(1, int(self.ttl_seconds)))
+                pipe.execute()
+            except Exception as e:
+                logger.error(f"Auth cache Redis write failed: {str(e)}")
+
+    def invalidate_user(self, user_id: str):
+        user_id = str(user_id)
+        with self._lock:
+            for jti in self._by_user.pop(user_id, set()):
+                self._entries.pop((user_id, jti), None)
+        if self.redis is not None:
+            try:
+                jtis = self.redis.smembers(f"auth:{user_id}")
+                keys = [f"auth:{user_id}:{jti.decode() if isinstance(jti, bytes) else jti}" for jti in jtis]
+                self.redis.delete(f"auth:{user_id}", *keys)
+            except Exception as e:
+                logger.error(f"Auth cache Redis invalidation failed: {str(e)}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+
+def _redis_client():
+    if not settings.AUTH_CACHE_REDIS_ENABLED:
+        return None
+    try:
+        import redis
+
+        return redis.Redis.from_url(settings.REDIS_URL, socket_timeout=0.05)
+    except Exception as e:
+        logger.error(f"Auth cache Redis unavailable, using in-process cache only: {str(e)}")
+        return None
+
+
+auth_cache = AuthCache(redis_client=_redis_client())
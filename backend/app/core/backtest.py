@@ -0,0 +1,490 @@
+"""Walk-forward backtester over stored market price history.
+
+History is laid out as a dense bars x markets price matrix, loaded from
+`MarketPrice` or from a compressed columnar archive. Each market is replayed
+independently: a causal signal is scored at decision bars from prices up to
+that bar only, sized with the same Kelly and profile limits the live
+RiskManager uses, and filled by a simulated fill model one or more bars
+later. Markets are split into column chunks and replayed in a process pool,
+one task per chunk and parameter set, and the per-market P&L curves are
+summed into a portfolio curve.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from app.core.equity_series import TRADING_DAYS_PER_YEAR
+from app.core.sizing import ensemble_probability, kelly_position_percent
+from app.utils.config import settings
+
+
+@dataclass
+class PriceMatrix:
+    market_ids: List[str]
+    start: datetime
+    bar_seconds: int
+    prices: np.ndarray  # bars x markets, NaN before a market's first price
+    outcomes: Optional[np.ndarray] = None  # settlement value of yes per market, NaN if unsettled
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        offsets = np.arange(self.prices.shape[0], dtype=np.int64) * self.bar_seconds
+        return np.datetime64(self.start, 's') + offsets.astype('timedelta64[s]')
+
+    def head(self, bars: int) -> "PriceMatrix":
+        """The first ``bars`` bars; markets are not settled within a prefix"""
+        return PriceMatrix(
+            market_ids=self.market_ids,
+            start=self.start,
+            bar_seconds=self.bar_seconds,
+            prices=self.prices[:bars]
+        )
+
+    def columns(self, indices: Sequence[int]) -> "PriceMatrix":
+        indices = list(indices)
+        return PriceMatrix(
+            market_ids=[self.market_ids[i] for i in indices],
+            start=self.start,
+            bar_seconds=self.bar_seconds,
+            prices=self.prices[:, indices],
+            outcomes=self.outcomes[indices] if self.outcomes is not None else None
+        )
+
+
+@dataclass
+class BacktestConfig:
+    name: str = "default"
+    initial_capital: float = 10000.0
+    risk_profile: str = "moderate"
+    kelly_fraction: Optional[float] = None  # defaults to the profile's
+    max_position_size_percent: Optional[float] = None
+    min_confidence: Optional[float] = None
+    min_edge: float = 0.02
+    signal: str = "momentum"
+    lookback: int = 24
+    decision_interval: int = 12  # bars between decisions
+    # Fill model
+    latency_bars: int = 1
+    half_spread: float = 0.01
+    impact_per_contract: float = 0.00001
+    max_contracts: int = 1000  # per market, a stand-in for book depth
+    rebalance_band: float = 0.25  # resize a held position only when off target by more than this
+    fee_rate: float = 0.07  # fee = rate x contracts x P x (1 - P)
+    params: Dict[str, Any] = field(default_factory=dict)  # signal parameters
+
+    @property
+    def signal_key(self) -> Tuple:
+        """Configs with equal keys produce identical signals and can share them"""
+        return (self.signal, self.lookback, self.decision_interval, json.dumps(self.params, sort_keys=True, default=str))
+
+    def resolved(self) -> "BacktestConfig":
+        """Fill profile-dependent limits from the configured risk profile"""
+        profile = settings.RISK_PROFILES.get(self.risk_profile, {})
+        defaults = settings.DEFAULT_RISK_CONFIG
+        return BacktestConfig(**{
+            **asdict(self),
+            'kelly_fraction': self.kelly_fraction if self.kelly_fraction is not None
+            else profile.get('kelly_fraction', defaults['kelly_fraction']),
+            'max_position_size_percent': self.max_position_size_percent if self.max_position_size_percent is not None
+            else min(profile.get('max_position_size_percent', defaults['max_position_size_percent']),
+                     defaults['max_position_size_percent']),
+            'min_confidence': self.min_confidence if self.min_confidence is not None
+            else profile.get('min_confidence_threshold', defaults['min_confidence_threshold']),
+            'latency_bars': max(self.latency_bars, 1)
+        })
+
+
+@dataclass
+class BacktestReport:
+    config: BacktestConfig
+    timestamps: np.ndarray
+    pnl: np.ndarray
+    equity: np.ndarray
+    total_pnl: float
+    total_return_percent: float
+    sharpe_ratio: float
+    max_drawdown: float
+    max_drawdown_percent: float
+    max_gross_exposure: float
+    trades: int
+    contracts_traded: int
+    fees: float
+    markets_traded: int
+    per_market: Dict[str, Dict[str, float]]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'name': self.config.name,
+            'config': asdict(self.config),
+            'total_pnl': self.total_pnl,
+            'total_return_percent': self.total_return_percent,
+            'sharpe_ratio': self.sharpe_ratio,
+            'max_drawdown': self.max_drawdown,
+            'max_drawdown_percent': self.max_drawdown_percent,
+            'max_gross_exposure': self.max_gross_exposure,
+            'trades': self.trades,
+            'contracts_traded': self.contracts_traded,
+            'fees': self.fees,
+            'markets_traded': self.markets_traded
+        }
+
+    def curve(self, points: int = 500) -> List[Dict[str, Any]]:
+        """Equity curve downsampled to at most ``points`` entries"""
+        step = max(len(self.equity) // points, 1)
+        return [
+            {'timestamp': str(ts), 'equity': float(equity), 'pnl': float(pnl)}
+            for ts, equity, pnl in zip(self.timestamps[::step], self.equity[::step], self.pnl[::step])
+        ]
+
+
+# Signals are causal: the value at bar t may only depend on prices[:t + 1].
+# They return (score in [-100, 100], confidence in [0, 100]) per bar and only
+# need to be meaningful where ``decisions`` is set.
+
+def _forward_fill(values: np.ndarray) -> np.ndarray:
+    return pd.Series(values).ffill().to_numpy()
+
+
+def momentum_signal(prices: np.ndarray, decisions: np.ndarray,
+                    config: BacktestConfig) -> Tuple[np.ndarray, np.ndarray]:
+    """Trend-following score from the move over the lookback in units of its noise"""
+    series = pd.Series(prices).ffill()
+    changes = series.diff()
+    noise = changes.rolling(config.lookback, min_periods=config.lookback).std() * np.sqrt(config.lookback)
+    move = series - series.shift(config.lookback)
+    t_stat = (move / noise.replace(0.0, np.nan)).fillna(0.0).to_numpy()
+    score = np.clip(t_stat * config.params.get('score_scale', 25.0), -100, 100)
+    confidence = np.clip(50 + 25 * np.abs(t_stat), 0, 100)
+    return score, confidence
+
+
+def mean_reversion_signal(prices: np.ndarray, decisions: np.ndarray,
+                          config: BacktestConfig) -> Tuple[np.ndarray, np.ndarray]:
+    """Fade deviations from the rolling mean"""
+    series = pd.Series(prices).ffill()
+    rolling = series.rolling(config.lookback, min_periods=config.lookback)
+    z_score = ((series - rolling.mean()) / rolling.std().replace(0.0, np.nan)).fillna(0.0).to_numpy()
+    score = np.clip(-z_score * config.params.get('score_scale', 25.0), -100, 100)
+    confidence = np.clip(50 + 20 * np.abs(z_score), 0, 100)
+    return score, confidence
+
+
+def statistical_signal(prices: np.ndarray, decisions: np.ndarray,
+                       config: BacktestConfig) -> Tuple[np.ndarray, np.ndarray]:
+    """The live StatisticalAnalyzer scored on each point-in-time window"""
+    from app.core.analyzers.statistical import StatisticalAnalyzer
+
+    analyzer = StatisticalAnalyzer()
+    for name, value in config.params.get('statistical', {}).items():
+        setattr(analyzer, name, value)
+
+    filled = _forward_fill(prices)
+    window = config.params.get('window', 90)
+    score = np.zeros(prices.size)
+    confidence = np.zeros(prices.size)
+    for t in np.flatnonzero(decisions):
+        history = filled[max(t + 1 - window, 0):t + 1]
+        history = history[~np.isnan(history)]
+        if history.size >= 10:
+            score[t], confidence[t], _ = analyzer.score_prices(history.tolist())
+    return score, confidence
+
+
+SIGNALS: Dict[str, Callable[[np.ndarray, np.ndarray, BacktestConfig], Tuple[np.ndarray, np.ndarray]]] = {
+    'momentum': momentum_signal,
+    'mean_reversion': mean_reversion_signal,
+    'statistical': statistical_signal,
+}
+
+
+def _fill_cash(quantity: np.ndarray, price: np.ndarray, config: BacktestConfig) -> np.ndarray:
+    """Cash paid for signed contract quantities at the given contract prices"""
+    direction = np.sign(quantity)
+    fill = np.clip(price + direction * (config.half_spread + config.impact_per_contract * np.abs(quantity)), 0.01, 0.99)
+    fees = config.fee_rate * np.abs(quantity) * price * (1.0 - price)
+    return quantity * fill + fees
+
+
+def compute_signal(prices: np.ndarray, config: BacktestConfig) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Decision bars and the signal's score and confidence for one market"""
+    prices = np.asarray(prices, dtype=float)
+    decisions = np.zeros(prices.size, dtype=bool)
+    decisions[config.lookback::max(config.decision_interval, 1)] = True
+    decisions &= ~np.isnan(prices)
+    score, confidence = SIGNALS[config.signal](prices, decisions, config)
+    return decisions, score, confidence
+
+
+def replay_market(prices: np.ndarray, config: BacktestConfig, outcome: float = np.nan,
+                  signal: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None) -> Dict[str, Any]:
+    """
+    Replay one market and return its P&L curve and trading stats.
+
+    Targets are set at decision bars from the signal and Kelly sizing on a
+    fixed bankroll and held until the next decision. An order decided at bar
+    t fills at the price of bar t + latency_bars. Positions are signed:
+    positive holds yes contracts, negative holds no contracts. Open
+    positions are marked at the last price or settled at ``outcome``.
+    ``signal`` is a precomputed result of compute_signal for this config.
+    """
+    prices = np.asarray(prices, dtype=float)
+    bars = prices.size
+    price = np.nan_to_num(_forward_fill(prices), nan=0.5)
+
+    decisions, score, confidence = signal if signal is not None else compute_signal(prices, config)
+    p_yes = ensemble_probability(score, confidence, price)
+    edge = p_yes - price
+    buy_yes = edge > 0
+    win_probability = np.where(buy_yes, p_yes, 1.0 - p_yes)
+    cost = np.clip(np.where(buy_yes, price, 1.0 - price), 1e-6, None)
+
+    percent = kelly_position_percent(
+        win_probability / cost - 1.0, win_probability, config.kelly_fraction, config.max_position_size_percent
+    )
+    active = (np.abs(edge) > 0) & (np.abs(edge) >= config.min_edge) & (confidence >= config.min_confidence)
+    contracts = np.floor(np.where(active, percent / 100 * config.initial_capital / cost, 0.0))
+    contracts = np.minimum(contracts, config.max_contracts)
+
+    # Only decision bars can change the target, so the path-dependent
+    # rebalance band is a loop over decisions rather than over bars
+    desired = np.where(buy_yes, contracts, -contracts)[decisions]
+    held = 0.0
+    for k, want in enumerate(desired.tolist()):
+        if want == 0 or (want > 0) != (held > 0) or abs(want - held) > config.rebalance_band * abs(held):
+            held = want
+        desired[k] = held
+    target = np.full(bars, np.nan)
+    target[decisions] = desired
+    target = np.nan_to_num(_forward_fill(target), nan=0.0)
+
+    position = np.zeros(bars)
+    position[config.latency_bars:] = target[:bars - config.latency_bars]
+
+    yes_qty = np.maximum(position, 0.0)
+    no_qty = np.maximum(-position, 0.0)
+    yes_traded = np.diff(yes_qty, prepend=0.0)
+    no_traded = np.diff(no_qty, prepend=0.0)
+    cash = -np.cumsum(_fill_cash(yes_traded, price, config) + _fill_cash(no_traded, 1.0 - price, config))
+    value = yes_qty * price + no_qty * (1.0 - price)
+    if not np.isnan(outcome) and bars:
+        value[-1] = yes_qty[-1] * outcome + no_qty[-1] * (1.0 - outcome)
+    pnl = cash + value
+
+    fees = config.fee_rate * (np.abs(yes_traded) * price * (1 - price) + np.abs(no_traded) * price * (1 - price))
+    return {
+        'pnl': pnl,
+        'exposure': value,
+        'trades': int(np.count_nonzero(yes_traded) + np.count_nonzero(no_traded)),
+        'contracts_traded': int(np.abs(yes_traded).sum() + np.abs(no_traded).sum()),
+        'fees': float(fees.sum())
+    }
+
+
+def _replay_chunk(matrix: PriceMatrix, configs: Sequence[BacktestConfig]
+                  ) -> List[Tuple[np.ndarray, np.ndarray, Dict[str, Dict[str, float]]]]:
+    """
+    Replay a column chunk under several configs.
+
+    Returns the summed P&L and exposure curves and per-market stats for each
+    config. Signals are computed once per market and shared by every config
+    with the same signal key, so configs that differ only in sizing or fills
+    cost one replay each rather than one signal computation each.
+    """
+    bars = matrix.prices.shape[0]
+    results = [(np.zeros(bars), np.zeros(bars), {}) for _ in configs]
+    for column, market_id in enumerate(matrix.market_ids):
+        prices = matrix.prices[:, column].astype(float)
+        outcome = matrix.outcomes[column] if matrix.outcomes is not None else np.nan
+        signals = {}
+        for config, (total, exposure, per_market) in zip(configs, results):
+            if config.signal_key not in signals:
+                signals[config.signal_key] = compute_signal(prices, config)
+            result = replay_market(prices, config, outcome, signals[config.signal_key])
+            total += result['pnl']
+            exposure += result['exposure']
+            per_market[market_id] = {
+                'pnl': float(result['pnl'][-1]) if result['pnl'].size else 0.0,
+                'trades': result['trades'],
+                'contracts_traded': result['contracts_traded'],
+                'fees': result['fees']
+            }
+    return results
+
+
+def _build_report(matrix: PriceMatrix, config: BacktestConfig, pnl: np.ndarray, exposure: np.ndarray,
+                  per_market: Dict[str, Dict[str, float]]) -> BacktestReport:
+    equity = config.initial_capital + pnl
+    # Sizing uses a fixed bankroll, so returns are measured against it too
+    returns = np.diff(pnl) / config.initial_capital if pnl.size > 1 else np.zeros(0)
+    periods = TRADING_DAYS_PER_YEAR * 86400 / matrix.bar_seconds
+    std = returns.std() if returns.size > 1 else 0.0
+    sharpe = (returns.mean() - 0.02 / periods) / std * np.sqrt(periods) if std > 0 else 0.0
+
+    peak = np.maximum.accumulate(equity) if equity.size else equity
+    drawdown = peak - equity
+    worst = int(drawdown.argmax()) if drawdown.size else 0
+
+    return BacktestReport(
+        config=config,
+        timestamps=matrix.timestamps,
+        pnl=pnl,
+        equity=equity,
+        total_pnl=float(pnl[-1]) if pnl.size else 0.0,
+        total_return_percent=float(pnl[-1] / config.initial_capital * 100) if pnl.size else 0.0,
+        sharpe_ratio=float(sharpe),
+        max_drawdown=float(drawdown[worst]) if drawdown.size else 0.0,
+        max_drawdown_percent=float(drawdown[worst] / peak[worst] * 100) if drawdown.size and peak[worst] > 0 else 0.0,
+        max_gross_exposure=float(exposure.max()) if exposure.size else 0.0,
+        trades=sum(stats['trades'] for stats in per_market.values()),
+        contracts_traded=sum(stats['contracts_traded'] for stats in per_market.values()),
+        fees=float(sum(stats['fees'] for stats in per_market.values())),
+        markets_traded=sum(1 for stats in per_market.values() if stats['trades']),
+        per_market=per_market
+    )
+
+
+def run_backtest(matrix: PriceMatrix, configs: Sequence[BacktestConfig], workers: Optional[int] = None,
+                 chunk_markets: int = 50) -> List[BacktestReport]:
+    """
+    Replay every parameter set over the whole matrix.
+
+    Work is split into (market chunk, signal group) tasks, where a signal
+    group is the configs sharing a signal key. With one worker the tasks run
+    in-process; otherwise they run in a process pool.
+    """
+    configs = [config.resolved() for config in configs]
+    chunks = [
+        matrix.columns(range(start, min(start + chunk_markets, len(matrix.market_ids))))
+        for start in range(0, len(matrix.market_ids), chunk_markets)
+    ]
+    groups: Dict[Tuple, List[int]] = {}
+    for index, config in enumerate(configs):
+        groups.setdefault(config.signal_key, []).append(index)
+    tasks = [(indices, chunk) for indices in groups.values() for chunk in chunks]
+    workers = workers or os.cpu_count() or 1
+
+    task_configs = [[configs[i] for i in indices] for indices, _ in tasks]
+    if workers == 1 or len(tasks) == 1:
+        results = [_replay_chunk(chunk, group) for (_, chunk), group in zip(tasks, task_configs)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_replay_chunk, [chunk for _, chunk in tasks], task_configs))
+
+    pnl = [np.zeros(matrix.prices.shape[0]) for _ in configs]
+    exposure = [np.zeros(matrix.prices.shape[0]) for _ in configs]
+    per_market: List[Dict[str, Dict[str, float]]] = [{} for _ in configs]
+    for (indices, _), group_results in zip(tasks, results):
+        for index, (chunk_pnl, chunk_exposure, chunk_stats) in zip(indices, group_results):
+            pnl[index] += chunk_pnl
+            exposure[index] += chunk_exposure
+            per_market[index].update(chunk_stats)
+
+    return [
+        _build_report(matrix, config, pnl[i], exposure[i], per_market[i])
+        for i, config in enumerate(configs)
+    ]
+
+
+def load_price_matrix(db, start: datetime, end: datetime, market_ids: Optional[Sequence[str]] = None,
+                      bar_seconds: int = 300) -> PriceMatrix:
+    """Stream MarketPrice rows into a bars x markets matrix of last prices per bar"""
+    from app.models.schemas import MarketPrice
+
+    query = db.query(MarketPrice.market_id, MarketPrice.timestamp, MarketPrice.price).filter(
+        MarketPrice.timestamp >= start, MarketPrice.timestamp < end
+    )
+    if market_ids is not None:
+        query = query.filter(MarketPrice.market_id.in_(list(market_ids)))
+
+    # A trailing partial bar still gets a row of its own
+    bars = max(math.ceil((end - start).total_seconds() / bar_seconds), 1)
+    columns: Dict[str, int] = {}
+    rows, cols, values = [], [], []
+    for market_id, timestamp, price in query.order_by(MarketPrice.timestamp).yield_per(50_000):
+        if timestamp.tzinfo is not None and start.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=None)
+        rows.append(int((timestamp - start).total_seconds() // bar_seconds))
+        cols.append(columns.setdefault(str(market_id), len(columns)))
+        values.append(float(price))
+
+    prices = np.full((bars, len(columns)), np.nan, dtype=np.float32)
+    # Rows arrive in time order, so the last write to a bar is its closing price
+    prices[np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)] = values
+    prices = pd.DataFrame(prices).ffill().to_numpy(dtype=np.float32)
+
+    logger.info(f"Loaded {len(values)} prices for {len(columns)} markets into {bars} bars")
+    return PriceMatrix(market_ids=list(columns), start=start, bar_seconds=bar_seconds, prices=prices)
+
+
+def save_price_archive(matrix: PriceMatrix, path: str):
+    """Write a price matrix to a compressed columnar archive"""
+    np.savez_compressed(
+        path,
+        market_ids=np.array(matrix.market_ids),
+        start=np.array(matrix.start.isoformat()),
+        bar_seconds=np.array(matrix.bar_seconds),
+        prices=matrix.prices.astype(np.float32),
+        outcomes=matrix.outcomes if matrix.outcomes is not None else np.full(len(matrix.market_ids), np.nan)
+    )
+
+
+def load_price_archive(path: str) -> PriceMatrix:
+    with np.load(path) as archive:
+        outcomes = archive['outcomes']
+        return PriceMatrix(
+            market_ids=[str(market_id) for market_id in archive['market_ids']],
+            start=datetime.fromisoformat(str(archive['start'])),
+            bar_seconds=int(archive['bar_seconds']),
+            prices=archive['prices'],
+            outcomes=None if np.isnan(outcomes).all() else outcomes
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay stored market history through the trading logic")
+    parser.add_argument("--archive", help="Columnar price archive (.npz); loads MarketPrice when omitted")
+    parser.add_argument("--save-archive", help="Write the loaded history to this archive")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--bar-seconds", type=int, default=300)
+    parser.add_argument("--signal", default="momentum", choices=sorted(SIGNALS))
+    parser.add_argument("--profile", default=settings.DEFAULT_RISK_PROFILE)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    if args.archive:
+        matrix = load_price_archive(args.archive)
+    else:
+        from app.models.database import SessionLocal
+
+        end = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            matrix = load_price_matrix(db, end - timedelta(days=args.days), end, bar_seconds=args.bar_seconds)
+        finally:
+            db.close()
+    if args.save_archive:
+        save_price_archive(matrix, args.save_archive)
+
+    report = run_backtest(matrix, [BacktestConfig(signal=args.signal, risk_profile=args.profile)],
+                          workers=args.workers)[0]
+    output = {**report.summary(), 'curve': report.curve()}
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(output, handle, indent=2, default=str)
+    print(json.dumps(report.summary(), indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
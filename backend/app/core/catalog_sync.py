@@ -0,0 +1,268 @@
+"""Market catalog sync worker.
+
+Crawls every Kalshi market and series page by page with cursor pagination
+and writes the changes into `markets` and `market_series`, so the market
+list endpoints read local tables instead of calling Kalshi per request.
+
+A market row is written only when Kalshi reports a newer `updated_at`, a
+different status or changed descriptive fields. Each page is compared
+against the stored rows with one IN query and written with one
+`INSERT ... ON CONFLICT DO UPDATE`, then committed together with the next
+page's cursor, so an interrupted crawl resumes where it stopped.
+
+Every pass that changes something bumps the catalog version. Changed rows
+carry the version that wrote them, and readers get the current version
+as a cheap freshness token.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models.database import SessionLocal
+from app.models.schemas import CatalogState, Market, MarketSeries
+from app.utils.config import settings
+
+CATALOG_NAME = "markets"
+MARKET_FIELDS = ('ticker', 'series_ticker', 'title', 'subtitle', 'category', 'status', 'settle_date',
+                 'source_updated_at')
+SERIES_FIELDS = ('title', 'category', 'description', 'frequency')
+
+
+@dataclass
+class CatalogSyncResult:
+    version: int
+    markets_seen: int
+    markets_changed: int
+    series_changed: int
+    elapsed_seconds: float
+
+
+def _parse_time(value: Any) -> Optional[datetime]:
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, (int, float)):
+        parsed = datetime.fromtimestamp(value, tz=timezone.utc)
+    else:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    # Stored naive in UTC like the rest of the schema
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+
+
+def market_uuid(value: str) -> uuid.UUID:
+    """Kalshi market ids are UUIDs; tickers used as ids map to a stable UUID"""
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return uuid.uuid5(uuid.NAMESPACE_URL, f"kalshi:market:{value}")
+
+
+def market_row(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    market_id = payload.get('id') or payload.get('ticker')
+    if not market_id or not payload.get('title'):
+        return None
+    return {
+        'market_id': market_uuid(market_id),
+        'ticker': payload.get('ticker') or payload.get('ticker_name'),
+        'series_ticker': payload.get('series_ticker'),
+        'title': payload['title'],
+        'subtitle': payload.get('subtitle'),
+        'category': payload.get('category') or 'other',
+        'status': payload.get('status'),
+        'settle_date': _parse_time(payload.get('resolve_time') or payload.get('close_time')),
+        'source_updated_at': _parse_time(payload.get('updated_at') or payload.get('last_updated_ts')),
+    }
+
+
+def series_row(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    series_ticker = payload.get('ticker') or payload.get('series_ticker')
+    if not series_ticker:
+        return None
+    return {
+        'series_ticker': series_ticker,
+        'title': payload.get('title') or payload.get('name'),
+        'category': payload.get('category') or 'other',
+        'description': payload.get('description'),
+        'frequency': payload.get('frequency'),
+    }
+
+
+def upsert(db: Session, model, rows: List[Dict[str, Any]], key, update_columns):
+    """Insert rows, updating the given columns of rows whose key (a column or columns) already exists"""
+    if not rows:
+        return
+    dialect = sqlite if db.get_bind().dialect.name == 'sqlite' else postgresql
+    statement = dialect.insert(model.__table__).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[key] if isinstance(key, str) else list(key),
+        set_={column: statement.excluded[column] for column in update_columns}
+    )
+    db.execute(statement)
+
+
+def _catalog_state(db: Session) -> CatalogState:
+    state = db.get(CatalogState, CATALOG_NAME, with_for_update=True)
+    if state is None:
+        state = CatalogState(name=CATALOG_NAME, version=0)
+        db.add(state)
+        db.flush()
+    return state
+
+
+def current_catalog_version(db: Session) -> int:
+    state = db.get(CatalogState, CATALOG_NAME)
+    return int(state.version) if state else 0
+
+
+def _differs(stored, row: Dict[str, Any], fields) -> bool:
+    for name in fields:
+        value = getattr(stored, name)
+        # Postgres hands back aware datetimes for naive UTC values written here
+        if isinstance(value, datetime):
+            value = _parse_time(value)
+        if value != row[name]:
+            return True
+    return False
+
+
+def _changed_markets(db: Session, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    stored = {
+        row.market_id: row
+        for row in db.query(Market.market_id, *(getattr(Market, name) for name in MARKET_FIELDS))
+        .filter(Market.market_id.in_([row['market_id'] for row in rows]))
+        .all()
+    }
+    changed = []
+    for row in rows:
+        existing = stored.get(row['market_id'])
+        if existing is None:
+            changed.append(row)
+            continue
+        stored_updated_at = _parse_time(existing.source_updated_at)
+        if row['source_updated_at'] and stored_updated_at and row['source_updated_at'] < stored_updated_at:
+            continue  # stale page, a later crawl already wrote a newer copy
+        if _differs(existing, row, MARKET_FIELDS):
+            changed.append(row)
+    return changed
+
+
+def sync_series(db: Session, client, version: int, page_size: int, now: datetime) -> int:
+    changed = 0
+    cursor = None
+    while True:
+        page = client.get_series_page(cursor=cursor, limit=page_size)
+        rows = {row['series_ticker']: row for row in map(series_row, page['series']) if row}
+        if rows:
+            stored = {
+                row.series_ticker: row
+                for row in db.query(MarketSeries).filter(MarketSeries.series_ticker.in_(list(rows))).all()
+            }
+            updates = [
+                {**row, 'catalog_version': version, 'updated_at': now}
+                for ticker, row in rows.items()
+                if ticker not in stored or _differs(stored[ticker], row, SERIES_FIELDS)
+            ]
+            upsert(db, MarketSeries, updates, 'series_ticker', SERIES_FIELDS + ('catalog_version', 'updated_at'))
+            changed += len(updates)
+            db.commit()
+        cursor = page['cursor']
+        if not cursor:
+            return changed
+
+
+def sync_markets(db: Session, client, state: CatalogState, version: int, page_size: int,
+                 now: datetime) -> tuple:
+    seen = changed = 0
+    while True:
+        page = client.get_markets_page(cursor=state.cursor, limit=page_size)
+        # A market repeated within a page keeps its last copy
+        rows = list({row['market_id']: row for row in map(market_row, page['markets']) if row}.values())
+        updates = [
+            {**row, 'catalog_version': version, 'updated_at': now, 'created_at': now}
+            for row in (_changed_markets(db, rows) if rows else [])
+        ]
+        upsert(db, Market, updates, 'market_id', MARKET_FIELDS + ('catalog_version', 'updated_at'))
+        seen += len(rows)
+        changed += len(updates)
+        state.cursor = page['cursor']
+        state.markets_seen = (state.markets_seen or 0) + len(rows)
+        state.markets_changed = (state.markets_changed or 0) + len(updates)
+        db.commit()
+        if not state.cursor:
+            return seen, changed
+
+
+def sync_catalog(db: Session, client=None, page_size: Optional[int] = None,
+                 now: Optional[datetime] = None) -> CatalogSyncResult:
+    """Crawl the Kalshi catalog and write changed series and markets"""
+    if client is None:
+        from app.core.kalshi_client import kalshi_client as client
+    page_size = page_size or settings.CATALOG_SYNC_PAGE_SIZE
+    now = now or datetime.utcnow()
+    started = time.perf_counter()
+
+    state = _catalog_state(db)
+    version = int(state.version or 0) + 1
+    if state.cursor:
+        logger.info(f"Resuming catalog sync for version {version}")
+    else:
+        state.sync_started_at = now
+        state.markets_seen = 0
+        state.markets_changed = 0
+    db.commit()
+
+    try:
+        series_changed = sync_series(db, client, version, page_size, now)
+        state = _catalog_state(db)
+        markets_seen, markets_changed = sync_markets(db, client, state, version, page_size, now)
+
+        state = _catalog_state(db)
+        if series_changed or state.markets_changed:
+            state.version = version
+        state.last_synced_at = now
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    result = CatalogSyncResult(
+        version=int(state.version),
+        markets_seen=markets_seen,
+        markets_changed=markets_changed,
+        series_changed=series_changed,
+        elapsed_seconds=time.perf_counter() - started
+    )
+    logger.info(f"Catalog sync finished: {result}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync the Kalshi market catalog into the database")
+    parser.add_argument("--once", action="store_true", help="Run one pass and exit")
+    args = parser.parse_args()
+
+    while True:
+        db = SessionLocal()
+        try:
+            sync_catalog(db)
+        except Exception as e:
+            logger.error(f"Catalog sync failed: {str(e)}")
+        finally:
+            db.close()
+        if args.once:
+            return
+        time.sleep(settings.CATALOG_SYNC_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    main()
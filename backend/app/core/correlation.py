@@ -0,0 +1,254 @@
+import numpy as np
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+class CorrelationEngine:
+    """
+    Rolling price-change correlations between markets.
+
+    Ticks are sampled into fixed bars. When a bar closes, its vector of price
+    changes is added to rolling first and second moment sums (S1 and the S2
+    outer-product matrix), and the bar leaving the window is subtracted. Only
+    markets that moved touch S2, and the cached correlation matrix is
+    recomputed only for the rows and columns of those markets. Correlations of
+    markets with a short history are shrunk toward zero.
+
+    Binary contract prices live in [0, 1], so bars use absolute price changes
+    rather than percentage returns, which blow up near zero.
+    """
+
+    def __init__(self, bar_seconds: int = 300, window: int = 288, shrinkage_bars: int = 30,
+                 capacity: int = 64):
+        self.bar_seconds = bar_seconds
+        self.window = window
+        self.shrinkage_bars = shrinkage_bars
+
+        self._capacity = 0
+        self._index: Dict[str, int] = {}
+        self._markets: List[str] = []
+
+        self._bars = np.zeros((window, 0))  # ring buffer of bar change vectors
+        self._head = 0
+        self._filled = 0
+        self._s1 = np.zeros(0)
+        self._s2 = np.zeros((0, 0))
+        self._observed = np.zeros(0, dtype=np.int64)
+        self._bar_close = np.zeros(0)
+        self._last_price = np.zeros(0)
+        self._bar_start: Optional[datetime] = None
+
+        self._corr = np.zeros((0, 0))
+        self._dirty: set = set()
+        self._dirty_all = False
+        self._grow(capacity)
+
+    def __len__(self) -> int:
+        return len(self._markets)
+
+    def __contains__(self, market_id: str) -> bool:
+        return str(market_id) in self._index
+
+    def _grow(self, new_capacity: int):
+        """Resize the per-market arrays, keeping existing state"""
+        extra = new_capacity - self._capacity
+        if extra <= 0:
+            return
+
+        self._bars = np.hstack([self._bars, np.zeros((self.window, extra))])
+        self._s1 = np.concatenate([self._s1, np.zeros(extra)])
+        s2 = np.zeros((new_capacity, new_capacity))
+        s2[:self._capacity, :self._capacity] = self._s2
+        self._s2 = s2
+        corr = np.eye(new_capacity)
+        corr[:self._capacity, :self._capacity] = self._corr
+        self._corr = corr
+        self._observed = np.concatenate([self._observed, np.zeros(extra, dtype=np.int64)])
+        self._bar_close = np.concatenate([self._bar_close, np.full(extra, np.nan)])
+        self._last_price = np.concatenate([self._last_price, np.full(extra, np.nan)])
+        self._capacity = new_capacity
+
+    def _track(self, market_id: str) -> int:
+        market_key = str(market_id)
+        index = self._index.get(market_key)
+        if index is None:
+            if len(self._markets) >= self._capacity:
+                self._grow(max(self._capacity * 2, 16))
+            index = len(self._markets)
+            self._index[market_key] = index
+            self._markets.append(market_key)
+        return index
+
+    def _bucket(self, timestamp: datetime) -> datetime:
+        seconds = int((timestamp - datetime(1970, 1, 1)).total_seconds())
+        return datetime(1970, 1, 1) + timedelta(seconds=seconds - seconds % self.bar_seconds)
+
+    def _roll_to(self, timestamp: datetime):
+        """Close every bar that ended before the timestamp"""
+        bucket = self._bucket(timestamp)
+        if self._bar_start is None:
+            self._bar_start = bucket
+            return
+
+        elapsed = int((bucket - self._bar_start).total_seconds() // self.bar_seconds)
+        # After the first closed bar every further empty bar is all zeros, so
+        # there is no point closing more than a full window of them
+        for _ in range(min(elapsed, self.window)):
+            self.close_bar()
+        if elapsed > 0:
+            self._bar_start = bucket
+
+    def update_price(self, market_id: str, price: float, timestamp: Optional[datetime] = None):
+        """Record a price tick"""
+        self._roll_to(timestamp or datetime.utcnow())
+        index = self._track(market_id)
+        self._last_price[index] = float(price)
+        if np.isnan(self._bar_close[index]):
+            self._bar_close[index] = float(price)
+
+    def close_bar(self):
+        """Push the current bar into the window and update the rolling sums"""
+        n = len(self._markets)
+        change = np.zeros(n)
+        last = self._last_price[:n]
+        close = self._bar_close[:n]
+        valid = ~np.isnan(last) & ~np.isnan(close)
+        change[valid] = last[valid] - close[valid]
+
+        if self._filled == self.window:
+            evicted = self._bars[self._head, :n].copy()
+            gone = np.flatnonzero(evicted)
+            if gone.size:
+                self._s1[gone] -= evicted[gone]
+                self._s2[np.ix_(gone, gone)] -= np.outer(evicted[gone], evicted[gone])
+                self._dirty.update(gone.tolist())
+        else:
+            # The sample count changes every bar until the window is full
+            self._filled += 1
+            self._dirty_all = True
+
+        moved = np.flatnonzero(change)
+        if moved.size:
+            self._s1[moved] += change[moved]
+            self._s2[np.ix_(moved, moved)] += np.outer(change[moved], change[moved])
+            self._dirty.update(moved.tolist())
+
+        self._bars[self._head, :] = 0.0
+        self._bars[self._head, :n] = change
+        self._head = (self._head + 1) % self.window
+        self._observed[:n] = np.minimum(self._observed[:n] + valid, self.window)
+        self._bar_close[:n][valid] = last[valid]
+        if self._bar_start is not None:
+            self._bar_start += timedelta(seconds=self.bar_seconds)
+
+    def load_history(self, market_id: str, points: Sequence[Tuple[datetime, float]]):
+        """
+        Backfill an untracked market from price history aligned to the current bars.
+
+        Points must be sorted by timestamp. Markets that are already tracked are
+        left alone so live sums are never double counted.
+        """
+        if str(market_id) in self._index or not points:
+            return
+
+        timestamps = [ts for ts, _ in points]
+        prices = np.array([float(price) for _, price in points])
+        index = self._track(market_id)
+
+        if self._bar_start is None:
+            self._bar_start = self._bucket(timestamps[-1])
+        if self._filled:
+            # Bar k (oldest first) ends at bar_start - (filled - 1 - k) bars
+            ends = [
+                self._bar_start - timedelta(seconds=self.bar_seconds * (self._filled - k))
+                for k in range(self._filled + 1)
+            ]
+            positions = np.searchsorted(np.array(timestamps, dtype='datetime64[us]'),
+                                        np.array(ends, dtype='datetime64[us]'), side='left') - 1
+            known = positions >= 0
+            level = np.where(known, prices[np.maximum(positions, 0)], np.nan)
+            if 0 < known.argmax():
+                # Like a live tick, the first price opens the bar it falls in
+                level[known.argmax() - 1] = prices[0]
+            column = np.diff(level)
+            observed = ~np.isnan(column)
+            column[~observed] = 0.0
+
+            slots = (self._head - self._filled + np.arange(self._filled)) % self.window
+            self._bars[slots, index] = column
+            self._s1[index] = column.sum()
+            cross = column @ self._bars[slots, :]
+            self._s2[index, :] = cross
+            self._s2[:, index] = cross
+            self._observed[index] = int(observed.sum())
+            self._dirty.add(index)
+
+        before_open_bar = [i for i, ts in enumerate(timestamps) if ts < self._bar_start]
+        self._bar_close[index] = prices[before_open_bar[-1]] if before_open_bar else prices[0]
+        self._last_price[index] = prices[-1]
+
+    def _refresh(self):
+        """Recompute the cached correlation rows of markets whose sums changed"""
+        n = len(self._markets)
+        if self._dirty_all:
+            rows = np.arange(n)
+        elif self._dirty:
+            rows = np.array(sorted(self._dirty))
+        else:
+            return
+        self._dirty.clear()
+        self._dirty_all = False
+        if self._filled == 0 or rows.size == 0:
+            return
+
+        count = float(self._filled)
+        mean = self._s1[:n] / count
+        std = np.sqrt(np.maximum(np.diag(self._s2)[:n] / count - mean * mean, 0.0))
+
+        cov = self._s2[rows, :n] / count - np.outer(mean[rows], mean)
+        denom = np.outer(std[rows], std)
+        corr = np.divide(cov, denom, out=np.zeros_like(cov), where=denom > 1e-12)
+        np.clip(corr, -1.0, 1.0, out=corr)
+
+        self._corr[rows, :n] = corr
+        self._corr[:n, rows] = corr.T
+        self._corr[rows, rows] = 1.0
+
+    def _weights(self, indices: np.ndarray) -> np.ndarray:
+        """Confidence in each market's correlations given its history length"""
+        observed = np.where(indices >= 0, self._observed[np.maximum(indices, 0)], 0).astype(float)
+        if self.shrinkage_bars <= 0:
+            return np.where(observed > 1, 1.0, 0.0)
+        return observed / (observed + self.shrinkage_bars)
+
+    def correlation_matrix(self, market_ids: Iterable[str]) -> np.ndarray:
+        """Shrunk correlation matrix for the given markets, in the given order"""
+        self._refresh()
+        indices = np.array([self._index.get(str(market_id), -1) for market_id in market_ids], dtype=np.int64)
+        safe = np.maximum(indices, 0)
+        matrix = self._corr[np.ix_(safe, safe)].copy()
+
+        weights = self._weights(indices)
+        matrix *= np.minimum.outer(weights, weights)
+        matrix[(indices < 0)[:, None] | (indices < 0)[None, :]] = 0.0
+        np.fill_diagonal(matrix, 1.0)
+        return matrix
+
+    def correlations_to(self, market_id: str, market_ids: Sequence[str]) -> np.ndarray:
+        """Shrunk correlations of one market against many"""
+        self._refresh()
+        index = self._index.get(str(market_id), -1)
+        indices = np.array([self._index.get(str(other), -1) for other in market_ids], dtype=np.int64)
+        if index < 0 or indices.size == 0:
+            return np.zeros(indices.size)
+
+        row = self._corr[index, np.maximum(indices, 0)]
+        weights = np.minimum(self._weights(np.array([index]))[0], self._weights(indices))
+        row = np.where(indices >= 0, row * weights, 0.0)
+        row[indices == index] = 1.0
+        return row
+
+    def history_bars(self, market_id: str) -> int:
+        """Number of bars observed for a market within the window"""
+        index = self._index.get(str(market_id))
+        return int(self._observed[index]) if index is not None else 0
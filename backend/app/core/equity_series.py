@@ -0,0 +1,284 @@
+import numpy as np
+from collections import deque
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+# (name, bucket size in seconds, retention); a bucket size of 0 keeps every point
+TIERS = (
+    ("raw", 0, timedelta(days=1)),
+    ("1m", 60, timedelta(days=7)),
+    ("1h", 3600, timedelta(days=90)),
+    ("1d", 86400, timedelta(days=1825)),
+)
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+@dataclass
+class EquityPoint:
+    timestamp: datetime
+    total_value: float
+    cash_balance: float
+    positions_value: float
+    pnl: float
+    high_value: float
+    low_value: float
+
+
+class SeriesTier:
+    """
+    Ring buffer of equity points at one resolution.
+
+    Bucketed tiers keep the current bucket open and fold every new sample into
+    it (close, high, low); a bucket is appended to the buffer once the next one
+    starts. Return sums are updated as points are appended and evicted, so
+    volatility and Sharpe never rescan the buffer; drawdown is computed over
+    the requested window by `EquitySeries.performance`.
+    """
+
+    def __init__(self, name: str, bucket_seconds: int, retention: timedelta):
+        self.name = name
+        self.bucket_seconds = bucket_seconds
+        self.retention = retention
+
+        self.points: Deque[EquityPoint] = deque()
+        self.open_bucket: Optional[EquityPoint] = None
+
+        # Incremental statistics over the closed points in the buffer
+        self._returns: Deque[float] = deque()
+        self._return_sum = 0.0
+        self._return_sq_sum = 0.0
+
+    def __len__(self) -> int:
+        return len(self.points) + (1 if self.open_bucket is not None else 0)
+
+    def bucket_start(self, timestamp: datetime) -> datetime:
+        """Start of the bucket a timestamp falls into"""
+        if not self.bucket_seconds:
+            return timestamp
+        epoch = int(timestamp.timestamp()) if timestamp.tzinfo else int((timestamp - datetime(1970, 1, 1)).total_seconds())
+        start = epoch - epoch % self.bucket_seconds
+        return timestamp - timedelta(seconds=epoch - start, microseconds=timestamp.microsecond)
+
+    def add(self, point: EquityPoint) -> Optional[EquityPoint]:
+        """Fold a sample into the tier; returns a point once it is final"""
+        if not self.bucket_seconds:
+            self._append(point)
+            return point
+
+        start = self.bucket_start(point.timestamp)
+        bucket = self.open_bucket
+        if bucket is not None and bucket.timestamp == start:
+            bucket.total_value = point.total_value
+            bucket.cash_balance = point.cash_balance
+            bucket.positions_value = point.positions_value
+            bucket.pnl = point.pnl
+            bucket.high_value = max(bucket.high_value, point.high_value)
+            bucket.low_value = min(bucket.low_value, point.low_value)
+            return None
+
+        closed = bucket
+        if closed is not None:
+            self._append(closed)
+        self.open_bucket = EquityPoint(**{**asdict(point), 'timestamp': start})
+        return closed
+
+    def load(self, points: Iterable[EquityPoint]):
+        """Replace the buffer with persisted points, oldest first"""
+        self.points.clear()
+        self.open_bucket = None
+        self._returns.clear()
+        self._return_sum = 0.0
+        self._return_sq_sum = 0.0
+        for point in points:
+            self._append(point)
+
+    def _append(self, point: EquityPoint):
+        """Append a final point and roll it into the running statistics"""
+        if self.points:
+            previous = self.points[-1].total_value
+            period_return = (point.total_value - previous) / previous if previous > 0 else 0.0
+            self._returns.append(period_return)
+            self._return_sum += period_return
+            self._return_sq_sum += period_return * period_return
+        self.points.append(point)
+
+        cutoff = point.timestamp - self.retention
+        while self.points and self.points[0].timestamp < cutoff:
+            self.points.popleft()
+            if self._returns:
+                evicted = self._returns.popleft()
+                self._return_sum -= evicted
+                self._return_sq_sum -= evicted * evicted
+
+    @property
+    def periods_per_year(self) -> float:
+        """Number of sampling periods in a trading year"""
+        if self.bucket_seconds:
+            return TRADING_DAYS_PER_YEAR * 86400 / self.bucket_seconds
+        if len(self.points) < 2:
+            return 0.0
+        span = (self.points[-1].timestamp - self.points[0].timestamp).total_seconds()
+        average_spacing = span / (len(self.points) - 1)
+        return TRADING_DAYS_PER_YEAR * 86400 / average_spacing if average_spacing > 0 else 0.0
+
+    def _return_moments(self):
+        count = len(self._returns)
+        if count == 0:
+            return 0, 0.0, 0.0
+        mean = self._return_sum / count
+        variance = max(self._return_sq_sum / count - mean * mean, 0.0)
+        return count, mean, variance ** 0.5
+
+    def volatility(self) -> float:
+        """Annualized volatility of period returns"""
+        count, _, std = self._return_moments()
+        return std * np.sqrt(self.periods_per_year) if count > 1 else 0.0
+
+    def sharpe_ratio(self, risk_free_rate: float = 0.02, min_returns: int = 10) -> float:
+        """Annualized Sharpe ratio of period returns"""
+        count, mean, std = self._return_moments()
+        periods = self.periods_per_year
+        if count < min_returns or std <= 0 or periods <= 0:
+            return 0.0
+        return (mean - risk_free_rate / periods) / std * np.sqrt(periods)
+
+    def window(self, since: datetime) -> List[EquityPoint]:
+        """Points newer than a timestamp, oldest first, including the open bucket"""
+        selected = []
+        for point in reversed(self.points):
+            if point.timestamp <= since:
+                break
+            selected.append(point)
+        selected.reverse()
+        if self.open_bucket is not None and self.open_bucket.timestamp > since:
+            selected.append(self.open_bucket)
+        return selected
+
+
+class EquitySeries:
+    """Portfolio equity history with raw, 1-minute, 1-hour and 1-day tiers"""
+
+    def __init__(self):
+        self.tiers: Dict[str, SeriesTier] = {
+            name: SeriesTier(name, bucket_seconds, retention)
+            for name, bucket_seconds, retention in TIERS
+        }
+        self._pending: List[Dict[str, Any]] = []
+
+    def add(self, timestamp: datetime, total_value: float, cash_balance: float = 0.0,
+            positions_value: float = 0.0, pnl: float = 0.0):
+        """Record an equity sample in every tier"""
+        for tier in self.tiers.values():
+            point = EquityPoint(
+                timestamp=timestamp,
+                total_value=total_value,
+                cash_balance=cash_balance,
+                positions_value=positions_value,
+                pnl=pnl,
+                high_value=total_value,
+                low_value=total_value
+            )
+            closed = tier.add(point)
+            if closed is not None:
+                self._pending.append(self._row(tier.name, closed))
+
+    def load(self, tier: str, points: Iterable[EquityPoint]):
+        """Rehydrate one tier from persisted points"""
+        self.tiers[tier].load(points)
+
+    def tier_for(self, days: int) -> SeriesTier:
+        """Finest tier whose retention covers the requested period"""
+        period = timedelta(days=days)
+        for name, _, retention in TIERS:
+            if retention >= period:
+                return self.tiers[name]
+        return self.tiers[TIERS[-1][0]]
+
+    def performance(self, days: int, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Return, range, volatility and drawdown over the last number of days"""
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(days=days)
+        tier = self.tier_for(days)
+        points = tier.window(cutoff)
+
+        if not points:
+            return {
+                'period_start': cutoff,
+                'period_end': now,
+                'starting_value': 0,
+                'ending_value': 0,
+                'total_return': 0,
+                'total_return_percent': 0,
+                'max_value': 0,
+                'min_value': 0,
+                'volatility': 0,
+                'max_drawdown': 0,
+                'resolution': tier.name,
+                'data_points': 0
+            }
+
+        values = np.array([point.total_value for point in points])
+        highs = np.array([point.high_value for point in points])
+        lows = np.array([point.low_value for point in points])
+
+        starting_value = float(values[0])
+        ending_value = float(values[-1])
+        total_return = ending_value - starting_value
+        total_return_percent = (total_return / starting_value) * 100 if starting_value > 0 else 0
+
+        if len(values) > 1:
+            previous = values[:-1]
+            returns = np.divide(np.diff(values), previous, out=np.zeros(len(previous)), where=previous > 0)
+            volatility = float(np.std(returns) * np.sqrt(tier.periods_per_year))
+        else:
+            volatility = 0.0
+
+        running_peak = np.maximum.accumulate(highs)
+        drawdowns = np.divide(running_peak - lows, running_peak, out=np.zeros(len(lows)), where=running_peak > 0)
+
+        return {
+            'period_start': cutoff,
+            'period_end': now,
+            'starting_value': starting_value,
+            'ending_value': ending_value,
+            'total_return': total_return,
+            'total_return_percent': total_return_percent,
+            'max_value': float(highs.max()),
+            'min_value': float(lows.min()),
+            'volatility': volatility,
+            'max_drawdown': float(drawdowns.max()),
+            'resolution': tier.name,
+            'data_points': len(points),
+            'daily_values': [
+                {
+                    'date': point.timestamp.isoformat(),
+                    'value': point.total_value,
+                    'pnl': point.pnl
+                }
+                for point in points
+            ]
+        }
+
+    @staticmethod
+    def _row(tier: str, point: EquityPoint) -> Dict[str, Any]:
+        return {
+            'tier': tier,
+            'bucket_start': point.timestamp,
+            'total_value': point.total_value,
+            'high_value': point.high_value,
+            'low_value': point.low_value,
+            'cash_balance': point.cash_balance,
+            'positions_value': point.positions_value,
+            'pnl': point.pnl
+        }
+
+    def drain_pending(self) -> List[Dict[str, Any]]:
+        """Final points not yet persisted, as snapshot rows; the latest row wins per bucket"""
+        rows, self._pending = self._pending, []
+        return list({(row['tier'], row['bucket_start']): row for row in rows}.values())
+
+    def mark_pending(self, rows: List[Dict[str, Any]]):
+        """Re-queue rows whose persistence failed"""
+        self._pending = rows + self._pending
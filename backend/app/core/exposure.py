@@ -0,0 +1,151 @@
+"""Per-user open-position counter and per-market exposure index.
+
+The ledger pipeline updates these rows in the same transaction as the fill or
+close, so risk checks read a user's open-position count or a market's open
+exposure with a single primary-key lookup.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterable
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.schemas import MarketExposure, PNLLedger, UserPositionState
+
+
+def _position_state(db: Session, user_id, now: datetime) -> UserPositionState:
+    state = db.get(UserPositionState, user_id, with_for_update=True)
+    if state is None:
+        state = UserPositionState(user_id=user_id, open_positions=0, open_exposure=Decimal("0"), updated_at=now)
+        db.add(state)
+    return state
+
+
+def _market_exposure(db: Session, user_id, market_ticker: str, now: datetime) -> MarketExposure:
+    exposure = db.get(MarketExposure, (user_id, market_ticker), with_for_update=True)
+    if exposure is None:
+        exposure = MarketExposure(
+            user_id=user_id, market_ticker=market_ticker, open_qty=0, open_cost=Decimal("0"), updated_at=now
+        )
+        db.add(exposure)
+    return exposure
+
+
+def apply_open(db: Session, user_id, market_ticker: str, qty: int, cost: Decimal, now: datetime):
+    """Add an opened quantity; a market going from flat to open counts as a new position"""
+    state = _position_state(db, user_id, now)
+    exposure = _market_exposure(db, user_id, market_ticker, now)
+    if (exposure.open_qty or 0) <= 0 and qty > 0:
+        state.open_positions = (state.open_positions or 0) + 1
+    exposure.open_qty = (exposure.open_qty or 0) + qty
+    exposure.open_cost = Decimal(exposure.open_cost or 0) + cost
+    state.open_exposure = Decimal(state.open_exposure or 0) + cost
+    exposure.updated_at = now
+    state.updated_at = now
+
+
+def apply_close(db: Session, user_id, market_ticker: str, qty: int, cost: Decimal, now: datetime):
+    """Remove a closed quantity; a market going flat releases its position"""
+    state = _position_state(db, user_id, now)
+    exposure = _market_exposure(db, user_id, market_ticker, now)
+    was_open = (exposure.open_qty or 0) > 0
+    exposure.open_qty = max((exposure.open_qty or 0) - qty, 0)
+    exposure.open_cost = max(Decimal(exposure.open_cost or 0) - cost, Decimal("0"))
+    state.open_exposure = max(Decimal(state.open_exposure or 0) - cost, Decimal("0"))
+    if was_open and exposure.open_qty == 0:
+        exposure.open_cost = Decimal("0")
+        state.open_positions = max((state.open_positions or 0) - 1, 0)
+    exposure.updated_at = now
+    state.updated_at = now
+
+
+def open_position_count(db: Session, user_id) -> int:
+    state = db.get(UserPositionState, user_id)
+    return int(state.open_positions or 0) if state else 0
+
+
+def open_position_counts(db: Session, user_ids: Iterable) -> Dict:
+    ids = list(set(user_ids))
+    if not ids:
+        return {}
+    rows = (
+        db.query(UserPositionState.user_id, UserPositionState.open_positions)
+        .filter(UserPositionState.user_id.in_(ids))
+        .all()
+    )
+    counts = {user_id: 0 for user_id in ids}
+    counts.update({user_id: int(count or 0) for user_id, count in rows})
+    return counts
+
+
+def market_exposure(db: Session, user_id, market_ticker: str) -> Decimal:
+    exposure = db.get(MarketExposure, (user_id, market_ticker))
+    return Decimal(exposure.open_cost or 0) if exposure else Decimal("0")
+
+
+def market_exposures(db: Session, user_id, market_tickers: Iterable[str]) -> Dict[str, Decimal]:
+    tickers = list(set(market_tickers))
+    if not tickers:
+        return {}
+    rows = (
+        db.query(MarketExposure.market_ticker, MarketExposure.open_cost)
+        .filter(MarketExposure.user_id == user_id, MarketExposure.market_ticker.in_(tickers))
+        .all()
+    )
+    return {ticker: Decimal(cost or 0) for ticker, cost in rows}
+
+
+def rebuild_exposure(db: Session, user_id, now: datetime | None = None) -> UserPositionState:
+    """Recompute a user's counter and exposure rows from open ledger entries"""
+    now = now or datetime.utcnow()
+    rows = (
+        db.query(
+            PNLLedger.market_ticker,
+            func.coalesce(func.sum(PNLLedger.qty), 0),
+            func.coalesce(func.sum(PNLLedger.entry_price * PNLLedger.qty), 0),
+        )
+        .filter(PNLLedger.user_id == user_id, PNLLedger.closed_at.is_(None))
+        .group_by(PNLLedger.market_ticker)
+        .all()
+    )
+    try:
+        db.query(MarketExposure).filter(MarketExposure.user_id == user_id).delete()
+        state = _position_state(db, user_id, now)
+        state.open_positions = 0
+        state.open_exposure = Decimal("0")
+        for market_ticker, qty, cost in rows:
+            if int(qty) <= 0:
+                continue
+            db.add(
+                MarketExposure(
+                    user_id=user_id, market_ticker=market_ticker, open_qty=int(qty), open_cost=Decimal(cost), updated_at=now
+                )
+            )
+            state.open_positions += 1
+            state.open_exposure += Decimal(cost)
+        state.updated_at = now
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return state
+
+
+def backfill_exposure(db: Session, now: datetime | None = None) -> int:
+    """Rebuild the index for users with open ledger entries but no counter row; returns how many"""
+    user_ids = [
+        user_id
+        for (user_id,) in (
+            db.query(PNLLedger.user_id)
+            .outerjoin(UserPositionState, UserPositionState.user_id == PNLLedger.user_id)
+            .filter(PNLLedger.closed_at.is_(None), UserPositionState.user_id.is_(None))
+            .distinct()
+            .all()
+        )
+    ]
+    for user_id in user_ids:
+        rebuild_exposure(db, user_id, now)
+    return len(user_ids)
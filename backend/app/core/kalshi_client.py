@@ -203,6 +203,37 @@ class KalshiClient:
             logger.error(f"Failed to fetch markets: {str(e)}")
             raise
 
+    def get_markets_page(self, cursor: Optional[str] = None, limit: int = 1000,
+                         status: Optional[str] = None) -> Dict:
+        """
+        Fetch one page of the market catalog with cursor pagination
+
+        Args:
+            cursor: Cursor returned by the previous page, None for the first page
+            limit: Page size
+            status: Filter by market status
+
+        Returns:
+            Dict with 'markets' and the 'cursor' of the next page (empty on the last page)
+        """
+        try:
+            params = {"limit": limit}
+            if cursor:
+                params["cursor"] = cursor
+            if status:
+                params["status"] = status
+
+            if self.kalshi_api:
+                markets_api = kalshi.MarketsApi(self.kalshi_api)
+                result = markets_api.get_markets(**params)
+            else:
+                result = self._make_request_with_retry('GET', '/markets', params=params)
+            return {'markets': result.get('markets', []), 'cursor': result.get('cursor') or None}
+
+        except Exception as e:
+            logger.error(f"Failed to fetch markets page: {str(e)}")
+            raise
+
     def get_market_details(self, market_id: str) -> Dict:
         """
         Get detailed information for a specific market
@@ -453,5 +484,24 @@ class KalshiClient:
             logger.error(f"Failed to get market series: {str(e)}")
             raise
 
+    def get_series_page(self, cursor: Optional[str] = None, limit: int = 1000) -> Dict:
+        """
+        Fetch one page of market series with cursor pagination
+
+        Returns:
+            Dict with 'series' and the 'cursor' of the next page (empty on the last page)
+        """
+        try:
+            params = {"limit": limit}
+            if cursor:
+                params["cursor"] = cursor
+
+            result = self._make_request_with_retry('GET', '/series', params=params)
+            return {'series': result.get('series', []), 'cursor': result.get('cursor') or None}
+
+        except Exception as e:
+            logger.error(f"Failed to fetch series page: {str(e)}")
+            raise
+
 # Global Kalshi client instance
 kalshi_client = KalshiClient()
\ No newline at end of file
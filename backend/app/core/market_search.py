@@ -0,0 +1,304 @@
+"""In-memory full-text index over the local market catalog.
+
+Search used to pull 500 markets from Kalshi per query and substring-scan
+them. The index instead holds every market in the `markets` table with its
+latest stored price, and answers queries without any upstream call:
+
+- terms from the title, subtitle and category are weighted by field
+  (title matches count most) and by inverse document frequency
+- every query word must match; the last word also matches as a prefix
+  ("elec" finds "election"), and words with no exact match fall back to
+  trigram similarity so small typos still hit ("electoin")
+- ties are broken by traded volume
+
+`refresh` is incremental: it only reads markets updated and prices recorded
+since the previous refresh, so it is cheap to run after every catalog sync.
+It runs from background jobs only; until the first refresh finishes the
+index is not `loaded` and searches find nothing.
+"""
+from __future__ import annotations
+
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from loguru import logger
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.schemas import Market, MarketPrice
+
+FIELD_WEIGHTS = {'title': 3.0, 'subtitle': 1.0, 'category': 0.5}
+PREFIX_WEIGHT = 0.8
+FUZZY_WEIGHT = 0.6
+FUZZY_MIN_SIMILARITY = 0.3  # pg_trgm's default threshold
+FUZZY_MIN_LENGTH = 4
+VOLUME_WEIGHT = 0.01
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN.findall(text.lower()) if text else []
+
+
+def trigrams(term: str) -> Set[str]:
+    padded = f"${term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class MarketDocument:
+    market_id: str
+    title: str
+    category: str
+    subtitle: Optional[str] = None
+    status: Optional[str] = None
+    settle_date: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    current_price: Optional[float] = None
+    volume: Optional[int] = None
+    terms: Dict[str, float] = field(default_factory=dict, repr=False)
+
+
+@dataclass
+class SearchHit:
+    document: MarketDocument
+    score: float
+
+
+class MarketSearchIndex:
+    """Inverted index with prefix and trigram lookup over market documents"""
+
+    def __init__(self):
+        self.documents: Dict[str, MarketDocument] = {}
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.term_trigrams: Dict[str, Set[str]] = defaultdict(set)
+        self.sorted_terms: List[str] = []
+        self.boost: Dict[str, float] = {}
+        self.market_watermark: Optional[datetime] = None
+        self.watermark_ids: Set[str] = set()
+        self.price_watermark: int = 0
+        self.loaded = False
+        self._lock = threading.RLock()
+        # One refresh at a time, so two cannot read the same watermarks and both advance them
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    @staticmethod
+    def _document_terms(document: MarketDocument) -> Dict[str, float]:
+        weights: Dict[str, float] = defaultdict(float)
+        for field_name, weight in FIELD_WEIGHTS.items():
+            for term, count in Counter(tokenize(getattr(document, field_name))).items():
+                # Saturate repeats so a title cannot win by repeating a word
+                weights[term] += weight * count / (count + 0.5)
+        return dict(weights)
+
+    def _unindex(self, market_id: str) -> Set[str]:
+        document = self.documents.pop(market_id, None)
+        self.boost.pop(market_id, None)
+        dropped = set()
+        if document is None:
+            return dropped
+        for term in document.terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(market_id, None)
+            if not posting:
+                del self.postings[term]
+                for gram in trigrams(term):
+                    self.term_trigrams[gram].discard(term)
+                dropped.add(term)
+        return dropped
+
+    def _index(self, document: MarketDocument) -> Set[str]:
+        document.terms = self._document_terms(document)
+        self.documents[document.market_id] = document
+        self.boost[document.market_id] = VOLUME_WEIGHT * math.log1p(document.volume or 0)
+        added = set()
+        for term, weight in document.terms.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = {}
+                for gram in trigrams(term):
+                    self.term_trigrams[gram].add(term)
+                added.add(term)
+            posting[document.market_id] = weight
+        return added
+
+    def upsert(self, documents: Iterable[MarketDocument]):
+        """Add or replace documents, keeping prices already known for them"""
+        with self._lock:
+            vocabulary_changed = False
+            for document in documents:
+                previous = self.documents.get(document.market_id)
+                if previous is not None and document.current_price is None:
+                    document.current_price, document.volume = previous.current_price, previous.volume
+                dropped = self._unindex(document.market_id)
+                added = self._index(document)
+                vocabulary_changed |= bool(dropped ^ added)
+            if vocabulary_changed:
+                self.sorted_terms = sorted(self.postings)
+
+    def remove(self, market_ids: Iterable[str]):
+        with self._lock:
+            dropped = set()
+            for market_id in market_ids:
+                dropped |= self._unindex(str(market_id))
+            if dropped:
+                self.sorted_terms = sorted(self.postings)
+
+    def update_prices(self, prices: Dict[str, tuple]):
+        """Set (price, volume) for indexed markets"""
+        with self._lock:
+            for market_id, (price, volume) in prices.items():
+                document = self.documents.get(market_id)
+                if document is not None:
+                    document.current_price, document.volume = price, volume
+                    self.boost[market_id] = VOLUME_WEIGHT * math.log1p(volume or 0)
+
+    def refresh(self, db: Session) -> int:
+        """Index markets changed and prices recorded since the last refresh"""
+        with self._refresh_lock:
+            with self._lock:
+                market_watermark, watermark_ids = self.market_watermark, set(self.watermark_ids)
+                price_watermark = self.price_watermark
+
+            # Queries run outside the index lock so searches are not held up by the database
+            query = db.query(Market)
+            if market_watermark is not None:
+                # Inclusive so rows sharing the watermark timestamp are never missed
+                query = query.filter(Market.updated_at >= market_watermark)
+            markets = [
+                market for market in query.all()
+                if not (market.updated_at == market_watermark and str(market.market_id) in watermark_ids)
+            ]
+
+            latest = (
+                db.query(func.max(MarketPrice.id).label('id'))
+                .filter(MarketPrice.id > price_watermark)
+                .group_by(MarketPrice.market_id)
+                .subquery()
+            )
+            prices = db.query(MarketPrice).join(latest, MarketPrice.id == latest.c.id).all()
+
+            with self._lock:
+                self._apply_refresh(markets, prices)
+            if markets:
+                logger.debug(f"Market search index refreshed: {len(markets)} markets, {len(self.documents)} indexed")
+            return len(markets)
+
+    def _apply_refresh(self, markets: List[Market], prices: List[MarketPrice]):
+        """Index the rows and advance the watermarks past them; the caller holds the lock"""
+        self.upsert(
+            MarketDocument(
+                market_id=str(market.market_id),
+                title=market.title,
+                category=market.category,
+                subtitle=market.subtitle,
+                status=market.status,
+                settle_date=market.settle_date,
+                created_at=market.created_at,
+                updated_at=market.updated_at,
+            )
+            for market in markets
+        )
+        self.update_prices({
+            str(price.market_id): (float(price.price), int(price.volume) if price.volume is not None else None)
+            for price in prices
+        })
+
+        updated = [market.updated_at for market in markets if market.updated_at is not None]
+        if updated and (self.market_watermark is None or max(updated) > self.market_watermark):
+            self.market_watermark = max(updated)
+            self.watermark_ids = set()
+        self.watermark_ids |= {
+            str(market.market_id) for market in markets if market.updated_at == self.market_watermark
+        }
+        if prices:
+            self.price_watermark = max(self.price_watermark, max(price.id for price in prices))
+        self.loaded = True
+
+    def _expand(self, token: str, prefix: bool) -> Dict[str, float]:
+        """Index terms a query token matches, with the strength of each match"""
+        matches: Dict[str, float] = {}
+        if token in self.postings:
+            matches[token] = 1.0
+        if prefix:
+            start = bisect.bisect_left(self.sorted_terms, token)
+            for term in self.sorted_terms[start:]:
+                if not term.startswith(token):
+                    break
+                if term != token:
+                    matches[term] = PREFIX_WEIGHT * (0.5 + 0.5 * len(token) / len(term))
+        if not matches and len(token) >= FUZZY_MIN_LENGTH:
+            grams = trigrams(token)
+            shared = Counter(term for gram in grams for term in self.term_trigrams.get(gram, ()))
+            for term, count in shared.items():
+                similarity = count / (len(grams) + len(term) - count)
+                if similarity >= FUZZY_MIN_SIMILARITY:
+                    matches[term] = FUZZY_WEIGHT * similarity
+        return matches
+
+    def search(self, query: str, category: Optional[str] = None, limit: int = 20) -> List[SearchHit]:
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        category = category.lower() if category else None
+
+        with self._lock:
+            total = max(len(self.documents), 1)
+            expanded = [
+                self._expand(token, prefix=position == len(tokens) - 1 and len(token) >= 2)
+                for position, token in enumerate(tokens)
+            ]
+            # Rarest word first keeps the candidate set small for common words
+            expanded.sort(key=lambda matches: sum(len(self.postings[term]) for term in matches))
+
+            scores: Optional[Dict[str, float]] = None
+            for matches in expanded:
+                token_scores: Dict[str, float] = {}
+                for term, strength in matches.items():
+                    posting = self.postings[term]
+                    factor = strength * math.log(1 + total / len(posting))
+                    if scores is None and not token_scores:
+                        token_scores = {market_id: factor * weight for market_id, weight in posting.items()}
+                        continue
+                    if scores is not None and len(scores) < len(posting):
+                        pairs = ((market_id, posting.get(market_id)) for market_id in scores)
+                    else:
+                        pairs = posting.items()
+                    for market_id, weight in pairs:
+                        if weight is None or (scores is not None and market_id not in scores):
+                            continue
+                        value = factor * weight
+                        if value > token_scores.get(market_id, 0.0):
+                            token_scores[market_id] = value
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {market_id: scores[market_id] + value for market_id, value in token_scores.items()}
+                if not scores:
+                    return []
+
+            if category:
+                scores = {
+                    market_id: score for market_id, score in scores.items()
+                    if self.documents[market_id].category.lower() == category
+                }
+            boost = self.boost
+            top = heapq.nlargest(limit, scores, key=lambda market_id: scores[market_id] + boost[market_id])
+            return [SearchHit(self.documents[market_id], scores[market_id] + boost[market_id]) for market_id in top]
+
+
+market_search_index = MarketSearchIndex()
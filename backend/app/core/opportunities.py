@@ -0,0 +1,187 @@
+"""Precomputed opportunity ranking.
+
+`market_opportunities` holds one row per market: its latest ensemble result,
+market metadata, last known price and the derived ranking fields. The
+analysis pipeline writes the row when it stores an ensemble result, and
+price ticks re-score rows in batches, so the opportunities endpoint is a
+single indexed read ordered by score.
+"""
+from __future__ import annotations
+
+import threading
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.catalog_sync import market_uuid
+from app.core.sizing import ensemble_probability
+from app.models.schemas import Market, MarketOpportunity, MarketPrice
+
+
+def score_opportunity(prediction: float, confidence: float, current_price: Optional[float]) -> Dict[str, Any]:
+    """
+    Expected value, risk score, recommendation and ranking score for a signal.
+
+    With a known price the expected value is the signed edge per contract
+    between the signal's implied probability and the price. Without one it
+    falls back to the signal strength, prediction/100 * confidence/100.
+    """
+    if current_price is not None and 0 < current_price < 1:
+        expected_value = ensemble_probability(prediction, confidence, current_price) - current_price
+    else:
+        expected_value = prediction * 0.01 * (confidence / 100.0)
+
+    risk_score = max(0, 100 - confidence + abs(prediction) * 0.5)
+
+    if prediction > 15 and confidence > 75:
+        recommendation = "Strong Buy"
+    elif prediction > 8 and confidence > 65:
+        recommendation = "Buy"
+    elif prediction < -15 and confidence > 75:
+        recommendation = "Strong Sell"
+    elif prediction < -8 and confidence > 65:
+        recommendation = "Sell"
+    else:
+        recommendation = "Hold"
+
+    return {
+        'expected_value': expected_value,
+        'risk_score': risk_score,
+        'recommendation': recommendation,
+        'score': expected_value * confidence,
+    }
+
+
+def _latest_price(db: Session, market_id) -> Tuple[Optional[float], Optional[int]]:
+    row = (
+        db.query(MarketPrice.price, MarketPrice.volume)
+        .filter(MarketPrice.market_id == market_id)
+        .order_by(MarketPrice.id.desc())
+        .first()
+    )
+    return (float(row.price), row.volume) if row else (None, None)
+
+
+def record_opportunity(db: Session, market_id: str, result: Dict[str, Any],
+                       analyzed_at: Optional[datetime] = None) -> Optional[MarketOpportunity]:
+    """Write a market's latest ensemble result into the ranking; the caller commits"""
+    key = market_uuid(market_id)
+    market = db.get(Market, key)
+    if market is None:
+        return None
+
+    price, volume = opportunity_prices.last(str(key))
+    if price is None:
+        price, volume = _latest_price(db, key)
+
+    opportunity = db.get(MarketOpportunity, key)
+    if opportunity is None:
+        opportunity = MarketOpportunity(market_id=key)
+        db.add(opportunity)
+    prediction = float(result['ensemble_prediction'])
+    confidence = float(result['confidence'])
+
+    opportunity.market_title = market.title
+    opportunity.category = market.category
+    opportunity.ensemble_prediction = prediction
+    opportunity.abs_prediction = abs(prediction)
+    opportunity.confidence = confidence
+    opportunity.signal_classification = result.get('signal_classification', 'hold')
+    opportunity.individual_predictions = result.get('individual_results', {})
+    opportunity.current_price = price
+    opportunity.volume = volume
+    opportunity.analyzed_at = analyzed_at or datetime.utcnow()
+    for name, value in score_opportunity(prediction, confidence, price).items():
+        setattr(opportunity, name, value)
+    return opportunity
+
+
+class OpportunityPriceBuffer:
+    """Latest price per market from ticks, drained in batches to re-score rows"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last: Dict[str, Tuple[float, Optional[int]]] = {}
+        self._pending: Dict[str, Tuple[float, Optional[int]]] = {}
+
+    def on_price_tick(self, market_id: str, price: float, volume: Optional[int] = None):
+        key = str(market_uuid(market_id))
+        tick = (price, int(volume) if volume is not None else None)
+        with self._lock:
+            self._last[key] = self._pending[key] = tick
+
+    def last(self, market_id: str) -> Tuple[Optional[float], Optional[int]]:
+        with self._lock:
+            return self._last.get(market_id, (None, None))
+
+    def drain(self) -> Dict[str, Tuple[float, Optional[int]]]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def restore(self, ticks: Dict[str, Tuple[float, Optional[int]]]):
+        """Put back ticks a failed flush did not apply, keeping any newer ones"""
+        with self._lock:
+            for market_id, tick in ticks.items():
+                self._pending.setdefault(market_id, tick)
+
+
+def reprice_opportunities(db: Session, ticks: Dict[str, Tuple[float, Optional[int]]],
+                          now: Optional[datetime] = None) -> int:
+    """Re-score ranked markets with new prices in one read and one batched update"""
+    if not ticks:
+        return 0
+    now = now or datetime.utcnow()
+    keys = {market_uuid(market_id): tick for market_id, tick in ticks.items()}
+    rows = (
+        db.query(MarketOpportunity.market_id, MarketOpportunity.ensemble_prediction, MarketOpportunity.confidence)
+        .filter(MarketOpportunity.market_id.in_(list(keys)))
+        .all()
+    )
+    updates = []
+    for market_id, prediction, confidence in rows:
+        price, volume = keys[market_id]
+        updates.append({
+            'market_id': market_id,
+            'current_price': price,
+            'volume': volume,
+            'price_updated_at': now,
+            **score_opportunity(float(prediction), float(confidence), price),
+        })
+    if updates:
+        db.bulk_update_mappings(MarketOpportunity, updates)
+    db.commit()
+    return len(updates)
+
+
+def flush_price_ticks(session_factory) -> int:
+    ticks = opportunity_prices.drain()
+    if not ticks:
+        return 0
+    db = session_factory()
+    try:
+        return reprice_opportunities(db, ticks)
+    except Exception:
+        db.rollback()
+        opportunity_prices.restore(ticks)
+        raise
+    finally:
+        db.close()
+
+
+def top_opportunities(db: Session, since: datetime, min_confidence: float = 0.0, min_prediction: float = 0.0,
+                      category: Optional[str] = None, limit: int = 20):
+    """Highest-scoring fresh opportunities, read straight off the score index"""
+    query = db.query(MarketOpportunity).filter(
+        MarketOpportunity.analyzed_at >= since,
+        MarketOpportunity.confidence >= Decimal(str(min_confidence)),
+        MarketOpportunity.abs_prediction >= Decimal(str(min_prediction)),
+    )
+    if category:
+        query = query.filter(MarketOpportunity.category == category)
+    return query.order_by(MarketOpportunity.score.desc(), MarketOpportunity.market_id).limit(limit).all()
+
+
+opportunity_prices = OpportunityPriceBuffer()
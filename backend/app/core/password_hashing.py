@@ -0,0 +1,138 @@
+"""Password hashing off the event loop.
+
+bcrypt takes 100-300ms per hash at production cost factors. Run inline in an
+`async def` handler, that stalls every request and WebSocket on the worker.
+`PasswordHasher` runs hashes on a bounded thread pool instead; bcrypt
+releases the GIL while hashing, so threads run in parallel. At most
+PASSWORD_HASH_WORKERS hashes run at once and at most PASSWORD_HASH_MAX_PENDING
+more wait. Beyond that, calls fail fast with `HashingOverloaded` rather than
+queueing without bound.
+
+The cost factor is BCRYPT_ROUNDS. A successful verify against a hash with
+fewer rounds returns a replacement hash, so raising the setting upgrades
+users as they log in.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+import bcrypt
+
+from app.utils.config import settings
+
+# bcrypt only uses the first 72 bytes; longer passwords are truncated as passlib did
+MAX_PASSWORD_BYTES = 72
+
+
+class HashingOverloaded(Exception):
+    """More password hashes requested than the pool runs and queues"""
+
+
+def _secret(password: str) -> bytes:
+    return password.encode('utf-8')[:MAX_PASSWORD_BYTES]
+
+
+def hash_rounds(hashed: str) -> Optional[int]:
+    """The cost factor of a $2a$/$2b$/$2y$ bcrypt hash"""
+    parts = hashed.split('$')
+    try:
+        return int(parts[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """bcrypt on a bounded thread pool, with queueing metrics"""
+
+    def __init__(self, rounds: Optional[int] = None, max_workers: Optional[int] = None,
+                 max_pending: Optional[int] = None):
+        self.rounds = rounds or settings.BCRYPT_ROUNDS
+        self.max_workers = max_workers or settings.PASSWORD_HASH_WORKERS
+        self.max_pending = settings.PASSWORD_HASH_MAX_PENDING if max_pending is None else max_pending
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._in_flight = 0  # queued or running
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.hash_seconds_total = 0.0
+
+    def hash_sync(self, password: str) -> str:
+        return bcrypt.hashpw(_secret(password), bcrypt.gensalt(self.rounds)).decode()
+
+    def verify_sync(self, password: str, hashed: str) -> bool:
+        try:
+            return bcrypt.checkpw(_secret(password), hashed.encode())
+        except ValueError:
+            return False
+
+    def needs_rehash(self, hashed: str) -> bool:
+        rounds = hash_rounds(hashed)
+        return rounds is None or rounds < self.rounds
+
+    def _verify_and_update_sync(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        if not self.verify_sync(password, hashed):
+            return False, None
+        return True, self.hash_sync(password) if self.needs_rehash(hashed) else None
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_pending:
+                self.rejected += 1
+                raise HashingOverloaded("Password hashing queue is full")
+            self._in_flight += 1
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            with self._lock:
+                self._running += 1
+            try:
+                return fn(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._running -= 1
+                    self.completed += 1
+                    self.wait_seconds_total += started - submitted
+                    self.wait_seconds_max = max(self.wait_seconds_max, started - submitted)
+                    self.hash_seconds_total += finished - started
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.hash_sync, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(self.verify_sync, password, hashed)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Whether the password matches, and a new hash when the stored one is below the current cost"""
+        return await self._run(self._verify_and_update_sync, password, hashed)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'rounds': self.rounds,
+                'workers': self.max_workers,
+                'running': self._running,
+                'queued': max(self._in_flight - self._running, 0),
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'wait_seconds_avg': round(self.wait_seconds_total / self.completed, 6) if self.completed else 0.0,
+                'wait_seconds_max': round(self.wait_seconds_max, 6),
+                'hash_seconds_avg': round(self.hash_seconds_total / self.completed, 6) if self.completed else 0.0,
+            }
+
+
+password_hasher = PasswordHasher()
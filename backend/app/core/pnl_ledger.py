@@ -0,0 +1,174 @@
+"""Fill-to-ledger pipeline.
+
+Fills open `PNLLedger` entries and closes settle them FIFO. Every write also
+rolls the amounts into the user's `DayState` row and the exposure index in the
+same transaction, so risk checks read today's spend, realized PnL and open
+positions from single rows instead of aggregating the ledger.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.exposure import apply_close, apply_open
+from app.core.risk_engine import _local_day, ledger_day_totals, new_day_state
+from app.models.schemas import DayState, PNLLedger
+
+
+def side_price(side: str, price) -> Decimal:
+    """Price of the held contract given the market's yes price"""
+    price = Decimal(str(price))
+    return price if side == "yes" else Decimal("1") - price
+
+
+def _day_state_for_update(db: Session, user_id, now: datetime) -> DayState:
+    date_key = _local_day(now)
+    day_state = (
+        db.query(DayState)
+        .filter(DayState.user_id == user_id, DayState.date_local == date_key)
+        .with_for_update()
+        .first()
+    )
+    if not day_state:
+        day_state = new_day_state(db, user_id, now)
+        db.add(day_state)
+        db.flush()
+    return day_state
+
+
+def record_fill(
+    db: Session,
+    user_id,
+    market_ticker: str,
+    qty: int,
+    price,
+    fees=Decimal("0"),
+    now: Optional[datetime] = None,
+) -> PNLLedger:
+    """Open a ledger entry for a fill and add its cost to today's spend"""
+    now = now or datetime.utcnow()
+    price = Decimal(str(price))
+    fees = Decimal(str(fees))
+    try:
+        day_state = _day_state_for_update(db, user_id, now)
+        entry = PNLLedger(
+            user_id=user_id,
+            market_ticker=market_ticker,
+            opened_at=now,
+            qty=qty,
+            entry_price=price,
+            fees=fees,
+        )
+        db.add(entry)
+        day_state.daily_spend = (day_state.daily_spend or Decimal("0")) + price * qty
+        day_state.updated_at = now
+        apply_open(db, user_id, market_ticker, qty, price * qty, now)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    db.refresh(entry)
+    return entry
+
+
+def record_close(
+    db: Session,
+    user_id,
+    market_ticker: str,
+    qty: int,
+    exit_price,
+    fees=Decimal("0"),
+    now: Optional[datetime] = None,
+) -> List[PNLLedger]:
+    """Close open entries for a market oldest first; returns the closed entries"""
+    now = now or datetime.utcnow()
+    exit_price = Decimal(str(exit_price))
+    fees = Decimal(str(fees))
+    closed: List[PNLLedger] = []
+    try:
+        open_entries = (
+            db.query(PNLLedger)
+            .filter(
+                PNLLedger.user_id == user_id,
+                PNLLedger.market_ticker == market_ticker,
+                PNLLedger.closed_at.is_(None),
+            )
+            .order_by(PNLLedger.opened_at)
+            .with_for_update()
+            .all()
+        )
+        # Taken before any entry is closed, so a freshly seeded row does not
+        # already include this close
+        day_state = _day_state_for_update(db, user_id, now) if open_entries else None
+        remaining = qty
+        for entry in open_entries:
+            if remaining <= 0:
+                break
+            if entry.qty > remaining:
+                # Split off the unclosed remainder so it stays open
+                db.add(
+                    PNLLedger(
+                        user_id=entry.user_id,
+                        market_ticker=entry.market_ticker,
+                        opened_at=entry.opened_at,
+                        qty=entry.qty - remaining,
+                        entry_price=entry.entry_price,
+                        fees=Decimal("0"),
+                    )
+                )
+                entry.qty = remaining
+            remaining -= entry.qty
+            closed.append(entry)
+
+        closed_qty = qty - remaining
+        realized_total = Decimal("0")
+        for entry in closed:
+            close_fees = fees * entry.qty / closed_qty if closed_qty else Decimal("0")
+            entry.fees = (entry.fees or Decimal("0")) + close_fees
+            entry.exit_price = exit_price
+            entry.closed_at = now
+            entry.realized_pnl = ((exit_price - entry.entry_price) * entry.qty - entry.fees).quantize(Decimal("0.01"))
+            realized_total += entry.realized_pnl
+
+        if closed:
+            day_state.realized_pnl_today = (day_state.realized_pnl_today or Decimal("0")) + realized_total
+            day_state.updated_at = now
+            closed_cost = sum((entry.entry_price * entry.qty for entry in closed), Decimal("0"))
+            apply_close(db, user_id, market_ticker, closed_qty, closed_cost, now)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return closed
+
+
+def rebuild_day_totals(db: Session, user_ids: Optional[Iterable] = None, now: Optional[datetime] = None) -> int:
+    """Recompute today's running totals from the ledger; returns the number of rows corrected.
+
+    Covers the given users, or every user with a DayState row today. Rows are
+    locked before the ledger is read, so a concurrent fill or close is either
+    fully included or applied on top afterwards.
+    """
+    now = now or datetime.utcnow()
+    query = db.query(DayState).filter(DayState.date_local == _local_day(now))
+    if user_ids is not None:
+        query = query.filter(DayState.user_id.in_(list(user_ids)))
+    try:
+        day_states = query.with_for_update().all()
+        totals = ledger_day_totals(db, (day_state.user_id for day_state in day_states), now)
+        corrected = 0
+        for day_state in day_states:
+            realized, spend = totals[day_state.user_id]
+            if day_state.realized_pnl_today != realized or day_state.daily_spend != spend:
+                day_state.realized_pnl_today = realized
+                day_state.daily_spend = spend
+                day_state.updated_at = now
+                corrected += 1
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return corrected
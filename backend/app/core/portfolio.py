@@ -1,16 +1,25 @@
-import numpy as np
 from typing import Dict, List, Optional, Tuple, Any
-from datetime import datetime, timedelta
+from datetime import datetime
 from dataclasses import dataclass, asdict
 from enum import Enum
 import asyncio
 from loguru import logger
+from sqlalchemy import func
+from sqlalchemy.orm import Session
 
+from app.core.catalog_sync import upsert
+from app.core.equity_series import EquitySeries, EquityPoint, TIERS
 from app.core.kalshi_client import kalshi_client
+from app.core.pnl_ledger import record_close, side_price
+from app.core.portfolio_queries import category_allocation, load_open_positions
+from app.core.position_book import PositionBook
+from app.core.risk_engine import _local_day
 from app.core.risk_manager import risk_manager
 from app.models.database import SessionLocal
-from app.models.schemas import Position, Trade, Market, MarketPrice
-from app.models.enums import TradeSide, TradeStatus, MarketStatus
+from app.models.schemas import Position, MarketPrice, PortfolioSnapshot, DayState
+from app.models.enums import TradeSide, MarketStatus
+
+SNAPSHOT_VALUE_COLUMNS = ('total_value', 'high_value', 'low_value', 'cash_balance', 'positions_value', 'pnl')
 
 class PortfolioStatus(Enum):
     ACTIVE = "active"
@@ -70,7 +79,14 @@ class PortfolioManager:
         self.portfolio_status = PortfolioStatus.ACTIVE
         self.positions_cache = {}
         self.last_update = datetime.utcnow()
-        self.historical_values = []
+
+        # In-memory position book, revalued per price tick and persisted in batches
+        self.position_book = PositionBook()
+        self._book_loaded_at = None
+        self._book_reload_seconds = 900  # Reconcile the book with the database every 15 minutes
+        # Tiered equity history, persisted to portfolio_snapshots
+        self.equity_series = EquitySeries()
+        self._equity_series_loaded = False
         self.daily_returns = []
 
         # Performance tracking
@@ -83,96 +99,169 @@ class PortfolioManager:
         self._metrics_cache = None
         self._metrics_cache_time = None
         self._cache_ttl_seconds = 60  # Cache metrics for 1 minute
+        self._cash_balance = 0.0
+        self._cash_balance_time = None
+
+    def _load_position_book(self, db):
+        """Load every open position from the database into the position book"""
+        positions = load_open_positions(db)
+        self.position_book.clear()
+
+        for position in positions:
+            try:
+                trade = position.trade
+                market = trade.market
+
+                self.position_book.add_position(
+                    position_id=position.id,
+                    market_id=trade.market_id,
+                    side=trade.side,
+                    count=trade.count,
+                    entry_price=float(trade.price),
+                    opened_at=trade.created_at,
+                    market_title=market.title if market else None,
+                    category=market.category if market else None
+                )
+
+            except Exception as e:
+                logger.error(f"Error loading position {position.id}: {str(e)}")
+                continue
+
+        # Freshly loaded rows already match the database
+        self.position_book.drain_dirty()
+        self._book_loaded_at = datetime.utcnow()
+        logger.info(f"Loaded {len(self.position_book)} positions into position book")
+
+    def _build_position_summaries(self) -> Dict[str, PositionSummary]:
+        """Build position summaries from the position book"""
+        now = datetime.utcnow()
+        summaries = {}
+
+        for row in self.position_book.positions():
+            entry_value = row['entry_value']
+            unrealized_pnl = row['unrealized_pnl']
+            unrealized_pnl_percent = (unrealized_pnl / entry_value) * 100 if entry_value > 0 else 0
+            duration_hours = (now - row['opened_at']).total_seconds() / 3600 if row['opened_at'] else 0.0
+
+            summaries[str(row['position_id'])] = PositionSummary(
+                position_id=str(row['position_id']),
+                market_id=row['market_id'],
+                market_title=row['market_title'],
+                side=row['side'],
+                count=row['count'],
+                entry_price=row['entry_price'],
+                current_price=row['current_price'],
+                current_value=row['current_value'],
+                unrealized_pnl=unrealized_pnl,
+                unrealized_pnl_percent=unrealized_pnl_percent,
+                duration_hours=duration_hours,
+                risk_level=self._calculate_position_risk_level(unrealized_pnl_percent, duration_hours)
+            )
+
+        return summaries
 
     async def update_positions(self) -> Dict[str, PositionSummary]:
-        """Update all current positions with latest market data"""
+        """Refresh prices for every held market and revalue the position book"""
         try:
             logger.info("Updating portfolio positions")
 
-            db = SessionLocal()
-            try:
-                # Get all positions from database
-                positions = db.query(Position).all()
-                updated_positions = {}
-
-                for position in positions:
-                    try:
-                        # Get current market price
-                        current_price_info = kalshi_client.get_market_price(position.trade.market_id)
-                        current_price = float(current_price_info.get('price', position.trade.price))
-
-                        # Calculate current values
-                        entry_price = float(position.trade.price)
-                        count = position.trade.count
-                        side = position.trade.side
-
-                        if side == 'yes':
-                            current_value = count * current_price
-                            entry_value = count * entry_price
-                        else:  # 'no'
-                            current_value = count * (1 - current_price)
-                            entry_value = count * (1 - entry_price)
-
-                        unrealized_pnl = current_value - entry_value
-                        unrealized_pnl_percent = (unrealized_pnl / entry_value) * 100 if entry_value > 0 else 0
-
-                        # Calculate duration
-                        duration = datetime.utcnow() - position.trade.created_at
-                        duration_hours = duration.total_seconds() / 3600
-
-                        # Get market title
-                        market = db.query(Market).filter(Market.market_id == position.trade.market_id).first()
-                        market_title = market.title if market else "Unknown Market"
-
-                        # Determine risk level
-                        risk_level = self._calculate_position_risk_level(unrealized_pnl_percent, duration_hours)
-
-                        # Create position summary
-                        position_summary = PositionSummary(
-                            position_id=str(position.id),
-                            market_id=position.trade.market_id,
-                            market_title=market_title,
-                            side=side,
-                            count=count,
-                            entry_price=entry_price,
-                            current_price=current_price,
-                            current_value=current_value,
-                            unrealized_pnl=unrealized_pnl,
-                            unrealized_pnl_percent=unrealized_pnl_percent,
-                            duration_hours=duration_hours,
-                            risk_level=risk_level
-                        )
+            # Load or reconcile the position book, persisting pending valuations
+            # first so the reload does not discard them
+            if (self._book_loaded_at is None or
+                (datetime.utcnow() - self._book_loaded_at).total_seconds() > self._book_reload_seconds):
+                self.flush_position_snapshots()
+                db = SessionLocal()
+                try:
+                    self._load_position_book(db)
+                finally:
+                    db.close()
+
+            # One price request per market, not per position
+            for market_id in self.position_book.markets():
+                try:
+                    current_price_info = kalshi_client.get_market_price(market_id)
+                    price = current_price_info.get('price')
+                    if price is not None:
+                        self.position_book.apply_price(market_id, float(price))
 
-                        # Update database
-                        position.current_value = current_value
-                        position.unrealized_pnl = unrealized_pnl
-                        position.updated_at = datetime.utcnow()
+                except Exception as e:
+                    logger.error(f"Error updating price for market {market_id}: {str(e)}")
+                    continue
 
-                        # Cache position
-                        updated_positions[str(position.id)] = position_summary
-                        self.positions_cache[str(position.id)] = position_summary
+            updated_positions = self._build_position_summaries()
+            self.positions_cache = updated_positions
 
-                    except Exception as e:
-                        logger.error(f"Error updating position {position.id}: {str(e)}")
-                        continue
+            # Update portfolio metrics
+            await self._update_portfolio_metrics(updated_positions)
 
-                # Commit changes to database
-                db.commit()
+            self.last_update = datetime.utcnow()
+            logger.info(f"Updated {len(updated_positions)} positions")
+
+            return updated_positions
+
+        except Exception as e:
+            logger.error(f"Error updating positions: {str(e)}")
+            return {}
+
+    def on_price_tick(self, market_id: str, price: float):
+        """Revalue only the positions in one market after a price tick"""
+        try:
+            if self.position_book.apply_price(market_id, price):
+                self._metrics_cache = None
 
-                # Update portfolio metrics
-                await self._update_portfolio_metrics(updated_positions)
+        except Exception as e:
+            logger.error(f"Error applying price tick for {market_id}: {str(e)}")
+
+    def register_position(self, position_id: Any, market_id: str, side: str, count: int,
+                          price: float, opened_at: Optional[datetime] = None,
+                          market_title: Optional[str] = None, category: Optional[str] = None):
+        """Add a newly filled position to the position book"""
+        try:
+            self.position_book.add_position(
+                position_id=position_id,
+                market_id=market_id,
+                side=side,
+                count=count,
+                entry_price=price,
+                opened_at=opened_at,
+                market_title=market_title,
+                category=category
+            )
+            self._metrics_cache = None
 
-                self.last_update = datetime.utcnow()
-                logger.info(f"Updated {len(updated_positions)} positions")
+        except Exception as e:
+            logger.error(f"Error registering position {position_id}: {str(e)}")
 
-                return updated_positions
+    def flush_position_snapshots(self) -> int:
+        """Persist valuations changed since the last flush in a single batch"""
+        rows = self.position_book.drain_dirty()
+        if not rows:
+            return 0
 
+        try:
+            db = SessionLocal()
+            try:
+                db.bulk_update_mappings(Position, rows)
+                db.commit()
             finally:
                 db.close()
 
+            logger.debug(f"Persisted {len(rows)} position snapshots")
+            return len(rows)
+
         except Exception as e:
-            logger.error(f"Error updating positions: {str(e)}")
-            return {}
+            logger.error(f"Error persisting position snapshots: {str(e)}")
+            self.position_book.mark_dirty(rows)
+            return 0
+
+    def _get_cash_balance(self) -> float:
+        """Account cash balance, cached for the metrics TTL"""
+        if (self._cash_balance_time is None or
+            (datetime.utcnow() - self._cash_balance_time).total_seconds() >= self._cache_ttl_seconds):
+            balance_info = kalshi_client.get_balance()
+            self._cash_balance = float(balance_info.get('cash_balance', 0))
+            self._cash_balance_time = datetime.utcnow()
+        return self._cash_balance
 
     def _calculate_position_risk_level(self, pnl_percent: float, duration_hours: float) -> str:
         """Calculate risk level for a position"""
@@ -197,8 +286,7 @@ class PortfolioManager:
         """Update portfolio performance metrics"""
         try:
             # Get account balance
-            balance_info = kalshi_client.get_balance()
-            cash_balance = float(balance_info.get('cash_balance', 0))
+            cash_balance = self._get_cash_balance()
 
             # Calculate position values
             positions_value = sum(pos.current_value for pos in positions.values())
@@ -221,21 +309,15 @@ class PortfolioManager:
             # Calculate average position size
             avg_position_size = positions_value / len(positions) if positions else 0
 
-            # Update historical values
-            self.historical_values.append({
-                'timestamp': datetime.utcnow(),
-                'total_value': total_value,
-                'cash_balance': cash_balance,
-                'positions_value': positions_value,
-                'pnl': total_pnl
-            })
-
-            # Keep only last 30 days of historical data
-            cutoff_date = datetime.utcnow() - timedelta(days=30)
-            self.historical_values = [
-                hv for hv in self.historical_values
-                if hv['timestamp'] > cutoff_date
-            ]
+            # Record equity sample in the tiered history
+            self._ensure_equity_series()
+            self.equity_series.add(
+                datetime.utcnow(),
+                total_value,
+                cash_balance=cash_balance,
+                positions_value=positions_value,
+                pnl=total_pnl
+            )
 
             # Update risk manager with portfolio value
             if hasattr(risk_manager, 'portfolio_value'):
@@ -251,18 +333,11 @@ class PortfolioManager:
         try:
             db = SessionLocal()
             try:
-                today = datetime.utcnow().date()
-                today_start = datetime.combine(today, datetime.min.time())
-
-                # Get filled trades from today
-                trades = db.query(Trade).filter(
-                    Trade.status == TradeStatus.FILLED,
-                    Trade.filled_at >= today_start
-                ).all()
-
-                # This is simplified - in production, would track realized P&L more accurately
-                # For now, return 0 as most P&L is unrealized
-                return 0.0
+                # Running per-user totals kept by the ledger pipeline
+                realized = db.query(func.coalesce(func.sum(DayState.realized_pnl_today), 0)).filter(
+                    DayState.date_local == _local_day(datetime.utcnow())
+                ).scalar()
+                return float(realized)
 
             finally:
                 db.close()
@@ -281,72 +356,65 @@ class PortfolioManager:
                 return self._metrics_cache
 
             # Update positions if stale
-            if (datetime.utcnow() - self.last_update).total_seconds() > 300:  # 5 minutes
+            if self._book_loaded_at is None or (datetime.utcnow() - self.last_update).total_seconds() > 300:  # 5 minutes
                 await self.update_positions()
 
-            # Get current data
-            db = SessionLocal()
-            try:
-                # Get account balance
-                balance_info = kalshi_client.get_balance()
-                cash_balance = float(balance_info.get('cash_balance', 0))
-
-                # Get positions
-                positions = db.query(Position).all()
-                positions_value = sum(float(p.current_value or 0) for p in positions)
-                total_value = cash_balance + positions_value
+            # Get account balance
+            cash_balance = self._get_cash_balance()
 
-                # Calculate P&L metrics
-                total_unrealized_pnl = sum(float(p.unrealized_pnl or 0) for p in positions)
-                daily_pnl = self._get_daily_realized_pnl()
-                total_pnl = total_unrealized_pnl + daily_pnl
+            # Position aggregates are maintained by the position book
+            book = self.position_book
+            positions_value = book.positions_value
+            total_value = cash_balance + positions_value
 
-                # Calculate percentages
-                invested_capital = total_value - total_pnl
-                total_pnl_percent = (total_pnl / invested_capital) * 100 if invested_capital > 0 else 0
-                daily_pnl_percent = (daily_pnl / cash_balance) * 100 if cash_balance > 0 else 0
-
-                # Position statistics
-                number_of_positions = len(positions)
-                winning_positions = sum(1 for p in positions if (p.unrealized_pnl or 0) > 0)
-                losing_positions = sum(1 for p in positions if (p.unrealized_pnl or 0) < 0)
-                win_rate = (winning_positions / number_of_positions) * 100 if number_of_positions > 0 else 0
-
-                # Risk metrics
-                max_drawdown = risk_manager.current_drawdown if hasattr(risk_manager, 'current_drawdown') else 0
-
-                # Sharpe ratio (simplified)
-                sharpe_ratio = self._calculate_sharpe_ratio()
-
-                # Average position size
-                avg_position_size = positions_value / number_of_positions if number_of_positions > 0 else 0
-
-                # Create metrics object
-                metrics = PortfolioMetrics(
-                    total_value=total_value,
-                    cash_balance=cash_balance,
-                    positions_value=positions_value,
-                    total_pnl=total_pnl,
-                    total_pnl_percent=total_pnl_percent,
-                    daily_pnl=daily_pnl,
-                    daily_pnl_percent=daily_pnl_percent,
-                    number_of_positions=number_of_positions,
-                    number_of_winning_positions=winning_positions,
-                    number_of_losing_positions=losing_positions,
-                    win_rate=win_rate,
-                    max_drawdown=max_drawdown,
-                    sharpe_ratio=sharpe_ratio,
-                    average_position_size=avg_position_size
-                )
+            # Calculate P&L metrics
+            total_unrealized_pnl = book.unrealized_pnl
+            daily_pnl = self._get_daily_realized_pnl()
+            total_pnl = total_unrealized_pnl + daily_pnl
 
-                # Cache results
-                self._metrics_cache = metrics
-                self._metrics_cache_time = datetime.utcnow()
+            # Calculate percentages
+            invested_capital = total_value - total_pnl
+            total_pnl_percent = (total_pnl / invested_capital) * 100 if invested_capital > 0 else 0
+            daily_pnl_percent = (daily_pnl / cash_balance) * 100 if cash_balance > 0 else 0
+
+            # Position statistics
+            number_of_positions = len(book)
+            winning_positions = book.winning_positions
+            losing_positions = book.losing_positions
+            win_rate = (winning_positions / number_of_positions) * 100 if number_of_positions > 0 else 0
+
+            # Risk metrics
+            max_drawdown = risk_manager.current_drawdown if hasattr(risk_manager, 'current_drawdown') else 0
+
+            # Sharpe ratio (simplified)
+            sharpe_ratio = self._calculate_sharpe_ratio()
+
+            # Average position size
+            avg_position_size = positions_value / number_of_positions if number_of_positions > 0 else 0
+
+            # Create metrics object
+            metrics = PortfolioMetrics(
+                total_value=total_value,
+                cash_balance=cash_balance,
+                positions_value=positions_value,
+                total_pnl=total_pnl,
+                total_pnl_percent=total_pnl_percent,
+                daily_pnl=daily_pnl,
+                daily_pnl_percent=daily_pnl_percent,
+                number_of_positions=number_of_positions,
+                number_of_winning_positions=winning_positions,
+                number_of_losing_positions=losing_positions,
+                win_rate=win_rate,
+                max_drawdown=max_drawdown,
+                sharpe_ratio=sharpe_ratio,
+                average_position_size=avg_position_size
+            )
 
-                return metrics
+            # Cache results
+            self._metrics_cache = metrics
+            self._metrics_cache_time = datetime.utcnow()
 
-            finally:
-                db.close()
+            return metrics
 
         except Exception as e:
             logger.error(f"Error getting portfolio metrics: {str(e)}")
@@ -359,43 +427,84 @@ class PortfolioManager:
             )
 
     def _calculate_sharpe_ratio(self, risk_free_rate: float = 0.02) -> float:
-        """Calculate Sharpe ratio from historical returns"""
+        """Calculate Sharpe ratio from hourly equity returns"""
         try:
-            if len(self.historical_values) < 30:  # Need at least 30 data points
-                return 0.0
-
-            # Calculate daily returns
-            returns = []
-            for i in range(1, len(self.historical_values)):
-                prev_value = self.historical_values[i-1]['total_value']
-                curr_value = self.historical_values[i]['total_value']
-                if prev_value > 0:
-                    daily_return = (curr_value - prev_value) / prev_value
-                    returns.append(daily_return)
-
-            if len(returns) < 10:
-                return 0.0
-
-            # Calculate Sharpe ratio
-            returns_array = np.array(returns)
-            excess_returns = returns_array - (risk_free_rate / 252)  # Daily risk-free rate
-
-            if np.std(excess_returns) > 0:
-                sharpe_ratio = np.mean(excess_returns) / np.std(excess_returns) * np.sqrt(252)  # Annualized
-            else:
-                sharpe_ratio = 0.0
-
-            return sharpe_ratio
+            self._ensure_equity_series()
+            return float(self.equity_series.tiers['1h'].sharpe_ratio(risk_free_rate))
 
         except Exception as e:
             logger.error(f"Error calculating Sharpe ratio: {str(e)}")
             return 0.0
 
+    def _ensure_equity_series(self):
+        """Load persisted equity history once per process"""
+        if self._equity_series_loaded:
+            return
+        self._equity_series_loaded = True
+
+        try:
+            db = SessionLocal()
+            try:
+                now = datetime.utcnow()
+                for name, _, retention in TIERS:
+                    rows = db.query(PortfolioSnapshot).filter(
+                        PortfolioSnapshot.tier == name,
+                        PortfolioSnapshot.bucket_start >= now - retention
+                    ).order_by(PortfolioSnapshot.bucket_start).all()
+
+                    self.equity_series.load(name, (
+                        EquityPoint(
+                            timestamp=row.bucket_start.replace(tzinfo=None),
+                            total_value=float(row.total_value),
+                            cash_balance=float(row.cash_balance or 0),
+                            positions_value=float(row.positions_value or 0),
+                            pnl=float(row.pnl or 0),
+                            high_value=float(row.high_value if row.high_value is not None else row.total_value),
+                            low_value=float(row.low_value if row.low_value is not None else row.total_value)
+                        )
+                        for row in rows
+                    ))
+            finally:
+                db.close()
+
+        except Exception as e:
+            logger.error(f"Error loading equity history: {str(e)}")
+
+    def flush_equity_snapshots(self) -> int:
+        """Persist finished equity points and prune rows past their tier retention"""
+        rows = self.equity_series.drain_pending()
+
+        try:
+            db = SessionLocal()
+            try:
+                if rows:
+                    # A bucket already written by another process or an earlier
+                    # run is overwritten rather than failing the whole batch
+                    upsert(db, PortfolioSnapshot, rows, ('tier', 'bucket_start'), SNAPSHOT_VALUE_COLUMNS)
+
+                now = datetime.utcnow()
+                for name, _, retention in TIERS:
+                    db.query(PortfolioSnapshot).filter(
+                        PortfolioSnapshot.tier == name,
+                        PortfolioSnapshot.bucket_start < now - retention
+                    ).delete(synchronize_session=False)
+
+                db.commit()
+            finally:
+                db.close()
+
+            return len(rows)
+
+        except Exception as e:
+            logger.error(f"Error persisting equity snapshots: {str(e)}")
+            self.equity_series.mark_pending(rows)
+            return 0
+
     async def get_position_summaries(self) -> List[PositionSummary]:
         """Get summaries of all current positions"""
         try:
             # Update positions if stale
-            if (datetime.utcnow() - self.last_update).total_seconds() > 300:  # 5 minutes
+            if self._book_loaded_at is None or (datetime.utcnow() - self.last_update).total_seconds() > 300:  # 5 minutes
                 await self.update_positions()
 
             return list(self.positions_cache.values())
@@ -404,7 +513,8 @@ class PortfolioManager:
             logger.error(f"Error getting position summaries: {str(e)}")
             return []
 
-    async def close_position(self, position_id: str, reason: str = "manual") -> Optional[Dict[str, Any]]:
+    async def close_position(self, position_id: str, reason: str = "manual",
+                             user_id: Optional[Any] = None) -> Optional[Dict[str, Any]]:
         """Close a specific position"""
         try:
             logger.info(f"Closing position {position_id}: {reason}")
@@ -416,6 +526,9 @@ class PortfolioManager:
                 if not position:
                     logger.error(f"Position {position_id} not found")
                     return None
+                if position.closed_at is not None:
+                    logger.error(f"Position {position_id} is already closed")
+                    return None
 
                 # Determine closing order
                 market_id = position.trade.market_id
@@ -436,9 +549,20 @@ class PortfolioManager:
                         price=close_price
                     )
 
-                    # Update position status
-                    # In a real implementation, you'd track the closing order
-                    # For now, we'll simulate the position being closed
+                    # Mark the position closed in the same transaction that settles
+                    # the ledger entries and today's realized P&L
+                    position.closed_at = datetime.utcnow()
+                    if user_id is not None:
+                        record_close(
+                            db, user_id, str(market_id), close_count,
+                            side_price(original_side, close_price)
+                        )
+                    else:
+                        db.commit()
+
+                    # Stop valuing the closed position
+                    self.position_book.remove_position(position.id)
+                    self._metrics_cache = None
 
                     logger.info(f"Position {position_id} closed successfully")
                     return {
@@ -463,97 +587,32 @@ class PortfolioManager:
     async def get_portfolio_performance(self, days: int = 30) -> Dict[str, Any]:
         """Get portfolio performance over specified period"""
         try:
-            # Filter historical values for the specified period
-            cutoff_date = datetime.utcnow() - timedelta(days=days)
-            filtered_values = [
-                hv for hv in self.historical_values
-                if hv['timestamp'] > cutoff_date
-            ]
-
-            if not filtered_values:
-                return {
-                    'period_start': cutoff_date,
-                    'period_end': datetime.utcnow(),
-                    'starting_value': 0,
-                    'ending_value': 0,
-                    'total_return': 0,
-                    'total_return_percent': 0,
-                    'max_value': 0,
-                    'min_value': 0,
-                    'volatility': 0,
-                    'data_points': 0
-                }
-
-            # Calculate performance metrics
-            starting_value = filtered_values[0]['total_value']
-            ending_value = filtered_values[-1]['total_value']
-            total_return = ending_value - starting_value
-            total_return_percent = (total_return / starting_value) * 100 if starting_value > 0 else 0
-
-            max_value = max(hv['total_value'] for hv in filtered_values)
-            min_value = min(hv['total_value'] for hv in filtered_values)
-
-            # Calculate volatility
-            values = [hv['total_value'] for hv in filtered_values]
-            if len(values) > 1:
-                returns = [(values[i] - values[i-1]) / values[i-1] for i in range(1, len(values))]
-                volatility = np.std(returns) * np.sqrt(252) if returns else 0  # Annualized volatility
-            else:
-                volatility = 0
-
-            return {
-                'period_start': cutoff_date,
-                'period_end': datetime.utcnow(),
-                'starting_value': starting_value,
-                'ending_value': ending_value,
-                'total_return': total_return,
-                'total_return_percent': total_return_percent,
-                'max_value': max_value,
-                'min_value': min_value,
-                'volatility': volatility,
-                'data_points': len(filtered_values),
-                'daily_values': [
-                    {
-                        'date': hv['timestamp'].isoformat(),
-                        'value': hv['total_value'],
-                        'pnl': hv['pnl']
-                    }
-                    for hv in filtered_values
-                ]
-            }
+            self._ensure_equity_series()
+            return self.equity_series.performance(days)
 
         except Exception as e:
             logger.error(f"Error getting portfolio performance: {str(e)}")
             return {}
 
-    def get_portfolio_allocation(self) -> Dict[str, Any]:
-        """Get portfolio allocation by market category"""
+    def get_portfolio_allocation(self, db: Optional[Session] = None) -> Dict[str, Any]:
+        """Get portfolio allocation by market category; reads through db when given, e.g. a replica session"""
         try:
-            db = SessionLocal()
+            owns_session = db is None
+            db = db or SessionLocal()
             try:
-                # Get positions with market information
-                positions = db.query(Position).join(Trade).join(Market).all()
-
-                category_values = {}
-                total_value = 0
-
-                for position in positions:
-                    category = position.trade.market.category
-                    value = float(position.current_value or 0)
-
-                    if category not in category_values:
-                        category_values[category] = 0
-                    category_values[category] += value
-                    total_value += value
+                # Value and position count per category in one aggregate query
+                category_totals = category_allocation(db)
+                total_value = sum(totals['value'] for totals in category_totals.values())
 
                 # Calculate percentages
-                category_allocation = {}
-                for category, value in category_values.items():
+                category_allocation_result = {}
+                for category, totals in category_totals.items():
+                    value = totals['value']
                     percentage = (value / total_value) * 100 if total_value > 0 else 0
-                    category_allocation[category] = {
+                    category_allocation_result[category] = {
                         'value': value,
                         'percentage': percentage,
-                        'positions': len([p for p in positions if p.trade.market.category == category])
+                        'positions': totals['positions']
                     }
 
                 # Add cash allocation
@@ -561,7 +620,7 @@ class PortfolioManager:
                 cash_balance = float(balance_info.get('cash_balance', 0))
                 cash_percentage = (cash_balance / (total_value + cash_balance)) * 100 if (total_value + cash_balance) > 0 else 0
 
-                category_allocation['cash'] = {
+                category_allocation_result['cash'] = {
                     'value': cash_balance,
                     'percentage': cash_percentage,
                     'positions': 0
@@ -569,13 +628,14 @@ class PortfolioManager:
 
                 return {
                     'total_portfolio_value': total_value + cash_balance,
-                    'category_allocation': category_allocation,
-                    'total_categories': len([c for c in category_allocation.keys() if c != 'cash']),
-                    'largest_category': max(category_allocation.keys(), key=lambda k: category_allocation[k]['value']) if category_allocation else None
+                    'category_allocation': category_allocation_result,
+                    'total_categories': len([c for c in category_allocation_result.keys() if c != 'cash']),
+                    'largest_category': max(category_allocation_result.keys(), key=lambda k: category_allocation_result[k]['value']) if category_allocation_result else None
                 }
 
             finally:
-                db.close()
+                if owns_session:
+                    db.close()
 
         except Exception as e:
             logger.error(f"Error getting portfolio allocation: {str(e)}")
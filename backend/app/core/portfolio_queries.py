@@ -0,0 +1,54 @@
+"""Batched portfolio queries.
+
+Each helper answers its question in a single round-trip so that portfolio
+refreshes and risk recalculations stay constant in query count no matter how
+many positions are open.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, List
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
+
+from app.models.schemas import Market, Position, Trade
+
+
+def load_open_positions(db: Session) -> List[Position]:
+    """All open positions with their trade and market loaded in one joined query"""
+    return (
+        db.query(Position)
+        .options(joinedload(Position.trade).joinedload(Trade.market))
+        .filter(Position.closed_at.is_(None))
+        .all()
+    )
+
+
+def category_allocation(db: Session) -> Dict[str, Dict[str, float]]:
+    """Open position value and position count per market category"""
+    rows = (
+        db.query(
+            Market.category,
+            func.coalesce(func.sum(Position.current_value), 0),
+            func.count(Position.id),
+        )
+        .select_from(Position)
+        .join(Trade, Position.trade_id == Trade.id)
+        .join(Market, Trade.market_id == Market.market_id)
+        .filter(Position.closed_at.is_(None))
+        .group_by(Market.category)
+        .all()
+    )
+    return {
+        category: {"value": float(value or 0), "positions": int(count)}
+        for category, value, count in rows
+    }
+
+
+def market_categories(db: Session, market_ids: Iterable) -> Dict[str, str]:
+    """Category for each of the given markets, keyed by market id string"""
+    ids = list({market_id for market_id in market_ids if market_id is not None})
+    if not ids:
+        return {}
+    rows = db.query(Market.market_id, Market.category).filter(Market.market_id.in_(ids)).all()
+    return {str(market_id): category for market_id, category in rows}
@@ -0,0 +1,239 @@
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional
+from datetime import datetime
+from loguru import logger
+
+
+class PositionBook:
+    """
+    In-memory book of open positions indexed by market.
+
+    Entry price, side, count and the latest valuation of every position live in
+    compact numpy arrays. A price tick only touches the slots of the affected
+    market and adjusts the portfolio aggregates by the resulting deltas, so the
+    cost of a tick does not depend on the size of the book. Slots whose values
+    changed are tracked as dirty so they can be persisted in batches.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self._capacity = 0
+        self._entry_price = np.zeros(0)
+        self._side = np.zeros(0, dtype=np.int8)  # +1 for 'yes', -1 for 'no'
+        self._count = np.zeros(0, dtype=np.int64)
+        self._current_price = np.zeros(0)
+        self._current_value = np.zeros(0)
+        self._unrealized_pnl = np.zeros(0)
+        self._grow(capacity)
+
+        self._position_ids: List[Any] = [None] * self._capacity
+        self._market_ids: List[Optional[str]] = [None] * self._capacity
+        self._opened_at: List[Optional[datetime]] = [None] * self._capacity
+        self._slot_by_position: Dict[Any, int] = {}
+        self._slots_by_market: Dict[str, List[int]] = {}
+        self._free_slots: List[int] = list(range(self._capacity - 1, -1, -1))
+        self._dirty_slots: set = set()
+
+        self.market_titles: Dict[str, str] = {}
+        self.market_categories: Dict[str, str] = {}
+        self.last_prices: Dict[str, float] = {}
+
+        # Portfolio aggregates, maintained incrementally
+        self.positions_value = 0.0
+        self.unrealized_pnl = 0.0
+        self.winning_positions = 0
+        self.losing_positions = 0
+
+    def __len__(self) -> int:
+        return len(self._slot_by_position)
+
+    def __contains__(self, position_id: Any) -> bool:
+        return position_id in self._slot_by_position
+
+    def _grow(self, new_capacity: int):
+        """Resize the backing arrays, keeping existing slots"""
+        extra = new_capacity - self._capacity
+        if extra <= 0:
+            return
+
+        self._entry_price = np.concatenate([self._entry_price, np.zeros(extra)])
+        self._side = np.concatenate([self._side, np.zeros(extra, dtype=np.int8)])
+        self._count = np.concatenate([self._count, np.zeros(extra, dtype=np.int64)])
+        self._current_price = np.concatenate([self._current_price, np.zeros(extra)])
+        self._current_value = np.concatenate([self._current_value, np.zeros(extra)])
+        self._unrealized_pnl = np.concatenate([self._unrealized_pnl, np.zeros(extra)])
+
+        if hasattr(self, '_position_ids'):
+            self._position_ids.extend([None] * extra)
+            self._market_ids.extend([None] * extra)
+            self._opened_at.extend([None] * extra)
+            self._free_slots = list(range(new_capacity - 1, self._capacity - 1, -1)) + self._free_slots
+
+        self._capacity = new_capacity
+
+    @staticmethod
+    def _value(side: np.ndarray, count: np.ndarray, price) -> np.ndarray:
+        """Contract value: count * price for 'yes', count * (1 - price) for 'no'"""
+        return count * np.where(side > 0, price, 1.0 - price)
+
+    def _apply_deltas(self, slots: np.ndarray, new_value: np.ndarray, new_pnl: np.ndarray):
+        """Write new valuations to slots and roll the change into the aggregates"""
+        old_pnl = self._unrealized_pnl[slots]
+
+        self.positions_value += float(new_value.sum() - self._current_value[slots].sum())
+        self.unrealized_pnl += float(new_pnl.sum() - old_pnl.sum())
+        self.winning_positions += int((new_pnl > 0).sum() - (old_pnl > 0).sum())
+        self.losing_positions += int((new_pnl < 0).sum() - (old_pnl < 0).sum())
+
+        self._current_value[slots] = new_value
+        self._unrealized_pnl[slots] = new_pnl
+        self._dirty_slots.update(slots.tolist())
+
+    def add_position(self, position_id: Any, market_id: str, side: str, count: int,
+                     entry_price: float, current_price: Optional[float] = None,
+                     opened_at: Optional[datetime] = None, market_title: Optional[str] = None,
+                     category: Optional[str] = None):
+        """Add a position, or replace it if it is already in the book"""
+        if position_id in self._slot_by_position:
+            self.remove_position(position_id)
+
+        if not self._free_slots:
+            self._grow(max(self._capacity * 2, 16))
+
+        market_key = str(market_id)
+        slot = self._free_slots.pop()
+
+        self._position_ids[slot] = position_id
+        self._market_ids[slot] = market_key
+        self._opened_at[slot] = opened_at or datetime.utcnow()
+        self._entry_price[slot] = float(entry_price)
+        self._side[slot] = 1 if side == 'yes' else -1
+        self._count[slot] = int(count)
+        self._current_value[slot] = 0.0
+        self._unrealized_pnl[slot] = 0.0
+
+        self._slot_by_position[position_id] = slot
+        self._slots_by_market.setdefault(market_key, []).append(slot)
+
+        if market_title is not None:
+            self.market_titles[market_key] = market_title
+        if category is not None:
+            self.market_categories[market_key] = category
+
+        price = current_price if current_price is not None else self.last_prices.get(market_key, float(entry_price))
+        self._current_price[slot] = float(price)
+
+        slots = np.array([slot])
+        new_value = self._value(self._side[slots], self._count[slots], float(price))
+        entry_value = self._value(self._side[slots], self._count[slots], self._entry_price[slots])
+        self._apply_deltas(slots, new_value, new_value - entry_value)
+
+    def remove_position(self, position_id: Any):
+        """Drop a position and take its value out of the aggregates"""
+        slot = self._slot_by_position.pop(position_id, None)
+        if slot is None:
+            return
+
+        slots = np.array([slot])
+        self._apply_deltas(slots, np.zeros(1), np.zeros(1))
+        self._dirty_slots.discard(slot)
+
+        market_key = self._market_ids[slot]
+        market_slots = self._slots_by_market.get(market_key, [])
+        if slot in market_slots:
+            market_slots.remove(slot)
+        if not market_slots:
+            self._slots_by_market.pop(market_key, None)
+
+        self._position_ids[slot] = None
+        self._market_ids[slot] = None
+        self._opened_at[slot] = None
+        self._count[slot] = 0
+        self._free_slots.append(slot)
+
+    def apply_price(self, market_id: str, price: float) -> int:
+        """Revalue the positions in one market; returns how many were touched"""
+        market_key = str(market_id)
+        price = float(price)
+        self.last_prices[market_key] = price
+
+        market_slots = self._slots_by_market.get(market_key)
+        if not market_slots:
+            return 0
+
+        slots = np.array(market_slots)
+        side = self._side[slots]
+        count = self._count[slots]
+
+        new_value = self._value(side, count, price)
+        entry_value = self._value(side, count, self._entry_price[slots])
+
+        self._current_price[slots] = price
+        self._apply_deltas(slots, new_value, new_value - entry_value)
+        return len(market_slots)
+
+    def markets(self) -> List[str]:
+        """Markets with at least one open position"""
+        return list(self._slots_by_market.keys())
+
+    def positions(self, market_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Current state of every position, optionally for one market"""
+        if market_id is not None:
+            slots: Iterable[int] = self._slots_by_market.get(str(market_id), [])
+        else:
+            slots = self._slot_by_position.values()
+
+        rows = []
+        for slot in slots:
+            market_key = self._market_ids[slot]
+            entry_price = float(self._entry_price[slot])
+            count = int(self._count[slot])
+            side = 'yes' if self._side[slot] > 0 else 'no'
+            entry_value = count * entry_price if side == 'yes' else count * (1 - entry_price)
+            rows.append({
+                'position_id': self._position_ids[slot],
+                'market_id': market_key,
+                'market_title': self.market_titles.get(market_key, "Unknown Market"),
+                'side': side,
+                'count': count,
+                'entry_price': entry_price,
+                'entry_value': entry_value,
+                'current_price': float(self._current_price[slot]),
+                'current_value': float(self._current_value[slot]),
+                'unrealized_pnl': float(self._unrealized_pnl[slot]),
+                'opened_at': self._opened_at[slot]
+            })
+        return rows
+
+    def drain_dirty(self) -> List[Dict[str, Any]]:
+        """Return valuation rows changed since the last drain and clear the dirty set"""
+        now = datetime.utcnow()
+        rows = [
+            {
+                'id': self._position_ids[slot],
+                'current_value': float(self._current_value[slot]),
+                'unrealized_pnl': float(self._unrealized_pnl[slot]),
+                'updated_at': now
+            }
+            for slot in self._dirty_slots
+            if self._position_ids[slot] is not None
+        ]
+        self._dirty_slots.clear()
+        return rows
+
+    def mark_dirty(self, rows: List[Dict[str, Any]]):
+        """Re-queue rows whose persistence failed"""
+        for row in rows:
+            slot = self._slot_by_position.get(row['id'])
+            if slot is not None:
+                self._dirty_slots.add(slot)
+
+    def clear(self):
+        """Empty the book"""
+        for position_id in list(self._slot_by_position):
+            self.remove_position(position_id)
+        self._dirty_slots.clear()
+        self.positions_value = 0.0
+        self.unrealized_pnl = 0.0
+        self.winning_positions = 0
+        self.losing_positions = 0
+        logger.debug("Position book cleared")
@@ -0,0 +1,155 @@
+"""Retention for the time-partitioned tables.
+
+For each table in `PARTITIONED_TABLES`, expired data is first rolled up into
+a daily table (prices, analysis results, gate decisions; system logs have no
+rollup) and then removed. Partitioned Postgres tables lose whole partitions
+with DETACH + DROP. Plain tables, such as sqlite in development, fall back to
+deleting expired rows one day at a time in bounded batches. Each partition or
+day is rolled up and removed in one transaction, so an interrupted run is safe
+to repeat. Rows that fell into a table's DEFAULT partition because the job
+stalled are moved into regular partitions on the next run.
+"""
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+from loguru import logger
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.orm import Session
+
+from app.core.catalog_sync import upsert
+from app.models.database import Base
+from app.models.partitions import (
+    PARTITIONED_TABLES, PartitionSpec, create_partitions, default_partition_bounds, drop_partition,
+    expired_partitions, is_partitioned, list_partitions
+)
+from app.models.schemas import (
+    AnalysisResult, AnalysisResultDaily, DecisionReceipt, DecisionReceiptDaily, MarketPrice, MarketPriceDaily
+)
+from app.utils.config import settings
+
+
+def _day(value) -> date:
+    # func.date returns a string on sqlite and a date on Postgres
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _rollup_market_prices(db: Session, start: datetime, end: datetime) -> int:
+    day = func.date(MarketPrice.timestamp)
+    rows = [
+        {'market_id': market_id, 'day': _day(row_day), 'low': low, 'high': high, 'average': average,
+         'volume': volume, 'samples': samples}
+        for market_id, row_day, low, high, average, volume, samples in db.query(
+            MarketPrice.market_id, day, func.min(MarketPrice.price), func.max(MarketPrice.price),
+            func.avg(MarketPrice.price), func.max(MarketPrice.volume), func.count(MarketPrice.id)
+        ).filter(MarketPrice.timestamp >= start, MarketPrice.timestamp < end)
+        .group_by(MarketPrice.market_id, day)
+    ]
+    upsert(db, MarketPriceDaily, rows, ('market_id', 'day'), ('low', 'high', 'average', 'volume', 'samples'))
+    return len(rows)
+
+
+def _rollup_analysis_results(db: Session, start: datetime, end: datetime) -> int:
+    day = func.date(AnalysisResult.timestamp)
+    rows = [
+        {'market_id': market_id, 'analyzer_type': analyzer_type, 'day': _day(row_day),
+         'average_prediction': prediction, 'average_confidence': confidence, 'results': results}
+        for market_id, analyzer_type, row_day, prediction, confidence, results in db.query(
+            AnalysisResult.market_id, AnalysisResult.analyzer_type, day, func.avg(AnalysisResult.prediction),
+            func.avg(AnalysisResult.confidence), func.count(AnalysisResult.id)
+        ).filter(AnalysisResult.timestamp >= start, AnalysisResult.timestamp < end)
+        .group_by(AnalysisResult.market_id, AnalysisResult.analyzer_type, day)
+    ]
+    upsert(db, AnalysisResultDaily, rows, ('market_id', 'analyzer_type', 'day'),
+           ('average_prediction', 'average_confidence', 'results'))
+    return len(rows)
+
+
+def _rollup_decision_receipts(db: Session, start: datetime, end: datetime) -> int:
+    day = func.date(DecisionReceipt.ts)
+    rows = [
+        {'user_id': user_id, 'market_ticker': market_ticker, 'day': _day(row_day), 'receipts': receipts,
+         'allowed': int(allowed or 0), 'average_edge': edge}
+        for user_id, market_ticker, row_day, receipts, allowed, edge in db.query(
+            DecisionReceipt.user_id, DecisionReceipt.market_ticker, day, func.count(DecisionReceipt.id),
+            func.sum(case((DecisionReceipt.allowed.is_(True), 1), else_=0)), func.avg(DecisionReceipt.edge)
+        ).filter(DecisionReceipt.ts >= start, DecisionReceipt.ts < end)
+        .group_by(DecisionReceipt.user_id, DecisionReceipt.market_ticker, day)
+    ]
+    upsert(db, DecisionReceiptDaily, rows, ('user_id', 'market_ticker', 'day'),
+           ('receipts', 'allowed', 'average_edge'))
+    return len(rows)
+
+
+ROLLUPS = {
+    'market_prices': _rollup_market_prices,
+    'analysis_results': _rollup_analysis_results,
+    'decision_receipts': _rollup_decision_receipts,
+}
+
+
+def _rollup(db: Session, spec: PartitionSpec, start: datetime, end: datetime) -> int:
+    rollup = ROLLUPS.get(spec.table)
+    return rollup(db, start, end) if rollup else 0
+
+
+def _drop_expired_partitions(db: Session, spec: PartitionSpec, now: datetime, cutoff: datetime) -> int:
+    conn = db.connection()
+    start, end = now, now + timedelta(days=settings.PARTITION_PREMAKE_DAYS)
+    # Give rows that landed in the default partition a regular one up to the premade horizon
+    stray = default_partition_bounds(conn, spec)
+    if stray:
+        start = min(start, stray[0])
+    create_partitions(conn, spec, start, end)
+    db.commit()
+    expired = expired_partitions(spec, list_partitions(db.connection(), spec.table), cutoff)
+    for name, start, end in expired:
+        _rollup(db, spec, start, end)
+        drop_partition(db.connection(), spec, name)
+        db.commit()
+        logger.info(f"Dropped partition {name} past {spec.retention_days} days retention")
+    return len(expired)
+
+
+def _delete_expired_rows(db: Session, spec: PartitionSpec, cutoff: datetime, batch_size: int) -> int:
+    table = Base.metadata.tables[spec.table]
+    column = table.c[spec.column]
+    cutoff = datetime(cutoff.year, cutoff.month, cutoff.day)
+
+    deleted = 0
+    while True:
+        oldest = db.execute(select(func.min(column)).where(column < cutoff)).scalar()
+        if oldest is None:
+            return deleted
+        # A day's rollup commits together with its deletes, so an interrupted run
+        # never leaves a rollup of rows that are about to be counted again
+        start = datetime(oldest.year, oldest.month, oldest.day)
+        end = start + timedelta(days=1)
+        _rollup(db, spec, start, end)
+        while True:
+            ids = db.execute(
+                select(table.c.id).where(column >= start, column < end).limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+            db.execute(delete(table).where(table.c.id.in_(ids)))
+            deleted += len(ids)
+        db.commit()
+
+
+def apply_retention(db: Session, now: Optional[datetime] = None, batch_size: int = 5000) -> Dict[str, int]:
+    """Roll up and remove data past each table's retention; returns partitions dropped or rows deleted per table"""
+    now = now or datetime.utcnow()
+    removed = {}
+    for spec in PARTITIONED_TABLES:
+        cutoff = now - timedelta(days=spec.retention_days)
+        try:
+            if is_partitioned(db.connection(), spec.table):
+                removed[spec.table] = _drop_expired_partitions(db, spec, now, cutoff)
+            else:
+                removed[spec.table] = _delete_expired_rows(db, spec, cutoff, batch_size)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Retention failed for {spec.table}: {str(e)}")
+    return removed
@@ -1,16 +1,17 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
-from typing import Dict, Optional
+from typing import Callable, Dict, Iterable, Optional, Tuple
 from zoneinfo import ZoneInfo
 
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
+from app.core.exposure import open_position_count, open_position_counts
 from app.models.enums import DecisionReason, KillState
-from app.models.schemas import DayState, PNLLedger, Position
+from app.models.schemas import DayState, PNLLedger
 from app.utils.config import settings
 
 PACIFIC_TZ = ZoneInfo("America/Los_Angeles")
@@ -21,6 +22,7 @@ PER_MARKET_SPEND_CAP = Decimal("40")
 MAX_OPEN_POSITIONS = 8
 SOFT_MAX_POSITIONS = 5
 BREACH_HYSTERESIS_SECONDS = 60
+DEFAULT_START_EQUITY = Decimal("10000")
 
 
 @dataclass
@@ -36,6 +38,57 @@ def _local_day(now: datetime) -> str:
     return now.astimezone(PACIFIC_TZ).strftime("%Y-%m-%d")
 
 
+def _start_of_day(now: datetime) -> datetime:
+    return datetime.strptime(_local_day(now), "%Y-%m-%d").replace(tzinfo=PACIFIC_TZ)
+
+
+def ledger_day_totals(db: Session, user_ids: Iterable, now: datetime) -> Dict:
+    """Today's realized PnL and spend per user, aggregated from the ledger"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    start_of_day = _start_of_day(now)
+    totals = {user_id: (Decimal("0"), Decimal("0")) for user_id in user_ids}
+    realized_rows = (
+        db.query(PNLLedger.user_id, func.coalesce(func.sum(PNLLedger.realized_pnl), 0))
+        .filter(PNLLedger.user_id.in_(user_ids), PNLLedger.closed_at >= start_of_day)
+        .group_by(PNLLedger.user_id)
+        .all()
+    )
+    for user_id, realized in realized_rows:
+        totals[user_id] = (Decimal(realized), totals[user_id][1])
+    spend_rows = (
+        db.query(PNLLedger.user_id, func.coalesce(func.sum(PNLLedger.entry_price * PNLLedger.qty), 0))
+        .filter(PNLLedger.user_id.in_(user_ids), PNLLedger.opened_at >= start_of_day)
+        .group_by(PNLLedger.user_id)
+        .all()
+    )
+    for user_id, spend in spend_rows:
+        totals[user_id] = (totals[user_id][0], Decimal(spend))
+    return totals
+
+
+def new_day_state(db: Session, user_id, now: datetime, totals: Optional[Tuple] = None) -> DayState:
+    """Today's DayState row for a user, seeded from the ledger (not added to the session).
+
+    Seeding keeps the running totals right when the row is first created after
+    fills or closes already happened today, e.g. after a mid-day deploy.
+    """
+    if totals is None:
+        totals = ledger_day_totals(db, [user_id], now)[user_id]
+    realized, spend = totals
+    return DayState(
+        user_id=user_id,
+        date_local=_local_day(now),
+        start_equity=DEFAULT_START_EQUITY,
+        realized_pnl_today=realized,
+        daily_spend=spend,
+        kill_state=KillState.NONE.value,
+        kill_reason=None,
+        updated_at=now,
+    )
+
+
 def _get_day_state(db: Session, user_id, now: datetime) -> DayState:
     date_key = _local_day(now)
     day_state = (
@@ -44,36 +97,15 @@ def _get_day_state(db: Session, user_id, now: datetime) -> DayState:
         .first()
     )
     if not day_state:
-        day_state = DayState(
-            user_id=user_id,
-            date_local=date_key,
-            start_equity=Decimal("10000"),
-            realized_pnl_today=Decimal("0"),
-            daily_spend=Decimal("0"),
-            kill_state=KillState.NONE.value,
-            kill_reason=None,
-            updated_at=now,
-        )
+        day_state = new_day_state(db, user_id, now)
         db.add(day_state)
         db.commit()
         db.refresh(day_state)
     return day_state
 
 
-def _aggregate_realized(db: Session, user_id, now: datetime) -> Decimal:
-    date_key = _local_day(now)
-    start_of_day = datetime.strptime(date_key, "%Y-%m-%d").replace(tzinfo=PACIFIC_TZ)
-    result = (
-        db.query(func.coalesce(func.sum(PNLLedger.realized_pnl), 0))
-        .filter(PNLLedger.user_id == user_id, PNLLedger.closed_at >= start_of_day)
-        .scalar()
-    )
-    return Decimal(result)
-
-
 def _aggregate_spend(db: Session, user_id, now: datetime, market_ticker: Optional[str]) -> Decimal:
-    date_key = _local_day(now)
-    start_of_day = datetime.strptime(date_key, "%Y-%m-%d").replace(tzinfo=PACIFIC_TZ)
+    start_of_day = _start_of_day(now)
     query = db.query(
         func.coalesce(func.sum(PNLLedger.entry_price * PNLLedger.qty), 0)
     ).filter(PNLLedger.user_id == user_id, PNLLedger.opened_at >= start_of_day)
@@ -83,70 +115,88 @@ def _aggregate_spend(db: Session, user_id, now: datetime, market_ticker: Optiona
 
 
 def _count_open_positions(db: Session, user_id) -> int:
-    # Existing schema does not explicitly store user on positions, so we fallback to counting all
-    # open positions. In a fuller implementation we would join trades owned by the user.
-    return db.query(Position).count()
-
-
-def _update_hysteresis(day_state: DayState, breach_level: KillState, now: datetime):
-    if breach_level == KillState.NONE:
-        return day_state.kill_state
-    marker = f"{breach_level.value}_breach"
-    existing = day_state.kill_reason or ""
-    ts_map: Dict[str, datetime] = {}
-    for token in existing.split("|"):
-        if not token:
-            continue
-        label, _, ts = token.partition(":")
-        try:
-            ts_map[label] = datetime.fromisoformat(ts)
-        except ValueError:
-            continue
-    last = ts_map.get(marker)
-    ts_map[marker] = now
-    day_state.kill_reason = "|".join(f"{k}:{v.isoformat()}" for k, v in ts_map.items())
-    if last and (now - last) >= timedelta(seconds=BREACH_HYSTERESIS_SECONDS):
-        day_state.kill_state = breach_level.value
-    return day_state.kill_state
+    # Maintained by the ledger pipeline on every fill and close
+    return open_position_count(db, user_id)
 
 
-def risk_gate(
-    db: Session,
-    user_id,
-    market_ticker: str,
-    intended_action: str,
-    intended_spend: Decimal,
-    now: Optional[datetime] = None,
-) -> GateResult:
-    now = now or datetime.utcnow()
-    day_state = _get_day_state(db, user_id, now)
-
-    if settings.TRADING_MODE != "live":
-        return GateResult(
-            allow_new_open=False,
-            size_multiplier=0,
-            effective_limits={},
-            reason_code=DecisionReason.TRADING_DISABLED.value,
-            kill_state=KillState.NONE,
-        )
+def _as_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    if ts is not None and ts.tzinfo is not None:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
 
-    realized_today = _aggregate_realized(db, user_id, now)
-    day_state.realized_pnl_today = realized_today
-    db.commit()
 
+@dataclass
+class HysteresisState:
+    kill_state: KillState
+    soft_breach_at: Optional[datetime]
+    hard_breach_at: Optional[datetime]
+    kill_reason: Optional[str]
+
+
+def _next_hysteresis(day_state: DayState, breach_level: KillState, now: datetime) -> HysteresisState:
+    """Pure hysteresis step: a breach escalates once it has persisted for the hysteresis window.
+
+    The kill state latches for the rest of the day; breach markers record when
+    a breach level was first seen and are cleared once it is no longer present.
+    """
+    now = _as_utc(now)
+    kill_state = KillState(day_state.kill_state or KillState.NONE.value)
+    kill_reason = day_state.kill_reason
+    markers = {
+        KillState.SOFT: _as_utc(day_state.soft_breach_at),
+        KillState.HARD: _as_utc(day_state.hard_breach_at),
+    }
+    for level in markers:
+        if level != breach_level:
+            markers[level] = None
+
+    if breach_level != KillState.NONE:
+        first_seen = markers[breach_level] or now
+        markers[breach_level] = first_seen
+        escalates = breach_level == KillState.HARD or kill_state == KillState.NONE
+        if escalates and (now - first_seen) >= timedelta(seconds=BREACH_HYSTERESIS_SECONDS):
+            kill_state = breach_level
+            kill_reason = f"{breach_level.value}_drawdown"
+
+    return HysteresisState(kill_state, markers[KillState.SOFT], markers[KillState.HARD], kill_reason)
+
+
+def _apply_hysteresis(day_state: DayState, state: HysteresisState, now: datetime) -> bool:
+    """Copy a hysteresis step onto the row; returns True if anything changed"""
+    changed = (
+        day_state.kill_state != state.kill_state.value
+        or _as_utc(day_state.soft_breach_at) != state.soft_breach_at
+        or _as_utc(day_state.hard_breach_at) != state.hard_breach_at
+    )
+    if changed:
+        day_state.kill_state = state.kill_state.value
+        day_state.kill_reason = state.kill_reason
+        day_state.soft_breach_at = state.soft_breach_at
+        day_state.hard_breach_at = state.hard_breach_at
+        day_state.updated_at = now
+    return changed
+
+
+def _breach_level(day_state: DayState) -> KillState:
+    # Running total maintained by the fill/close ledger pipeline
+    realized_today = Decimal(day_state.realized_pnl_today or 0)
     drawdown_pct = (min(realized_today, Decimal("0")) / Decimal(day_state.start_equity)).quantize(Decimal("0.0001"))
-    breach_state = KillState.NONE
     if drawdown_pct <= HARD_DRAWDOWN:
-        breach_state = KillState.HARD
-    elif drawdown_pct <= SOFT_DRAWDOWN:
-        breach_state = KillState.SOFT
-    kill_state_value = _update_hysteresis(day_state, breach_state, now)
-    db.commit()
+        return KillState.HARD
+    if drawdown_pct <= SOFT_DRAWDOWN:
+        return KillState.SOFT
+    return KillState.NONE
 
-    kill_state = KillState(kill_state_value)
 
+def _evaluate_gate(
+    day_state: DayState,
+    kill_state: KillState,
+    per_market_spend: Decimal,
+    intended_action: str,
+    intended_spend: Decimal,
+    count_open_positions: Callable[[], int],
+) -> GateResult:
     daily_spend = day_state.daily_spend or Decimal("0")
-    per_market_spend = _aggregate_spend(db, user_id, now, market_ticker)
 
     allow_new_open = True
     size_multiplier = 1.0
@@ -161,7 +211,7 @@ def risk_gate(
             allow_new_open = False
             reason = DecisionReason.PER_MARKET_CAP_REACHED
 
-        open_positions = _count_open_positions(db, user_id)
+        open_positions = count_open_positions()
         if open_positions >= max_positions_allowed:
             allow_new_open = False
             reason = DecisionReason.TOO_MANY_POSITIONS
@@ -173,13 +223,10 @@ def risk_gate(
             size_multiplier = 0.5
             reason = DecisionReason.SOFT_THROTTLE
 
-    day_state.updated_at = now
-    db.commit()
-
     effective_limits = {
         "daily_remaining": DAILY_SPEND_CAP - daily_spend,
         "per_market_remaining": PER_MARKET_SPEND_CAP - per_market_spend,
-        "max_positions": max_positions_allowed if intended_action == "open" else max_positions_allowed,
+        "max_positions": max_positions_allowed,
     }
 
     return GateResult(
@@ -189,3 +236,123 @@ def risk_gate(
         reason_code=reason.value if isinstance(reason, DecisionReason) else reason,
         kill_state=kill_state,
     )
+
+
+def _disabled_gate() -> GateResult:
+    return GateResult(
+        allow_new_open=False,
+        size_multiplier=0,
+        effective_limits={},
+        reason_code=DecisionReason.TRADING_DISABLED.value,
+        kill_state=KillState.NONE,
+    )
+
+
+def risk_gate(
+    db: Session,
+    user_id,
+    market_ticker: str,
+    intended_action: str,
+    intended_spend: Decimal,
+    now: Optional[datetime] = None,
+) -> GateResult:
+    """Evaluate the risk gate for one user and market.
+
+    Evaluation itself does not write. Today's day-state row is created on first
+    use and afterwards only updated, in a single commit, when the hysteresis
+    state changes.
+    """
+    now = now or datetime.utcnow()
+    day_state = _get_day_state(db, user_id, now)
+
+    if settings.TRADING_MODE != "live":
+        return _disabled_gate()
+
+    hysteresis = _next_hysteresis(day_state, _breach_level(day_state), now)
+    kill_state = hysteresis.kill_state
+    per_market_spend = _aggregate_spend(db, user_id, now, market_ticker)
+
+    result = _evaluate_gate(
+        day_state,
+        kill_state,
+        per_market_spend,
+        intended_action,
+        intended_spend,
+        lambda: _count_open_positions(db, user_id),
+    )
+
+    if _apply_hysteresis(day_state, hysteresis, now):
+        db.commit()
+    return result
+
+
+def risk_gate_batch(
+    db: Session,
+    entries: Iterable[Tuple],
+    intended_action: str,
+    intended_spend: Decimal,
+    now: Optional[datetime] = None,
+) -> Dict[Tuple, GateResult]:
+    """Evaluate the gate for many (user_id, market_ticker) pairs with set-based queries.
+
+    Day states and per-market spend for every user are loaded with one query
+    each, gates are evaluated in memory and nothing is committed; the caller
+    owns the transaction.
+    """
+    now = now or datetime.utcnow()
+    pairs = list(dict.fromkeys((user_id, market_ticker) for user_id, market_ticker in entries))
+    if not pairs:
+        return {}
+    if settings.TRADING_MODE != "live":
+        return {pair: _disabled_gate() for pair in pairs}
+
+    user_ids = list({user_id for user_id, _ in pairs})
+    date_key = _local_day(now)
+    day_states = {
+        day_state.user_id: day_state
+        for day_state in db.query(DayState).filter(
+            DayState.user_id.in_(user_ids), DayState.date_local == date_key
+        )
+    }
+    missing = [user_id for user_id in user_ids if user_id not in day_states]
+    for user_id, totals in ledger_day_totals(db, missing, now).items():
+        day_state = new_day_state(db, user_id, now, totals)
+        db.add(day_state)
+        day_states[user_id] = day_state
+
+    spend_rows = (
+        db.query(
+            PNLLedger.user_id,
+            PNLLedger.market_ticker,
+            func.coalesce(func.sum(PNLLedger.entry_price * PNLLedger.qty), 0),
+        )
+        .filter(PNLLedger.user_id.in_(user_ids), PNLLedger.opened_at >= _start_of_day(now))
+        .group_by(PNLLedger.user_id, PNLLedger.market_ticker)
+        .all()
+    )
+    market_spend = {(user_id, ticker): Decimal(total) for user_id, ticker, total in spend_rows}
+
+    kill_states: Dict = {}
+    for user_id, day_state in day_states.items():
+        hysteresis = _next_hysteresis(day_state, _breach_level(day_state), now)
+        _apply_hysteresis(day_state, hysteresis, now)
+        kill_states[user_id] = hysteresis.kill_state
+
+    open_counts: Dict = {}
+
+    def open_positions_for(user_id):
+        if not open_counts:
+            open_counts.update(open_position_counts(db, user_ids))
+        return open_counts[user_id]
+
+    return {
+        (user_id, market_ticker): _evaluate_gate(
+            day_states[user_id],
+            kill_states[user_id],
+            market_spend.get((user_id, market_ticker), Decimal("0")),
+            intended_action,
+            intended_spend,
+            lambda user_id=user_id: open_positions_for(user_id),
+        )
+        for user_id, market_ticker in pairs
+    }
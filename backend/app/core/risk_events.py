@@ -0,0 +1,130 @@
+"""Event-driven risk monitoring.
+
+Price ticks and fills are queued with `publish_risk_event` and evaluated by
+`run_risk_monitor` as they arrive; each one only revalues the affected
+market. A full `reconcile()` sweep runs whenever the last one is older than
+RISK_RECONCILE_INTERVAL_SECONDS, however busy the event queue is, and
+re-sends any alerts that are still active.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from app.utils.config import settings
+
+# Price ticks and fills waiting to be evaluated by the risk monitor
+risk_events: asyncio.Queue = asyncio.Queue()
+
+
+def publish_risk_event(event_type: str, market_id: str, data: Optional[Dict[str, Any]] = None):
+    """Queue a price tick ('price') or fill ('fill') for immediate risk evaluation"""
+    try:
+        risk_events.put_nowait({
+            'type': event_type,
+            'market_id': str(market_id),
+            'data': data or {},
+            'timestamp': datetime.utcnow()
+        })
+    except Exception as e:
+        logger.error(f"Error publishing risk event for {market_id}: {str(e)}")
+
+
+def build_risk_alerts(risk_metrics: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Derive alert messages from a risk metrics snapshot"""
+    alerts = []
+
+    if risk_metrics.get('current_drawdown', 0) > 10:
+        alerts.append({
+            'type': 'drawdown_warning',
+            'message': f"Portfolio drawdown: {risk_metrics['current_drawdown']:.1f}%",
+            'severity': 'high' if risk_metrics['current_drawdown'] > 15 else 'medium'
+        })
+
+    if risk_metrics.get('daily_pnl', 0) < -risk_metrics.get('portfolio_value', 10000) * 0.02:
+        alerts.append({
+            'type': 'daily_loss_warning',
+            'message': f"Daily loss: ${abs(risk_metrics['daily_pnl']):.2f}",
+            'severity': 'high'
+        })
+
+    if risk_metrics.get('emergency_stop_active', False):
+        alerts.append({
+            'type': 'emergency_stop_active',
+            'message': "Emergency stop is active - all trading halted",
+            'severity': 'critical'
+        })
+
+    return alerts
+
+
+def evaluate_risk_event(manager, event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Apply one queued event to the risk manager; None for a tick without a price"""
+    if event['type'] == 'fill':
+        data = event['data']
+        return manager.register_fill(
+            position_id=data.get('position_id'),
+            market_id=event['market_id'],
+            side=data.get('side', 'yes'),
+            count=int(data.get('count', 0)),
+            price=float(data.get('price', 0)),
+            category=data.get('category')
+        )
+
+    price = event['data'].get('price')
+    if price is None:
+        return None
+    return manager.apply_price_tick(event['market_id'], float(price))
+
+
+async def run_risk_monitor(manager, broadcast: Callable[..., Awaitable[None]],
+                           events: Optional[asyncio.Queue] = None, interval: Optional[float] = None,
+                           clock: Callable[[], float] = time.monotonic):
+    """
+    Evaluate queued events against `manager` and send alerts through `broadcast`
+
+    Event-driven evaluations only notify when the alert set changes. The
+    reconciliation sweep is due `interval` seconds after the previous one,
+    measured on `clock`, whether or not events arrived in between.
+    """
+    events = risk_events if events is None else events
+    interval = settings.RISK_RECONCILE_INTERVAL_SECONDS if interval is None else interval
+    last_alert_keys = frozenset()
+    last_reconcile = clock()
+
+    while True:
+        try:
+            try:
+                timeout = max(interval - (clock() - last_reconcile), 0)
+                event = await asyncio.wait_for(events.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                event = None
+
+            try:
+                evaluations = []
+                if event is not None:
+                    risk_metrics = evaluate_risk_event(manager, event)
+                    if risk_metrics is not None:
+                        evaluations.append((event, risk_metrics))
+
+                if clock() - last_reconcile >= interval:
+                    last_reconcile = clock()
+                    evaluations.append((None, manager.reconcile()))
+
+                for trigger, risk_metrics in evaluations:
+                    alerts = build_risk_alerts(risk_metrics)
+                    alert_keys = frozenset((alert['type'], alert['severity']) for alert in alerts)
+                    if alerts and (trigger is None or alert_keys != last_alert_keys):
+                        await broadcast(alerts, risk_metrics, trigger)
+                    last_alert_keys = alert_keys
+
+            except Exception as e:
+                logger.error(f"Error in risk monitor: {str(e)}")
+
+        except Exception as e:
+            logger.error(f"Error in risk monitoring: {str(e)}")
+            await asyncio.sleep(interval)
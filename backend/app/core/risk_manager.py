@@ -5,11 +5,19 @@ from dataclasses import dataclass
 from enum import Enum
 from collections import defaultdict
 import asyncio
+import threading
 from loguru import logger
 
 from app.core.kalshi_client import kalshi_client
+from app.core.correlation import CorrelationEngine
+from app.core.exposure import market_exposure, market_exposures
+from app.core.risk_simulation import RiskSimulator
+from app.core.sizing import (
+    ensemble_probability, greedy_allocate, kelly_position_percent, optimize_kelly_portfolio
+)
+from app.core.portfolio_queries import load_open_positions, market_categories
 from app.models.database import SessionLocal
-from app.models.schemas import Position, Trade, Market
+from app.models.schemas import Trade, Market, MarketPrice
 from app.models.enums import MarketCategory, TradeSide, RiskProfile
 from app.utils.config import settings
 
@@ -27,6 +35,25 @@ class RiskAlertType(Enum):
     MARGIN_WARNING = "margin_warning"
     DRAWDOWN_ALERT = "drawdown_alert"
     VOLATILITY_SPIKE = "volatility_spike"
+    TAIL_RISK = "tail_risk"
+
+# Categories treated as related when markets lack price history
+SIMILAR_CATEGORIES = {
+    'politics': ['government'],
+    'finance': ['economy', 'banking'],
+    'sports': ['entertainment'],
+    'technology': ['innovation']
+}
+
+def _similar_category_exposure(new_category: str, category_exposures: Dict[str, float]) -> float:
+    """Exposure held in categories related to a market's category"""
+    total_similar_exposure = 0
+    for category, similar in SIMILAR_CATEGORIES.items():
+        if new_category == category or new_category in similar:
+            total_similar_exposure += category_exposures.get(category, 0)
+            for sim_category in similar:
+                total_similar_exposure += category_exposures.get(sim_category, 0)
+    return total_similar_exposure
 
 @dataclass
 class RiskCheck:
@@ -54,13 +81,29 @@ class TradeRiskAssessment:
     risk_checks: List[RiskCheck]
     recommendations: List[str]
 
+@dataclass
+class BatchTradeAssessment:
+    market_id: str
+    side: str
+    requested_count: int
+    recommended_count: int
+    kelly_size_percent: float
+    assessment: TradeRiskAssessment
+
 class RiskManager:
     """
     Advanced risk management system that ensures responsible trading behavior
     and capital preservation through comprehensive risk monitoring and controls.
+
+    Price ticks and fills mutate the in-memory book on the event loop while
+    assessments and simulations run in worker threads. Both sides touch the
+    positions, exposures and correlation engine only while holding ``_lock``;
+    database round-trips and Monte Carlo runs happen outside it, on copies.
     """
 
     def __init__(self):
+        self._lock = threading.RLock()
+
         # Risk configuration
         self.config = settings.DEFAULT_RISK_CONFIG.copy()
         self.user_profiles = settings.RISK_PROFILES.copy()
@@ -70,15 +113,27 @@ class RiskManager:
         self.daily_trades_count = 0
         self.last_reset_date = datetime.utcnow().date()
         self.current_positions = {}
+        self.market_positions = defaultdict(set)  # market_id -> position ids
+        self.market_categories = {}
         self.risk_alerts = []
         self.portfolio_value = 10000.0  # Default starting value
 
         # Correlation tracking
-        self.correlation_matrix = {}
+        self.correlation_engine = CorrelationEngine(
+            bar_seconds=settings.CORRELATION_BAR_SECONDS,
+            window=settings.CORRELATION_WINDOW_BARS
+        )
+        self._correlation_backfilled = set()
+
+        # Joint settlement risk of the open book
+        self.risk_simulator = RiskSimulator(
+            scenarios=settings.RISK_SIMULATION_SCENARIOS,
+            confidence=settings.RISK_SIMULATION_CONFIDENCE
+        )
         self.category_exposures = defaultdict(float)
 
         # Performance tracking
-        self.max_portfolio_value = self.portfolio_value
+        self.max_portfolio_value = 0.0  # Peak is set by the first real valuation, not the default
         self.current_drawdown = 0.0
         self.daily_returns = []
 
@@ -105,11 +160,11 @@ class RiskManager:
     def _load_current_positions(self):
         """Load current positions from database"""
         try:
+            loaded = {}
             db = SessionLocal()
             try:
-                positions = db.query(Position).all()
-                for position in positions:
-                    self.current_positions[position.id] = {
+                for position in load_open_positions(db):
+                    loaded[position.id] = {
                         'market_id': position.trade.market_id,
                         'side': position.trade.side,
                         'count': position.trade.count,
@@ -121,6 +176,13 @@ class RiskManager:
             finally:
                 db.close()
 
+            with self._lock:
+                self.current_positions.clear()
+                self.current_positions.update(loaded)
+                self.market_positions.clear()
+                for position_id, position_data in loaded.items():
+                    self.market_positions[str(position_data['market_id'])].add(position_id)
+
         except Exception as e:
             logger.error(f"Error loading current positions: {str(e)}")
 
@@ -131,21 +193,22 @@ class RiskManager:
             balance_info = kalshi_client.get_balance()
             account_balance = float(balance_info.get('total_balance', 0))
 
-            # Calculate unrealized P&L from positions
-            total_unrealized_pnl = sum(
-                position['unrealized_pnl']
-                for position in self.current_positions.values()
-            )
+            with self._lock:
+                # Calculate unrealized P&L from positions
+                total_unrealized_pnl = sum(
+                    position['unrealized_pnl']
+                    for position in self.current_positions.values()
+                )
 
-            self.portfolio_value = account_balance + total_unrealized_pnl
+                self.portfolio_value = account_balance + total_unrealized_pnl
 
-            # Update maximum portfolio value for drawdown calculation
-            if self.portfolio_value > self.max_portfolio_value:
-                self.max_portfolio_value = self.portfolio_value
+                # Update maximum portfolio value for drawdown calculation
+                if self.portfolio_value > self.max_portfolio_value:
+                    self.max_portfolio_value = self.portfolio_value
 
-            # Calculate current drawdown
-            if self.max_portfolio_value > 0:
-                self.current_drawdown = (self.max_portfolio_value - self.portfolio_value) / self.max_portfolio_value * 100
+                # Calculate current drawdown
+                if self.max_portfolio_value > 0:
+                    self.current_drawdown = (self.max_portfolio_value - self.portfolio_value) / self.max_portfolio_value * 100
 
         except Exception as e:
             logger.warning(f"Error updating portfolio value: {str(e)}")
@@ -153,36 +216,42 @@ class RiskManager:
     def _calculate_category_exposures(self):
         """Calculate exposure by market category"""
         try:
-            # Reset category exposures
-            self.category_exposures.clear()
+            with self._lock:
+                held_markets = [position_data['market_id'] for position_data in self.current_positions.values()]
 
-            db = SessionLocal()
-            try:
-                for position_id, position_data in self.current_positions.items():
-                    # Get market category
-                    market = db.query(Market).filter(
-                        Market.market_id == position_data['market_id']
-                    ).first()
-
-                    if market:
-                        category = market.category
-                        position_value = position_data['current_value'] or position_data['price'] * position_data['count']
-                        self.category_exposures[category] += position_value
+            # Categories for every held market in one query
+            self._load_market_categories(held_markets)
 
-            finally:
-                db.close()
+            with self._lock:
+                self.category_exposures.clear()
+                for position_data in self.current_positions.values():
+                    category = self.market_categories.get(str(position_data['market_id']))
+                    if category is not None:
+                        position_value = position_data['current_value'] or position_data['price'] * position_data['count']
+                        self.category_exposures[category] += float(position_value)
 
         except Exception as e:
             logger.error(f"Error calculating category exposures: {str(e)}")
 
+    def _load_market_categories(self, market_ids):
+        """Fetch categories for the given markets into the category cache"""
+        db = SessionLocal()
+        try:
+            categories = market_categories(db, market_ids)
+        finally:
+            db.close()
+        with self._lock:
+            self.market_categories.update(categories)
+
     def _reset_daily_metrics(self):
         """Reset daily metrics if new day"""
-        current_date = datetime.utcnow().date()
-        if current_date > self.last_reset_date:
-            self.daily_pnl = 0.0
-            self.daily_trades_count = 0
-            self.last_reset_date = current_date
-            logger.info("Daily risk metrics reset")
+        with self._lock:
+            current_date = datetime.utcnow().date()
+            if current_date > self.last_reset_date:
+                self.daily_pnl = 0.0
+                self.daily_trades_count = 0
+                self.last_reset_date = current_date
+                logger.info("Daily risk metrics reset")
 
     def _calculate_kelly_position_size(self, expected_return: float, win_probability: float,
                                      user_risk_profile: str = 'moderate') -> float:
@@ -195,64 +264,27 @@ class RiskManager:
             # Get user's Kelly fraction based on risk profile
             kelly_fraction = self.user_profiles.get(user_risk_profile, {}).get('kelly_fraction', 0.25)
 
-            # Calculate Kelly percentage
-            if win_probability <= 0 or win_probability >= 1:
-                return 0.0
-
-            # Estimate average win/loss ratio (simplified)
-            win_loss_ratio = abs(expected_return) / 0.05 if expected_return != 0 else 1.0  # Assume 5% average loss
-
-            kelly_percentage = win_probability - ((1 - win_probability) / win_loss_ratio)
-            kelly_percentage = max(0, kelly_percentage)  # Can't be negative
-
-            # Apply fractional Kelly and convert to portfolio percentage
-            position_size_percentage = kelly_percentage * kelly_fraction * 100
-
-            return min(position_size_percentage, self.config['max_position_size_percent'])
+            return float(kelly_position_percent(
+                expected_return, win_probability, kelly_fraction, self.config['max_position_size_percent']
+            )[0])
 
         except Exception as e:
             logger.error(f"Error calculating Kelly position size: {str(e)}")
             return self.config['max_position_size_percent'] * 0.5  # Conservative fallback
 
-    def _check_position_size_risk(self, trade_size: float, market_id: str) -> RiskCheck:
+    def _check_position_size_risk(self, trade_size: float, market_id: str, user_id: Optional[Any] = None) -> RiskCheck:
         """Check if position size exceeds limits"""
         try:
-            position_percentage = (trade_size / self.portfolio_value) * 100
-
-            max_position_size = self.config['max_position_size_percent']
+            # Include the user's existing open exposure in this market
+            existing_exposure = 0.0
+            if user_id is not None:
+                db = SessionLocal()
+                try:
+                    existing_exposure = float(market_exposure(db, user_id, str(market_id)))
+                finally:
+                    db.close()
 
-            if position_percentage > max_position_size * 1.5:
-                return RiskCheck(
-                    passed=False,
-                    level=RiskLevel.CRITICAL,
-                    message=f"Position size {position_percentage:.2f}% far exceeds limit of {max_position_size}%",
-                    details={
-                        'position_percentage': position_percentage,
-                        'max_allowed': max_position_size,
-                        'excess_by': position_percentage - max_position_size
-                    }
-                )
-            elif position_percentage > max_position_size:
-                return RiskCheck(
-                    passed=False,
-                    level=RiskLevel.HIGH,
-                    message=f"Position size {position_percentage:.2f}% exceeds limit of {max_position_size}%",
-                    details={
-                        'position_percentage': position_percentage,
-                        'max_allowed': max_position_size,
-                        'excess_by': position_percentage - max_position_size
-                    }
-                )
-            else:
-                return RiskCheck(
-                    passed=True,
-                    level=RiskLevel.LOW,
-                    message=f"Position size {position_percentage:.2f}% within limits",
-                    details={
-                        'position_percentage': position_percentage,
-                        'max_allowed': max_position_size
-                    }
-                )
+            return self._position_size_result(trade_size, existing_exposure)
 
         except Exception as e:
             return RiskCheck(
@@ -262,6 +294,46 @@ class RiskManager:
                 details={'error': str(e)}
             )
 
+    def _position_size_result(self, trade_size: float, existing_exposure: float) -> RiskCheck:
+        """Position size check for a trade on top of existing exposure in the market"""
+        position_percentage = ((trade_size + existing_exposure) / self.portfolio_value) * 100
+
+        max_position_size = self.config['max_position_size_percent']
+
+        if position_percentage > max_position_size * 1.5:
+            return RiskCheck(
+                passed=False,
+                level=RiskLevel.CRITICAL,
+                message=f"Position size {position_percentage:.2f}% far exceeds limit of {max_position_size}%",
+                details={
+                    'position_percentage': position_percentage,
+                    'max_allowed': max_position_size,
+                    'excess_by': position_percentage - max_position_size
+                }
+            )
+        elif position_percentage > max_position_size:
+            return RiskCheck(
+                passed=False,
+                level=RiskLevel.HIGH,
+                message=f"Position size {position_percentage:.2f}% exceeds limit of {max_position_size}%",
+                details={
+                    'position_percentage': position_percentage,
+                    'max_allowed': max_position_size,
+                    'excess_by': position_percentage - max_position_size
+                }
+            )
+        else:
+            return RiskCheck(
+                passed=True,
+                level=RiskLevel.LOW,
+                message=f"Position size {position_percentage:.2f}% within limits",
+                details={
+                    'position_percentage': position_percentage,
+                    'max_allowed': max_position_size,
+                    'existing_exposure': existing_exposure
+                }
+            )
+
     def _check_category_exposure_risk(self, market_id: str, trade_size: float) -> RiskCheck:
         """Check if category exposure exceeds limits"""
         try:
@@ -277,37 +349,9 @@ class RiskManager:
                         details={'market_id': market_id}
                     )
 
-                category = market.category
-                current_exposure = self.category_exposures.get(category, 0)
-                new_exposure = current_exposure + trade_size
-                exposure_percentage = (new_exposure / self.portfolio_value) * 100
-
-                max_category_exposure = self.config['max_category_exposure_percent']
-
-                if exposure_percentage > max_category_exposure:
-                    return RiskCheck(
-                        passed=False,
-                        level=RiskLevel.HIGH,
-                        message=f"Category {category} exposure {exposure_percentage:.2f}% exceeds limit of {max_category_exposure}%",
-                        details={
-                            'category': category,
-                            'current_exposure': current_exposure,
-                            'new_exposure': new_exposure,
-                            'exposure_percentage': exposure_percentage,
-                            'max_allowed': max_category_exposure
-                        }
-                    )
-                else:
-                    return RiskCheck(
-                        passed=True,
-                        level=RiskLevel.LOW,
-                        message=f"Category {category} exposure {exposure_percentage:.2f}% within limits",
-                        details={
-                            'category': category,
-                            'exposure_percentage': exposure_percentage,
-                            'max_allowed': max_category_exposure
-                        }
-                    )
+                return self._category_exposure_result(
+                    market.category, self.category_exposures.get(market.category, 0), trade_size
+                )
 
             finally:
                 db.close()
@@ -320,6 +364,38 @@ class RiskManager:
                 details={'error': str(e)}
             )
 
+    def _category_exposure_result(self, category: str, current_exposure: float, trade_size: float) -> RiskCheck:
+        """Category exposure check for a trade on top of current category exposure"""
+        new_exposure = current_exposure + trade_size
+        exposure_percentage = (new_exposure / self.portfolio_value) * 100
+
+        max_category_exposure = self.config['max_category_exposure_percent']
+
+        if exposure_percentage > max_category_exposure:
+            return RiskCheck(
+                passed=False,
+                level=RiskLevel.HIGH,
+                message=f"Category {category} exposure {exposure_percentage:.2f}% exceeds limit of {max_category_exposure}%",
+                details={
+                    'category': category,
+                    'current_exposure': current_exposure,
+                    'new_exposure': new_exposure,
+                    'exposure_percentage': exposure_percentage,
+                    'max_allowed': max_category_exposure
+                }
+            )
+        else:
+            return RiskCheck(
+                passed=True,
+                level=RiskLevel.LOW,
+                message=f"Category {category} exposure {exposure_percentage:.2f}% within limits",
+                details={
+                    'category': category,
+                    'exposure_percentage': exposure_percentage,
+                    'max_allowed': max_category_exposure
+                }
+            )
+
     def _check_daily_loss_limit(self) -> RiskCheck:
         """Check if daily loss limit is exceeded"""
         try:
@@ -372,12 +448,119 @@ class RiskManager:
                 details={'error': str(e)}
             )
 
+    def _backfill_correlation_history(self, market_ids: List[str]):
+        """Load recent price history for markets the correlation engine has not seen"""
+        with self._lock:
+            missing = [m for m in market_ids if m not in self._correlation_backfilled]
+            if not missing:
+                return
+            self._correlation_backfilled.update(missing)
+
+        try:
+            db = SessionLocal()
+            try:
+                since = datetime.utcnow() - timedelta(
+                    seconds=settings.CORRELATION_BAR_SECONDS * (settings.CORRELATION_WINDOW_BARS + 1)
+                )
+                rows = db.query(MarketPrice.market_id, MarketPrice.timestamp, MarketPrice.price).filter(
+                    MarketPrice.market_id.in_(missing),
+                    MarketPrice.timestamp >= since
+                ).order_by(MarketPrice.market_id, MarketPrice.timestamp).all()
+            finally:
+                db.close()
+
+            history = defaultdict(list)
+            for market_id, timestamp, price in rows:
+                history[str(market_id)].append((timestamp.replace(tzinfo=None), float(price)))
+            with self._lock:
+                for market_id, points in history.items():
+                    self.correlation_engine.load_history(market_id, points)
+
+        except Exception as e:
+            logger.error(f"Error loading correlation history: {str(e)}")
+
+    def _held_market_exposure(self) -> Dict[str, float]:
+        """Current value held in each market"""
+        held_exposure = {}
+        with self._lock:
+            for held_market, position_ids in self.market_positions.items():
+                exposure = sum(
+                    float(self.current_positions[position_id]['current_value'] or 0)
+                    for position_id in position_ids if position_id in self.current_positions
+                )
+                if exposure:
+                    held_exposure[held_market] = exposure
+        return held_exposure
+
+    def _correlation_result(self, total_correlated_exposure: float,
+                            top_correlations: Dict[str, float]) -> RiskCheck:
+        """Correlation check for the exposure that moves together with a trade"""
+        max_correlation = self.config['max_correlation']
+        correlation_ratio = total_correlated_exposure / self.portfolio_value
+
+        if correlation_ratio > max_correlation:
+            return RiskCheck(
+                passed=False,
+                level=RiskLevel.MEDIUM,
+                message=f"High correlation risk: {correlation_ratio:.2f} exposure to correlated markets",
+                details={
+                    'correlated_exposure': total_correlated_exposure,
+                    'correlation_ratio': correlation_ratio,
+                    'max_allowed': max_correlation,
+                    'top_correlations': top_correlations
+                }
+            )
+        else:
+            return RiskCheck(
+                passed=True,
+                level=RiskLevel.LOW,
+                message=f"Correlation risk acceptable: {correlation_ratio:.2f}",
+                details={
+                    'correlation_ratio': correlation_ratio,
+                    'max_allowed': max_correlation,
+                    'top_correlations': top_correlations
+                }
+            )
+
     def _check_correlation_risk(self, market_id: str, trade_size: float) -> RiskCheck:
-        """Check correlation risk with existing positions"""
+        """Check price correlation risk with existing positions"""
         try:
-            # Simplified correlation check based on market categories
-            # In production, this would use actual price correlation calculations
+            market_key = str(market_id)
+            held_exposure = {
+                held_market: exposure
+                for held_market, exposure in self._held_market_exposure().items()
+                if held_market != market_key
+            }
+
+            self._backfill_correlation_history([market_key] + list(held_exposure))
+            with self._lock:
+                has_history = self.correlation_engine.history_bars(market_key) >= settings.CORRELATION_MIN_BARS
+                held_markets = list(held_exposure)
+                correlations = self.correlation_engine.correlations_to(market_key, held_markets)
+            if not has_history:
+                return self._check_category_similarity_risk(market_id, trade_size)
+
+            exposures = np.array([held_exposure[m] for m in held_markets])
+
+            # Exposure that moves with the new market, weighted by positive correlation
+            correlated_exposure = float(np.maximum(correlations, 0.0) @ exposures) if held_markets else 0.0
+
+            top = np.argsort(-correlations)[:5] if held_markets else []
+            top_correlations = {held_markets[i]: float(correlations[i]) for i in top}
+
+            return self._correlation_result(correlated_exposure + trade_size, top_correlations)
+
+        except Exception as e:
+            return RiskCheck(
+                passed=False,
+                level=RiskLevel.MEDIUM,
+                message=f"Error checking correlation risk: {str(e)}",
+                details={'error': str(e)}
+            )
 
+    def _check_category_similarity_risk(self, market_id: str, trade_size: float) -> RiskCheck:
+        """Correlation proxy from related categories, used until a market has price history"""
+        try:
             db = SessionLocal()
             try:
                 market = db.query(Market).filter(Market.market_id == market_id).first()
@@ -393,20 +576,8 @@ class RiskManager:
                 max_correlation = self.config['max_correlation']
 
                 # Check exposure to similar categories
-                similar_categories = {
-                    'politics': ['government'],
-                    'finance': ['economy', 'banking'],
-                    'sports': ['entertainment'],
-                    'technology': ['innovation']
-                }
-
-                total_similar_exposure = 0
-                for category, similar in similar_categories.items():
-                    if new_category == category or new_category in similar:
-                        total_similar_exposure += self.category_exposures.get(category, 0)
-                        for sim_category in similar:
-                            total_similar_exposure += self.category_exposures.get(sim_category, 0)
-
+                with self._lock:
+                    total_similar_exposure = _similar_category_exposure(new_category, self.category_exposures)
                 total_similar_exposure += trade_size
                 correlation_ratio = total_similar_exposure / self.portfolio_value
 
@@ -444,6 +615,139 @@ class RiskManager:
                 details={'error': str(e)}
             )
 
+    def _settlement_profile(self) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+        """Per-market yes probability and portfolio P&L if each market settles yes or no"""
+        p_yes = {}
+        pnl_yes = defaultdict(float)
+        pnl_no = defaultdict(float)
+
+        with self._lock:
+            positions = [dict(position) for position in self.current_positions.values()]
+        for position in positions:
+            count = int(position['count'] or 0)
+            if count <= 0:
+                continue
+            market_key = str(position['market_id'])
+            current_value = float(position['current_value'] or 0) or float(position['price']) * count
+            # The held contract's price is the market-implied probability that it pays out
+            held_price = min(max(current_value / count, 0.0), 1.0)
+
+            if position['side'] == 'yes':
+                p_yes[market_key] = held_price
+                pnl_yes[market_key] += count - current_value
+                pnl_no[market_key] -= current_value
+            else:
+                p_yes[market_key] = 1.0 - held_price
+                pnl_yes[market_key] -= current_value
+                pnl_no[market_key] += count - current_value
+
+        markets = list(p_yes)
+        return (
+            markets,
+            np.array([p_yes[m] for m in markets]),
+            np.array([pnl_yes[m] for m in markets]),
+            np.array([pnl_no[m] for m in markets])
+        )
+
+    def simulate_portfolio_risk(self) -> Dict[str, Any]:
+        """Monte Carlo VaR and CVaR of the open positions"""
+        try:
+            with self._lock:
+                markets, p_yes, pnl_yes, pnl_no = self._settlement_profile()
+                correlation = self.correlation_engine.correlation_matrix(markets)
+            # The simulation runs on the copied arrays, outside the lock
+            result = self.risk_simulator.simulate(p_yes, pnl_yes, pnl_no, correlation)
+            return {
+                'markets': len(markets),
+                'scenarios': result.scenarios,
+                'confidence': result.confidence,
+                'expected_pnl': result.expected_pnl,
+                'var': result.var,
+                'cvar': result.cvar,
+                'probability_of_loss': result.probability_of_loss,
+                'loss_quantiles': result.loss_quantiles
+            }
+
+        except Exception as e:
+            logger.error(f"Error simulating portfolio risk: {str(e)}")
+            return {}
+
+    def _check_tail_risk(self, market_id: str, side: str, count: int, price: float,
+                         win_probability: float) -> RiskCheck:
+        """Check the change in simulated CVaR from adding the trade"""
+        return self._tail_risk_checks([(market_id, side, count, price, win_probability)])[0]
+
+    def _tail_risk_checks(self, trades: List[Tuple[str, str, int, float, float]]) -> List[RiskCheck]:
+        """
+        Tail-risk check per (market_id, side, count, price, win_probability) trade
+
+        Each trade is judged on its own against the current book, and all of
+        them are scored on one set of simulated scenarios.
+        """
+        try:
+            with self._lock:
+                markets, p_yes, pnl_yes, pnl_no = self._settlement_profile()
+                portfolio_value = self.portfolio_value
+            new_markets = list(dict.fromkeys(
+                str(trade[0]) for trade in trades if str(trade[0]) not in markets
+            ))
+            markets = markets + new_markets
+            p_yes = np.append(p_yes, np.full(len(new_markets), 0.5))
+            pnl_yes = np.append(pnl_yes, np.zeros(len(new_markets)))
+            pnl_no = np.append(pnl_no, np.zeros(len(new_markets)))
+            with self._lock:
+                correlation = self.correlation_engine.correlation_matrix(markets)
+
+            position = {market: i for i, market in enumerate(markets)}
+            index = np.array([position[str(trade[0])] for trade in trades])
+            yes = np.array([trade[1] == 'yes' for trade in trades])
+            count = np.array([float(trade[2]) for trade in trades])
+            cost = count * np.array([float(trade[3]) for trade in trades])
+            win_probability = np.array([float(trade[4]) for trade in trades])
+
+            # Each trade settles on the caller's probability estimate
+            impact = self.risk_simulator.trades_impact(
+                p_yes, pnl_yes, pnl_no, correlation, index,
+                np.where(yes, win_probability, 1.0 - win_probability),
+                np.where(yes, count - cost, -cost),
+                np.where(yes, -cost, count - cost)
+            )
+            return [
+                self._tail_risk_result({key: float(values[i]) for key, values in impact.items()}, portfolio_value)
+                for i in range(len(trades))
+            ]
+
+        except Exception as e:
+            return [RiskCheck(
+                passed=False,
+                level=RiskLevel.MEDIUM,
+                message=f"Error simulating tail risk: {str(e)}",
+                details={'error': str(e)}
+            )] * len(trades)
+
+    def _tail_risk_result(self, impact: Dict[str, float], portfolio_value: float) -> RiskCheck:
+        """Tail-risk check for one trade's simulated VaR and CVaR before and after"""
+        max_cvar_percent = settings.RISK_SIMULATION_MAX_CVAR_PERCENT
+        cvar_percent = (impact['cvar_after'] / portfolio_value) * 100
+        details = dict(impact, cvar_percent=cvar_percent, max_allowed=max_cvar_percent,
+                       confidence=self.risk_simulator.confidence)
+
+        if cvar_percent > max_cvar_percent and impact['cvar_delta'] > 0:
+            level = RiskLevel.HIGH if cvar_percent > max_cvar_percent * 1.5 else RiskLevel.MEDIUM
+            return RiskCheck(
+                passed=False,
+                level=level,
+                message=f"Simulated tail loss {cvar_percent:.2f}% exceeds limit of {max_cvar_percent}%",
+                details=details
+            )
+        else:
+            return RiskCheck(
+                passed=True,
+                level=RiskLevel.LOW,
+                message=f"Simulated tail loss {cvar_percent:.2f}% within limits",
+                details=details
+            )
+
     def _check_drawdown_limit(self) -> RiskCheck:
         """Check if drawdown exceeds warning limits"""
         try:
@@ -495,7 +799,7 @@ class RiskManager:
 
     def assess_trade_risk(self, market_id: str, side: str, count: int, price: float,
                          expected_return: float = 0, win_probability: float = 0.5,
-                         user_risk_profile: str = 'moderate') -> TradeRiskAssessment:
+                         user_risk_profile: str = 'moderate', user_id: Optional[Any] = None) -> TradeRiskAssessment:
         """
         Comprehensive risk assessment for a potential trade
 
@@ -507,6 +811,7 @@ class RiskManager:
             expected_return: Expected return percentage
             win_probability: Probability of winning (0-1)
             user_risk_profile: User's risk profile
+            user_id: User placing the trade, used to include existing market exposure
 
         Returns:
             TradeRiskAssessment with detailed risk analysis
@@ -542,7 +847,7 @@ class RiskManager:
                 critical_issues.append(drawdown_check.message)
 
             # Position size risk
-            position_size_check = self._check_position_size_risk(trade_size, market_id)
+            position_size_check = self._check_position_size_risk(trade_size, market_id, user_id)
             risk_checks.append(position_size_check)
             if not position_size_check.passed:
                 overall_risk_level = max(overall_risk_level, position_size_check.level, key=lambda x: list(RiskLevel).index(x))
@@ -559,6 +864,12 @@ class RiskManager:
             if not correlation_risk.passed:
                 overall_risk_level = max(overall_risk_level, correlation_risk.level, key=lambda x: list(RiskLevel).index(x))
 
+            # Joint tail risk of the book with the trade added
+            tail_risk = self._check_tail_risk(market_id, side, count, price, win_probability)
+            risk_checks.append(tail_risk)
+            if not tail_risk.passed:
+                overall_risk_level = max(overall_risk_level, tail_risk.level, key=lambda x: list(RiskLevel).index(x))
+
             # Calculate optimal position size using Kelly Criterion
             kelly_recommended_size = self._calculate_kelly_position_size(
                 expected_return, win_probability, user_risk_profile
@@ -604,21 +915,365 @@ class RiskManager:
 
         except Exception as e:
             logger.error(f"Error in trade risk assessment: {str(e)}")
-            return TradeRiskAssessment(
-                approved=False,
-                risk_level=RiskLevel.CRITICAL,
-                risk_score=100.0,
-                position_size=0,
-                max_loss=0,
-                risk_checks=[RiskCheck(
-                    passed=False,
-                    level=RiskLevel.CRITICAL,
-                    message=f"Risk assessment error: {str(e)}",
-                    details={'error': str(e)}
-                )],
-                recommendations=["Fix risk assessment system before trading"]
+            return self._failed_assessment(e)
+
+    @staticmethod
+    def _failed_assessment(error: Exception) -> TradeRiskAssessment:
+        """Critical rejection returned when the assessment itself fails"""
+        return TradeRiskAssessment(
+            approved=False,
+            risk_level=RiskLevel.CRITICAL,
+            risk_score=100.0,
+            position_size=0,
+            max_loss=0,
+            risk_checks=[RiskCheck(
+                passed=False,
+                level=RiskLevel.CRITICAL,
+                message=f"Risk assessment error: {str(error)}",
+                details={'error': str(error)}
+            )],
+            recommendations=["Fix risk assessment system before trading"]
+        )
+
+    def assess_trades_batch(self, candidates: List[Dict[str, Any]], user_risk_profile: str = 'moderate',
+                            greedy: bool = False, user_id: Optional[Any] = None) -> List[BatchTradeAssessment]:
+        """
+        Assess many candidate trades against one snapshot of portfolio state
+
+        Categories, existing market exposure and correlations are loaded once
+        for the whole set and Kelly sizes and limit checks are computed as
+        arrays. Without ``greedy`` every candidate is judged on its own against
+        the current book. With ``greedy`` capital is allocated to candidates in
+        order, so earlier candidates use up the market, category and
+        correlation headroom of later ones. The simulated tail-risk check scores
+        every distinct trade against the current book on one shared set of
+        scenarios, at the requested size or, with ``greedy``, at the allocated
+        size.
+
+        Args:
+            candidates: Dicts with market_id, side, count, price and optional
+                expected_return and win_probability
+            user_risk_profile: User's risk profile
+            greedy: Allocate cumulatively in candidate order
+            user_id: User placing the trades, used to include existing market exposure
+
+        Returns:
+            BatchTradeAssessment per candidate, in input order
+        """
+        try:
+            if not candidates:
+                return []
+
+            market_ids = [str(c['market_id']) for c in candidates]
+            sides = [c['side'] for c in candidates]
+            count = np.array([int(c['count']) for c in candidates])
+            price = np.array([float(c['price']) for c in candidates])
+            expected_return = np.array([float(c.get('expected_return') or 0) for c in candidates])
+            win_probability = np.array([float(c.get('win_probability', 0.5)) for c in candidates])
+            trade_size = count * price
+            portfolio_value = self.portfolio_value
+
+            # Portfolio-level checks are the same for every candidate
+            shared_checks = [self._check_daily_loss_limit(), self._check_drawdown_limit()]
+            shared_issues = [
+                check.message for check in shared_checks
+                if not check.passed and check.level == RiskLevel.CRITICAL
+            ]
+            if self.emergency_stop_active:
+                shared_issues.append("Emergency stop is active - all trading halted")
+            if not self.risk_checks_enabled:
+                shared_issues.append("Risk checks are disabled")
+
+            # One round-trip for categories and existing exposure
+            unique_markets = list(dict.fromkeys(market_ids))
+            missing = [m for m in unique_markets if m not in self.market_categories]
+            if missing:
+                self._load_market_categories(missing)
+            existing = {}
+            if user_id is not None:
+                db = SessionLocal()
+                try:
+                    existing = {m: float(v) for m, v in market_exposures(db, user_id, unique_markets).items()}
+                finally:
+                    db.close()
+            categories = [self.market_categories.get(m) for m in market_ids]
+
+            # Correlated exposure per candidate from one correlation matrix
+            held_exposure = self._held_market_exposure()
+            held_markets = list(held_exposure)
+            self._backfill_correlation_history(unique_markets + held_markets)
+            with self._lock:
+                matrix = self.correlation_engine.correlation_matrix(unique_markets + held_markets)
+                has_history = np.array([
+                    self.correlation_engine.history_bars(m) >= settings.CORRELATION_MIN_BARS for m in unique_markets
+                ])
+                similar = np.array([
+                    _similar_category_exposure(self.market_categories.get(m), self.category_exposures)
+                    for m in unique_markets
+                ])
+            k = len(unique_markets)
+            position = {m: i for i, m in enumerate(unique_markets)}
+            rows = np.array([position[m] for m in market_ids])
+
+            to_held = np.maximum(matrix[:k, k:], 0.0)
+            to_held[np.array(unique_markets)[:, None] == np.array(held_markets, dtype=object)[None, :]] = 0.0
+            held_values = np.array([held_exposure[m] for m in held_markets])
+            correlated = to_held @ held_values if held_markets else np.zeros(k)
+            correlated_exposure = np.where(has_history, correlated, similar)[rows]
+
+            # Vectorized Kelly sizing
+            profile_config = self.user_profiles.get(user_risk_profile, {})
+            kelly_percent = kelly_position_percent(
+                expected_return, win_probability,
+                profile_config.get('kelly_fraction', 0.25),
+                self.config['max_position_size_percent']
+            )
+            kelly_size = kelly_percent / 100 * portfolio_value
+
+            # Remaining room under each limit
+            existing_exposure = np.array([existing.get(m, 0.0) for m in market_ids])
+            category_exposure = np.array([self.category_exposures.get(c, 0) if c else 0.0 for c in categories])
+            market_headroom = {
+                m: self.config['max_position_size_percent'] / 100 * portfolio_value - existing.get(m, 0.0)
+                for m in unique_markets
+            }
+            category_headroom = {
+                c: self.config['max_category_exposure_percent'] / 100 * portfolio_value - self.category_exposures.get(c, 0)
+                for c in set(categories) if c is not None
+            }
+            correlation_headroom = self.config['max_correlation'] * portfolio_value - correlated_exposure
+            requested = np.minimum(trade_size, kelly_size)
+
+            if greedy:
+                candidate_correlation = matrix[np.ix_(rows, rows)]
+                allocated = greedy_allocate(
+                    requested, market_ids, categories, market_headroom, category_headroom,
+                    correlation_headroom, candidate_correlation
+                )
+                # Each candidate is checked at its allocation, on top of earlier allocations
+                prior_market = np.zeros(len(candidates))
+                prior_category = np.zeros(len(candidates))
+                prior_correlated = np.zeros(len(candidates))
+                positive = np.maximum(candidate_correlation, 0.0)
+                for i in range(len(candidates)):
+                    same_market = np.array(market_ids[:i]) == market_ids[i]
+                    same_category = np.array(categories[:i], dtype=object) == categories[i]
+                    prior_market[i] = allocated[:i][same_market].sum() if i else 0.0
+                    prior_category[i] = allocated[:i][same_category].sum() if i and categories[i] else 0.0
+                    prior_correlated[i] = positive[i, :i] @ allocated[:i] if i else 0.0
+                evaluated_size = allocated
+            else:
+                caps = np.minimum.reduce([
+                    requested,
+                    np.array([market_headroom[m] for m in market_ids]),
+                    np.array([category_headroom.get(c, np.inf) for c in categories]),
+                    correlation_headroom
+                ])
+                allocated = np.maximum(caps, 0.0)
+                prior_market = prior_category = prior_correlated = np.zeros(len(candidates))
+                evaluated_size = trade_size
+
+            recommended_count = np.where(price > 0, np.floor(allocated / np.where(price > 0, price, 1) + 1e-9), 0).astype(int)
+            recommended_count = np.minimum(recommended_count, count)
+
+            # Joint tail risk, as in assess_trade_risk; every distinct trade is scored on one simulation
+            evaluated_count = recommended_count if greedy else count
+            tail_keys = [
+                (market_id, sides[i], int(evaluated_count[i]), float(price[i]), float(win_probability[i]))
+                for i, market_id in enumerate(market_ids)
+            ]
+            distinct_trades = list(dict.fromkeys(tail_keys))
+            tail_checks = dict(zip(distinct_trades, self._tail_risk_checks(distinct_trades)))
+
+            results = []
+            for i, market_id in enumerate(market_ids):
+                size = float(evaluated_size[i])
+                risk_checks = list(shared_checks)
+                risk_checks.append(self._position_size_result(size, existing_exposure[i] + prior_market[i]))
+                if categories[i] is not None:
+                    risk_checks.append(self._category_exposure_result(
+                        categories[i], category_exposure[i] + prior_category[i], size
+                    ))
+                risk_checks.append(self._correlation_result(
+                    float(correlated_exposure[i] + prior_correlated[i] + size), {}
+                ))
+                risk_checks.append(tail_checks[tail_keys[i]])
+
+                overall_risk_level = RiskLevel.LOW
+                for check in risk_checks[len(shared_checks):]:
+                    if not check.passed:
+                        overall_risk_level = max(overall_risk_level, check.level, key=lambda x: list(RiskLevel).index(x))
+
+                issues = list(shared_issues)
+                min_confidence = profile_config.get('min_confidence_threshold', 60.0)
+                if profile_config and win_probability[i] * 100 < min_confidence:
+                    issues.append(f"Win probability {win_probability[i]*100:.1f}% below minimum {min_confidence}% for {user_risk_profile} profile")
+
+                approved = len(issues) == 0 and all(check.passed for check in risk_checks)
+                if greedy:
+                    approved = approved and recommended_count[i] > 0
+
+                assessment = TradeRiskAssessment(
+                    approved=approved,
+                    risk_level=overall_risk_level,
+                    risk_score=self._calculate_trade_risk_score(risk_checks, size, expected_return[i]),
+                    position_size=size,
+                    max_loss=size if sides[i] == 'yes' else size * (1 - price[i]),
+                    risk_checks=risk_checks,
+                    recommendations=self._generate_trade_recommendations(
+                        risk_checks, size, float(kelly_percent[i]), expected_return[i]
+                    )
+                )
+                results.append(BatchTradeAssessment(
+                    market_id=market_id,
+                    side=sides[i],
+                    requested_count=int(count[i]),
+                    recommended_count=int(recommended_count[i]),
+                    kelly_size_percent=float(kelly_percent[i]),
+                    assessment=assessment
+                ))
+
+            logger.info(f"Batch risk assessment completed: {sum(r.assessment.approved for r in results)}/{len(results)} approved")
+            return results
+
+        except Exception as e:
+            logger.error(f"Error in batch trade risk assessment: {str(e)}")
+            failed = self._failed_assessment(e)
+            return [
+                BatchTradeAssessment(
+                    market_id=str(c.get('market_id')),
+                    side=c.get('side'),
+                    requested_count=int(c.get('count') or 0),
+                    recommended_count=0,
+                    kelly_size_percent=0.0,
+                    assessment=failed
+                )
+                for c in candidates
+            ]
+
+    def optimize_portfolio_allocation(self, candidates: List[Dict[str, Any]], user_risk_profile: str = 'moderate',
+                                      user_id: Optional[Any] = None) -> Dict[str, Any]:
+        """
+        Jointly size simultaneous opportunities with a multi-asset Kelly optimizer
+
+        Per-trade Kelly sizes every bet as if it were the only one, which
+        over-allocates to correlated markets. This solves for the fractions
+        that maximize expected log growth of the whole candidate set, with
+        outcomes correlated through the price-correlation engine, under the
+        position, category, total exposure and drawdown limits still open to
+        the current book.
+
+        Args:
+            candidates: Dicts with market_id, the market's yes price and either
+                probability (of yes) or an ensemble prediction and confidence
+            user_risk_profile: User's risk profile
+            user_id: User placing the trades, used to include existing market exposure
+
+        Returns:
+            Target side, size and contract count per candidate plus solver stats
+        """
+        try:
+            if not candidates:
+                return {'allocations': [], 'total_fraction': 0.0}
+
+            market_ids = [str(c['market_id']) for c in candidates]
+            price = np.array([float(c['price']) for c in candidates])
+            p_yes = np.array([
+                float(c['probability']) if c.get('probability') is not None else ensemble_probability(
+                    float(c.get('ensemble_prediction') or 0), float(c.get('confidence') or 0), float(c['price'])
+                )
+                for c in candidates
+            ])
+            unique_markets = list(dict.fromkeys(market_ids))
+            missing = [m for m in unique_markets if m not in self.market_categories]
+            if missing:
+                self._load_market_categories(missing)
+            existing = {}
+            if user_id is not None:
+                db = SessionLocal()
+                try:
+                    existing = {m: float(v) for m, v in market_exposures(db, user_id, unique_markets).items()}
+                finally:
+                    db.close()
+            categories = [self.market_categories.get(m) for m in market_ids]
+
+            self._backfill_correlation_history(unique_markets)
+            # Copy the book state the limits need; the optimizer runs outside the lock
+            with self._lock:
+                correlation = self.correlation_engine.correlation_matrix(market_ids)
+                portfolio_value = self.portfolio_value
+                current_drawdown = self.current_drawdown
+                category_exposures = dict(self.category_exposures)
+                held_total = sum(self._held_market_exposure().values()) / portfolio_value
+
+            # Limits as bankroll fractions, net of what the book already uses
+            profile_config = self.user_profiles.get(user_risk_profile, {})
+            max_position = min(
+                profile_config.get('max_position_size_percent', self.config['max_position_size_percent']),
+                self.config['max_position_size_percent']
+            ) / 100
+            position_room = np.array([
+                max(max_position - existing.get(m, 0.0) / portfolio_value, 0.0) for m in market_ids
+            ])
+            category_room = {
+                c: max(self.config['max_category_exposure_percent'] / 100 - category_exposures.get(c, 0) / portfolio_value, 0.0)
+                for c in set(categories) if c is not None
+            }
+            total_room = max(settings.KELLY_OPTIMIZER_MAX_TOTAL_PERCENT / 100 - held_total, 0.0)
+            drawdown_room = max(15.0 - current_drawdown, 0.0) / 100
+
+            allocation = optimize_kelly_portfolio(
+                p_yes, price, correlation, categories,
+                kelly_fraction=profile_config.get('kelly_fraction', self.config['kelly_fraction']),
+                max_position=position_room,
+                category_limits=category_room,
+                max_total=total_room,
+                max_drawdown=drawdown_room,
+                confidence=settings.KELLY_OPTIMIZER_DRAWDOWN_CONFIDENCE,
+                scenarios=settings.KELLY_OPTIMIZER_SCENARIOS,
+                max_iterations=settings.KELLY_OPTIMIZER_MAX_ITERATIONS,
+                time_budget=settings.KELLY_OPTIMIZER_TIME_BUDGET_SECONDS
             )
 
+            allocations = []
+            for i, market_id in enumerate(market_ids):
+                side = allocation.sides[i]
+                cost = price[i] if side == 'yes' else 1.0 - price[i]
+                target_size = float(allocation.fractions[i] * portfolio_value)
+                individual = self._calculate_kelly_position_size(
+                    (p_yes[i] if side == 'yes' else 1.0 - p_yes[i]) / cost - 1.0,
+                    p_yes[i] if side == 'yes' else 1.0 - p_yes[i],
+                    user_risk_profile
+                )
+                allocations.append({
+                    'market_id': market_id,
+                    'side': side,
+                    'probability': float(p_yes[i]),
+                    'price': float(price[i]),
+                    'category': categories[i],
+                    'target_fraction': float(allocation.fractions[i]),
+                    'target_size': target_size,
+                    'target_count': int(target_size / cost + 1e-9) if cost > 0 else 0,
+                    'individual_kelly_percent': individual
+                })
+
+            logger.info(f"Portfolio Kelly allocation for {len(candidates)} candidates: "
+                        f"{allocation.fractions.sum():.1%} of bankroll in {allocation.iterations} iterations")
+            return {
+                'allocations': allocations,
+                'total_fraction': float(allocation.fractions.sum()),
+                'total_size': float(allocation.fractions.sum() * portfolio_value),
+                'expected_log_growth': allocation.expected_growth,
+                'drawdown_at_confidence': allocation.drawdown_at_confidence,
+                'iterations': allocation.iterations,
+                'converged': allocation.converged,
+                'elapsed_seconds': allocation.elapsed_seconds
+            }
+
+        except Exception as e:
+            logger.error(f"Error optimizing portfolio allocation: {str(e)}")
+            return {}
+
     def _calculate_trade_risk_score(self, risk_checks: List[RiskCheck], trade_size: float,
                                   expected_return: float) -> float:
         """Calculate overall risk score for the trade (0-100)"""
@@ -689,10 +1344,99 @@ class RiskManager:
 
         return recommendations
 
+    def _apply_unrealized_pnl_change(self, pnl_change: float):
+        """Shift portfolio value by an unrealized P&L delta and refresh drawdown"""
+        self.portfolio_value += pnl_change
+
+        if self.portfolio_value > self.max_portfolio_value:
+            self.max_portfolio_value = self.portfolio_value
+
+        if self.max_portfolio_value > 0:
+            self.current_drawdown = (self.max_portfolio_value - self.portfolio_value) / self.max_portfolio_value * 100
+
+    def apply_price_tick(self, market_id: str, price: float) -> Dict[str, Any]:
+        """
+        Revalue only the positions held in one market after a price tick
+
+        Exposure, portfolio value and drawdown are adjusted by the change in
+        value of the affected positions, so no database or API round-trip is
+        needed per tick.
+        """
+        try:
+            market_key = str(market_id)
+            with self._lock:
+                category = self.market_categories.get(market_key)
+                pnl_change = 0.0
+                self.correlation_engine.update_price(market_key, price)
+
+                for position_id in self.market_positions.get(market_key, ()):
+                    position = self.current_positions.get(position_id)
+                    if not position:
+                        continue
+
+                    count = position['count']
+                    entry_price = float(position['price'])
+                    if position['side'] == 'yes':
+                        current_value = count * price
+                        entry_value = count * entry_price
+                    else:
+                        current_value = count * (1 - price)
+                        entry_value = count * (1 - entry_price)
+                    unrealized_pnl = current_value - entry_value
+
+                    if category is not None:
+                        self.category_exposures[category] += current_value - float(position['current_value'] or 0)
+                    pnl_change += unrealized_pnl - float(position['unrealized_pnl'] or 0)
+
+                    position['current_value'] = current_value
+                    position['unrealized_pnl'] = unrealized_pnl
+                    position['updated_at'] = datetime.utcnow()
+
+                if pnl_change:
+                    self._apply_unrealized_pnl_change(pnl_change)
+
+            return self._risk_metrics_snapshot()
+
+        except Exception as e:
+            logger.error(f"Error applying price tick for {market_id}: {str(e)}")
+            return self._risk_metrics_snapshot()
+
+    def register_fill(self, position_id: Any, market_id: str, side: str, count: int, price: float,
+                      category: Optional[str] = None) -> Dict[str, Any]:
+        """Add a newly filled position to the in-memory risk state"""
+        try:
+            market_key = str(market_id)
+            current_value = count * price if side == 'yes' else count * (1 - price)
+            with self._lock:
+                if category is not None:
+                    self.market_categories[market_key] = category
+                category = self.market_categories.get(market_key)
+
+                self.current_positions[position_id] = {
+                    'market_id': market_id,
+                    'side': side,
+                    'count': count,
+                    'price': price,
+                    'current_value': current_value,
+                    'unrealized_pnl': 0.0,
+                    'updated_at': datetime.utcnow()
+                }
+                self.market_positions[market_key].add(position_id)
+
+                if category is not None:
+                    self.category_exposures[category] += current_value
+
+            return self._risk_metrics_snapshot()
+
+        except Exception as e:
+            logger.error(f"Error registering fill for {market_id}: {str(e)}")
+            return self._risk_metrics_snapshot()
+
     def update_daily_pnl(self, pnl_change: float):
         """Update daily P&L tracking"""
         try:
-            self.daily_pnl += pnl_change
+            with self._lock:
+                self.daily_pnl += pnl_change
             logger.info(f"Daily P&L updated: {self.daily_pnl:.2f}")
 
         except Exception as e:
@@ -701,8 +1445,9 @@ class RiskManager:
     def increment_daily_trades(self):
         """Increment daily trade count"""
         try:
-            self._reset_daily_metrics()
-            self.daily_trades_count += 1
+            with self._lock:
+                self._reset_daily_metrics()
+                self.daily_trades_count += 1
             logger.info(f"Daily trades count: {self.daily_trades_count}")
 
         except Exception as e:
@@ -714,23 +1459,43 @@ class RiskManager:
             self._update_portfolio_value()
             self._calculate_category_exposures()
 
-            return {
-                'portfolio_value': self.portfolio_value,
-                'daily_pnl': self.daily_pnl,
-                'daily_trades_count': self.daily_trades_count,
-                'current_drawdown': self.current_drawdown,
-                'max_portfolio_value': self.max_portfolio_value,
-                'category_exposures': dict(self.category_exposures),
-                'total_positions': len(self.current_positions),
-                'risk_checks_enabled': self.risk_checks_enabled,
-                'emergency_stop_active': self.emergency_stop_active,
-                'last_updated': datetime.utcnow()
-            }
+            return self._risk_metrics_snapshot()
 
         except Exception as e:
             logger.error(f"Error getting risk metrics: {str(e)}")
             return {}
 
+    def reconcile(self) -> Dict[str, Any]:
+        """Rebuild all risk state from the database and account balance"""
+        try:
+            self._load_current_positions()
+            return self.get_risk_metrics()
+
+        except Exception as e:
+            logger.error(f"Error reconciling risk state: {str(e)}")
+            return {}
+
+    def _risk_metrics_snapshot(self) -> Dict[str, Any]:
+        """Current risk metrics from in-memory state, without refreshing it"""
+        try:
+            with self._lock:
+                return {
+                    'portfolio_value': self.portfolio_value,
+                    'daily_pnl': self.daily_pnl,
+                    'daily_trades_count': self.daily_trades_count,
+                    'current_drawdown': self.current_drawdown,
+                    'max_portfolio_value': self.max_portfolio_value,
+                    'category_exposures': dict(self.category_exposures),
+                    'total_positions': len(self.current_positions),
+                    'risk_checks_enabled': self.risk_checks_enabled,
+                    'emergency_stop_active': self.emergency_stop_active,
+                    'last_updated': datetime.utcnow()
+                }
+
+        except Exception as e:
+            logger.error(f"Error building risk metrics snapshot: {str(e)}")
+            return {}
+
     def set_emergency_stop(self, active: bool, reason: str = ""):
         """Activate or deactivate emergency stop"""
         try:
@@ -747,7 +1512,8 @@ class RiskManager:
     def update_risk_config(self, new_config: Dict[str, Any]):
         """Update risk management configuration"""
         try:
-            self.config.update(new_config)
+            with self._lock:
+                self.config.update(new_config)
             logger.info(f"Risk configuration updated: {new_config}")
 
         except Exception as e:
@@ -0,0 +1,197 @@
+import numpy as np
+from scipy.special import ndtri
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+
+@dataclass
+class SimulationResult:
+    scenarios: int
+    confidence: float
+    expected_pnl: float
+    var: float
+    cvar: float
+    probability_of_loss: float
+    loss_quantiles: Dict[str, float]
+
+
+def _correlation_factor(correlation: np.ndarray) -> np.ndarray:
+    """Cholesky factor of the nearest valid correlation matrix"""
+    n = correlation.shape[0]
+    if n == 0:
+        return np.zeros((0, 0))
+
+    matrix = (correlation + correlation.T) / 2.0
+    np.fill_diagonal(matrix, 1.0)
+    try:
+        return np.linalg.cholesky(matrix)
+    except np.linalg.LinAlgError:
+        # Clip negative eigenvalues and rescale back to a unit diagonal
+        values, vectors = np.linalg.eigh(matrix)
+        matrix = (vectors * np.maximum(values, 1e-8)) @ vectors.T
+        scale = 1.0 / np.sqrt(np.diag(matrix))
+        matrix = matrix * np.outer(scale, scale)
+        return np.linalg.cholesky(matrix + np.eye(n) * 1e-10)
+
+
+class RiskSimulator:
+    """
+    Monte Carlo settlement simulator for binary-outcome portfolios.
+
+    Each market settles yes or no. Outcomes are correlated through a Gaussian
+    copula: latent normals are drawn with the given correlation and a market
+    settles yes when its latent value falls below the normal quantile of its
+    yes probability. Draws are generated in chunks so memory stays bounded
+    by ``chunk_size`` x markets regardless of the scenario count.
+    """
+
+    def __init__(self, scenarios: int = 100_000, chunk_size: int = 20_000,
+                 confidence: float = 0.99, seed: Optional[int] = None):
+        self.scenarios = scenarios
+        self.chunk_size = chunk_size
+        self.confidence = confidence
+        self.seed = seed
+
+    def _scenario_pnl(self, p_yes: np.ndarray, pnl_yes: np.ndarray, pnl_no: np.ndarray,
+                      correlation: np.ndarray, delta_yes: Optional[np.ndarray] = None,
+                      delta_no: Optional[np.ndarray] = None) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Portfolio P&L per scenario, and optionally the P&L change from a trade on the same draws"""
+        p_yes = np.clip(np.asarray(p_yes, dtype=float), 1e-9, 1 - 1e-9)
+        pnl_yes = np.asarray(pnl_yes, dtype=float)
+        pnl_no = np.asarray(pnl_no, dtype=float)
+        n = p_yes.size
+
+        base = np.zeros(self.scenarios)
+        delta = np.zeros(self.scenarios) if delta_yes is not None else None
+        if n == 0:
+            return base, delta
+
+        factor = _correlation_factor(np.asarray(correlation, dtype=float)).astype(np.float32)
+        thresholds = ndtri(p_yes).astype(np.float32)
+        swing = (pnl_yes - pnl_no).astype(np.float32)
+        floor = float(pnl_no.sum())
+        if delta is not None:
+            delta_yes = np.asarray(delta_yes, dtype=float)
+            delta_no = np.asarray(delta_no, dtype=float)
+            delta_swing = (delta_yes - delta_no).astype(np.float32)
+            delta_floor = float(delta_no.sum())
+
+        rng = np.random.default_rng(self.seed)
+        for start in range(0, self.scenarios, self.chunk_size):
+            size = min(self.chunk_size, self.scenarios - start)
+            latent = rng.standard_normal((size, n), dtype=np.float32) @ factor.T
+            settles_yes = (latent < thresholds).astype(np.float32)
+            base[start:start + size] = floor + settles_yes @ swing
+            if delta is not None:
+                delta[start:start + size] = delta_floor + settles_yes @ delta_swing
+
+        return base, delta
+
+    def _summarize(self, pnl: np.ndarray) -> SimulationResult:
+        tail_cutoff = np.quantile(pnl, 1 - self.confidence)
+        tail = pnl[pnl <= tail_cutoff]
+        var = max(-float(tail_cutoff), 0.0)
+        cvar = max(-float(tail.mean()), 0.0) if tail.size else var
+        losses = -pnl
+        return SimulationResult(
+            scenarios=int(pnl.size),
+            confidence=self.confidence,
+            expected_pnl=float(pnl.mean()),
+            var=var,
+            cvar=cvar,
+            probability_of_loss=float((pnl < 0).mean()),
+            loss_quantiles={
+                f"p{int(q * 100)}": float(np.quantile(losses, q))
+                for q in (0.5, 0.9, 0.95, 0.99)
+            }
+        )
+
+    def simulate(self, p_yes: np.ndarray, pnl_yes: np.ndarray, pnl_no: np.ndarray,
+                 correlation: np.ndarray) -> SimulationResult:
+        """Loss distribution, VaR and CVaR of a portfolio"""
+        pnl, _ = self._scenario_pnl(p_yes, pnl_yes, pnl_no, correlation)
+        return self._summarize(pnl)
+
+    def trade_impact(self, p_yes: np.ndarray, pnl_yes: np.ndarray, pnl_no: np.ndarray,
+                     correlation: np.ndarray, delta_yes: np.ndarray,
+                     delta_no: np.ndarray) -> Dict[str, object]:
+        """
+        Change in VaR and CVaR from adding a trade.
+
+        ``delta_yes``/``delta_no`` hold the trade's P&L per market for each
+        settlement. Both portfolios are evaluated on the same draws (common
+        random numbers), so the delta is not swamped by sampling noise.
+        """
+        base, delta = self._scenario_pnl(p_yes, pnl_yes, pnl_no, correlation, delta_yes, delta_no)
+        before = self._summarize(base)
+        after = self._summarize(base + delta)
+        return {
+            'before': before,
+            'after': after,
+            'var_delta': after.var - before.var,
+            'cvar_delta': after.cvar - before.cvar,
+            'expected_pnl_delta': after.expected_pnl - before.expected_pnl
+        }
+
+    def _tail_stats(self, pnl: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """VaR and CVaR of each row of a portfolios x scenarios P&L matrix, as in _summarize"""
+        cutoff = np.quantile(pnl, 1 - self.confidence, axis=1)
+        in_tail = pnl <= cutoff[:, None]
+        tail_count = in_tail.sum(axis=1)
+        tail_mean = np.where(in_tail, pnl, 0.0).sum(axis=1) / np.maximum(tail_count, 1)
+        var = np.maximum(-cutoff, 0.0)
+        cvar = np.where(tail_count > 0, np.maximum(-tail_mean, 0.0), var)
+        return var, cvar
+
+    def trades_impact(self, p_yes: np.ndarray, pnl_yes: np.ndarray, pnl_no: np.ndarray,
+                      correlation: np.ndarray, trade_index: np.ndarray, trade_p_yes: np.ndarray,
+                      trade_delta_yes: np.ndarray, trade_delta_no: np.ndarray,
+                      block_size: int = 128) -> Dict[str, np.ndarray]:
+        """
+        VaR and CVaR before and after each of many single-market trades.
+
+        Trade ``t`` is on market ``trade_index[t]``, which settles yes with
+        probability ``trade_p_yes[t]`` in both of its evaluations, and changes
+        P&L by ``trade_delta_yes[t]`` or ``trade_delta_no[t]``. Every trade is
+        scored on the same draws, so a batch costs one simulation, and only the
+        latent column of each trade's market is kept besides the book P&L.
+        """
+        p_yes = np.clip(np.asarray(p_yes, dtype=float), 1e-9, 1 - 1e-9)
+        pnl_yes = np.asarray(pnl_yes, dtype=float)
+        pnl_no = np.asarray(pnl_no, dtype=float)
+        trade_index = np.asarray(trade_index, dtype=np.int64)
+        trade_p_yes = np.clip(np.asarray(trade_p_yes, dtype=float), 1e-9, 1 - 1e-9)
+        trade_delta_yes = np.asarray(trade_delta_yes, dtype=float)
+        trade_delta_no = np.asarray(trade_delta_no, dtype=float)
+        n = p_yes.size
+
+        columns, column_of_trade = np.unique(trade_index, return_inverse=True)
+        base = np.zeros(self.scenarios)
+        # Scenarios run along rows so per-trade quantiles partition contiguous memory
+        latent_columns = np.zeros((columns.size, self.scenarios), dtype=np.float32)
+        factor = _correlation_factor(np.asarray(correlation, dtype=float)).astype(np.float32)
+        thresholds = ndtri(p_yes).astype(np.float32)
+        swing = (pnl_yes - pnl_no).astype(np.float32)
+        floor = float(pnl_no.sum())
+
+        rng = np.random.default_rng(self.seed)
+        for start in range(0, self.scenarios, self.chunk_size):
+            size = min(self.chunk_size, self.scenarios - start)
+            latent = rng.standard_normal((size, n), dtype=np.float32) @ factor.T
+            base[start:start + size] = floor + (latent < thresholds).astype(np.float32) @ swing
+            latent_columns[:, start:start + size] = latent[:, columns].T
+
+        book_settles = latent_columns < thresholds[columns][:, None]
+        trade_thresholds = ndtri(trade_p_yes).astype(np.float32)
+        result = {key: np.zeros(trade_index.size) for key in ('var_before', 'var_after', 'cvar_before', 'cvar_after')}
+        for start in range(0, trade_index.size, block_size):
+            block = slice(start, start + block_size)
+            column = column_of_trade[block]
+            settles = latent_columns[column] < trade_thresholds[block][:, None]
+            # The trade's own market settles on the trade's probability, with the book's P&L in it
+            before = base + (settles.astype(float) - book_settles[column]) * swing[trade_index[block]][:, None]
+            after = before + np.where(settles, trade_delta_yes[block][:, None], trade_delta_no[block][:, None])
+            result['var_before'][block], result['cvar_before'][block] = self._tail_stats(before)
+            result['var_after'][block], result['cvar_after'][block] = self._tail_stats(after)
+        result['cvar_delta'] = result['cvar_after'] - result['cvar_before']
+        return result
@@ -0,0 +1,227 @@
+"""Vectorized position sizing helpers for RiskManager."""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+from scipy.special import ndtri
+
+from app.core.risk_simulation import _correlation_factor
+
+ASSUMED_AVERAGE_LOSS = 0.05
+
+
+def kelly_position_percent(expected_return, win_probability, kelly_fraction: float,
+                           max_position_percent: float) -> np.ndarray:
+    """
+    Fractional Kelly position size as a percent of the portfolio.
+
+    Kelly % = W - [(1 - W) / R], with R estimated as the expected return over
+    an assumed 5% average loss, scaled by the profile's Kelly fraction and
+    capped at the maximum position size.
+    """
+    expected_return = np.atleast_1d(np.asarray(expected_return, dtype=float))
+    win_probability = np.atleast_1d(np.asarray(win_probability, dtype=float))
+
+    win_loss_ratio = np.where(expected_return != 0, np.abs(expected_return) / ASSUMED_AVERAGE_LOSS, 1.0)
+    kelly = np.maximum(win_probability - (1 - win_probability) / win_loss_ratio, 0.0)
+    percent = kelly * kelly_fraction * 100
+    percent = np.where((win_probability <= 0) | (win_probability >= 1), 0.0, percent)
+    return np.minimum(percent, max_position_percent)
+
+
+def greedy_allocate(requested: np.ndarray, market_keys: Sequence[Hashable],
+                    category_keys: Sequence[Optional[Hashable]],
+                    market_headroom: Dict[Hashable, float], category_headroom: Dict[Hashable, float],
+                    correlation_headroom: np.ndarray,
+                    correlation: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Allocate capital to candidates in order under cumulative limits.
+
+    Each candidate gets as much of its requested size as the remaining
+    per-market, per-category and correlated-exposure headroom allows. Earlier
+    allocations use up the headroom of later candidates in the same market or
+    category, and count against their correlated exposure in proportion to
+    the positive correlation between the two candidates.
+    """
+    requested = np.asarray(requested, dtype=float)
+    n = requested.size
+    allocated = np.zeros(n)
+    market_left = dict(market_headroom)
+    category_left = dict(category_headroom)
+    positive = np.maximum(correlation, 0.0) if correlation is not None else np.eye(n)
+
+    for i in range(n):
+        cap = min(
+            requested[i],
+            market_left.get(market_keys[i], np.inf),
+            category_left.get(category_keys[i], np.inf),
+            correlation_headroom[i] - float(positive[i, :i] @ allocated[:i])
+        )
+        allocated[i] = max(cap, 0.0)
+        if market_keys[i] in market_left:
+            market_left[market_keys[i]] -= allocated[i]
+        if category_keys[i] in category_left:
+            category_left[category_keys[i]] -= allocated[i]
+
+    return allocated
+
+
+def ensemble_probability(prediction, confidence, price):
+    """
+    Yes probability implied by an ensemble signal.
+
+    The ensemble score runs from -100 (certain no) to +100 (certain yes) and
+    is scaled by its confidence, so a neutral or unconfident signal leaves the
+    market price as the probability. Accepts scalars or arrays.
+    """
+    price = np.asarray(price, dtype=float)
+    strength = np.clip(np.asarray(prediction, dtype=float) / 100.0, -1.0, 1.0) \
+        * np.clip(np.asarray(confidence, dtype=float) / 100.0, 0.0, 1.0)
+    room = np.where(strength > 0, 1.0 - price, price)
+    probability = np.clip(price + strength * room, 0.0, 1.0)
+    return float(probability) if probability.ndim == 0 else probability
+
+
+@dataclass
+class KellyAllocation:
+    sides: List[str]
+    fractions: np.ndarray  # bankroll fraction spent on each candidate's side
+    expected_growth: float
+    drawdown_at_confidence: float
+    iterations: int
+    converged: bool
+    elapsed_seconds: float
+
+
+def _settlement_returns(p_yes: np.ndarray, cost: np.ndarray, buy_yes: np.ndarray,
+                        correlation: np.ndarray, scenarios: int, seed: Optional[int]) -> np.ndarray:
+    """Return per unit staked for each candidate across correlated settlement scenarios"""
+    rng = np.random.default_rng(seed)
+    factor = _correlation_factor(correlation)
+    latent = rng.standard_normal((scenarios, p_yes.size)) @ factor.T
+    settles_yes = latent < ndtri(np.clip(p_yes, 1e-9, 1 - 1e-9))
+    wins = np.where(buy_yes, settles_yes, ~settles_yes)
+    return np.where(wins, (1.0 - cost) / cost, -1.0)
+
+
+def _project(fractions: np.ndarray, upper: np.ndarray, groups: List[np.ndarray],
+             group_limits: np.ndarray, total_limit: float, returns: np.ndarray,
+             drawdown_limit: float, confidence: float) -> np.ndarray:
+    """
+    Pull fractions back inside the constraint set.
+
+    Clip to the per-position box, then scale down any category over its limit,
+    the total over its limit and finally the whole book if its loss at the
+    confidence level exceeds the drawdown budget. Scaling down never breaks a
+    constraint that already held, so the result is always feasible.
+    """
+    fractions = np.clip(fractions, 0.0, upper)
+    for members, limit in zip(groups, group_limits):
+        spent = fractions[members].sum()
+        if spent > limit:
+            fractions[members] *= max(limit, 0.0) / spent
+    total = fractions.sum()
+    if total > total_limit:
+        fractions *= total_limit / total
+    if fractions.any():
+        loss = -np.quantile(returns @ fractions, 1 - confidence)
+        if loss > drawdown_limit:
+            fractions *= max(drawdown_limit, 0.0) / loss
+    return fractions
+
+
+def optimize_kelly_portfolio(p_yes, price, correlation: np.ndarray,
+                             categories: Sequence[Optional[Hashable]],
+                             kelly_fraction: float = 0.25,
+                             max_position: Optional[np.ndarray] = None,
+                             category_limits: Optional[Dict[Hashable, float]] = None,
+                             max_total: float = 1.0,
+                             max_drawdown: float = 1.0,
+                             confidence: float = 0.95,
+                             scenarios: int = 4000,
+                             max_iterations: int = 500,
+                             time_budget: float = 0.25,
+                             tolerance: float = 1e-7,
+                             seed: Optional[int] = 0) -> KellyAllocation:
+    """
+    Jointly growth-optimal bankroll fractions for simultaneous binary bets.
+
+    Each candidate is bought on the side where the probability beats the
+    price. Expected log growth E[log(1 + R f)] is estimated over correlated
+    settlement scenarios and maximized by projected gradient ascent with a
+    backtracking step, stopping at convergence, ``max_iterations`` or
+    ``time_budget`` seconds, whichever comes first. Every iterate is feasible,
+    so the best point so far is always a valid answer.
+
+    The optimization runs on full Kelly with every limit divided by
+    ``kelly_fraction``, and the result is scaled back down, so the returned
+    fractional-Kelly book respects the limits as given.
+    """
+    started = time.perf_counter()
+    p_yes = np.clip(np.atleast_1d(np.asarray(p_yes, dtype=float)), 0.0, 1.0)
+    price = np.clip(np.atleast_1d(np.asarray(price, dtype=float)), 1e-6, 1 - 1e-6)
+    n = p_yes.size
+
+    buy_yes = p_yes >= price
+    sides = ['yes' if flag else 'no' for flag in buy_yes]
+    cost = np.where(buy_yes, price, 1.0 - price)
+    if n == 0:
+        return KellyAllocation(sides, np.zeros(0), 0.0, 0.0, 0, True, 0.0)
+
+    scale = 1.0 / max(kelly_fraction, 1e-6)
+    upper = np.full(n, np.inf) if max_position is None else np.broadcast_to(
+        np.asarray(max_position, dtype=float), (n,)) * scale
+    # Staking the whole bankroll risks log(0) in the all-lose scenario
+    upper = np.where(np.abs(p_yes - price) > 1e-9, upper, 0.0)
+    keys = [key for key in dict.fromkeys(categories) if key is not None and key in (category_limits or {})]
+    groups = [np.array([c == key for c in categories]) for key in keys]
+    group_limits = np.array([category_limits[key] * scale for key in keys])
+    total_limit = min(max_total * scale, 0.999)
+    drawdown_limit = max_drawdown * scale
+
+    returns = _settlement_returns(p_yes, cost, buy_yes, np.asarray(correlation, dtype=float), scenarios, seed)
+
+    def growth(fractions):
+        return float(np.mean(np.log(np.maximum(1.0 + returns @ fractions, 1e-12))))
+
+    def project(fractions):
+        return _project(fractions, upper, groups, group_limits, total_limit, returns, drawdown_limit, confidence)
+
+    fractions = np.zeros(n)
+    value = growth(fractions)
+    step = 1.0
+    converged = False
+    iterations = 0
+    while iterations < max_iterations and time.perf_counter() - started < time_budget:
+        iterations += 1
+        gradient = returns.T @ (1.0 / np.maximum(1.0 + returns @ fractions, 1e-12)) / scenarios
+        # Backtracking line search on the projected step
+        while True:
+            candidate = project(fractions + step * gradient)
+            candidate_value = growth(candidate)
+            if candidate_value >= value + 1e-4 * gradient @ (candidate - fractions) or step < 1e-8:
+                break
+            step *= 0.5
+        moved = np.abs(candidate - fractions).max()
+        gained = candidate_value - value
+        if gained >= 0:
+            fractions, value = candidate, candidate_value
+        if moved < tolerance or abs(gained) < tolerance * 1e-2:
+            converged = True
+            break
+        step = min(step * 2.0, 1.0)
+
+    fractions = fractions / scale
+    drawdown = max(-float(np.quantile(returns @ fractions, 1 - confidence)), 0.0)
+    return KellyAllocation(
+        sides=sides,
+        fractions=fractions,
+        expected_growth=growth(fractions),
+        drawdown_at_confidence=drawdown,
+        iterations=iterations,
+        converged=converged,
+        elapsed_seconds=time.perf_counter() - started
+    )
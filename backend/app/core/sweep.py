@@ -0,0 +1,261 @@
+"""Parameter sweeps over analyzer and trading settings.
+
+Candidate parameter sets come from a grid or random samples of a
+`ParameterSpace` and are scored by replaying history with the backtester.
+Bad configs are dropped early with successive halving: every survivor is
+scored on a growing prefix of the history and only the best 1/eta move on
+to the next rung, so most of the budget goes to promising configs and
+every promotion decision is made on data the later rungs extend forward.
+
+Parameters are dotted paths:
+
+    backtest.<field>      BacktestConfig field (min_edge, lookback, ...)
+    signal.<name>         signal parameter (score_scale, window, ...)
+    statistical.<attr>    StatisticalAnalyzer attribute (rsi_period, ...)
+    ml_models.<attr>...   MLModelsAnalyzer attribute or dict key
+    ensemble.<attr>...    EnsembleAnalyzer attribute or dict key
+
+The first three change the replay. ML and ensemble settings cannot be
+replayed without lookahead (their inputs are fetched as of now), so a sweep
+scores them as constants: they are left out of the exported config, and
+apply_sweep_config refuses them.
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import math
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from loguru import logger
+
+from app.core.backtest import BacktestConfig, PriceMatrix, load_price_archive, run_backtest
+
+REPLAYED_PREFIXES = ('backtest', 'signal', 'statistical')
+DISTRIBUTIONS = ('uniform', 'loguniform', 'int')
+
+
+class ParameterSpace:
+    """
+    Search space over dotted parameter paths.
+
+    A list is a set of choices (a grid axis). A tuple describes a
+    distribution for random sampling: ('uniform', low, high),
+    ('loguniform', low, high) or ('int', low, high) with high inclusive.
+    """
+
+    def __init__(self, space: Dict[str, Any]):
+        self.space = space
+
+    def grid(self) -> List[Dict[str, Any]]:
+        """Every combination of the listed choices"""
+        for name, values in self.space.items():
+            if not isinstance(values, list):
+                raise ValueError(f"Grid search needs a list of values for {name}")
+        names = list(self.space)
+        return [dict(zip(names, combo)) for combo in itertools.product(*(self.space[n] for n in names))]
+
+    def sample(self, count: int, seed: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Independent random draws from each parameter's distribution"""
+        rng = np.random.default_rng(seed)
+        samples = []
+        for _ in range(count):
+            params = {}
+            for name, spec in self.space.items():
+                if isinstance(spec, list):
+                    params[name] = spec[int(rng.integers(len(spec)))]
+                elif spec[0] == 'uniform':
+                    params[name] = float(rng.uniform(spec[1], spec[2]))
+                elif spec[0] == 'loguniform':
+                    params[name] = float(np.exp(rng.uniform(np.log(spec[1]), np.log(spec[2]))))
+                elif spec[0] == 'int':
+                    params[name] = int(rng.integers(spec[1], spec[2] + 1))
+                else:
+                    raise ValueError(f"Unknown distribution {spec[0]} for {name}")
+            samples.append(params)
+        return samples
+
+
+def config_from_params(params: Dict[str, Any], base: Optional[BacktestConfig] = None) -> BacktestConfig:
+    """Backtest config with the replayable parameters applied"""
+    base = base or BacktestConfig()
+    fields = {}
+    signal_params = json.loads(json.dumps(base.params))
+    for path, value in params.items():
+        prefix, _, name = path.partition('.')
+        if prefix == 'backtest':
+            fields[name] = value
+        elif prefix == 'signal':
+            signal_params[name] = value
+        elif prefix == 'statistical':
+            signal_params.setdefault('statistical', {})[name] = value
+    return replace(base, **fields, params=signal_params)
+
+
+@dataclass
+class SweepResult:
+    params: Dict[str, Any]
+    score: float
+    rung: int
+    bars: int
+    metrics: Dict[str, Any] = field(default_factory=dict)
+
+
+def _score(report, metric: str) -> float:
+    value = getattr(report, metric)
+    return float(value) if np.isfinite(value) else -np.inf
+
+
+def run_sweep(matrix: PriceMatrix, candidates: Sequence[Dict[str, Any]], base: Optional[BacktestConfig] = None,
+              metric: str = 'sharpe_ratio', eta: int = 3, rungs: int = 3, workers: Optional[int] = None,
+              chunk_markets: int = 50) -> List[SweepResult]:
+    """
+    Score candidates with successive halving and return them ranked.
+
+    Rung r replays the first eta^(r - rungs + 1) of the history, so with
+    eta=3 and rungs=3 the rungs see 1/9, 1/3 and all of it. Configs that
+    were dropped keep their score from the last rung they reached and rank
+    below every config that went further.
+    """
+    candidates = list(candidates)
+    unreplayed = {
+        path for params in candidates for path in params
+        if path.partition('.')[0] not in REPLAYED_PREFIXES
+    }
+    if unreplayed:
+        logger.warning(f"Parameters not replayed by the backtester, scored as constants: {sorted(unreplayed)}")
+
+    bars = matrix.prices.shape[0]
+    results = [SweepResult(params=params, score=-np.inf, rung=-1, bars=0) for params in candidates]
+    survivors = list(range(len(candidates)))
+
+    for rung in range(rungs):
+        rung_bars = max(int(bars * eta ** (rung - rungs + 1)), 1)
+        configs = [
+            replace(config_from_params(candidates[i], base), name=f"candidate-{i}")
+            for i in survivors
+        ]
+        reports = run_backtest(matrix.head(rung_bars) if rung_bars < bars else matrix, configs,
+                               workers=workers, chunk_markets=chunk_markets)
+        for i, report in zip(survivors, reports):
+            summary = report.summary()
+            summary.pop('config')
+            results[i] = SweepResult(params=candidates[i], score=_score(report, metric), rung=rung,
+                                     bars=rung_bars, metrics=summary)
+
+        logger.info(f"Sweep rung {rung}: {len(survivors)} configs on {rung_bars} bars, "
+                    f"best {metric} {max(results[i].score for i in survivors):.3f}")
+        if rung < rungs - 1:
+            keep = max(math.ceil(len(survivors) / eta), 1)
+            survivors = sorted(survivors, key=lambda i: results[i].score, reverse=True)[:keep]
+
+    return sorted(results, key=lambda result: (result.rung, result.score), reverse=True)
+
+
+def sweep_report(results: Sequence[SweepResult], metric: str = 'sharpe_ratio') -> Dict[str, Any]:
+    """Ranked, JSON-serializable summary of a sweep"""
+    return {
+        'generated_at': datetime.utcnow().isoformat(),
+        'metric': metric,
+        'candidates': len(results),
+        'ranking': [
+            {'rank': rank + 1, **asdict(result), 'score': result.score if np.isfinite(result.score) else None}
+            for rank, result in enumerate(results)
+        ]
+    }
+
+
+def replayed_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """The parameters the backtester replays; only these have a meaningful best value"""
+    return {path: value for path, value in params.items() if path.partition('.')[0] in REPLAYED_PREFIXES}
+
+
+def export_sweep_config(result: SweepResult, path: str, metric: str = 'sharpe_ratio'):
+    """Write the winning replayed parameters as a config that apply_sweep_config can load"""
+    params = replayed_params(result.params)
+    dropped = sorted(set(result.params) - set(params))
+    if dropped:
+        logger.warning(f"Not exporting parameters the sweep did not replay: {dropped}")
+    with open(path, 'w') as handle:
+        json.dump({
+            'generated_at': datetime.utcnow().isoformat(),
+            'metric': metric,
+            'score': result.score,
+            'bars': result.bars,
+            'params': params
+        }, handle, indent=2, default=str)
+
+
+def load_sweep_config(path: str) -> Dict[str, Any]:
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def _set_path(target: Any, path: Sequence[str], value: Any):
+    for name in path[:-1]:
+        target = target[name] if isinstance(target, dict) else getattr(target, name)
+    if isinstance(target, dict):
+        target[path[-1]] = value
+    else:
+        setattr(target, path[-1], value)
+
+
+def apply_sweep_config(config: Dict[str, Any]) -> List[str]:
+    """Apply the replayed analyzer parameters of an exported config to the live analyzers"""
+    from app.core.analyzers.statistical import statistical_analyzer
+
+    targets = {'statistical': statistical_analyzer}
+    params = config.get('params', {})
+    refused = sorted(set(params) - set(replayed_params(params)))
+    if refused:
+        logger.warning(f"Not applying parameters a sweep cannot score: {refused}")
+    applied = []
+    for path, value in replayed_params(params).items():
+        prefix, _, rest = path.partition('.')
+        if prefix in targets and rest:
+            _set_path(targets[prefix], rest.split('.'), value)
+            applied.append(path)
+    logger.info(f"Applied analyzer config: {applied}")
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search analyzer and trading parameters against history")
+    parser.add_argument("--archive", required=True, help="Columnar price archive (.npz) from app.core.backtest")
+    parser.add_argument("--space", required=True, help="JSON file mapping dotted parameters to lists or distributions")
+    parser.add_argument("--samples", type=int, help="Random samples to draw; grid search when omitted")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--signal", default="statistical")
+    parser.add_argument("--metric", default="sharpe_ratio")
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument("--rungs", type=int, default=3)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--output", help="Write the ranked report here")
+    parser.add_argument("--export", help="Write the best config here")
+    args = parser.parse_args()
+
+    with open(args.space) as handle:
+        # JSON has no tuples: a list led by a distribution name is a distribution
+        space = ParameterSpace({
+            name: tuple(spec) if spec and spec[0] in DISTRIBUTIONS else spec
+            for name, spec in json.load(handle).items()
+        })
+    candidates = space.sample(args.samples, args.seed) if args.samples else space.grid()
+    results = run_sweep(load_price_archive(args.archive), candidates, BacktestConfig(signal=args.signal),
+                        metric=args.metric, eta=args.eta, rungs=args.rungs, workers=args.workers)
+
+    report = sweep_report(results, args.metric)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent=2, default=str)
+    if args.export and results:
+        export_sweep_config(results[0], args.export, args.metric)
+    print(json.dumps(report['ranking'][:10], indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,9 +6,16 @@ from typing import Callable
 from loguru import logger
 from sqlalchemy.orm import Session
 
-from app.core.risk_engine import risk_gate
+from app.core.analysis_queue import AnalysisWorker
+from app.core.catalog_sync import sync_catalog
+from app.core.market_search import market_search_index
+from app.core.opportunities import flush_price_ticks
+from app.core.pnl_ledger import rebuild_day_totals
+from app.core.portfolio import portfolio_manager
+from app.core.retention import apply_retention
+from app.core.risk_engine import risk_gate_batch
 from app.core.watchlist import cleanup_expired
-from app.models.database import SessionLocal
+from app.models.database import AsyncSessionLocal, SessionLocal
 from app.models.schemas import DecisionReceipt, Watchlist
 from app.utils.config import settings
 
@@ -16,43 +23,154 @@ from app.utils.config import settings
 async def watchlist_expiry_job():
     while True:
         try:
-            db: Session = SessionLocal()
-            removed = cleanup_expired(db)
+            async with AsyncSessionLocal() as db:
+                removed = await db.run_sync(cleanup_expired)
             if removed:
                 logger.info(f"Expired watchlist entries cleaned: {removed}")
-            db.close()
         except Exception as exc:
             logger.error(f"watchlist_expiry_job failure: {exc}")
         await asyncio.sleep(1800)
 
 
+def _limits_snapshot(limits):
+    return {key: float(value) if isinstance(value, Decimal) else value for key, value in limits.items()}
+
+
+def _record_heartbeat(db: Session):
+    now = datetime.utcnow()
+    entries = db.query(Watchlist.user_id, Watchlist.market_ticker).filter(Watchlist.expires_at > now).all()
+    gates = risk_gate_batch(db, entries, "heartbeat", Decimal("0"), now)
+    receipts = [
+        {
+            "user_id": user_id,
+            "market_ticker": market_ticker,
+            "ts": now,
+            "allowed": gate.allow_new_open,
+            "reason_code": gate.reason_code,
+            "kill_state": gate.kill_state.value,
+            "spend_snapshot": _limits_snapshot(gate.effective_limits),
+        }
+        for (user_id, market_ticker), gate in gates.items()
+    ]
+    if receipts:
+        db.bulk_insert_mappings(DecisionReceipt, receipts)
+    db.commit()
+
+
 async def heartbeat_job():
     while True:
         try:
-            db: Session = SessionLocal()
-            now = datetime.utcnow()
-            entries = db.query(Watchlist).filter(Watchlist.expires_at > now).all()
-            for entry in entries:
-                gate = risk_gate(db, entry.user_id, entry.market_ticker, "heartbeat", Decimal("0"), now)
-                receipt = DecisionReceipt(
-                    user_id=entry.user_id,
-                    market_ticker=entry.market_ticker,
-                    ts=now,
-                    allowed=gate.allow_new_open,
-                    reason_code=gate.reason_code,
-                    kill_state=gate.kill_state.value,
-                    spend_snapshot=gate.effective_limits,
-                )
-                db.add(receipt)
-            db.commit()
-            db.close()
+            async with AsyncSessionLocal() as db:
+                await db.run_sync(_record_heartbeat)
         except Exception as exc:
             logger.error(f"heartbeat_job failure: {exc}")
         await asyncio.sleep(settings.HEARTBEAT_INTERVAL_SECONDS)
 
 
+def _rebuild_day_totals():
+    db: Session = SessionLocal()
+    try:
+        return rebuild_day_totals(db)
+    finally:
+        db.close()
+
+
+async def day_totals_reconcile_job():
+    while True:
+        try:
+            corrected = await asyncio.to_thread(_rebuild_day_totals)
+            if corrected:
+                logger.warning(f"Day totals drifted from the ledger for {corrected} users; corrected")
+        except Exception as exc:
+            logger.error(f"day_totals_reconcile_job failure: {exc}")
+        await asyncio.sleep(settings.DAY_TOTALS_RECONCILE_SECONDS)
+
+
+async def position_snapshot_job():
+    while True:
+        await asyncio.sleep(settings.POSITION_SNAPSHOT_INTERVAL_SECONDS)
+        try:
+            await asyncio.to_thread(portfolio_manager.flush_position_snapshots)
+            await asyncio.to_thread(portfolio_manager.flush_equity_snapshots)
+        except Exception as exc:
+            logger.error(f"position_snapshot_job failure: {exc}")
+
+
+def _sync_catalog():
+    db: Session = SessionLocal()
+    try:
+        sync_catalog(db)
+        market_search_index.refresh(db)
+    finally:
+        db.close()
+
+
+async def catalog_sync_job():
+    while True:
+        try:
+            await asyncio.to_thread(_sync_catalog)
+        except Exception as exc:
+            logger.error(f"catalog_sync_job failure: {exc}")
+        await asyncio.sleep(settings.CATALOG_SYNC_INTERVAL_SECONDS)
+
+
+def _refresh_market_search():
+    db: Session = SessionLocal()
+    try:
+        return market_search_index.refresh(db)
+    finally:
+        db.close()
+
+
+async def market_search_refresh_job():
+    while True:
+        try:
+            await asyncio.to_thread(_refresh_market_search)
+        except Exception as exc:
+            logger.error(f"market_search_refresh_job failure: {exc}")
+        await asyncio.sleep(settings.MARKET_SEARCH_REFRESH_SECONDS)
+
+
+async def opportunity_reprice_job():
+    while True:
+        await asyncio.sleep(settings.OPPORTUNITY_REPRICE_INTERVAL_SECONDS)
+        try:
+            await asyncio.to_thread(flush_price_ticks, SessionLocal)
+        except Exception as exc:
+            logger.error(f"opportunity_reprice_job failure: {exc}")
+
+
+def _apply_retention():
+    db: Session = SessionLocal()
+    try:
+        return apply_retention(db)
+    finally:
+        db.close()
+
+
+async def retention_job():
+    while True:
+        try:
+            removed = await asyncio.to_thread(_apply_retention)
+            if any(removed.values()):
+                logger.info(f"Retention removed {removed}")
+        except Exception as exc:
+            logger.error(f"retention_job failure: {exc}")
+        await asyncio.sleep(settings.RETENTION_INTERVAL_SECONDS)
+
+
 async def start_background_jobs():
-    await asyncio.gather(
+    jobs = [
         watchlist_expiry_job(),
         heartbeat_job(),
-    )
+        day_totals_reconcile_job(),
+        position_snapshot_job(),
+        market_search_refresh_job(),
+        opportunity_reprice_job(),
+        retention_job(),
+    ]
+    if settings.CATALOG_SYNC_IN_PROCESS:
+        jobs.append(catalog_sync_job())
+    if settings.ANALYSIS_WORKER_IN_PROCESS:
+        jobs.append(AnalysisWorker().run())
+    await asyncio.gather(*jobs)
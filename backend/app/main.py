@@ -9,7 +9,9 @@ from app.utils.logging import setup_logging
 from app.api.endpoints import markets, analysis, trading, auth
 from app.api.endpoints import watchlist, rules, admin, market_requests
 from app.api.websocket import websocket_router
-from app.models.database import engine, Base
+from app.models.database import engine, Base, pool_metrics
+from app.core.auth_cache import auth_cache
+from app.core.password_hashing import password_hasher
 from app.core.tasks import start_background_jobs
 
 # Setup logging
@@ -27,6 +29,11 @@ async def lifespan(app: FastAPI):
     else:
         logger.info("Skipping automatic table creation; run migrations instead")
 
+    if settings.ANALYZER_CONFIG_FILE:
+        from app.core.sweep import apply_sweep_config, load_sweep_config
+
+        apply_sweep_config(load_sweep_config(settings.ANALYZER_CONFIG_FILE))
+
     # Start background maintenance
     import asyncio
 
@@ -53,6 +60,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Catalog-Version"],
 )
 
 # Include API routers
@@ -80,6 +88,21 @@ async def health_check():
     )
 
 
+@app.get("/health/db")
+async def database_health():
+    """Connection pool checkout counts and wait times"""
+    return JSONResponse(status_code=200, content=pool_metrics())
+
+
+@app.get("/health/auth")
+async def auth_health():
+    """Password hashing pool queueing and auth cache hit counts"""
+    return JSONResponse(status_code=200, content={
+        "password_hashing": password_hasher.metrics(),
+        "auth_cache": {"hits": auth_cache.hits, "misses": auth_cache.misses},
+    })
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
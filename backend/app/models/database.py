@@ -1,14 +1,298 @@
-from sqlalchemy import MetaData, create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+import asyncio
+import hashlib
+import itertools
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request
+from loguru import logger
+from sqlalchemy import MetaData, create_engine, event, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from app.utils.config import settings
 
+
+class PoolMetrics:
+    """Checkout wait time and counts for an engine's connection pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def observe(self, wait_seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += int(timed_out)
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+    def snapshot(self, pool) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_seconds_total': round(self.wait_seconds_total, 6),
+                'wait_seconds_max': round(self.wait_seconds_max, 6),
+                'wait_seconds_avg': round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+            }
+        if isinstance(pool, QueuePool):
+            stats.update({
+                'size': pool.size(),
+                'checked_out': pool.checkedout(),
+                'checked_in': pool.checkedin(),
+                'overflow': max(pool.overflow(), 0),
+            })
+        return stats
+
+
+class _TimedCheckout:
+    """Records how long each checkout waited for a free connection"""
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.metrics.observe(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.observe(time.perf_counter() - start)
+        return connection
+
+
+def timed_pool(base=QueuePool):
+    """A pool class with its own metrics; dispose() recreates the pool from the same class, keeping them"""
+    return type(f"Timed{base.__name__}", (_TimedCheckout, base), {'metrics': PoolMetrics()})
+
+
+def pool_options(database_url: str, poolclass) -> Dict[str, Any]:
+    """Pool settings for an engine; sqlite keeps SQLAlchemy's default pool"""
+    if make_url(database_url).get_backend_name() == 'sqlite':
+        return {}
+    return {
+        'poolclass': poolclass,
+        'pool_size': settings.DB_POOL_SIZE,
+        'max_overflow': settings.DB_MAX_OVERFLOW,
+        'pool_timeout': settings.DB_POOL_TIMEOUT,
+        'pool_recycle': settings.DB_POOL_RECYCLE,
+        'pool_pre_ping': settings.DB_POOL_PRE_PING,
+    }
+
+
+def async_database_url(database_url: str) -> str:
+    """The async driver URL for a sync URL: asyncpg for Postgres, aiosqlite for sqlite"""
+    url = make_url(database_url)
+    drivers = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+    backend = url.get_backend_name()
+    if backend not in drivers:
+        return database_url
+    return url.set(drivername=drivers[backend]).render_as_string(hide_password=False)
+
+
 # Create engine
-engine = create_engine(settings.DATABASE_URL)
+engine = create_engine(settings.DATABASE_URL, **pool_options(settings.DATABASE_URL, timed_pool(QueuePool)))
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+_async_lock = threading.Lock()
+_async_engine = None
+_async_session_factory = None
+
+
+def get_async_engine():
+    """The async engine, created on first use so the async driver is only needed where it is used"""
+    global _async_engine
+    with _async_lock:
+        if _async_engine is None:
+            from sqlalchemy.ext.asyncio import create_async_engine
+
+            url = settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL)
+            options = pool_options(url, timed_pool(AsyncAdaptedQueuePool))
+            if make_url(url).get_backend_name() == 'postgresql':
+                options['connect_args'] = {'statement_cache_size': settings.DB_STATEMENT_CACHE_SIZE}
+            _async_engine = create_async_engine(url, **options)
+        return _async_engine
+
+
+def AsyncSessionLocal():
+    """A new AsyncSession; objects stay usable after commit, as async code cannot lazy-load them"""
+    global _async_session_factory
+    if _async_session_factory is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        _async_session_factory = async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
+    return _async_session_factory()
+
+
+def replica_lag(replica: Engine) -> float:
+    """Seconds a replica is behind its primary; 0 for a caught-up replica or a non-Postgres database"""
+    if replica.dialect.name != 'postgresql':
+        return 0.0
+    with replica.connect() as conn:
+        lag = conn.execute(text(
+            "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+            "THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+        )).scalar()
+    return float(lag or 0.0)
+
+
+class ReplicaRouter:
+    """
+    Routes read-only sessions to replicas.
+
+    A replica is used while its lag is within REPLICA_MAX_LAG_SECONDS; lag is
+    probed at most every REPLICA_LAG_CHECK_SECONDS and a failed probe counts as
+    lagging. Replicas are used round robin, and the primary serves reads when
+    none qualifies. A client that committed a write reads from the primary for
+    READ_YOUR_WRITES_SECONDS so it sees its own changes. The async path runs
+    stale lag probes in a worker thread, never on the event loop.
+    """
+
+    def __init__(self, primary: Engine, replica_urls: List[str], max_lag_seconds: Optional[float] = None,
+                 lag_check_seconds: Optional[float] = None, sticky_seconds: Optional[float] = None,
+                 lag_probe=replica_lag):
+        self.primary_session = sessionmaker(autocommit=False, autoflush=False, bind=primary)
+        self.replica_urls = list(replica_urls)
+        self.replicas = [create_engine(url, **pool_options(url, timed_pool(QueuePool))) for url in self.replica_urls]
+        self.replica_sessions = [sessionmaker(autocommit=False, autoflush=False, bind=replica) for replica in self.replicas]
+        self.max_lag_seconds = settings.REPLICA_MAX_LAG_SECONDS if max_lag_seconds is None else max_lag_seconds
+        self.lag_check_seconds = settings.REPLICA_LAG_CHECK_SECONDS if lag_check_seconds is None else lag_check_seconds
+        self.sticky_seconds = settings.READ_YOUR_WRITES_SECONDS if sticky_seconds is None else sticky_seconds
+        self.lag_probe = lag_probe
+        self._lock = threading.Lock()
+        self._lag: Dict[int, tuple] = {}
+        self._sticky: Dict[str, float] = {}
+        self._turn = itertools.count()
+        self._async_sessions: Dict[int, Any] = {}
+
+    def mark_write(self, client_key: Optional[str]):
+        if not client_key:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._sticky) > 10000:
+                self._sticky = {key: until for key, until in self._sticky.items() if until > now}
+            self._sticky[client_key] = now + self.sticky_seconds
+
+    def is_sticky(self, client_key: Optional[str]) -> bool:
+        with self._lock:
+            return bool(client_key) and self._sticky.get(client_key, 0.0) > time.monotonic()
+
+    def cached_lag(self, index: int) -> Optional[float]:
+        """The last probed lag while it is fresh, else None"""
+        with self._lock:
+            cached = self._lag.get(index)
+        if cached and time.monotonic() - cached[1] < self.lag_check_seconds:
+            return cached[0]
+        return None
+
+    def lag(self, index: int) -> float:
+        cached = self.cached_lag(index)
+        if cached is not None:
+            return cached
+        now = time.monotonic()
+        try:
+            lag = self.lag_probe(self.replicas[index])
+        except Exception as e:
+            logger.error(f"Replica lag probe failed for replica {index}: {str(e)}")
+            lag = float('inf')
+        with self._lock:
+            self._lag[index] = (lag, now)
+        return lag
+
+    def _rotation(self, client_key: Optional[str]) -> List[int]:
+        """Replica indexes to try in round-robin order; none for a client reading its own writes"""
+        if not self.replicas or self.is_sticky(client_key):
+            return []
+        start = next(self._turn)
+        return [(start + offset) % len(self.replicas) for offset in range(len(self.replicas))]
+
+    def pick(self, client_key: Optional[str] = None) -> Optional[int]:
+        """Index of the replica to read from, or None for the primary"""
+        for index in self._rotation(client_key):
+            if self.lag(index) <= self.max_lag_seconds:
+                return index
+        return None
+
+    async def async_pick(self, client_key: Optional[str] = None) -> Optional[int]:
+        """pick() for the event loop: a cached lag is used as is, a stale one is probed in a worker thread"""
+        for index in self._rotation(client_key):
+            lag = self.cached_lag(index)
+            if lag is None:
+                lag = await asyncio.to_thread(self.lag, index)
+            if lag <= self.max_lag_seconds:
+                return index
+        return None
+
+    def read_session(self, client_key: Optional[str] = None) -> Session:
+        index = self.pick(client_key)
+        return self.primary_session() if index is None else self.replica_sessions[index]()
+
+    async def async_read_session(self, client_key: Optional[str] = None):
+        index = await self.async_pick(client_key)
+        if index is None:
+            return AsyncSessionLocal()
+        with self._lock:
+            factory = self._async_sessions.get(index)
+            if factory is None:
+                from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+                url = async_database_url(self.replica_urls[index])
+                replica = create_async_engine(url, **pool_options(url, timed_pool(AsyncAdaptedQueuePool)))
+                factory = self._async_sessions[index] = async_sessionmaker(
+                    replica, autoflush=False, expire_on_commit=False
+                )
+        return factory()
+
+    def engines(self) -> Dict[str, Engine]:
+        return {f"replica_{index}": replica for index, replica in enumerate(self.replicas)}
+
+
+def pool_metrics() -> Dict[str, Any]:
+    """Pool metrics per engine; sqlite's default pools report no checkout timings"""
+    engines = {'sync': engine, **replica_router.engines()}
+    if _async_engine is not None:
+        engines['async'] = _async_engine.sync_engine
+    return {
+        name: bound.pool.metrics.snapshot(bound.pool) if hasattr(bound.pool, 'metrics') else {}
+        for name, bound in engines.items()
+    }
+
+
+replica_router = ReplicaRouter(engine, settings.DATABASE_REPLICA_URLS)
+
+
+def client_key(request: Optional[Request]) -> Optional[str]:
+    """Read-your-writes key: a hash of the request's credentials"""
+    authorization = request.headers.get('authorization') if request is not None else None
+    return hashlib.sha256(authorization.encode()).hexdigest() if authorization else None
+
+
+@event.listens_for(Session, "after_flush")
+def _flushed_changes(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _executed_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _committed(session):
+    if session.info.pop('wrote', False):
+        replica_router.mark_write(session.info.get('client_key'))
+
+
 # Create base class for models
 Base = declarative_base()
 
@@ -16,14 +300,36 @@ Base = declarative_base()
 metadata = MetaData()
 
 
-def get_db():
+def get_db(request: Request = None):
     """Dependency to get database session"""
     db = SessionLocal()
+    db.info['client_key'] = client_key(request)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db(request: Request = None):
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
+        db.sync_session.info['client_key'] = client_key(request)
+        yield db
+
+
+def get_read_db(request: Request = None):
+    """Dependency for read-only endpoints: a replica session when one is usable"""
+    db = replica_router.read_session(client_key(request))
     try:
         yield db
     finally:
         db.close()
 
 
+async def get_async_read_db(request: Request = None):
+    async with await replica_router.async_read_session(client_key(request)) as db:
+        yield db
+
+
 # Import all models to ensure they are registered with Base
 from . import schemas  # noqa: F401
@@ -147,3 +147,11 @@ TWITTER_RATE_LIMIT = 300  # requests per 15 minutes
 REDDIT_RATE_LIMIT = 60  # requests per minute
 NEWS_API_RATE_LIMIT = 1000  # requests per day
 KALSHI_RATE_LIMIT = 100  # requests per minute
+
+
+class AnalysisTaskStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    DUPLICATE = "duplicate"  # follows an already-active task for the same market
@@ -0,0 +1,10 @@
+"""Tiered portfolio equity history."""
+from app.models.schemas import PortfolioSnapshot
+
+
+def upgrade(engine):
+    PortfolioSnapshot.__table__.create(bind=engine, checkfirst=True)
+
+
+def downgrade(engine):
+    PortfolioSnapshot.__table__.drop(bind=engine, checkfirst=True)
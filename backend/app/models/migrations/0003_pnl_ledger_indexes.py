@@ -0,0 +1,20 @@
+"""Covering indexes for ledger aggregates and FIFO close lookups."""
+from app.models.schemas import PNLLedger
+
+INDEX_NAMES = (
+    "idx_pnl_user_closed",
+    "idx_pnl_user_opened_market",
+    "idx_pnl_user_market_open",
+)
+
+
+def upgrade(engine):
+    for index in PNLLedger.__table__.indexes:
+        if index.name in INDEX_NAMES:
+            index.create(bind=engine, checkfirst=True)
+
+
+def downgrade(engine):
+    for index in PNLLedger.__table__.indexes:
+        if index.name in INDEX_NAMES:
+            index.drop(bind=engine, checkfirst=True)
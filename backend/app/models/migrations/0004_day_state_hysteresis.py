@@ -0,0 +1,18 @@
+"""Typed breach markers on day_state replacing the pipe-delimited kill_reason."""
+from sqlalchemy import text
+
+COLUMNS = ("soft_breach_at", "hard_breach_at")
+
+
+def upgrade(engine):
+    with engine.begin() as conn:
+        for column in COLUMNS:
+            conn.execute(text(f"ALTER TABLE day_state ADD COLUMN IF NOT EXISTS {column} TIMESTAMP WITH TIME ZONE"))
+        # Old markers were stored as "<level>_breach:<iso timestamp>" tokens
+        conn.execute(text("UPDATE day_state SET kill_reason = NULL WHERE kill_reason LIKE '%\\_breach:%'"))
+
+
+def downgrade(engine):
+    with engine.begin() as conn:
+        for column in COLUMNS:
+            conn.execute(text(f"ALTER TABLE day_state DROP COLUMN IF EXISTS {column}"))
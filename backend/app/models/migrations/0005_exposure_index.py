@@ -0,0 +1,21 @@
+"""Per-user open-position counter and per-market exposure tables.
+
+Users with positions opened before this migration are backfilled from their
+open ledger entries; otherwise their counters would read as zero.
+"""
+from sqlalchemy.orm import Session
+
+from app.core.exposure import backfill_exposure
+from app.models.schemas import MarketExposure, UserPositionState
+
+
+def upgrade(engine):
+    UserPositionState.__table__.create(bind=engine, checkfirst=True)
+    MarketExposure.__table__.create(bind=engine, checkfirst=True)
+    with Session(bind=engine) as db:
+        backfill_exposure(db)
+
+
+def downgrade(engine):
+    MarketExposure.__table__.drop(bind=engine, checkfirst=True)
+    UserPositionState.__table__.drop(bind=engine, checkfirst=True)
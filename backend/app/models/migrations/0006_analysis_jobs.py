@@ -0,0 +1,12 @@
+"""Durable analysis job queue tables."""
+from app.models.schemas import AnalysisJob, AnalysisTask
+
+
+def upgrade(engine):
+    AnalysisJob.__table__.create(bind=engine, checkfirst=True)
+    AnalysisTask.__table__.create(bind=engine, checkfirst=True)
+
+
+def downgrade(engine):
+    AnalysisTask.__table__.drop(bind=engine, checkfirst=True)
+    AnalysisJob.__table__.drop(bind=engine, checkfirst=True)
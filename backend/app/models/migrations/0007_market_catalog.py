@@ -0,0 +1,35 @@
+"""Market catalog sync: status columns on markets, series and sync state tables."""
+from sqlalchemy import text
+
+from app.models.schemas import CatalogState, Market, MarketSeries
+
+COLUMNS = (
+    ("ticker", "VARCHAR"),
+    ("series_ticker", "VARCHAR"),
+    ("status", "VARCHAR(20)"),
+    ("source_updated_at", "TIMESTAMP WITH TIME ZONE"),
+    ("catalog_version", "BIGINT"),
+)
+INDEX_NAMES = ("idx_market_status_category", "idx_market_series")
+
+
+def upgrade(engine):
+    with engine.begin() as conn:
+        for column, column_type in COLUMNS:
+            conn.execute(text(f"ALTER TABLE markets ADD COLUMN IF NOT EXISTS {column} {column_type}"))
+    for index in Market.__table__.indexes:
+        if index.name in INDEX_NAMES:
+            index.create(bind=engine, checkfirst=True)
+    MarketSeries.__table__.create(bind=engine, checkfirst=True)
+    CatalogState.__table__.create(bind=engine, checkfirst=True)
+
+
+def downgrade(engine):
+    CatalogState.__table__.drop(bind=engine, checkfirst=True)
+    MarketSeries.__table__.drop(bind=engine, checkfirst=True)
+    for index in Market.__table__.indexes:
+        if index.name in INDEX_NAMES:
+            index.drop(bind=engine, checkfirst=True)
+    with engine.begin() as conn:
+        for column, _ in COLUMNS:
+            conn.execute(text(f"ALTER TABLE markets DROP COLUMN IF EXISTS {column}"))
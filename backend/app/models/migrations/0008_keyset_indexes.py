@@ -0,0 +1,22 @@
+"""Composite (created_at, id) indexes for keyset pagination and the position lookup by trade."""
+from app.models.schemas import Market, Position, Trade
+
+INDEXES = (
+    (Trade, "idx_trades_created_id"),
+    (Market, "idx_market_created_id"),
+    (Position, "idx_positions_trade"),
+)
+
+
+def upgrade(engine):
+    for model, name in INDEXES:
+        for index in model.__table__.indexes:
+            if index.name == name:
+                index.create(bind=engine, checkfirst=True)
+
+
+def downgrade(engine):
+    for model, name in INDEXES:
+        for index in model.__table__.indexes:
+            if index.name == name:
+                index.drop(bind=engine, checkfirst=True)
@@ -0,0 +1,10 @@
+"""Precomputed opportunity ranking maintained by the analysis pipeline."""
+from app.models.schemas import MarketOpportunity
+
+
+def upgrade(engine):
+    MarketOpportunity.__table__.create(bind=engine, checkfirst=True)
+
+
+def downgrade(engine):
+    MarketOpportunity.__table__.drop(bind=engine, checkfirst=True)
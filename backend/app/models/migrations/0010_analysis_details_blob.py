@@ -0,0 +1,21 @@
+"""Compressed details column and timestamp index for retention on analysis_results."""
+from sqlalchemy import text
+
+from app.models.schemas import AnalysisResult
+
+
+def upgrade(engine):
+    blob_type = "BYTEA" if engine.dialect.name == "postgresql" else "BLOB"
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE analysis_results ADD COLUMN IF NOT EXISTS details_blob {blob_type}"))
+    for index in AnalysisResult.__table__.indexes:
+        if index.name == "idx_analysis_timestamp":
+            index.create(bind=engine, checkfirst=True)
+
+
+def downgrade(engine):
+    for index in AnalysisResult.__table__.indexes:
+        if index.name == "idx_analysis_timestamp":
+            index.drop(bind=engine, checkfirst=True)
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE analysis_results DROP COLUMN IF EXISTS details_blob"))
@@ -0,0 +1,81 @@
+"""Range-partition the append-heavy tables by time and add the daily rollup tables.
+
+Postgres only: each table in PARTITIONED_TABLES is rebuilt as a partitioned
+table with (id, time column) as its primary key, as Postgres requires the
+partition key in it, and existing rows are copied into monthly or daily
+partitions plus a DEFAULT partition for anything outside them. Other
+databases only get the rollup tables.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.schema import AddConstraint
+
+from app.models.partitions import PARTITIONED_TABLES, create_default_partition, create_partitions, is_partitioned
+from app.models.schemas import (
+    AnalysisResult, AnalysisResultDaily, DecisionReceipt, DecisionReceiptDaily, MarketPrice, MarketPriceDaily,
+    SystemLog
+)
+from app.utils.config import settings
+
+MODELS = {
+    'market_prices': MarketPrice,
+    'analysis_results': AnalysisResult,
+    'decision_receipts': DecisionReceipt,
+    'system_logs': SystemLog,
+}
+ROLLUP_MODELS = (MarketPriceDaily, AnalysisResultDaily, DecisionReceiptDaily)
+
+
+def _rebuild(conn, spec, partitioned: bool):
+    model = MODELS[spec.table]
+    table, column, old = spec.table, spec.column, f"{spec.table}_old"
+    conn.execute(text(f'ALTER TABLE "{table}" RENAME TO "{old}"'))
+    if partitioned:
+        conn.execute(text(f'UPDATE "{old}" SET "{column}" = now() WHERE "{column}" IS NULL'))
+        conn.execute(text(
+            f'CREATE TABLE "{table}" (LIKE "{old}" INCLUDING DEFAULTS) PARTITION BY RANGE ("{column}")'
+        ))
+        now = datetime.utcnow()
+        oldest, newest = conn.execute(text(f'SELECT min("{column}"), max("{column}") FROM "{old}"')).first()
+        start = oldest.replace(tzinfo=None) if oldest else now
+        end = max(now + timedelta(days=settings.PARTITION_PREMAKE_DAYS),
+                  newest.replace(tzinfo=None) + timedelta(days=1) if newest else now)
+        create_partitions(conn, spec, start, end)
+        create_default_partition(conn, spec)
+    else:
+        conn.execute(text(f'CREATE TABLE "{table}" (LIKE "{old}" INCLUDING DEFAULTS)'))
+    conn.execute(text(f'INSERT INTO "{table}" SELECT * FROM "{old}"'))
+
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence(:old, 'id')"), {'old': old}).scalar()
+    if sequence:
+        conn.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY "{table}".id'))
+    conn.execute(text(f'DROP TABLE "{old}"'))
+
+    key = f'id, "{column}"' if partitioned else 'id'
+    conn.execute(text(f'ALTER TABLE "{table}" ADD PRIMARY KEY ({key})'))
+    for constraint in model.__table__.foreign_key_constraints:
+        conn.execute(AddConstraint(constraint))
+    for index in model.__table__.indexes:
+        index.create(bind=conn)
+
+
+def upgrade(engine):
+    for model in ROLLUP_MODELS:
+        model.__table__.create(bind=engine, checkfirst=True)
+    if engine.dialect.name != 'postgresql':
+        return
+    with engine.begin() as conn:
+        for spec in PARTITIONED_TABLES:
+            if not is_partitioned(conn, spec.table):
+                _rebuild(conn, spec, partitioned=True)
+
+
+def downgrade(engine):
+    if engine.dialect.name == 'postgresql':
+        with engine.begin() as conn:
+            for spec in PARTITIONED_TABLES:
+                if is_partitioned(conn, spec.table):
+                    _rebuild(conn, spec, partitioned=False)
+    for model in ROLLUP_MODELS:
+        model.__table__.drop(bind=engine, checkfirst=True)
@@ -0,0 +1,49 @@
+"""Make the active analysis task index unique per market.
+
+Markets that already have more than one queued or running task keep one,
+preferring a running task over the oldest queued one; the others become
+duplicates that follow it.
+"""
+from sqlalchemy import case, text
+from sqlalchemy.orm import Session
+
+from app.models.enums import AnalysisTaskStatus
+from app.models.schemas import AnalysisTask
+
+NAME = "idx_analysis_tasks_market_active"
+ACTIVE_STATUSES = (AnalysisTaskStatus.QUEUED.value, AnalysisTaskStatus.RUNNING.value)
+
+
+def _model_index():
+    return next(index for index in AnalysisTask.__table__.indexes if index.name == NAME)
+
+
+def upgrade(engine):
+    with Session(bind=engine) as db:
+        winners = {}
+        for task in (
+            db.query(AnalysisTask)
+            .filter(AnalysisTask.status.in_(ACTIVE_STATUSES))
+            .order_by(
+                AnalysisTask.market_id,
+                case((AnalysisTask.status == AnalysisTaskStatus.RUNNING.value, 0), else_=1),
+                AnalysisTask.created_at,
+            )
+        ):
+            winner = winners.setdefault(task.market_id, task)
+            if winner is not task:
+                task.status = AnalysisTaskStatus.DUPLICATE.value
+                task.duplicate_of = winner.id
+        db.commit()
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP INDEX IF EXISTS {NAME}"))
+    _model_index().create(bind=engine)
+
+
+def downgrade(engine):
+    _model_index().drop(bind=engine, checkfirst=True)
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE INDEX {NAME} ON analysis_tasks (market_id) WHERE status IN ('queued', 'running')"
+        ))
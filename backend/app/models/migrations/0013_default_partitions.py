@@ -0,0 +1,33 @@
+"""DEFAULT partitions for tables partitioned before 0011 created them.
+
+Without one, inserts fail once time runs past the premade partitions, which
+happens whenever the retention job stalls for PARTITION_PREMAKE_DAYS.
+"""
+from sqlalchemy import text
+
+from app.models.partitions import (
+    PARTITIONED_TABLES, create_default_partition, default_partition_bounds, default_partition_name, is_partitioned
+)
+
+
+def upgrade(engine):
+    if engine.dialect.name != 'postgresql':
+        return
+    with engine.begin() as conn:
+        for spec in PARTITIONED_TABLES:
+            if is_partitioned(conn, spec.table):
+                create_default_partition(conn, spec)
+
+
+def downgrade(engine):
+    if engine.dialect.name != 'postgresql':
+        return
+    with engine.begin() as conn:
+        for spec in PARTITIONED_TABLES:
+            if not is_partitioned(conn, spec.table):
+                continue
+            if default_partition_bounds(conn, spec):
+                raise RuntimeError(
+                    f"{default_partition_name(spec.table)} still holds rows; run retention to move them first"
+                )
+            conn.execute(text(f'DROP TABLE IF EXISTS "{default_partition_name(spec.table)}"'))
@@ -0,0 +1,12 @@
+"""Closed marker on positions, so closed positions stay out of the open book."""
+from sqlalchemy import text
+
+
+def upgrade(engine):
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE positions ADD COLUMN IF NOT EXISTS closed_at TIMESTAMP WITH TIME ZONE"))
+
+
+def downgrade(engine):
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE positions DROP COLUMN IF EXISTS closed_at"))
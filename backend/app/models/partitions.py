@@ -0,0 +1,172 @@
+"""Declarative time partitioning for the append-heavy tables.
+
+Each `PartitionSpec` names a table, the timestamp column it is ranged on, the
+width of one partition and the setting holding its retention. On Postgres,
+migration 0011 turns these tables into `PARTITION BY RANGE` tables. The
+retention job keeps partitions created ahead of time and drops whole expired
+partitions, so inserts and range scans only touch a few small partitions
+however long the history is. A DEFAULT partition takes rows outside every
+premade range. Other databases keep plain tables.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.utils.config import settings
+
+NAME_FORMATS = {'day': '%Y%m%d', 'month': '%Y%m'}
+
+
+@dataclass(frozen=True)
+class PartitionSpec:
+    table: str
+    column: str
+    interval: str  # 'day' or 'month'
+    retention_setting: str
+
+    @property
+    def retention_days(self) -> int:
+        return getattr(settings, self.retention_setting)
+
+
+PARTITIONED_TABLES = (
+    PartitionSpec('market_prices', 'timestamp', 'month', 'MARKET_PRICE_RETENTION_DAYS'),
+    PartitionSpec('analysis_results', 'timestamp', 'month', 'ANALYSIS_RESULT_RETENTION_DAYS'),
+    PartitionSpec('decision_receipts', 'ts', 'day', 'DECISION_RECEIPT_RETENTION_DAYS'),
+    PartitionSpec('system_logs', 'timestamp', 'day', 'SYSTEM_LOG_RETENTION_DAYS'),
+)
+
+
+def partition_start(value: datetime, interval: str) -> datetime:
+    start = datetime(value.year, value.month, value.day)
+    return start.replace(day=1) if interval == 'month' else start
+
+
+def partition_end(start: datetime, interval: str) -> datetime:
+    if interval == 'month':
+        return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start + timedelta(days=1)
+
+
+def partition_name(table: str, start: datetime, interval: str) -> str:
+    """market_prices_p202406 for a month partition, decision_receipts_p20240601 for a day"""
+    return f"{table}_p{start.strftime(NAME_FORMATS[interval])}"
+
+
+def parse_partition_name(table: str, name: str, interval: str) -> Optional[Tuple[datetime, datetime]]:
+    """The [start, end) range of a partition created by this module, or None for any other table"""
+    prefix = f"{table}_p"
+    if not name.startswith(prefix):
+        return None
+    try:
+        start = datetime.strptime(name[len(prefix):], NAME_FORMATS[interval])
+    except ValueError:
+        return None
+    if partition_name(table, start, interval) != name:
+        return None
+    return start, partition_end(start, interval)
+
+
+def partition_ranges(start: datetime, end: datetime, interval: str) -> List[Tuple[datetime, datetime]]:
+    """Consecutive partition ranges covering [start, end)"""
+    ranges = []
+    current = partition_start(start, interval)
+    while current < end:
+        upper = partition_end(current, interval)
+        ranges.append((current, upper))
+        current = upper
+    return ranges
+
+
+def expired_partitions(spec: PartitionSpec, names: List[str], cutoff: datetime) -> List[Tuple[str, datetime, datetime]]:
+    """Partitions whose whole range is older than cutoff, oldest first"""
+    expired = []
+    for name in names:
+        bounds = parse_partition_name(spec.table, name, spec.interval)
+        if bounds and bounds[1] <= cutoff:
+            expired.append((name, *bounds))
+    return sorted(expired, key=lambda item: item[1])
+
+
+def is_partitioned(conn: Connection, table: str) -> bool:
+    if conn.dialect.name != 'postgresql':
+        return False
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :table"
+    ), {'table': table}).first() is not None
+
+
+def list_partitions(conn: Connection, table: str) -> List[str]:
+    rows = conn.execute(text(
+        "SELECT child.relname FROM pg_inherits i "
+        "JOIN pg_class child ON child.oid = i.inhrelid "
+        "JOIN pg_class parent ON parent.oid = i.inhparent "
+        "WHERE parent.relname = :table"
+    ), {'table': table})
+    return [name for (name,) in rows]
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def create_default_partition(conn: Connection, spec: PartitionSpec):
+    """Catch-all partition, so inserts past the premade range still succeed if retention stalls"""
+    conn.execute(text(
+        f'CREATE TABLE IF NOT EXISTS "{default_partition_name(spec.table)}" PARTITION OF "{spec.table}" DEFAULT'
+    ))
+
+
+def default_partition_bounds(conn: Connection, spec: PartitionSpec) -> Optional[Tuple[datetime, datetime]]:
+    """Oldest and newest timestamps held by the default partition, None when it is empty or missing"""
+    if default_partition_name(spec.table) not in list_partitions(conn, spec.table):
+        return None
+    oldest, newest = conn.execute(text(
+        f'SELECT min("{spec.column}"), max("{spec.column}") FROM "{default_partition_name(spec.table)}"'
+    )).first()
+    if oldest is None:
+        return None
+    return oldest.replace(tzinfo=None), newest.replace(tzinfo=None)
+
+
+def create_partitions(conn: Connection, spec: PartitionSpec, start: datetime, end: datetime) -> int:
+    """
+    Create any missing partitions covering [start, end)
+
+    Postgres refuses a partition whose range has rows in the default
+    partition, so the default is detached while those rows move into the
+    new partition.
+    """
+    existing = set(list_partitions(conn, spec.table))
+    default = default_partition_name(spec.table)
+    ranges = [
+        (lower, upper) for lower, upper in partition_ranges(start, end, spec.interval)
+        if partition_name(spec.table, lower, spec.interval) not in existing
+    ]
+    for lower, upper in ranges:
+        lower_bound, upper_bound = f"'{lower.isoformat()}+00'", f"'{upper.isoformat()}+00'"
+        if default in existing:
+            conn.execute(text(f'ALTER TABLE "{spec.table}" DETACH PARTITION "{default}"'))
+        conn.execute(text(
+            f'CREATE TABLE "{partition_name(spec.table, lower, spec.interval)}" '
+            f'PARTITION OF "{spec.table}" FOR VALUES FROM ({lower_bound}) TO ({upper_bound})'
+        ))
+        if default in existing:
+            conn.execute(text(
+                f'WITH moved AS (DELETE FROM "{default}" WHERE "{spec.column}" >= {lower_bound} '
+                f'AND "{spec.column}" < {upper_bound} RETURNING *) '
+                f'INSERT INTO "{spec.table}" SELECT * FROM moved'
+            ))
+            conn.execute(text(f'ALTER TABLE "{spec.table}" ATTACH PARTITION "{default}" DEFAULT'))
+    return len(ranges)
+
+
+def drop_partition(conn: Connection, spec: PartitionSpec, name: str):
+    conn.execute(text(f'ALTER TABLE "{spec.table}" DETACH PARTITION "{name}"'))
+    conn.execute(text(f'DROP TABLE "{name}"'))
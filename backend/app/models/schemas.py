@@ -10,6 +10,7 @@ from sqlalchemy import (
     Index,
     ForeignKey,
     Numeric,
+    LargeBinary,
     Date,
     Time,
 )
@@ -19,7 +20,7 @@ from datetime import datetime
 import uuid
 
 from .database import Base
-from .enums import AccessSource, AccessStatus, MarketRequestStatus, KillState
+from .enums import AccessSource, AccessStatus, AnalysisTaskStatus, MarketRequestStatus, KillState
 
 # SQLAlchemy Models
 class Market(Base):
@@ -30,6 +31,11 @@ class Market(Base):
     category = Column(String(50), nullable=False)
     subtitle = Column(Text)
     settle_date = Column(DateTime(timezone=True))
+    ticker = Column(String)
+    series_ticker = Column(String)
+    status = Column(String(20))
+    source_updated_at = Column(DateTime(timezone=True))  # Kalshi's last change, drives sync change detection
+    catalog_version = Column(BigInteger)  # catalog sync pass that last wrote this row
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
     updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -40,6 +46,9 @@ class Market(Base):
 
     __table_args__ = (
         Index('idx_category_created', 'category', 'created_at'),
+        Index('idx_market_status_category', 'status', 'category'),
+        Index('idx_market_series', 'series_ticker'),
+        Index('idx_market_created_id', 'created_at', 'market_id'),
     )
 
 class MarketPrice(Base):
@@ -67,6 +76,8 @@ class AnalysisResult(Base):
     prediction = Column(Numeric(10, 4), nullable=False)
     confidence = Column(Numeric(5, 2), nullable=False)
     details = Column(JSON)
+    # zlib-compressed JSON details, used instead of `details` when they are large
+    details_blob = Column(LargeBinary)
     timestamp = Column(DateTime(timezone=True), default=datetime.utcnow)
 
     # Relationships
@@ -75,8 +86,15 @@ class AnalysisResult(Base):
     __table_args__ = (
         Index('idx_market_analyzer', 'market_id', 'analyzer_type'),
         Index('idx_analyzer_timestamp', 'analyzer_type', 'timestamp'),
+        Index('idx_analysis_timestamp', 'timestamp'),
     )
 
+    @property
+    def payload(self):
+        """Details, whether stored inline or compressed"""
+        from app.core.analysis_writer import unpack_details
+        return unpack_details(self.details, self.details_blob)
+
 class Trade(Base):
     __tablename__ = "trades"
 
@@ -96,6 +114,7 @@ class Trade(Base):
     __table_args__ = (
         Index('idx_market_status', 'market_id', 'status'),
         Index('idx_created_status', 'created_at', 'status'),
+        Index('idx_trades_created_id', 'created_at', 'id'),
     )
 
 class Position(Base):
@@ -106,10 +125,32 @@ class Position(Base):
     current_value = Column(Numeric(10, 4))
     unrealized_pnl = Column(Numeric(10, 4))
     updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+    closed_at = Column(DateTime(timezone=True))  # set when the position is closed; open positions have none
 
     # Relationships
     trade = relationship("Trade", back_populates="position")
 
+    __table_args__ = (
+        Index('idx_positions_trade', 'trade_id'),
+    )
+
+class PortfolioSnapshot(Base):
+    __tablename__ = "portfolio_snapshots"
+
+    id = Column(BigInteger, primary_key=True)
+    tier = Column(String(8), nullable=False)  # 'raw', '1m', '1h', '1d'
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    total_value = Column(Numeric(14, 4), nullable=False)
+    high_value = Column(Numeric(14, 4))
+    low_value = Column(Numeric(14, 4))
+    cash_balance = Column(Numeric(14, 4))
+    positions_value = Column(Numeric(14, 4))
+    pnl = Column(Numeric(14, 4))
+
+    __table_args__ = (
+        Index('idx_snapshot_tier_bucket', 'tier', 'bucket_start', unique=True),
+    )
+
 class User(Base):
     __tablename__ = "users"
 
@@ -244,6 +285,8 @@ class DayState(Base):
     daily_spend = Column(Numeric(12, 2), default=0)
     kill_state = Column(String, default=KillState.NONE.value)
     kill_reason = Column(String)
+    soft_breach_at = Column(DateTime(timezone=True))
+    hard_breach_at = Column(DateTime(timezone=True))
     updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
@@ -262,6 +305,32 @@ class PNLLedger(Base):
     realized_pnl = Column(Numeric(12, 2))
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
 
+    __table_args__ = (
+        Index('idx_pnl_user_closed', 'user_id', 'closed_at', postgresql_include=['realized_pnl']),
+        Index('idx_pnl_user_opened_market', 'user_id', 'opened_at', 'market_ticker',
+              postgresql_include=['qty', 'entry_price']),
+        Index('idx_pnl_user_market_open', 'user_id', 'market_ticker', 'closed_at'),
+    )
+
+
+class UserPositionState(Base):
+    __tablename__ = "user_position_state"
+
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    open_positions = Column(Integer, nullable=False, default=0)
+    open_exposure = Column(Numeric(14, 4), nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class MarketExposure(Base):
+    __tablename__ = "market_exposure"
+
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    market_ticker = Column(String, primary_key=True)
+    open_qty = Column(Integer, nullable=False, default=0)
+    open_cost = Column(Numeric(14, 4), nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+
 
 class DecisionReceipt(Base):
     __tablename__ = "decision_receipts"
@@ -278,4 +347,133 @@ class DecisionReceipt(Base):
     reason_code = Column(String)
     kill_state = Column(String, default=KillState.NONE.value)
     spend_snapshot = Column(JSON)
-    model_version = Column(String)
\ No newline at end of file
+    model_version = Column(String)
+
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True))
+    force_refresh = Column(Boolean, default=False)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+    tasks = relationship("AnalysisTask", back_populates="job", foreign_keys="AnalysisTask.job_id")
+
+
+class AnalysisTask(Base):
+    __tablename__ = "analysis_tasks"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    job_id = Column(UUID(as_uuid=True), ForeignKey("analysis_jobs.id"), nullable=False)
+    market_id = Column(String, nullable=False)
+    status = Column(String, nullable=False, default=AnalysisTaskStatus.QUEUED.value)
+    priority = Column(Integer, nullable=False, default=0)
+    duplicate_of = Column(UUID(as_uuid=True), ForeignKey("analysis_tasks.id"))
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    available_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    locked_by = Column(String)
+    locked_at = Column(DateTime(timezone=True))
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    finished_at = Column(DateTime(timezone=True))
+
+    job = relationship("AnalysisJob", back_populates="tasks", foreign_keys=[job_id])
+
+    __table_args__ = (
+        # Claim order over the queue only; finished tasks never touch it
+        Index('idx_analysis_tasks_claim', 'priority', 'created_at',
+              postgresql_where=(status == AnalysisTaskStatus.QUEUED.value)),
+        # At most one queued or running task per market; enqueue inserts against it with ON CONFLICT
+        Index('idx_analysis_tasks_market_active', 'market_id', unique=True,
+              postgresql_where=status.in_([AnalysisTaskStatus.QUEUED.value, AnalysisTaskStatus.RUNNING.value]),
+              sqlite_where=status.in_([AnalysisTaskStatus.QUEUED.value, AnalysisTaskStatus.RUNNING.value])),
+        Index('idx_analysis_tasks_job', 'job_id'),
+    )
+
+
+class MarketSeries(Base):
+    __tablename__ = "market_series"
+
+    series_ticker = Column(String, primary_key=True)
+    title = Column(Text)
+    category = Column(String(50))
+    description = Column(Text)
+    frequency = Column(String(50))
+    catalog_version = Column(BigInteger)
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class CatalogState(Base):
+    __tablename__ = "catalog_state"
+
+    name = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    cursor = Column(String)  # resume point of an interrupted crawl
+    sync_started_at = Column(DateTime(timezone=True))
+    last_synced_at = Column(DateTime(timezone=True))
+    markets_seen = Column(Integer, default=0)
+    markets_changed = Column(Integer, default=0)
+
+
+class MarketOpportunity(Base):
+    __tablename__ = "market_opportunities"
+
+    market_id = Column(UUID(as_uuid=True), ForeignKey("markets.market_id"), primary_key=True)
+    market_title = Column(Text, nullable=False)
+    category = Column(String(50), nullable=False)
+    ensemble_prediction = Column(Numeric(10, 4), nullable=False)
+    abs_prediction = Column(Numeric(10, 4), nullable=False)
+    confidence = Column(Numeric(5, 2), nullable=False)
+    signal_classification = Column(String(30))
+    individual_predictions = Column(JSON)
+    current_price = Column(Numeric(10, 4))
+    volume = Column(BigInteger)
+    expected_value = Column(Numeric(10, 6), nullable=False)
+    risk_score = Column(Numeric(10, 4), nullable=False)
+    score = Column(Numeric(12, 6), nullable=False)  # expected_value * confidence, the ranking key
+    recommendation = Column(String(20), nullable=False)
+    analyzed_at = Column(DateTime(timezone=True), nullable=False)
+    price_updated_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index('idx_opportunities_score', 'score'),
+        Index('idx_opportunities_category_score', 'category', 'score'),
+    )
+
+
+class MarketPriceDaily(Base):
+    """Daily price rollup kept after raw market_prices partitions expire"""
+    __tablename__ = "market_price_daily"
+
+    market_id = Column(UUID(as_uuid=True), primary_key=True)
+    day = Column(Date, primary_key=True)
+    low = Column(Numeric(10, 4), nullable=False)
+    high = Column(Numeric(10, 4), nullable=False)
+    average = Column(Numeric(10, 4), nullable=False)
+    volume = Column(BigInteger)
+    samples = Column(Integer, nullable=False)
+
+
+class AnalysisResultDaily(Base):
+    """Daily analysis rollup kept after raw analysis_results partitions expire"""
+    __tablename__ = "analysis_result_daily"
+
+    market_id = Column(UUID(as_uuid=True), primary_key=True)
+    analyzer_type = Column(String(50), primary_key=True)
+    day = Column(Date, primary_key=True)
+    average_prediction = Column(Numeric(10, 4), nullable=False)
+    average_confidence = Column(Numeric(5, 2), nullable=False)
+    results = Column(Integer, nullable=False)
+
+
+class DecisionReceiptDaily(Base):
+    """Daily gate decision counts kept after raw decision_receipts partitions expire"""
+    __tablename__ = "decision_receipt_daily"
+
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    market_ticker = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    receipts = Column(Integer, nullable=False)
+    allowed = Column(Integer, nullable=False)
+    average_edge = Column(Numeric(10, 4))
@@ -22,11 +22,37 @@ class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///:memory:"
     REDIS_URL: str = "redis://localhost:6379/0"
 
+    ASYNC_DATABASE_URL: Optional[str] = None  # defaults to DATABASE_URL with the asyncpg/aiosqlite driver
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 10.0  # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100  # asyncpg prepared statements per connection; 0 behind pgbouncer
+    DATABASE_REPLICA_URLS: List[str] = []  # read replicas for get_read_db
+    REPLICA_MAX_LAG_SECONDS: float = 5.0
+    REPLICA_LAG_CHECK_SECONDS: float = 5.0
+    READ_YOUR_WRITES_SECONDS: float = 10.0  # a client reads from the primary this long after its writes
+
     # Database lifecycle
     AUTO_CREATE_TABLES: bool = False
 
+    # Retention of time-partitioned tables (app.models.partitions)
+    MARKET_PRICE_RETENTION_DAYS: int = 90
+    ANALYSIS_RESULT_RETENTION_DAYS: int = 90
+    DECISION_RECEIPT_RETENTION_DAYS: int = 30
+    SYSTEM_LOG_RETENTION_DAYS: int = 14
+    PARTITION_PREMAKE_DAYS: int = 35  # partitions are created this far ahead
+    RETENTION_INTERVAL_SECONDS: int = 3600
+
     # Security
     SECRET_KEY: str = "dev"
+    AUTH_CACHE_TTL_SECONDS: float = 30.0  # how long a resolved token skips the user lookup
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+    AUTH_CACHE_REDIS_ENABLED: bool = False  # share cached principals across workers via REDIS_URL
+    BCRYPT_ROUNDS: int = 12  # raising it rehashes passwords on their next login
+    PASSWORD_HASH_WORKERS: int = 4  # concurrent bcrypt hashes per API process
+    PASSWORD_HASH_MAX_PENDING: int = 64  # queued hashes beyond the workers before returning 503
     CORS_ORIGINS: List[str] = ["http://localhost:3000"]
 
     # External API Keys
@@ -49,6 +75,23 @@ class Settings(BaseSettings):
     MIN_CONFIDENCE_THRESHOLD: float = 60.0
     TRADING_MODE: str = "signals"
     HEARTBEAT_INTERVAL_SECONDS: int = 300
+    DAY_TOTALS_RECONCILE_SECONDS: int = 600  # re-derive DayState running totals from the ledger
+    POSITION_SNAPSHOT_INTERVAL_SECONDS: int = 30
+    RISK_RECONCILE_INTERVAL_SECONDS: int = 180  # full risk sweep, however busy the event queue is
+    CORRELATION_BAR_SECONDS: int = 300
+    CORRELATION_WINDOW_BARS: int = 288  # one day of 5 minute bars
+    CORRELATION_MIN_BARS: int = 12  # fall back to category similarity below this
+    RISK_SIMULATION_SCENARIOS: int = 20000
+    RISK_SIMULATION_CONFIDENCE: float = 0.99
+    RISK_SIMULATION_MAX_CVAR_PERCENT: float = 10.0
+    KELLY_OPTIMIZER_SCENARIOS: int = 4000
+    KELLY_OPTIMIZER_MAX_ITERATIONS: int = 500
+    KELLY_OPTIMIZER_TIME_BUDGET_SECONDS: float = 0.25
+    KELLY_OPTIMIZER_MAX_TOTAL_PERCENT: float = 50.0
+    KELLY_OPTIMIZER_DRAWDOWN_CONFIDENCE: float = 0.95
+
+    # Analyzer parameters exported by a sweep (app.core.sweep), applied at startup
+    ANALYZER_CONFIG_FILE: Optional[str] = None
 
     # Logging
     LOG_LEVEL: str = "INFO"
@@ -59,6 +102,22 @@ class Settings(BaseSettings):
     WS_MAX_CONNECTIONS: int = 100
 
     # Analysis Configuration
+    ANALYSIS_WORKER_IN_PROCESS: bool = True  # disable when dedicated workers run app.core.analysis_queue
+    ANALYSIS_WORKER_CONCURRENCY: int = 4
+    ANALYSIS_WORKER_POLL_SECONDS: float = 1.0
+    ANALYSIS_TASK_MAX_ATTEMPTS: int = 3
+    ANALYSIS_RETRY_BACKOFF_SECONDS: float = 30.0
+    ANALYSIS_TASK_LEASE_SECONDS: int = 600
+    ANALYSIS_REUSE_SECONDS: int = 900  # a refresh that is not forced reuses an ensemble result this recent
+    ANALYSIS_WRITE_BATCH_SIZE: int = 500  # rows per multi-row insert
+    ANALYSIS_WRITE_FLUSH_SECONDS: float = 2.0
+    ANALYSIS_DETAILS_INLINE_BYTES: int = 1024  # larger details are stored compressed
+    MARKET_SEARCH_REFRESH_SECONDS: int = 60
+    CATALOG_SYNC_IN_PROCESS: bool = True  # disable when a dedicated app.core.catalog_sync worker runs
+    CATALOG_SYNC_INTERVAL_SECONDS: int = 300
+    CATALOG_SYNC_PAGE_SIZE: int = 1000
+    OPPORTUNITY_REPRICE_INTERVAL_SECONDS: int = 15
+    OPPORTUNITY_MAX_AGE_HOURS: int = 6
     MODEL_RETRAIN_INTERVAL: int = 7  # days
     ENSEMBLE_WEIGHT_UPDATE_INTERVAL: int = 1  # day
     MAX_HISTORICAL_DAYS: int = 365
@@ -0,0 +1,53 @@
+"""Keyset (cursor) pagination on (created_at, id).
+
+A cursor encodes the sort key of the last row of a page. The next page
+starts strictly after it, so its cost does not depend on how deep the
+client has paged and rows inserted meanwhile do not shift page boundaries
+the way OFFSET does.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import tuple_
+
+
+def encode_cursor(created_at: datetime, row_id) -> str:
+    payload = json.dumps([created_at.isoformat(), str(row_id)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Raises ValueError for a cursor this module did not produce"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), row_id
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def keyset_page(query, created_column, id_column, limit: int, cursor: Optional[str] = None,
+                id_type=str, offset: int = 0):
+    """
+    Newest-first page of ``query`` after ``cursor``.
+
+    Without a cursor, ``offset`` skips that many rows of the ordered query for
+    clients that still page by offset.
+    Returns the rows and the cursor of the next page, None on the last page.
+    Rows may be entities or tuples whose first element is the entity.
+    """
+    query = query.order_by(created_column.desc(), id_column.desc())
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(created_column, id_column) < tuple_(created_at, id_type(row_id)))
+    elif offset:
+        query = query.offset(offset)
+    # One extra row tells whether another page exists without a COUNT
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1][0] if hasattr(rows[-1], '_mapping') else rows[-1]
+    return rows, encode_cursor(getattr(last, created_column.key), getattr(last, id_column.key))
@@ -0,0 +1,84 @@
+"""Login throughput benchmark for password hashing.
+
+Runs a burst of concurrent login-style verifications on one event loop while
+a probe task measures how late the loop wakes up. In "pool" mode hashes run
+on the PasswordHasher thread pool. In "inline" mode they run inside the
+coroutine, as the auth handlers did before. Usage:
+
+    python scripts/benchmark_login.py --logins 200 --concurrency 50 --rounds 12
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.password_hashing import PasswordHasher  # noqa: E402
+
+
+async def _probe_loop_lag(stop: asyncio.Event, interval: float, lags: list):
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def run(mode: str, logins: int, concurrency: int, hasher: PasswordHasher, hashed: str):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def login():
+        async with semaphore:
+            start = time.perf_counter()
+            if mode == "pool":
+                verified, _ = await hasher.verify_and_update("correct horse", hashed)
+            else:
+                verified = hasher.verify_sync("correct horse", hashed)
+            assert verified
+            latencies.append(time.perf_counter() - start)
+
+    stop = asyncio.Event()
+    lags = []
+    probe = asyncio.create_task(_probe_loop_lag(stop, 0.01, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "logins_per_second": logins / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "max_loop_lag_ms": max(lags, default=0.0) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--mode", choices=("pool", "inline", "both"), default="both")
+    args = parser.parse_args()
+
+    hasher = PasswordHasher(rounds=args.rounds, max_workers=args.workers, max_pending=args.logins)
+    hashed = hasher.hash_sync("correct horse")
+    modes = ("inline", "pool") if args.mode == "both" else (args.mode,)
+    for mode in modes:
+        result = asyncio.run(run(mode, args.logins, args.concurrency, hasher, hashed))
+        print(
+            f"{result['mode']:>6}: {result['logins_per_second']:8.1f} logins/s  "
+            f"p50 {result['p50_ms']:8.1f} ms  p99 {result['p99_ms']:8.1f} ms  "
+            f"max loop lag {result['max_loop_lag_ms']:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+from datetime import datetime, timedelta
+import asyncio
+import importlib
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+import os
+import sys
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+
+@compiles(UUID, "sqlite")
+def compile_uuid_sqlite(type_, compiler, **kw):  # pragma: no cover
+    return "BLOB"
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.analysis_queue import (
+    AnalysisWorker, claim_tasks, complete_task, enqueue_analysis, fail_task, job_status, requeue_stale
+)
+from app.models.database import Base
+from app.models.schemas import AnalysisJob, AnalysisTask, Watchlist
+from app.utils.config import settings
+
+
+def make_session():
+    # One shared connection so the worker's threads see the same in-memory database
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(
+        bind=engine, tables=[Watchlist.__table__, AnalysisJob.__table__, AnalysisTask.__table__]
+    )
+    return sessionmaker(bind=engine)
+
+
+def test_enqueue_prioritizes_watchlist_and_dedupes_active_markets():
+    db = make_session()()
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    db.add(Watchlist(user_id=uuid.uuid4(), market_ticker="B", expires_at=now + timedelta(hours=1)))
+    db.add(Watchlist(user_id=uuid.uuid4(), market_ticker="C", expires_at=now - timedelta(hours=1)))
+    db.commit()
+
+    first = enqueue_analysis(db, ["A", "C", "A"], now=now)
+    second = enqueue_analysis(db, ["A", "B"], now=now + timedelta(seconds=1))
+
+    assert db.query(AnalysisTask).filter(AnalysisTask.status == "queued").count() == 3
+    claimed = claim_tasks(db, "worker-1", 10, now=now + timedelta(seconds=2))
+    assert claimed[0].market_id == "B"
+    assert sorted(task.market_id for task in claimed[1:]) == ["A", "C"]
+    assert all(task.status == "running" and task.attempts == 1 for task in claimed)
+    assert claim_tasks(db, "worker-2", 10, now=now + timedelta(seconds=2)) == []
+
+    status = job_status(db, second.id)
+    assert status['total'] == 2
+    assert {m['market_id']: m['deduplicated'] for m in status['markets']} == {"A": True, "B": False}
+    assert status['counts']['running'] == 2
+    assert job_status(db, first.id)['total'] == 2
+
+
+
+def test_enqueue_follows_a_task_queued_by_a_concurrent_refresh():
+    SessionLocal = make_session()
+    engine = SessionLocal.kw["bind"]
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    db = SessionLocal()
+    job = AnalysisJob(created_at=now)
+    db.add(job)
+    db.commit()
+    winner_id = uuid.uuid4()
+    raced = []
+
+    # Another refresh queues "A" after this one has looked for active tasks but before it inserts
+    def race(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO analysis_tasks") and not raced:
+            raced.append(statement)
+            cursor.execute(
+                "INSERT INTO analysis_tasks (id, job_id, market_id, status, priority, attempts, max_attempts) "
+                "VALUES (?, ?, 'A', 'queued', 0, 0, 3)", (winner_id.hex, job.id.hex)
+            )
+
+    event.listen(engine, "before_cursor_execute", race)
+    try:
+        second = enqueue_analysis(db, ["A", "B"], priority=5, now=now)
+    finally:
+        event.remove(engine, "before_cursor_execute", race)
+    tasks = {task.market_id: task for task in db.query(AnalysisTask).filter_by(job_id=second.id)}
+    assert tasks["A"].status == "duplicate" and tasks["A"].duplicate_of == winner_id
+    assert tasks["B"].status == "queued"
+    assert db.get(AnalysisTask, winner_id).priority == 5
+
+    # The index itself refuses a second active task for a market
+    db.add(AnalysisTask(job_id=job.id, market_id="B", status="queued", created_at=now))
+    with pytest.raises(IntegrityError):
+        db.commit()
+
+
+def test_unique_index_migration_demotes_extra_active_tasks():
+    engine = make_session().kw["bind"]
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX idx_analysis_tasks_market_active"))
+        conn.execute(text("CREATE INDEX idx_analysis_tasks_market_active ON analysis_tasks (market_id)"))
+    db = sessionmaker(bind=engine)()
+    job = AnalysisJob(created_at=now)
+    db.add(job)
+    db.flush()
+    older = AnalysisTask(job_id=job.id, market_id="A", status="queued", created_at=now)
+    running = AnalysisTask(job_id=job.id, market_id="A", status="running", created_at=now + timedelta(seconds=1))
+    db.add_all([older, running])
+    db.commit()
+
+    importlib.import_module("app.models.migrations.0012_unique_active_analysis_task").upgrade(engine)
+
+    db.expire_all()
+    assert (running.status, older.status, older.duplicate_of) == ("running", "duplicate", running.id)
+    enqueue_analysis(db, ["A"], now=now)
+    assert db.query(AnalysisTask).filter(AnalysisTask.status.in_(["queued", "running"])).count() == 1
+
+def test_failed_tasks_back_off_then_fail_and_progress_is_reported():
+    db = make_session()()
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    job = enqueue_analysis(db, ["A", "B"], now=now)
+
+    tasks = {task.market_id: task for task in claim_tasks(db, "worker-1", 2, now=now)}
+    complete_task(db, tasks["B"].id, now=now)
+    assert fail_task(db, tasks["A"].id, "timeout", now=now) == "queued"
+
+    # Backoff keeps the retry out of reach until it is due
+    assert claim_tasks(db, "worker-1", 2, now=now) == []
+    later = now + timedelta(seconds=settings.ANALYSIS_RETRY_BACKOFF_SECONDS)
+    for attempt in range(2, settings.ANALYSIS_TASK_MAX_ATTEMPTS + 1):
+        retried = claim_tasks(db, "worker-1", 2, now=later)
+        assert [task.attempts for task in retried] == [attempt]
+        status = fail_task(db, retried[0].id, "timeout", now=later)
+        later += timedelta(days=1)
+    assert status == "failed"
+
+    report = job_status(db, job.id)
+    assert report['progress'] == 1.0
+    assert report['counts']['done'] == 1 and report['counts']['failed'] == 1
+    assert report['status'] == "done"
+
+
+def test_stale_leases_are_requeued():
+    db = make_session()()
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    enqueue_analysis(db, ["A"], now=now)
+    claim_tasks(db, "dead-worker", 1, now=now)
+
+    assert requeue_stale(db, now=now + timedelta(seconds=settings.ANALYSIS_TASK_LEASE_SECONDS - 1)) == 0
+    assert requeue_stale(db, now=now + timedelta(seconds=settings.ANALYSIS_TASK_LEASE_SECONDS + 1)) == 1
+    task = claim_tasks(db, "worker-2", 1, now=now + timedelta(hours=1))[0]
+    assert task.locked_by == "worker-2" and task.attempts == 2
+
+    # A lease that expires on the last attempt fails the task instead of queueing it again
+    later = now + timedelta(hours=2)
+    for _ in range(2, settings.ANALYSIS_TASK_MAX_ATTEMPTS):
+        assert requeue_stale(db, now=later) == 1
+        task = claim_tasks(db, "worker-2", 1, now=later)[0]
+        later += timedelta(hours=1)
+    assert task.attempts == settings.ANALYSIS_TASK_MAX_ATTEMPTS
+    assert requeue_stale(db, now=later) == 1
+    db.refresh(task)
+    assert task.status == "failed" and task.finished_at == later
+    assert claim_tasks(db, "worker-2", 1, now=later) == []
+
+
+def test_worker_runs_tasks_with_bounded_concurrency():
+    factory = make_session()
+    db = factory()
+    job = enqueue_analysis(db, [f"M{i}" for i in range(5)], force_refresh=True)
+    db.close()
+
+    active = []
+    peak = []
+    forced = set()
+
+    async def handler(market_id, user_id, force_refresh):
+        forced.add(force_refresh)
+        active.append(market_id)
+        peak.append(len(active))
+        await asyncio.sleep(0.01)
+        active.remove(market_id)
+        if market_id == "M0":
+            raise RuntimeError("boom")
+
+    async def run():
+        worker = AnalysisWorker(concurrency=2, session_factory=factory, handler=handler)
+        while await worker.run_once():
+            await worker.drain()
+
+    asyncio.run(run())
+    assert max(peak) == 2
+    assert forced == {True}
+
+    db = factory()
+    report = job_status(db, job.id)
+    assert report['counts']['done'] == 4
+    # The failed market is waiting out its backoff
+    assert report['counts']['queued'] == 1
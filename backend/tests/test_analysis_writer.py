@@ -0,0 +1,110 @@
+import uuid
+
+import pytest
+from sqlalchemy import BigInteger, create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+import os
+import sys
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+
+@compiles(UUID, "sqlite")
+def compile_uuid_sqlite(type_, compiler, **kw):  # pragma: no cover
+    return "BLOB"
+
+@compiles(BigInteger, "sqlite")
+def compile_bigint_sqlite(type_, compiler, **kw):  # pragma: no cover
+    # INTEGER PRIMARY KEY is sqlite's rowid, so BIGINT ids autoincrement as on Postgres
+    return "INTEGER"
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.analysis_writer import AnalysisResultWriter, pack_details
+from app.models.database import Base
+from app.models.schemas import AnalysisResult, Market, MarketOpportunity, MarketPrice
+
+
+def make_session():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=[
+        Market.__table__, MarketPrice.__table__, AnalysisResult.__table__, MarketOpportunity.__table__
+    ])
+    return engine, sessionmaker(bind=engine)
+
+
+def ensemble(prediction, indicator_length=10):
+    return {
+        'ensemble_prediction': prediction,
+        'confidence': 80,
+        'signal_classification': 'buy',
+        'dynamic_weights': {'statistical': 1.0},
+        'individual_results': {
+            'statistical': {
+                'score': prediction,
+                'confidence': 80,
+                'details': {'rsi': [50.0 + i % 7 for i in range(indicator_length)]},
+            },
+        },
+    }
+
+
+def test_large_details_are_compressed_and_read_back():
+    small = {'rsi': [1, 2, 3]}
+    assert pack_details(small, inline_bytes=1024) == {'details': small, 'details_blob': None}
+
+    large = {'rsi': [50.0 + i % 7 for i in range(2000)]}
+    packed = pack_details(large, inline_bytes=1024)
+    assert packed['details'] is None and len(packed['details_blob']) < 1024
+    assert AnalysisResult(**packed).payload == large
+    assert AnalysisResult(details=None).payload == {}
+
+
+def test_writer_batches_markets_into_one_insert_and_updates_ranking():
+    engine, factory = make_session()
+    db = factory()
+    markets = [Market(market_id=uuid.uuid4(), title=f"Market {i}", category="politics") for i in range(3)]
+    db.add_all(markets)
+    db.commit()
+
+    inserts = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_inserts(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO analysis_results"):
+            inserts.append(statement)
+
+    writer = AnalysisResultWriter(session_factory=factory, batch_size=6, flush_seconds=60)
+    writer.add(str(markets[0].market_id), ensemble(20, indicator_length=2000))
+    writer.add(str(markets[1].market_id), ensemble(30))
+    assert len(writer) == 4 and not writer.due()
+    writer.add(str(markets[2].market_id), ensemble(40))
+    assert writer.due()
+
+    assert writer.flush() == 6
+    assert len(writer) == 0 and len(inserts) <= 2
+    rows = db.query(AnalysisResult).filter(AnalysisResult.analyzer_type == 'statistical').all()
+    assert len(rows) == 3
+    assert sum(row.details_blob is not None for row in rows) == 1
+    assert all(len(row.payload['rsi']) in (10, 2000) for row in rows)
+    assert db.query(MarketOpportunity).count() == 3
+
+
+def test_failed_flush_keeps_rows_for_retry():
+    engine, factory = make_session()
+    db = factory()
+    market = Market(market_id=uuid.uuid4(), title="Rain", category="weather")
+    db.add(market)
+    db.commit()
+
+    writer = AnalysisResultWriter(session_factory=factory, batch_size=100, flush_seconds=0)
+    writer.add(str(market.market_id), ensemble(20))
+    AnalysisResult.__table__.drop(bind=engine)
+    with pytest.raises(Exception):
+        writer.flush()
+    assert len(writer) == 2
+
+    AnalysisResult.__table__.create(bind=engine)
+    assert writer.flush() == 2
+    assert db.query(AnalysisResult).count() == 2
+
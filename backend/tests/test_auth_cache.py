@@ -0,0 +1,56 @@
+from datetime import datetime
+import time
+import uuid
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.auth_cache import AuthCache, principal_from_user, token_id, user_from_principal
+from app.models.schemas import User
+
+
+def make_principal(user_id=None):
+    user = User(id=user_id or uuid.uuid4(), email="a@example.com", hashed_password="secret", risk_profile="moderate",
+                is_active=True, created_at=datetime(2024, 1, 1, 12), updated_at=datetime(2024, 1, 2, 12))
+    return principal_from_user(user)
+
+
+def test_principal_round_trip_leaves_out_credentials():
+    principal = make_principal()
+    assert "hashed_password" not in principal and "kalshi_private_key" not in principal
+    user = user_from_principal(principal)
+    assert isinstance(user.id, uuid.UUID) and str(user.id) == principal["id"]
+    assert user.created_at == datetime(2024, 1, 1, 12) and user.is_active
+    assert token_id({"jti": "abc"}, "token") == "abc"
+    assert token_id({}, "token") == token_id({}, "token") != token_id({}, "other")
+
+
+def test_cache_hits_expire_evict_and_invalidate_per_user():
+    cache = AuthCache(ttl_seconds=30, max_entries=3)
+    alice, bob = str(uuid.uuid4()), str(uuid.uuid4())
+    assert cache.get(alice, "t1") is None
+
+    cache.set(alice, "t1", make_principal(alice))
+    cache.set(alice, "t2", make_principal(alice))
+    cache.set(bob, "t1", make_principal(bob))
+    assert cache.get(alice, "t1")["id"] == alice
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Least recently used entry (alice t2) goes first
+    cache.set(bob, "t2", make_principal(bob))
+    assert cache.get(alice, "t2") is None
+    assert cache.get(alice, "t1") is not None
+
+    cache.invalidate_user(bob)
+    assert cache.get(bob, "t1") is None and cache.get(bob, "t2") is None
+    assert cache.get(alice, "t1") is not None
+
+    # Entries never outlive the token
+    cache.set(alice, "short", make_principal(alice), token_expires_at=time.time() + 0.05)
+    assert cache.get(alice, "short") is not None
+    time.sleep(0.06)
+    assert cache.get(alice, "short") is None
+    cache.set(alice, "expired", make_principal(alice), token_expires_at=time.time() - 1)
+    assert cache.get(alice, "expired") is None
@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+import os
+import sys
+import uuid
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+
+@compiles(UUID, "sqlite")
+def compile_uuid_sqlite(type_, compiler, **kw):  # pragma: no cover
+    return "BLOB"
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.backtest import (
+    BacktestConfig, PriceMatrix, load_price_archive, load_price_matrix, replay_market,
+    run_backtest, save_price_archive, SIGNALS
+)
+from app.models.database import Base
+from app.models.schemas import Market, MarketPrice
+
+
+def random_walk_matrix(bars=2000, markets=6, seed=0):
+    rng = np.random.default_rng(seed)
+    prices = np.clip(0.5 + np.cumsum(rng.normal(0, 0.01, (bars, markets)), axis=0), 0.02, 0.98)
+    prices[:100, 0] = np.nan  # listed late
+    return PriceMatrix(
+        market_ids=[f"m{i}" for i in range(markets)],
+        start=datetime(2024, 1, 1),
+        bar_seconds=300,
+        prices=prices
+    )
+
+
+@pytest.mark.parametrize("signal", ["momentum", "mean_reversion"])
+def test_signals_and_replay_never_look_ahead(signal):
+    prices = random_walk_matrix().prices[:, 1]
+    config = BacktestConfig(signal=signal, lookback=20, decision_interval=5).resolved()
+    decisions = np.ones(prices.size, dtype=bool)
+
+    full_score, full_confidence = SIGNALS[signal](prices, decisions, config)
+    full_pnl = replay_market(prices, config)['pnl']
+    for cut in (150, 777, 1500):
+        score, confidence = SIGNALS[signal](prices[:cut], decisions[:cut], config)
+        assert score == pytest.approx(full_score[:cut])
+        assert confidence == pytest.approx(full_confidence[:cut])
+        # Truncating the future leaves the P&L path up to the cut unchanged
+        assert replay_market(prices[:cut], config)['pnl'] == pytest.approx(full_pnl[:cut])
+
+
+def test_fill_model_charges_spread_fees_and_settles():
+    prices = np.full(60, 0.4)
+    config = BacktestConfig(
+        signal="momentum", lookback=5, decision_interval=1000, min_edge=0.0, min_confidence=0.0,
+        half_spread=0.01, impact_per_contract=0.0, fee_rate=0.07, params={}
+    ).resolved()
+    # Flat prices give no signal and no trades
+    flat = replay_market(prices, config)
+    assert flat['trades'] == 0 and np.all(flat['pnl'] == 0)
+
+    prices[:6] = [0.3, 0.33, 0.32, 0.36, 0.37, 0.4]  # rising into the one decision at bar 5
+    result = replay_market(prices, config, outcome=1.0)
+    assert result['trades'] == 1
+    contracts = result['contracts_traded']
+    entry_cost = contracts * (0.4 + 0.01) + 0.07 * contracts * 0.4 * 0.6
+    # Marked at the mid after the fill, settled at 1 at the end
+    assert result['pnl'][6] == pytest.approx(contracts * 0.4 - entry_cost)
+    assert result['pnl'][-1] == pytest.approx(contracts * 1.0 - entry_cost)
+
+
+def test_process_pool_matches_inline_and_report_metrics():
+    matrix = random_walk_matrix()
+    configs = [BacktestConfig(name="fast", lookback=12), BacktestConfig(name="slow", lookback=48)]
+
+    inline = run_backtest(matrix, configs, workers=1, chunk_markets=4)
+    pooled = run_backtest(matrix, configs, workers=2, chunk_markets=4)
+
+    for a, b in zip(inline, pooled):
+        assert a.pnl == pytest.approx(b.pnl)
+        assert a.per_market == b.per_market
+    report = inline[0]
+    assert report.total_pnl == pytest.approx(sum(stats['pnl'] for stats in report.per_market.values()))
+    assert report.max_drawdown == pytest.approx(np.max(np.maximum.accumulate(report.equity) - report.equity))
+    assert len(report.curve(points=100)) <= 200
+
+
+def test_price_matrix_from_database_and_archive(tmp_path):
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine, tables=[Market.__table__, MarketPrice.__table__])
+    db = sessionmaker(bind=engine)()
+    start = datetime(2024, 1, 1)
+    market = Market(market_id=uuid.uuid4(), title="A", category="sports")
+    db.add(market)
+    for i, (minutes, price) in enumerate([(1, 0.4), (3, 0.45), (12, 0.5), (31, 0.6)]):
+        db.add(MarketPrice(id=i + 1, market_id=market.market_id, price=price, timestamp=start + timedelta(minutes=minutes)))
+    db.commit()
+
+    matrix = load_price_matrix(db, start, start + timedelta(minutes=40), bar_seconds=600)
+    # Last price per 10 minute bar, carried forward across empty bars
+    assert matrix.market_ids == [str(market.market_id)]
+    assert matrix.prices[:, 0] == pytest.approx([0.45, 0.5, 0.5, 0.6])
+
+    path = str(tmp_path / "history.npz")
+    save_price_archive(matrix, path)
+    restored = load_price_archive(path)
+    assert restored.market_ids == matrix.market_ids
+    assert restored.start == matrix.start
+    assert restored.prices == pytest.approx(matrix.prices)
+
+
+def test_price_matrix_keeps_trailing_partial_bar():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine, tables=[Market.__table__, MarketPrice.__table__])
+    db = sessionmaker(bind=engine)()
+    start = datetime(2024, 1, 1)
+    market = Market(market_id=uuid.uuid4(), title="A", category="sports")
+    db.add(market)
+    for i, (seconds, price) in enumerate([(10, 0.4), (920, 0.55), (990, 0.7)]):
+        db.add(MarketPrice(id=i + 1, market_id=market.market_id, price=price, timestamp=start + timedelta(seconds=seconds)))
+    db.commit()
+
+    # 1000s is three full 300s bars plus a 100s partial one
+    matrix = load_price_matrix(db, start, start + timedelta(seconds=1000), bar_seconds=300)
+
+    assert matrix.prices[:, 0] == pytest.approx([0.4, 0.4, 0.4, 0.7])
@@ -0,0 +1,112 @@
+from datetime import datetime
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import os
+import sys
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+
+@compiles(UUID, "sqlite")
+def compile_uuid_sqlite(type_, compiler, **kw):  # pragma: no cover
+    return "BLOB"
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.catalog_sync import current_catalog_version, market_uuid, sync_catalog
+from app.models.database import Base
+from app.models.schemas import CatalogState, Market, MarketSeries
+
+
+class FakeCatalog:
+    def __init__(self, markets, series, fail_on_page=None):
+        self.markets = markets
+        self.series = series
+        self.fail_on_page = fail_on_page
+        self.requested = []
+
+    def _page(self, items, cursor, limit):
+        start = int(cursor or 0)
+        end = start + limit
+        return items[start:end], (str(end) if end < len(items) else None)
+
+    def get_markets_page(self, cursor=None, limit=1000, status=None):
+        self.requested.append(cursor)
+        if self.fail_on_page is not None and len(self.requested) == self.fail_on_page:
+            raise RuntimeError("upstream timeout")
+        markets, next_cursor = self._page(self.markets, cursor, limit)
+        return {'markets': markets, 'cursor': next_cursor}
+
+    def get_series_page(self, cursor=None, limit=1000):
+        series, next_cursor = self._page(self.series, cursor, limit)
+        return {'series': series, 'cursor': next_cursor}
+
+
+def market(i, status="open", updated_at="2024-01-01T00:00:00Z"):
+    return {
+        'id': str(uuid.UUID(int=i)),
+        'ticker': f"MKT-{i}",
+        'series_ticker': "SER",
+        'title': f"Market {i}",
+        'category': "politics",
+        'status': status,
+        'updated_at': updated_at,
+    }
+
+
+def make_session():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(
+        bind=engine, tables=[Market.__table__, MarketSeries.__table__, CatalogState.__table__]
+    )
+    return sessionmaker(bind=engine)()
+
+
+def test_sync_upserts_only_changed_markets_and_bumps_version():
+    db = make_session()
+    series = [{'ticker': "SER", 'title': "Series", 'category': "politics"}]
+    markets = [market(i) for i in range(5)]
+
+    result = sync_catalog(db, FakeCatalog(markets, series), page_size=2, now=datetime(2024, 1, 1))
+    assert (result.version, result.markets_seen, result.markets_changed, result.series_changed) == (1, 5, 5, 1)
+    assert db.query(Market).count() == 5
+    assert db.get(MarketSeries, "SER").catalog_version == 1
+
+    unchanged = sync_catalog(db, FakeCatalog(markets, series), page_size=2, now=datetime(2024, 1, 2))
+    assert (unchanged.version, unchanged.markets_changed, unchanged.series_changed) == (1, 0, 0)
+
+    markets[3] = market(3, status="closed", updated_at="2024-01-03T00:00:00Z")
+    markets.append(market(9))
+    changed = sync_catalog(db, FakeCatalog(markets, series), page_size=2, now=datetime(2024, 1, 3))
+    assert (changed.version, changed.markets_changed) == (2, 2)
+    assert current_catalog_version(db) == 2
+
+    db.expire_all()
+    closed = db.get(Market, market_uuid(markets[3]['id']))
+    assert closed.status == "closed" and closed.catalog_version == 2
+    assert closed.created_at == datetime(2024, 1, 1)
+    assert db.get(Market, market_uuid(markets[0]['id'])).catalog_version == 1
+
+
+def test_interrupted_crawl_resumes_from_saved_cursor():
+    db = make_session()
+    markets = [market(i) for i in range(6)]
+
+    with pytest.raises(RuntimeError):
+        sync_catalog(db, FakeCatalog(markets, [], fail_on_page=3), page_size=2)
+    assert db.query(Market).count() == 4
+    assert current_catalog_version(db) == 0
+
+    client = FakeCatalog(markets, [])
+    result = sync_catalog(db, client, page_size=2)
+    assert client.requested == ["4"]
+    assert result.version == 1
+    assert db.query(Market).count() == 6
+    assert {row.catalog_version for row in db.query(Market)} == {1}
+
+
+def test_ticker_ids_map_to_stable_uuids():
+    assert market_uuid("PRES-2024") == market_uuid("PRES-2024")
+    assert market_uuid(str(uuid.UUID(int=7))) == uuid.UUID(int=7)
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.correlation import CorrelationEngine
+
+
+def simulate_prices(bars, markets, seed=3):
+    rng = np.random.default_rng(seed)
+    common = rng.normal(0, 0.01, bars)
+    changes = np.column_stack([
+        common * loading + rng.normal(0, 0.01, bars)
+        for loading in np.linspace(-1.5, 1.5, markets)
+    ])
+    changes[:, -1] = 0.0  # one market never moves
+    return 0.5 + np.cumsum(changes, axis=0)
+
+
+def test_incremental_correlations_match_window_recompute():
+    engine = CorrelationEngine(bar_seconds=60, window=40, shrinkage_bars=0)
+    prices = simulate_prices(100, 6)
+    ids = [f"M{i}" for i in range(6)]
+    start = datetime(2024, 1, 1)
+
+    for bar, row in enumerate(prices):
+        for market_id, price in zip(ids, row):
+            engine.update_price(market_id, price, start + timedelta(seconds=60 * bar + 5))
+    engine.update_price(ids[0], prices[-1, 0], start + timedelta(seconds=60 * len(prices) + 5))
+
+    expected = np.corrcoef(np.diff(prices, axis=0)[-40:, :5].T)
+    matrix = engine.correlation_matrix(ids)
+
+    np.testing.assert_allclose(matrix[:5, :5], expected, atol=1e-9)
+    assert matrix[5, :5] == pytest.approx(np.zeros(5))
+    assert engine.correlations_to("M0", ids[1:3]) == pytest.approx(expected[0, 1:3])
+
+
+def test_backfilled_market_aligns_with_live_bars_and_is_shrunk():
+    start = datetime(2024, 1, 1)
+    prices = simulate_prices(30, 3)
+    live = CorrelationEngine(bar_seconds=60, window=50, shrinkage_bars=10)
+    for bar, row in enumerate(prices):
+        live.update_price("A", row[0], start + timedelta(seconds=60 * bar + 1))
+        live.update_price("B", row[1], start + timedelta(seconds=60 * bar + 1))
+    live.update_price("A", prices[-1, 0], start + timedelta(seconds=60 * len(prices) + 1))
+
+    history = [(start + timedelta(seconds=60 * bar + 1), row[1]) for bar, row in enumerate(prices)]
+    backfilled = CorrelationEngine(bar_seconds=60, window=50, shrinkage_bars=10)
+    for bar, row in enumerate(prices):
+        backfilled.update_price("A", row[0], start + timedelta(seconds=60 * bar + 1))
+    backfilled.update_price("A", prices[-1, 0], start + timedelta(seconds=60 * len(prices) + 1))
+    backfilled.load_history("B", history)
+
+    assert backfilled.history_bars("B") == live.history_bars("B")
+    np.testing.assert_allclose(
+        backfilled.correlation_matrix(["A", "B"]), live.correlation_matrix(["A", "B"]), atol=1e-9
+    )
+    raw = CorrelationEngine(bar_seconds=60, window=50, shrinkage_bars=0)
+    for bar, row in enumerate(prices):
+        raw.update_price("A", row[0], start + timedelta(seconds=60 * bar + 1))
+        raw.update_price("B", row[1], start + timedelta(seconds=60 * bar + 1))
+    raw.update_price("A", prices[-1, 0], start + timedelta(seconds=60 * len(prices) + 1))
+    assert abs(live.correlation_matrix(["A", "B"])[0, 1]) < abs(raw.correlation_matrix(["A", "B"])[0, 1])
@@ -0,0 +1,52 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.models.database import async_database_url, pool_options, timed_pool
+from app.utils.config import settings
+
+
+def test_async_url_and_pool_options():
+    assert async_database_url("postgresql://u:p@db:5432/kalshi") == "postgresql+asyncpg://u:p@db:5432/kalshi"
+    assert async_database_url("postgresql+psycopg2://u:p@db/kalshi") == "postgresql+asyncpg://u:p@db/kalshi"
+    assert async_database_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+
+    assert pool_options("sqlite:///:memory:", QueuePool) == {}
+    options = pool_options("postgresql://u:p@db/kalshi", QueuePool)
+    assert options["pool_size"] == settings.DB_POOL_SIZE
+    assert options["max_overflow"] == settings.DB_MAX_OVERFLOW
+    assert options["pool_pre_ping"] is settings.DB_POOL_PRE_PING
+
+
+def test_timed_pool_records_waits_and_timeouts(tmp_path):
+    poolclass = timed_pool(QueuePool)
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=poolclass,
+                           pool_size=1, max_overflow=0, pool_timeout=0.2)
+    held = engine.connect()
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+
+    def release():
+        time.sleep(0.1)
+        held.close()
+
+    threading.Thread(target=release).start()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        stats = poolclass.metrics.snapshot(engine.pool)
+        assert stats["checked_out"] == 1 and stats["size"] == 1
+
+    stats = poolclass.metrics.snapshot(engine.pool)
+    assert stats["checkouts"] == 3 and stats["timeouts"] == 1
+    assert stats["wait_seconds_max"] >= 0.15
+    assert stats["checked_out"] == 0
+    # Each pool class keeps its own numbers
+    assert timed_pool(QueuePool).metrics.checkouts == 0
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+import os
+import sys
+
+import numpy as np
+import pytest
+from sqlalchemy import BigInteger
+from sqlalchemy.ext.compiler import compiles
+
+@compiles(BigInteger, "sqlite")
+def compile_bigint_sqlite(type_, compiler, **kw):  # pragma: no cover
+    # INTEGER PRIMARY KEY is sqlite's rowid, so BIGINT ids autoincrement as on Postgres
+    return "INTEGER"
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.equity_series import EquitySeries
+
+
+def test_buckets_roll_up_and_emit_closed_points():
+    series = EquitySeries()
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    for i, value in enumerate([100.0, 104.0, 98.0, 101.0]):
+        series.add(start + timedelta(seconds=20 * i), value)
+
+    minute = series.tiers["1m"]
+    assert len(minute.points) == 1
+    assert minute.points[0].timestamp == start
+    assert minute.points[0].total_value == 98.0
+    assert minute.points[0].high_value == 104.0
+    assert minute.points[0].low_value == 98.0
+    assert minute.open_bucket.total_value == 101.0
+
+    pending = series.drain_pending()
+    assert [row["tier"] for row in pending].count("raw") == 4
+    assert [row["tier"] for row in pending].count("1m") == 1
+    assert series.drain_pending() == []
+
+
+def test_incremental_stats_match_full_recompute():
+    series = EquitySeries()
+    start = datetime(2024, 1, 1)
+    rng = np.random.default_rng(7)
+    values = 1000 * np.cumprod(1 + rng.normal(0.001, 0.01, 200))
+    for i, value in enumerate(values):
+        series.add(start + timedelta(days=i), float(value))
+
+    daily = series.tiers["1d"]
+    closed = values[:-1]
+    returns = np.diff(closed) / closed[:-1]
+    expected_sharpe = (returns.mean() - 0.02 / 252) / returns.std() * np.sqrt(252)
+    assert daily.sharpe_ratio() == pytest.approx(expected_sharpe)
+    assert daily.volatility() == pytest.approx(returns.std() * np.sqrt(252))
+
+
+def test_performance_reads_from_tier_covering_period():
+    series = EquitySeries()
+    now = datetime(2024, 6, 1)
+    for i in range(400):
+        series.add(now - timedelta(days=399 - i), 1000.0 + i)
+
+    performance = series.performance(365, now=now)
+
+    assert performance["resolution"] == "1d"
+    assert performance["data_points"] == 365
+    assert performance["ending_value"] == 1399.0
+    assert series.tier_for(1).name == "raw"
+    assert series.tier_for(30).name == "1h"
+
+
+def test_flush_overwrites_buckets_that_already_exist(monkeypatch):
+    pytest.importorskip("kalshi")
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    import app.core.portfolio as portfolio_module
+    from app.models.database import Base
+    from app.models.schemas import PortfolioSnapshot
+
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine, tables=[PortfolioSnapshot.__table__])
+    SessionLocal = sessionmaker(bind=engine)
+    monkeypatch.setattr(portfolio_module, "SessionLocal", SessionLocal)
+
+    now = datetime.utcnow().replace(second=0, microsecond=0)  # both samples stay in one 1m bucket
+    db = SessionLocal()
+    db.add(PortfolioSnapshot(tier="raw", bucket_start=now, total_value=1))
+    db.commit()
+    db.close()
+
+    manager = portfolio_module.PortfolioManager()
+    manager._equity_series_loaded = True
+    manager.equity_series.add(now, 100.0)
+    manager.equity_series.add(now + timedelta(seconds=1), 101.0)
+
+    assert manager.flush_equity_snapshots() == 2
+    assert manager.equity_series.drain_pending() == []
+    db = SessionLocal()
+    try:
+        rows = db.query(PortfolioSnapshot).filter(PortfolioSnapshot.tier == "raw").order_by(
+            PortfolioSnapshot.bucket_start).all()
+        assert [float(row.total_value) for row in rows] == [100.0, 101.0]
+    finally:
+        db.close()
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+import threading
+import uuid
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+import os
+import sys
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+
+@compiles(UUID, "sqlite")
+def compile_uuid_sqlite(type_, compiler, **kw):  # pragma: no cover
+    return "BLOB"
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.market_search import MarketDocument, MarketSearchIndex
+from app.models.database import Base
+from app.models.schemas import Market, MarketPrice
+
+
+def build_index():
+    index = MarketSearchIndex()
+    index.upsert([
+        MarketDocument("m1", "Will the Democrats win the 2024 presidential election?", "politics", volume=500),
+        MarketDocument("m2", "Senate election: Republicans hold majority", "politics", volume=100),
+        MarketDocument("m3", "Will Bitcoin close above 100k?", "crypto", subtitle="Election day price"),
+        MarketDocument("m4", "Fed cuts rates in March", "economics"),
+    ])
+    return index
+
+
+def test_ranks_title_matches_and_supports_prefix_and_typos():
+    index = build_index()
+
+    assert [hit.document.market_id for hit in index.search("election")] == ["m1", "m2", "m3"]
+    assert [hit.document.market_id for hit in index.search("presidential elec")] == ["m1"]
+    assert [hit.document.market_id for hit in index.search("electoin")][:2] == ["m1", "m2"]
+    assert [hit.document.market_id for hit in index.search("election", category="Crypto")] == ["m3"]
+    assert index.search("election bitcoin fed") == []
+
+
+def test_upsert_and_remove_keep_postings_consistent():
+    index = build_index()
+    index.upsert([MarketDocument("m4", "Fed holds rates in March", "economics")])
+    assert index.search("cuts") == []
+    assert [hit.document.market_id for hit in index.search("holds")] == ["m4"]
+
+    index.remove(["m3"])
+    assert "bitcoin" not in index.postings
+    assert "bitcoin" not in index.sorted_terms
+    assert [hit.document.market_id for hit in index.search("election")] == ["m1", "m2"]
+
+
+def test_refresh_reads_only_new_markets_and_prices():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine, tables=[Market.__table__, MarketPrice.__table__])
+    db = sessionmaker(bind=engine)()
+    now = datetime(2024, 1, 1)
+    first = Market(market_id=uuid.uuid4(), title="Rain in Seattle tomorrow", category="weather",
+                   created_at=now, updated_at=now)
+    db.add(first)
+    db.add(MarketPrice(id=1, market_id=first.market_id, price=0.4, volume=10, timestamp=now))
+    db.add(MarketPrice(id=2, market_id=first.market_id, price=0.6, volume=20, timestamp=now))
+    db.commit()
+
+    index = MarketSearchIndex()
+    assert index.refresh(db) == 1
+    hit = index.search("seattle")[0]
+    assert hit.document.current_price == 0.6 and hit.document.volume == 20
+
+    later = now + timedelta(hours=1)
+    second = Market(market_id=uuid.uuid4(), title="Snow in Seattle this week", category="weather",
+                    created_at=later, updated_at=later)
+    db.add(second)
+    db.add(MarketPrice(id=3, market_id=first.market_id, price=0.7, volume=25, timestamp=later))
+    db.commit()
+
+    assert index.refresh(db) == 1
+    assert len(index) == 2
+    assert index.documents[str(first.market_id)].current_price == 0.7
+    assert [hit.document.market_id for hit in index.search("snow")] == [str(second.market_id)]
+
+
+def test_refreshes_run_one_at_a_time_without_blocking_search():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=[Market.__table__, MarketPrice.__table__])
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    now = datetime(2024, 1, 1)
+    db.add(Market(market_id=uuid.uuid4(), title="Rain in Seattle tomorrow", category="weather",
+                  created_at=now, updated_at=now))
+    db.commit()
+
+    index = build_index()
+    entered, release = threading.Event(), threading.Event()
+
+    class GatedSession:
+        """Holds the first refresh inside its database queries until released"""
+
+        def query(self, *entities):
+            entered.set()
+            release.wait(5)
+            return db.query(*entities)
+
+    results = {}
+    first = threading.Thread(target=lambda: results.setdefault("first", index.refresh(GatedSession())))
+    second = threading.Thread(target=lambda: results.setdefault("second", index.refresh(factory())))
+    first.start()
+    assert entered.wait(5)
+    second.start()
+    second.join(0.2)
+
+    # The second refresh waits for the first; searches are served meanwhile
+    assert second.is_alive()
+    assert [hit.document.market_id for hit in index.search("bitcoin")] == ["m3"]
+
+    release.set()
+    first.join(5)
+    second.join(5)
+    assert results == {"first": 1, "second": 0}
+    assert [hit.document.title for hit in index.search("seattle")] == ["Rain in Seattle tomorrow"]
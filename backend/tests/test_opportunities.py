@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+import uuid
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import os
+import sys
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+
+@compiles(UUID, "sqlite")
+def compile_uuid_sqlite(type_, compiler, **kw):  # pragma: no cover
+    return "BLOB"
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.opportunities import (
+    OpportunityPriceBuffer, record_opportunity, reprice_opportunities, score_opportunity, top_opportunities
+)
+from app.models.database import Base
+from app.models.schemas import Market, MarketOpportunity, MarketPrice
+
+
+def ensemble(prediction, confidence):
+    return {
+        'ensemble_prediction': prediction,
+        'confidence': confidence,
+        'signal_classification': 'buy' if prediction > 0 else 'sell',
+        'individual_results': {'statistical': {'score': prediction}},
+    }
+
+
+def test_score_uses_price_edge_when_price_is_known():
+    unpriced = score_opportunity(50, 80, None)
+    assert abs(unpriced['expected_value'] - 0.4) < 1e-9
+    cheap = score_opportunity(50, 80, 0.2)
+    rich = score_opportunity(50, 80, 0.8)
+    assert cheap['expected_value'] > rich['expected_value'] > 0
+    assert score_opportunity(-50, 80, 0.5)['expected_value'] < 0
+    assert cheap['recommendation'] == "Strong Buy"
+
+
+def test_ranking_is_maintained_on_analysis_and_price_ticks():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(
+        bind=engine, tables=[Market.__table__, MarketPrice.__table__, MarketOpportunity.__table__]
+    )
+    db = sessionmaker(bind=engine)()
+    now = datetime(2024, 1, 1, 12)
+    markets = [Market(market_id=uuid.uuid4(), title=f"Market {i}", category=category)
+               for i, category in enumerate(["politics", "politics", "crypto"])]
+    db.add_all(markets)
+    db.add(MarketPrice(id=1, market_id=markets[0].market_id, price=0.5, volume=10, timestamp=now))
+    db.commit()
+
+    record_opportunity(db, str(markets[0].market_id), ensemble(40, 80), now)
+    record_opportunity(db, str(markets[1].market_id), ensemble(60, 90), now)
+    record_opportunity(db, str(markets[2].market_id), ensemble(5, 95), now)
+    assert record_opportunity(db, str(uuid.uuid4()), ensemble(60, 90), now) is None
+    db.commit()
+
+    ranked = top_opportunities(db, now - timedelta(hours=6), min_confidence=60, min_prediction=10)
+    assert [row.market_id for row in ranked] == [markets[1].market_id, markets[0].market_id]
+    assert float(ranked[1].current_price) == 0.5
+    assert [row.market_id for row in top_opportunities(db, now - timedelta(hours=6), category="crypto")] \
+        == [markets[2].market_id]
+    assert top_opportunities(db, now + timedelta(minutes=1)) == []
+
+    # A tick that leaves little edge on the leader pushes it down the ranking
+    assert reprice_opportunities(db, {str(markets[1].market_id): (0.95, 500)}, now) == 1
+    db.expire_all()
+    ranked = top_opportunities(db, now - timedelta(hours=6), min_confidence=60, min_prediction=10)
+    assert [row.market_id for row in ranked] == [markets[0].market_id, markets[1].market_id]
+    assert ranked[1].volume == 500 and ranked[1].price_updated_at == now
+
+
+def test_price_buffer_drains_latest_tick_and_restores_failed_ones():
+    buffer = OpportunityPriceBuffer()
+    market_id = str(uuid.uuid4())
+    buffer.on_price_tick(market_id, 0.4, 10)
+    buffer.on_price_tick(market_id, 0.45, 12)
+    assert buffer.drain() == {market_id: (0.45, 12)}
+    assert buffer.drain() == {}
+
+    buffer.on_price_tick(market_id, 0.5, 15)
+    buffer.restore({market_id: (0.45, 12)})
+    assert buffer.drain() == {market_id: (0.5, 15)}
+    assert buffer.last(market_id) == (0.5, 15)
@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import os
+import sys
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+
+@compiles(UUID, "sqlite")
+def compile_uuid_sqlite(type_, compiler, **kw):  # pragma: no cover
+    return "BLOB"
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.models.database import Base
+from app.models.schemas import Market, Position, Trade
+from app.utils.pagination import decode_cursor, encode_cursor, keyset_page
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    created_at = datetime(2024, 1, 1, 12, 30, 15, 123456)
+    row_id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(created_at, row_id)) == (created_at, str(row_id))
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def seed_trades():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine, tables=[Market.__table__, Trade.__table__, Position.__table__])
+    db = sessionmaker(bind=engine)()
+    market = Market(market_id=uuid.uuid4(), title="Rain tomorrow", category="weather")
+    db.add(market)
+    start = datetime(2024, 1, 1)
+    for i in range(25):
+        trade = Trade(id=uuid.uuid4(), market_id=market.market_id, side="yes", count=1, price=Decimal("0.5"),
+                      status="filled", created_at=start + timedelta(minutes=i // 3))
+        db.add(trade)
+        if i % 2:
+            db.add(Position(trade_id=trade.id, unrealized_pnl=Decimal(i)))
+    db.commit()
+
+    return (
+        db.query(Trade, Market.title, Position.unrealized_pnl)
+        .join(Market, Trade.market_id == Market.market_id)
+        .outerjoin(Position, Position.trade_id == Trade.id)
+    )
+
+
+def test_keyset_pages_cover_every_trade_once_with_tied_timestamps():
+    query = seed_trades()
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        rows, cursor = keyset_page(query, Trade.created_at, Trade.id, 10, cursor, id_type=uuid.UUID)
+        pages += 1
+        seen.extend(rows)
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert len({trade.id for trade, _, _ in seen}) == 25
+    keys = [(trade.created_at, trade.id.bytes) for trade, _, _ in seen]
+    assert keys == sorted(keys, reverse=True)
+    assert sum(pnl is not None for _, _, pnl in seen) == 12
+    assert all(title == "Rain tomorrow" for _, title, _ in seen)
+
+
+def test_offset_skips_into_the_ordered_query_and_continues_by_cursor():
+    query = seed_trades()
+    everything, _ = keyset_page(query, Trade.created_at, Trade.id, 25, id_type=uuid.UUID)
+
+    rows, cursor = keyset_page(query, Trade.created_at, Trade.id, 10, id_type=uuid.UUID, offset=10)
+    assert [trade.id for trade, _, _ in rows] == [trade.id for trade, _, _ in everything[10:20]]
+    rows, cursor = keyset_page(query, Trade.created_at, Trade.id, 10, cursor, id_type=uuid.UUID, offset=10)
+    assert [trade.id for trade, _, _ in rows] == [trade.id for trade, _, _ in everything[20:]]
+    assert cursor is None
+
+
+def test_trade_history_endpoint_pages_through_an_async_session(tmp_path):
+    pytest.importorskip("kalshi")
+    pytest.importorskip("jwt")
+    pytest.importorskip("aiosqlite")
+    import asyncio
+    from types import SimpleNamespace
+
+    from fastapi import Response
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from app.api.endpoints import trading
+
+    url = f"sqlite:///{tmp_path / 'trades.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine, tables=[Market.__table__, Trade.__table__, Position.__table__])
+    db = sessionmaker(bind=engine)()
+    market = Market(market_id=uuid.uuid4(), title="Rain tomorrow", category="weather")
+    db.add(market)
+    for i in range(15):
+        db.add(Trade(id=uuid.uuid4(), market_id=market.market_id, side="yes", count=1, price=Decimal("0.5"),
+                     status="filled", created_at=datetime(2024, 1, 1) + timedelta(minutes=i)))
+    db.commit()
+    db.close()
+
+    async def pages():
+        async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+        seen, cursor = [], None
+        async with async_sessionmaker(async_engine)() as session:
+            while True:
+                response = Response()
+                seen.extend(await trading.get_trade_history(
+                    response, start_date=None, end_date=None, status=None, market_id=None, limit=10, offset=0,
+                    cursor=cursor, current_user=SimpleNamespace(id=None), db=session
+                ))
+                cursor = response.headers.get("X-Next-Cursor")
+                if cursor is None:
+                    break
+        await async_engine.dispose()
+        return seen
+
+    trades = asyncio.run(pages())
+    assert len({trade.trade_id for trade in trades}) == 15
+    assert all(trade.market_title == "Rain tomorrow" for trade in trades)
@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+import pytest
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.password_hashing import HashingOverloaded, PasswordHasher, hash_rounds
+
+
+def test_hash_verify_and_rehash_below_configured_cost():
+    old = PasswordHasher(rounds=4, max_workers=1)
+    current = PasswordHasher(rounds=5, max_workers=2)
+
+    async def run():
+        hashed = await old.hash("correct horse")
+        assert hash_rounds(hashed) == 4
+        assert await old.verify("correct horse", hashed)
+        assert not await old.verify("wrong", hashed)
+        assert not await old.verify("correct horse", "not-a-hash")
+
+        assert await old.verify_and_update("correct horse", hashed) == (True, None)
+        assert await current.verify_and_update("wrong", hashed) == (False, None)
+        verified, upgraded = await current.verify_and_update("correct horse", hashed)
+        assert verified and hash_rounds(upgraded) == 5
+        assert await current.verify("correct horse", upgraded)
+
+    asyncio.run(run())
+    # Passwords past bcrypt's 72 bytes verify on their first 72, as passlib hashed them
+    long_password = "x" * 80
+    assert old.verify_sync("x" * 72, old.hash_sync(long_password))
+    assert old.metrics()["completed"] == 5
+
+
+def test_pool_keeps_loop_responsive_and_rejects_past_queue_limit():
+    hasher = PasswordHasher(rounds=4, max_workers=1, max_pending=1)
+    slow_hash = hasher.hash_sync
+
+    def slow(password):
+        time.sleep(0.05)
+        return slow_hash(password)
+
+    hasher.hash_sync = slow
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        probe = asyncio.create_task(ticker())
+        first = asyncio.create_task(hasher.hash("a"))
+        second = asyncio.create_task(hasher.hash("b"))
+        await asyncio.sleep(0.01)
+        assert hasher.metrics()["running"] == 1 and hasher.metrics()["queued"] == 1
+        with pytest.raises(HashingOverloaded):
+            await hasher.hash("c")
+        await asyncio.gather(first, second)
+        probe.cancel()
+        return ticks
+
+    assert asyncio.run(run()) >= 5
+    metrics = hasher.metrics()
+    assert metrics["completed"] == 2 and metrics["rejected"] == 1
+    assert metrics["wait_seconds_max"] >= 0.03
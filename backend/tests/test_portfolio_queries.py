@@ -0,0 +1,121 @@
+from decimal import Decimal
+import asyncio
+import os
+import sys
+
+import pytest
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+
+@compiles(UUID, "sqlite")
+def compile_uuid_sqlite(type_, compiler, **kw):  # pragma: no cover
+    return "BLOB"
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.portfolio_queries import category_allocation, load_open_positions, market_categories
+from app.models.database import Base
+from app.models.schemas import DayState, Market, PortfolioSnapshot, Position, Trade
+
+
+def setup_db(position_count):
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine, tables=[
+        Market.__table__,
+        Trade.__table__,
+        Position.__table__,
+        PortfolioSnapshot.__table__,
+        DayState.__table__,
+    ])
+    SessionLocal = sessionmaker(bind=engine)
+
+    db = SessionLocal()
+    for i in range(position_count):
+        market = Market(title=f"Market {i}", category="sports" if i % 2 else "politics")
+        trade = Trade(market=market, side="yes", count=10, price=Decimal("0.5"), status="filled")
+        db.add(Position(trade=trade, current_value=Decimal("5"), unrealized_pnl=Decimal("0")))
+    db.commit()
+    db.close()
+    return engine, SessionLocal
+
+
+def count_queries(engine, fn):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return len(statements)
+
+
+def run_portfolio_refresh(SessionLocal):
+    db = SessionLocal()
+    try:
+        positions = load_open_positions(db)
+        titles = [position.trade.market.title for position in positions]
+        categories = market_categories(db, (position.trade.market_id for position in positions))
+        allocation = category_allocation(db)
+        return positions, titles, categories, allocation
+    finally:
+        db.close()
+
+
+def managers_on(monkeypatch, SessionLocal):
+    pytest.importorskip("kalshi")
+    import app.core.portfolio as portfolio_module
+    import app.core.risk_manager as risk_manager_module
+
+    for module in (portfolio_module, risk_manager_module):
+        monkeypatch.setattr(module, "SessionLocal", SessionLocal)
+    kalshi_client = portfolio_module.kalshi_client
+    monkeypatch.setattr(kalshi_client, "get_market_price", lambda market_id: {"price": 0.6})
+    monkeypatch.setattr(kalshi_client, "get_balance", lambda: {"cash_balance": 100, "total_balance": 100})
+    return portfolio_module.PortfolioManager(), risk_manager_module.RiskManager
+
+
+def refresh_managers(portfolio_manager, RiskManager):
+    positions = asyncio.run(portfolio_manager.update_positions())
+    risk_manager = RiskManager()  # loads positions and category exposures
+    allocation = portfolio_manager.get_portfolio_allocation()
+    return positions, risk_manager, allocation
+
+
+def test_refresh_query_count_does_not_grow_with_positions(monkeypatch):
+    counts = []
+    for position_count in (3, 60):
+        engine, SessionLocal = setup_db(position_count)
+        portfolio_manager, RiskManager = managers_on(monkeypatch, SessionLocal)
+        counts.append(count_queries(engine, lambda: refresh_managers(portfolio_manager, RiskManager)))
+
+    assert counts[0] == counts[1]
+
+
+def test_managers_value_and_group_every_position(monkeypatch):
+    _, SessionLocal = setup_db(5)
+    positions, risk_manager, allocation = refresh_managers(*managers_on(monkeypatch, SessionLocal))
+
+    assert len(positions) == 5
+    assert all(summary.current_value == pytest.approx(6.0) for summary in positions.values())
+    assert dict(risk_manager.category_exposures) == {"politics": 15.0, "sports": 10.0}
+    assert allocation["category_allocation"]["politics"]["positions"] == 3
+    assert allocation["category_allocation"]["cash"]["value"] == 100.0
+
+
+def test_category_allocation_totals():
+    _, SessionLocal = setup_db(5)
+    positions, titles, categories, allocation = run_portfolio_refresh(SessionLocal)
+
+    assert len(positions) == 5
+    assert len(set(categories.values())) == 2
+    assert allocation == {
+        "politics": {"value": 15.0, "positions": 3},
+        "sports": {"value": 10.0, "positions": 2},
+    }
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.position_book import PositionBook
+
+
+def test_price_tick_updates_only_affected_market():
+    book = PositionBook(capacity=2)
+    book.add_position("p1", "A", "yes", 10, 0.40)
+    book.add_position("p2", "A", "no", 5, 0.40)
+    book.add_position("p3", "B", "yes", 20, 0.50)
+    book.drain_dirty()
+
+    touched = book.apply_price("A", 0.60)
+
+    assert touched == 2
+    rows = {row["position_id"]: row for row in book.positions()}
+    assert rows["p1"]["unrealized_pnl"] == pytest.approx(2.0)
+    assert rows["p2"]["unrealized_pnl"] == pytest.approx(-1.0)
+    assert rows["p3"]["unrealized_pnl"] == pytest.approx(0.0)
+    assert book.unrealized_pnl == pytest.approx(1.0)
+    assert book.positions_value == pytest.approx(6.0 + 2.0 + 10.0)
+    assert book.winning_positions == 1
+    assert book.losing_positions == 1
+    assert {row["id"] for row in book.drain_dirty()} == {"p1", "p2"}
+    assert book.drain_dirty() == []
+
+
+def test_remove_position_reverses_aggregates():
+    book = PositionBook()
+    book.add_position("p1", "A", "yes", 10, 0.40, current_price=0.30)
+    book.add_position("p2", "B", "yes", 4, 0.50)
+
+    book.remove_position("p1")
+
+    assert len(book) == 1
+    assert book.markets() == ["B"]
+    assert book.unrealized_pnl == pytest.approx(0.0)
+    assert book.positions_value == pytest.approx(2.0)
+    assert book.losing_positions == 0
+
+
+def portfolio_manager_on_book(monkeypatch):
+    pytest.importorskip("kalshi")
+    from decimal import Decimal
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.dialects.postgresql import UUID
+    from sqlalchemy.ext.compiler import compiles
+    from sqlalchemy.orm import sessionmaker
+
+    @compiles(UUID, "sqlite")
+    def compile_uuid_sqlite(type_, compiler, **kw):  # pragma: no cover
+        return "BLOB"
+
+    import app.core.portfolio as portfolio_module
+    from app.models.database import Base
+    from app.models.schemas import Market, Position, Trade
+
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine, tables=[Market.__table__, Trade.__table__, Position.__table__])
+    SessionLocal = sessionmaker(bind=engine)
+    monkeypatch.setattr(portfolio_module, "SessionLocal", SessionLocal)
+
+    db = SessionLocal()
+    for title in ("Rain", "Snow"):
+        trade = Trade(market=Market(title=title, category="weather"), side="yes", count=10,
+                      price=Decimal("0.5"), status="filled")
+        db.add(Position(trade=trade, current_value=Decimal("5"), unrealized_pnl=Decimal("0")))
+    db.commit()
+
+    manager = portfolio_module.PortfolioManager()
+    manager._load_position_book(db)
+    positions = {position.trade.market.title: (position.id, str(position.trade.market_id))
+                 for position in db.query(Position).all()}
+    db.close()
+    return portfolio_module, manager, SessionLocal, positions
+
+
+def test_closed_position_leaves_the_book(monkeypatch):
+    portfolio_module, manager, SessionLocal, positions = portfolio_manager_on_book(monkeypatch)
+    monkeypatch.setattr(portfolio_module.kalshi_client, "get_market_price", lambda market_id: {"price": 0.6})
+    monkeypatch.setattr(portfolio_module.kalshi_client, "place_order", lambda **order: {"order_id": "o1"})
+    rain_id, _ = positions["Rain"]
+    snow_id, snow_market = positions["Snow"]
+    manager.on_price_tick(snow_market, 0.6)
+
+    result = asyncio.run(manager.close_position(rain_id))
+
+    assert result["close_price"] == 0.6
+    assert rain_id not in manager.position_book and snow_id in manager.position_book
+    assert manager.position_book.positions_value == pytest.approx(6.0)
+    assert manager.position_book.unrealized_pnl == pytest.approx(1.0)
+    assert [row["id"] for row in manager.position_book.drain_dirty()] == [snow_id]
+
+    # The position is closed in the database too, so a reload does not bring it back
+    db = SessionLocal()
+    try:
+        manager._load_position_book(db)
+    finally:
+        db.close()
+    assert rain_id not in manager.position_book and snow_id in manager.position_book
+    assert asyncio.run(manager.close_position(rain_id)) is None
+
+
+def test_reload_persists_pending_valuations_first(monkeypatch):
+    portfolio_module, manager, SessionLocal, positions = portfolio_manager_on_book(monkeypatch)
+    monkeypatch.setattr(portfolio_module.kalshi_client, "get_market_price", lambda market_id: {})
+    from app.models.schemas import Position
+
+    snow_id, snow_market = positions["Snow"]
+    manager.on_price_tick(snow_market, 0.9)
+    manager._book_loaded_at = None
+
+    asyncio.run(manager.update_positions())
+
+    db = SessionLocal()
+    try:
+        assert float(db.query(Position).filter(Position.id == snow_id).one().current_value) == pytest.approx(9.0)
+    finally:
+        db.close()
+    assert manager.position_book.positions_value == pytest.approx(14.0)
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import sys
+import threading
+
+from sqlalchemy import column, create_engine, insert, table, text
+from sqlalchemy.orm import sessionmaker
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.models.database import ReplicaRouter, replica_router
+
+
+def make_database(path, name):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE origin (name TEXT)"))
+        conn.execute(text("INSERT INTO origin VALUES (:name)"), {"name": name})
+    return engine
+
+
+def served_by(session):
+    try:
+        return session.execute(text("SELECT name FROM origin")).scalar()
+    finally:
+        session.close()
+
+
+def test_reads_go_to_replicas_until_lag_or_own_writes(tmp_path):
+    primary = make_database(tmp_path / "primary.db", "primary")
+    make_database(tmp_path / "replica.db", "replica")
+    lag = {"seconds": 0.0}
+    router = ReplicaRouter(primary, [f"sqlite:///{tmp_path / 'replica.db'}"], max_lag_seconds=5,
+                           lag_check_seconds=0, sticky_seconds=60, lag_probe=lambda engine: lag["seconds"])
+
+    assert served_by(router.read_session("alice")) == "replica"
+
+    router.mark_write("alice")
+    assert served_by(router.read_session("alice")) == "primary"
+    assert served_by(router.read_session("bob")) == "replica"
+    assert served_by(router.read_session(None)) == "replica"
+
+    lag["seconds"] = 30.0
+    assert served_by(router.read_session("bob")) == "primary"
+
+    def broken_probe(engine):
+        raise RuntimeError("replica down")
+
+    router.lag_probe = broken_probe
+    assert served_by(router.read_session("bob")) == "primary"
+
+
+def test_async_pick_probes_stale_lag_off_the_event_loop(tmp_path):
+    primary = make_database(tmp_path / "primary.db", "primary")
+    make_database(tmp_path / "replica.db", "replica")
+    probes = []
+
+    def probe(engine):
+        probes.append(threading.get_ident())
+        return 0.0
+
+    router = ReplicaRouter(primary, [f"sqlite:///{tmp_path / 'replica.db'}"], max_lag_seconds=5,
+                           lag_check_seconds=60, sticky_seconds=60, lag_probe=probe)
+
+    async def pick_twice():
+        return threading.get_ident(), await router.async_pick("alice"), await router.async_pick("alice")
+
+    loop_thread, first, second = asyncio.run(pick_twice())
+    assert first == second == 0
+    assert len(probes) == 1 and probes[0] != loop_thread
+
+    router.mark_write("alice")
+    assert asyncio.run(router.async_pick("alice")) is None
+
+
+def test_without_replicas_everything_reads_from_primary(tmp_path):
+    primary = make_database(tmp_path / "primary.db", "primary")
+    router = ReplicaRouter(primary, [])
+    assert router.pick("alice") is None
+    assert served_by(router.read_session()) == "primary"
+
+
+def test_committed_writes_mark_the_client_sticky(tmp_path):
+    primary = make_database(tmp_path / "primary.db", "primary")
+    db = sessionmaker(bind=primary)()
+    db.info["client_key"] = "carol"
+    db.execute(text("SELECT name FROM origin"))
+    db.commit()
+    assert not replica_router.is_sticky("carol")
+
+    db.execute(insert(table("origin", column("name"))).values(name="write"))
+    db.commit()
+    db.close()
+    assert replica_router.is_sticky("carol")
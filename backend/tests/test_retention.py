@@ -0,0 +1,153 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import uuid
+
+from sqlalchemy import BigInteger, create_engine, event
+from sqlalchemy.orm import sessionmaker
+import os
+import sys
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+
+@compiles(UUID, "sqlite")
+def compile_uuid_sqlite(type_, compiler, **kw):  # pragma: no cover
+    return "BLOB"
+
+@compiles(BigInteger, "sqlite")
+def compile_bigint_sqlite(type_, compiler, **kw):  # pragma: no cover
+    # INTEGER PRIMARY KEY is sqlite's rowid, so BIGINT ids autoincrement as on Postgres
+    return "INTEGER"
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.retention import apply_retention
+from app.models.database import Base
+from app.models.partitions import (
+    PARTITIONED_TABLES, create_partitions, expired_partitions, parse_partition_name, partition_name,
+    partition_ranges
+)
+from app.models.schemas import (
+    AnalysisResult, AnalysisResultDaily, DecisionReceipt, DecisionReceiptDaily, Market, MarketPrice,
+    MarketPriceDaily, SystemLog
+)
+
+
+def test_partition_names_round_trip_and_cover_ranges():
+    assert partition_name("market_prices", datetime(2024, 6, 1), "month") == "market_prices_p202406"
+    assert partition_name("system_logs", datetime(2024, 6, 9), "day") == "system_logs_p20240609"
+    assert parse_partition_name("market_prices", "market_prices_p202412", "month") == \
+        (datetime(2024, 12, 1), datetime(2025, 1, 1))
+    assert parse_partition_name("market_prices", "market_prices_old", "month") is None
+    assert parse_partition_name("market_prices", "market_prices_p2024061", "month") is None
+
+    ranges = partition_ranges(datetime(2024, 11, 15, 8), datetime(2025, 1, 2), "month")
+    assert [start.month for start, _ in ranges] == [11, 12, 1]
+    assert all(ranges[i][1] == ranges[i + 1][0] for i in range(len(ranges) - 1))
+
+    spec = PARTITIONED_TABLES[0]
+    names = ["market_prices_p202403", "market_prices_p202401", "market_prices_p202402", "other"]
+    assert [name for name, _, _ in expired_partitions(spec, names, datetime(2024, 3, 1))] == \
+        ["market_prices_p202401", "market_prices_p202402"]
+
+
+class RecordingConnection:
+    """Postgres connection double: answers the partition listing and records every other statement"""
+
+    def __init__(self, partitions):
+        self.partitions = partitions
+        self.statements = []
+
+    def execute(self, statement, parameters=None):
+        sql = str(statement)
+        if sql.startswith("SELECT child.relname"):
+            return [(name,) for name in self.partitions]
+        self.statements.append(sql.split(" (", 1)[0].split(" WHERE", 1)[0])
+
+
+def test_new_partitions_take_their_rows_from_the_default_partition():
+    spec = PARTITIONED_TABLES[3]  # system_logs, daily
+    conn = RecordingConnection(["system_logs_p20240601", "system_logs_default"])
+
+    assert create_partitions(conn, spec, datetime(2024, 6, 1, 12), datetime(2024, 6, 2, 12)) == 1
+    assert conn.statements == [
+        'ALTER TABLE "system_logs" DETACH PARTITION "system_logs_default"',
+        'CREATE TABLE "system_logs_p20240602" PARTITION OF "system_logs" FOR VALUES FROM',
+        'WITH moved AS',
+        'ALTER TABLE "system_logs" ATTACH PARTITION "system_logs_default" DEFAULT',
+    ]
+
+
+def make_retention_db():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine, tables=[
+        Market.__table__, MarketPrice.__table__, AnalysisResult.__table__, DecisionReceipt.__table__,
+        SystemLog.__table__, MarketPriceDaily.__table__, AnalysisResultDaily.__table__,
+        DecisionReceiptDaily.__table__,
+    ])
+    return engine, sessionmaker(bind=engine)()
+
+
+def test_retention_rolls_up_then_deletes_expired_days_on_plain_tables():
+    _, db = make_retention_db()
+    market = Market(market_id=uuid.uuid4(), title="Rain", category="weather")
+    user_id = uuid.uuid4()
+    db.add(market)
+    now = datetime(2024, 6, 1, 12)
+    old = now - timedelta(days=120)
+    for hour, price in enumerate([Decimal("0.40"), Decimal("0.60"), Decimal("0.50")]):
+        db.add(MarketPrice(market_id=market.market_id, price=price, volume=10 * hour,
+                           timestamp=old + timedelta(hours=hour)))
+        db.add(AnalysisResult(market_id=market.market_id, analyzer_type="ensemble", prediction=10 * hour,
+                              confidence=60, timestamp=old + timedelta(hours=hour)))
+        db.add(DecisionReceipt(user_id=user_id, market_ticker="RAIN", ts=old + timedelta(hours=hour),
+                               allowed=hour > 0, edge=Decimal("0.1")))
+        db.add(SystemLog(level="INFO", message="tick", timestamp=old + timedelta(hours=hour)))
+    db.add(MarketPrice(market_id=market.market_id, price=Decimal("0.55"), timestamp=now))
+    db.add(SystemLog(level="INFO", message="tick", timestamp=now))
+    db.commit()
+
+    removed = apply_retention(db, now=now, batch_size=2)
+    assert removed == {"market_prices": 3, "analysis_results": 3, "decision_receipts": 3, "system_logs": 3}
+    assert db.query(MarketPrice).count() == 1 and db.query(SystemLog).count() == 1
+
+    daily = db.query(MarketPriceDaily).one()
+    assert daily.day == old.date() and daily.samples == 3
+    assert (float(daily.low), float(daily.high), daily.volume) == (0.4, 0.6, 20)
+    analysis = db.query(AnalysisResultDaily).one()
+    assert analysis.results == 3 and float(analysis.average_prediction) == 10.0
+    decisions = db.query(DecisionReceiptDaily).one()
+    assert (decisions.receipts, decisions.allowed, decisions.day) == (3, 2, date(2024, 2, 2))
+
+    # Nothing left past retention; a second run is a no-op
+    assert apply_retention(db, now=now) == {
+        "market_prices": 0, "analysis_results": 0, "decision_receipts": 0, "system_logs": 0
+    }
+
+
+def test_interrupted_retention_does_not_shrink_the_rollup():
+    engine, db = make_retention_db()
+    market = Market(market_id=uuid.uuid4(), title="Rain", category="weather")
+    db.add(market)
+    now = datetime(2024, 6, 1, 12)
+    old = now - timedelta(days=120)
+    for hour in range(3):
+        db.add(MarketPrice(market_id=market.market_id, price=Decimal("0.5"), timestamp=old + timedelta(hours=hour)))
+    db.commit()
+
+    deletes = []
+
+    def fail_second_delete(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("DELETE FROM market_prices"):
+            deletes.append(statement)
+            if len(deletes) == 2:
+                raise RuntimeError("connection lost")
+
+    event.listen(engine, "before_cursor_execute", fail_second_delete)
+    try:
+        assert "market_prices" not in apply_retention(db, now=now, batch_size=2)
+    finally:
+        event.remove(engine, "before_cursor_execute", fail_second_delete)
+    assert db.query(MarketPrice).count() == 3
+
+    assert apply_retention(db, now=now, batch_size=2)["market_prices"] == 3
+    assert db.query(MarketPriceDaily).one().samples == 3
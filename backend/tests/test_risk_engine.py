@@ -1,8 +1,9 @@
 from datetime import datetime, timedelta
 from decimal import Decimal
+import importlib
 import uuid
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 import os
 import sys
@@ -16,10 +17,12 @@ def compile_uuid_sqlite(type_, compiler, **kw):  # pragma: no cover
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import app.core.risk_engine as risk_engine
-from app.core.risk_engine import risk_gate
+from app.core.exposure import backfill_exposure, market_exposure, open_position_count, rebuild_exposure
+from app.core.pnl_ledger import rebuild_day_totals, record_close, record_fill
+from app.core.risk_engine import _local_day, risk_gate, risk_gate_batch
 from app.models.database import Base
 from app.models.enums import DecisionReason, KillState
-from app.models.schemas import DayState, PNLLedger, Watchlist, WatchlistOverride
+from app.models.schemas import DayState, MarketExposure, PNLLedger, UserPositionState, Watchlist, WatchlistOverride
 from app.utils import config
 
 
@@ -30,6 +33,8 @@ def setup_db():
         PNLLedger.__table__,
         Watchlist.__table__,
         WatchlistOverride.__table__,
+        UserPositionState.__table__,
+        MarketExposure.__table__,
     ])
     SessionLocal = sessionmaker(bind=engine)
     return SessionLocal
@@ -45,25 +50,15 @@ def test_soft_hysteresis_triggers_after_second_tick(monkeypatch):
     db.add(
         DayState(
             user_id=user_id,
-            date_local=now.strftime("%Y-%m-%d"),
+            date_local=_local_day(now),
             start_equity=Decimal("1000"),
             realized_pnl_today=Decimal("0"),
             daily_spend=Decimal("0"),
         )
     )
-    db.add(
-        PNLLedger(
-            user_id=user_id,
-            market_ticker="TICK",
-            realized_pnl=Decimal("-25"),
-            opened_at=now,
-            closed_at=now,
-            qty=1,
-            entry_price=Decimal("10"),
-            exit_price=Decimal("0"),
-        )
-    )
     db.commit()
+    record_fill(db, user_id, "TICK", 25, Decimal("1"), now=now)
+    record_close(db, user_id, "TICK", 25, Decimal("0"), now=now)
 
     first = risk_gate(db, user_id, "TICK", "open", Decimal("10"), now)
     assert first.kill_state == KillState.NONE
@@ -84,25 +79,15 @@ def test_hard_kill_stops_opens(monkeypatch):
     db.add(
         DayState(
             user_id=user_id,
-            date_local=now.strftime("%Y-%m-%d"),
+            date_local=_local_day(now),
             start_equity=Decimal("1000"),
             realized_pnl_today=Decimal("0"),
             daily_spend=Decimal("0"),
         )
     )
-    db.add(
-        PNLLedger(
-            user_id=user_id,
-            market_ticker="TICK",
-            realized_pnl=Decimal("-40"),
-            opened_at=now,
-            closed_at=now,
-            qty=1,
-            entry_price=Decimal("10"),
-            exit_price=Decimal("0"),
-        )
-    )
     db.commit()
+    record_fill(db, user_id, "TICK", 40, Decimal("1"), now=now)
+    record_close(db, user_id, "TICK", 40, Decimal("0"), now=now)
 
     first = risk_gate(db, user_id, "TICK", "open", Decimal("10"), now)
     assert first.allow_new_open is False or first.kill_state in (KillState.NONE, KillState.HARD)
@@ -123,7 +108,7 @@ def test_daily_cap_blocks(monkeypatch):
     db.add(
         DayState(
             user_id=user_id,
-            date_local=now.strftime("%Y-%m-%d"),
+            date_local=_local_day(now),
             start_equity=Decimal("1000"),
             realized_pnl_today=Decimal("0"),
             daily_spend=Decimal("95"),
@@ -133,3 +118,197 @@ def test_daily_cap_blocks(monkeypatch):
     result = risk_gate(db, user_id, "TICK", "open", Decimal("10"), now)
     assert result.allow_new_open is False
     assert result.reason_code == DecisionReason.DAILY_CAP_REACHED.value
+
+
+def test_ledger_pipeline_keeps_day_totals():
+    SessionLocal = setup_db()
+    db = SessionLocal()
+    user_id = uuid.uuid4()
+    now = datetime.utcnow()
+
+    record_fill(db, user_id, "TICK", 10, Decimal("0.40"), now=now)
+    record_fill(db, user_id, "TICK", 5, Decimal("0.60"), now=now + timedelta(seconds=1))
+    closed = record_close(db, user_id, "TICK", 12, Decimal("0.70"), fees=Decimal("0.12"), now=now)
+
+    assert [entry.qty for entry in closed] == [10, 2]
+    day_state = db.query(DayState).filter(DayState.user_id == user_id).one()
+    assert day_state.daily_spend == Decimal("7.00")
+    assert day_state.realized_pnl_today == Decimal("3.08")
+    still_open = db.query(PNLLedger).filter(PNLLedger.closed_at.is_(None)).all()
+    assert [(entry.qty, entry.entry_price) for entry in still_open] == [(3, Decimal("0.6000"))]
+
+
+def test_batch_gate_matches_single_gate_with_constant_queries(monkeypatch):
+    monkeypatch.setattr(config.settings, "TRADING_MODE", "live")
+    monkeypatch.setattr(risk_engine, "_count_open_positions", lambda db, uid: 0)
+    SessionLocal = setup_db()
+    db = SessionLocal()
+    now = datetime.utcnow()
+    users = [uuid.uuid4() for _ in range(6)]
+    for i, user_id in enumerate(users):
+        db.add(
+            DayState(
+                user_id=user_id,
+                date_local=_local_day(now),
+                start_equity=Decimal("1000"),
+                realized_pnl_today=Decimal("0"),
+                daily_spend=Decimal("0"),
+            )
+        )
+        db.commit()
+        record_fill(db, user_id, "TICK", 35 if i % 2 else 5, Decimal("1"), now=now)
+    entries = [(user_id, ticker) for user_id in users for ticker in ("TICK", "OTHER")]
+
+    statements = []
+    engine = db.get_bind()
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    gates = risk_gate_batch(db, entries, "open", Decimal("10"), now)
+    event.remove(engine, "before_cursor_execute", listener)
+    db.commit()
+
+    assert len(statements) == 3
+    for user_id, ticker in entries:
+        single = risk_gate(db, user_id, ticker, "open", Decimal("10"), now)
+        assert gates[(user_id, ticker)].reason_code == single.reason_code
+        assert gates[(user_id, ticker)].effective_limits == single.effective_limits
+    assert gates[(users[1], "TICK")].reason_code == DecisionReason.PER_MARKET_CAP_REACHED.value
+    assert gates[(users[1], "OTHER")].reason_code == DecisionReason.ALLOWED.value
+
+
+def test_gate_writes_only_when_hysteresis_changes(monkeypatch):
+    monkeypatch.setattr(config.settings, "TRADING_MODE", "live")
+    monkeypatch.setattr(risk_engine, "_count_open_positions", lambda db, uid: 0)
+    SessionLocal = setup_db()
+    db = SessionLocal()
+    user_id = uuid.uuid4()
+    now = datetime.utcnow()
+    db.add(
+        DayState(
+            user_id=user_id,
+            date_local=_local_day(now),
+            start_equity=Decimal("1000"),
+            realized_pnl_today=Decimal("-25"),
+            daily_spend=Decimal("0"),
+        )
+    )
+    db.commit()
+
+    writes = []
+    engine = db.get_bind()
+    listener = lambda conn, cursor, statement, *args: statement.startswith(("UPDATE", "INSERT")) and writes.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    for seconds in (0, 10, 20, 30):
+        risk_gate(db, user_id, "TICK", "heartbeat", Decimal("0"), now + timedelta(seconds=seconds))
+    assert len(writes) == 1  # first sighting of the soft breach
+
+    result = risk_gate(db, user_id, "TICK", "open", Decimal("10"), now + timedelta(seconds=61))
+    assert result.kill_state == KillState.SOFT
+    assert len(writes) == 2
+
+    risk_gate(db, user_id, "TICK", "open", Decimal("10"), now + timedelta(seconds=90))
+    event.remove(engine, "before_cursor_execute", listener)
+
+    assert len(writes) == 2
+    day_state = db.query(DayState).filter(DayState.user_id == user_id).one()
+    assert day_state.kill_state == KillState.SOFT.value
+    assert day_state.soft_breach_at is not None
+
+
+def test_exposure_index_tracks_opens_and_closes():
+    SessionLocal = setup_db()
+    db = SessionLocal()
+    user_id = uuid.uuid4()
+    now = datetime.utcnow()
+
+    record_fill(db, user_id, "A", 10, Decimal("0.50"), now=now)
+    record_fill(db, user_id, "A", 10, Decimal("0.30"), now=now)
+    record_fill(db, user_id, "B", 4, Decimal("0.25"), now=now)
+    assert open_position_count(db, user_id) == 2
+    assert market_exposure(db, user_id, "A") == Decimal("8.00")
+
+    record_close(db, user_id, "A", 15, Decimal("0.60"), now=now)
+    assert open_position_count(db, user_id) == 2
+    assert market_exposure(db, user_id, "A") == Decimal("1.50")
+
+    record_close(db, user_id, "A", 5, Decimal("0.60"), now=now)
+    record_close(db, user_id, "B", 4, Decimal("0.10"), now=now)
+    assert open_position_count(db, user_id) == 0
+    assert market_exposure(db, user_id, "A") == Decimal("0")
+
+    record_fill(db, user_id, "C", 2, Decimal("0.50"), now=now)
+    db.query(UserPositionState).delete()
+    db.commit()
+    rebuild_exposure(db, user_id, now)
+    assert open_position_count(db, user_id) == 1
+    assert market_exposure(db, user_id, "C") == Decimal("1.00")
+
+
+def test_day_totals_are_seeded_and_reconciled_from_the_ledger():
+    SessionLocal = setup_db()
+    db = SessionLocal()
+    user_id = uuid.uuid4()
+    now = datetime.utcnow()
+
+    # Ledger rows written before the DayState row exists, e.g. before a deploy
+    db.add_all([
+        PNLLedger(user_id=user_id, market_ticker="TICK", opened_at=now, qty=10,
+                  entry_price=Decimal("0.40"), fees=Decimal("0")),
+        PNLLedger(user_id=user_id, market_ticker="TICK", opened_at=now, closed_at=now, qty=5,
+                  entry_price=Decimal("0.60"), exit_price=Decimal("0.20"), fees=Decimal("0"),
+                  realized_pnl=Decimal("-2.00")),
+    ])
+    db.commit()
+
+    record_close(db, user_id, "TICK", 10, Decimal("0.10"), now=now)
+    day_state = db.query(DayState).filter(DayState.user_id == user_id).one()
+    assert day_state.realized_pnl_today == Decimal("-5.00")
+    assert day_state.daily_spend == Decimal("7.00")
+
+    # A write that bypasses the pipeline is corrected by the reconcile pass
+    day_state.realized_pnl_today = Decimal("0")
+    db.commit()
+    assert rebuild_day_totals(db, now=now) == 1
+    assert db.query(DayState).one().realized_pnl_today == Decimal("-5.00")
+    assert rebuild_day_totals(db, [user_id], now=now) == 0
+
+
+def test_batch_gate_seeds_missing_day_state(monkeypatch):
+    monkeypatch.setattr(config.settings, "TRADING_MODE", "live")
+    SessionLocal = setup_db()
+    db = SessionLocal()
+    user_id = uuid.uuid4()
+    now = datetime.utcnow()
+    db.add(PNLLedger(user_id=user_id, market_ticker="TICK", opened_at=now, closed_at=now, qty=100,
+                     entry_price=Decimal("1"), exit_price=Decimal("0"), fees=Decimal("0"),
+                     realized_pnl=Decimal("-400")))
+    db.commit()
+
+    gates = risk_gate_batch(db, [(user_id, "TICK")], "heartbeat", Decimal("0"), now)
+
+    assert db.query(DayState).one().realized_pnl_today == Decimal("-400")
+    assert gates[(user_id, "TICK")].kill_state == KillState.NONE
+
+
+def test_exposure_migration_backfills_existing_positions():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine, tables=[PNLLedger.__table__])
+    db = sessionmaker(bind=engine)()
+    user_id, flat_user_id = uuid.uuid4(), uuid.uuid4()
+    now = datetime.utcnow()
+    db.add_all([
+        PNLLedger(user_id=user_id, market_ticker="A", opened_at=now, qty=10, entry_price=Decimal("0.40"),
+                  fees=Decimal("0")),
+        PNLLedger(user_id=user_id, market_ticker="B", opened_at=now, qty=4, entry_price=Decimal("0.25"),
+                  fees=Decimal("0")),
+        PNLLedger(user_id=flat_user_id, market_ticker="A", opened_at=now, closed_at=now, qty=3,
+                  entry_price=Decimal("0.50"), exit_price=Decimal("0.60"), fees=Decimal("0")),
+    ])
+    db.commit()
+
+    importlib.import_module("app.models.migrations.0005_exposure_index").upgrade(engine)
+
+    assert open_position_count(db, user_id) == 2
+    assert market_exposure(db, user_id, "A") == Decimal("4.00")
+    assert open_position_count(db, flat_user_id) == 0
+    assert backfill_exposure(db) == 0  # already indexed users are left alone
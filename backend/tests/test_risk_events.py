@@ -0,0 +1,195 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+
+@compiles(UUID, "sqlite")
+def compile_uuid_sqlite(type_, compiler, **kw):  # pragma: no cover
+    return "BLOB"
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.risk_events import build_risk_alerts, run_risk_monitor
+from app.models.database import Base
+from app.models.schemas import Market, Position, Trade
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class RecordingManager:
+    """Risk manager double: every tick is 60s after the previous one and leaves a 12% drawdown"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.ticks = []
+        self.fills = []
+        self.reconciles = []
+
+    def apply_price_tick(self, market_id, price):
+        self.clock.now += 60
+        self.ticks.append((market_id, price))
+        return {'current_drawdown': 12.0}
+
+    def register_fill(self, **fill):
+        self.fills.append(fill)
+        return {'current_drawdown': 12.0}
+
+    def reconcile(self):
+        self.reconciles.append(self.clock.now)
+        return {'current_drawdown': 12.0}
+
+
+async def run_until(events, manager, broadcasts, done, clock=None, interval=180):
+    async def broadcast(alerts, risk_metrics, trigger):
+        broadcasts.append((trigger['type'] if trigger else 'reconcile', [alert['type'] for alert in alerts]))
+
+    task = asyncio.create_task(run_risk_monitor(
+        manager, broadcast, events=events, interval=interval, **({'clock': clock} if clock else {})
+    ))
+    try:
+        # Poll in real time: the idle-queue sweep waits on a real timeout, not on loop turns
+        deadline = time.monotonic() + 5
+        while not done() and time.monotonic() < deadline:
+            await asyncio.sleep(0.001)
+        assert done()
+        for _ in range(5):
+            await asyncio.sleep(0)
+    finally:
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+
+def test_reconcile_runs_on_schedule_under_constant_tick_traffic():
+    async def scenario():
+        clock = FakeClock()
+        manager = RecordingManager(clock)
+        events = asyncio.Queue()
+        for _ in range(10):
+            events.put_nowait({'type': 'price', 'market_id': 'RAIN', 'data': {'price': 0.4}})
+        broadcasts = []
+        await run_until(events, manager, broadcasts, lambda: len(manager.ticks) == 10, clock=clock)
+        return manager, broadcasts
+
+    manager, broadcasts = asyncio.run(scenario())
+
+    # Ticks every 60s never let the queue go idle for the 180s interval
+    assert manager.reconciles == [180, 360, 540]
+    # Ticks notify only when the alert set changes; each sweep re-sends the active alerts
+    assert broadcasts == [('price', ['drawdown_warning'])] + [('reconcile', ['drawdown_warning'])] * 3
+
+
+def test_idle_queue_reconciles_and_fills_are_registered():
+    async def scenario():
+        manager = RecordingManager(FakeClock())
+        events = asyncio.Queue()
+        events.put_nowait({'type': 'fill', 'market_id': 'RAIN',
+                           'data': {'position_id': 7, 'side': 'no', 'count': '3', 'price': '0.25'}})
+        events.put_nowait({'type': 'price', 'market_id': 'RAIN', 'data': {}})
+        broadcasts = []
+        await run_until(events, manager, broadcasts, lambda: len(manager.reconciles) >= 2, interval=0.01)
+        return manager, broadcasts
+
+    manager, broadcasts = asyncio.run(scenario())
+
+    assert manager.fills == [{'position_id': 7, 'market_id': 'RAIN', 'side': 'no', 'count': 3,
+                              'price': 0.25, 'category': None}]
+    assert manager.ticks == []
+    assert broadcasts[0] == ('fill', ['drawdown_warning'])
+    assert broadcasts[1:] and all(kind == 'reconcile' for kind, _ in broadcasts[1:])
+
+
+def test_alerts_follow_risk_metrics():
+    assert build_risk_alerts({'current_drawdown': 5.0, 'daily_pnl': 0.0, 'portfolio_value': 1000}) == []
+    alerts = build_risk_alerts({'current_drawdown': 16.0, 'daily_pnl': -30.0, 'portfolio_value': 1000,
+                                'emergency_stop_active': True})
+    assert [(alert['type'], alert['severity']) for alert in alerts] == [
+        ('drawdown_warning', 'high'), ('daily_loss_warning', 'high'), ('emergency_stop_active', 'critical')
+    ]
+
+
+def risk_manager_on_empty_book(monkeypatch):
+    pytest.importorskip("kalshi")
+    import app.core.risk_manager as risk_manager_module
+
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine, tables=[Market.__table__, Trade.__table__, Position.__table__])
+    monkeypatch.setattr(risk_manager_module, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(risk_manager_module.kalshi_client, "get_balance", lambda: {'total_balance': 1000})
+    return risk_manager_module.RiskManager()
+
+
+def test_fill_then_ticks_revalue_only_that_market(monkeypatch):
+    manager = risk_manager_on_empty_book(monkeypatch)
+    assert manager.portfolio_value == 1000
+
+    manager.register_fill(position_id=1, market_id="RAIN", side="yes", count=100, price=0.5, category="weather")
+    metrics = manager.register_fill(position_id=2, market_id="SNOW", side="no", count=100, price=0.2,
+                                    category="weather")
+    assert metrics['total_positions'] == 2
+    assert metrics['category_exposures'] == {'weather': pytest.approx(130.0)}
+
+    metrics = manager.apply_price_tick("RAIN", 0.3)
+    assert manager.current_positions[1]['unrealized_pnl'] == pytest.approx(-20.0)
+    assert manager.current_positions[2]['unrealized_pnl'] == 0.0
+    assert metrics['portfolio_value'] == pytest.approx(980.0)
+    assert metrics['current_drawdown'] == pytest.approx(2.0)
+    assert metrics['category_exposures'] == {'weather': pytest.approx(110.0)}
+
+    # A 'no' position gains as the price falls; repeated ticks apply deltas, not totals
+    manager.apply_price_tick("SNOW", 0.1)
+    metrics = manager.apply_price_tick("SNOW", 0.1)
+    assert manager.current_positions[2]['unrealized_pnl'] == pytest.approx(10.0)
+    assert metrics['portfolio_value'] == pytest.approx(990.0)
+    assert metrics['category_exposures'] == {'weather': pytest.approx(120.0)}
+
+
+def test_tick_for_unheld_market_leaves_book_unchanged(monkeypatch):
+    manager = risk_manager_on_empty_book(monkeypatch)
+    before = manager.apply_price_tick(str(uuid.uuid4()), 0.9)
+    assert before['portfolio_value'] == 1000 and before['total_positions'] == 0
+    assert before['category_exposures'] == {}
+
+
+def test_simulation_in_a_worker_thread_runs_against_a_changing_book(monkeypatch):
+    manager = risk_manager_on_empty_book(monkeypatch)
+    manager.risk_simulator.scenarios = 200
+    failures = []
+    stop = threading.Event()
+
+    def simulate():
+        while not stop.is_set():
+            if not manager.simulate_portfolio_risk():
+                failures.append("simulation failed")
+
+    # Switch threads often so the worker is interrupted mid-iteration
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    worker = threading.Thread(target=simulate)
+    worker.start()
+    try:
+        # Fills and ticks arrive on the event loop while the worker iterates the book
+        for i in range(2000):
+            manager.register_fill(position_id=i, market_id=f"M{i % 150}", side="yes", count=10, price=0.5)
+            manager.apply_price_tick(f"M{i % 150}", 0.4)
+    finally:
+        stop.set()
+        worker.join()
+        sys.setswitchinterval(switch_interval)
+
+    assert failures == []
+    assert manager.simulate_portfolio_risk()['markets'] == 150
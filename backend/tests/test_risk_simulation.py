@@ -0,0 +1,76 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.risk_simulation import RiskSimulator
+
+
+def test_independent_markets_match_binomial_tail():
+    simulator = RiskSimulator(scenarios=200_000, chunk_size=30_000, confidence=0.95, seed=11)
+    n = 10
+    p_yes = np.full(n, 0.5)
+    result = simulator.simulate(p_yes, np.ones(n), -np.ones(n), np.eye(n))
+
+    # Sum of 10 fair +/-1 bets: P(loss >= 4) = P(yes <= 3) ~= 0.172, P(loss >= 6) ~= 0.055
+    assert result.expected_pnl == pytest.approx(0.0, abs=0.02)
+    assert result.var == pytest.approx(6.0)
+    assert result.probability_of_loss == pytest.approx(386 / 1024, abs=0.005)
+
+
+def test_perfect_correlation_settles_together_and_chunking_is_invisible():
+    n = 4
+    correlation = np.ones((n, n))
+    args = (np.full(n, 0.3), np.full(n, 7.0), np.full(n, -3.0), correlation)
+
+    chunked = RiskSimulator(scenarios=50_000, chunk_size=7_000, seed=5)
+    whole = RiskSimulator(scenarios=50_000, chunk_size=50_000, seed=5)
+    pnl_chunked, _ = chunked._scenario_pnl(*args)
+    pnl_whole, _ = whole._scenario_pnl(*args)
+
+    # The clipped eigen-decomposition of a singular matrix leaves only tiny noise
+    assert np.isin(pnl_chunked, [28.0, -12.0]).mean() > 0.999
+    assert (pnl_chunked == 28.0).mean() == pytest.approx(0.3, abs=0.01)
+    np.testing.assert_allclose(pnl_chunked, pnl_whole)
+
+
+def test_trade_impact_uses_common_random_numbers():
+    simulator = RiskSimulator(scenarios=20_000, seed=2)
+    correlation = np.ones((2, 2))
+    p_yes = np.array([0.4, 0.4])
+    pnl_yes = np.array([6.0, 0.0])
+    pnl_no = np.array([-4.0, 0.0])
+
+    hedge = simulator.trade_impact(p_yes, pnl_yes, pnl_no, correlation,
+                                   np.array([0.0, -4.0]), np.array([0.0, 6.0]))
+    doubling = simulator.trade_impact(p_yes, pnl_yes, pnl_no, correlation,
+                                      np.array([0.0, 6.0]), np.array([0.0, -4.0]))
+    nothing = simulator.trade_impact(p_yes, pnl_yes, pnl_no, correlation, np.zeros(2), np.zeros(2))
+
+    assert hedge["cvar_delta"] < 0 < doubling["cvar_delta"]
+    assert nothing["cvar_delta"] == 0.0
+
+
+def test_batch_trade_impact_scores_every_trade_on_one_draw():
+    simulator = RiskSimulator(scenarios=20_000, seed=2)
+    correlation = np.ones((2, 2))
+    p_yes = np.array([0.4, 0.4])
+    pnl_yes = np.array([6.0, 0.0])
+    pnl_no = np.array([-4.0, 0.0])
+
+    impact = simulator.trades_impact(
+        p_yes, pnl_yes, pnl_no, correlation,
+        trade_index=[1, 1, 1, 0], trade_p_yes=[0.4, 0.4, 0.4, 0.4],
+        trade_delta_yes=[-4.0, 6.0, 0.0, 6.0], trade_delta_no=[6.0, -4.0, 0.0, -4.0]
+    )
+    single = simulator.trade_impact(p_yes, pnl_yes, pnl_no, correlation,
+                                    np.array([0.0, 6.0]), np.array([0.0, -4.0]))
+
+    assert impact["cvar_delta"][0] < 0 < impact["cvar_delta"][1]
+    assert impact["cvar_delta"][2] == 0.0
+    assert impact["cvar_after"][1] == pytest.approx(single["after"].cvar, rel=0.02)
+    # Doubling the held market itself matches doubling its perfectly correlated twin
+    assert impact["cvar_after"][3] == pytest.approx(impact["cvar_after"][1], rel=0.02)
@@ -0,0 +1,201 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.sizing import greedy_allocate, kelly_position_percent, optimize_kelly_portfolio
+
+
+def _scalar_kelly(expected_return, win_probability, kelly_fraction, max_percent):
+    if win_probability <= 0 or win_probability >= 1:
+        return 0.0
+    ratio = abs(expected_return) / 0.05 if expected_return != 0 else 1.0
+    kelly = max(0, win_probability - ((1 - win_probability) / ratio))
+    return min(kelly * kelly_fraction * 100, max_percent)
+
+
+def test_vectorized_kelly_matches_scalar_formula():
+    rng = np.random.default_rng(3)
+    expected_return = np.concatenate([rng.normal(0, 0.2, 200), [0.0, 0.1]])
+    win_probability = np.concatenate([rng.uniform(0, 1, 200), [0.7, 1.0]])
+
+    percent = kelly_position_percent(expected_return, win_probability, 0.25, 10.0)
+
+    expected = [_scalar_kelly(er, p, 0.25, 10.0) for er, p in zip(expected_return, win_probability)]
+    assert percent == pytest.approx(expected)
+    assert percent[-1] == 0.0
+
+
+def test_greedy_allocation_uses_up_shared_headroom_in_order():
+    requested = np.array([60.0, 60.0, 60.0, 60.0])
+    markets = ["a", "a", "b", "c"]
+    categories = ["sports", "sports", "sports", "politics"]
+    correlation = np.eye(4)
+    correlation[2, 3] = correlation[3, 2] = 0.5
+
+    allocated = greedy_allocate(
+        requested, markets, categories,
+        market_headroom={"a": 100.0, "b": 100.0, "c": 100.0},
+        category_headroom={"sports": 150.0, "politics": 500.0},
+        correlation_headroom=np.array([500.0, 500.0, 500.0, 50.0]),
+        correlation=correlation
+    )
+
+    # Market "a" caps the second candidate, the sports category the third, and
+    # the third's allocation eats into the fourth's correlated headroom
+    assert allocated == pytest.approx([60.0, 40.0, 50.0, 25.0])
+
+
+def test_portfolio_kelly_matches_single_bet_and_shares_correlated_stake():
+    single = optimize_kelly_portfolio([0.6], [0.5], np.eye(1), [None], kelly_fraction=1.0,
+                                      scenarios=20_000, time_budget=5.0)
+    # Even-money bet won 60% of the time: full Kelly stakes 2p - 1 = 20%
+    assert single.sides == ["yes"]
+    assert single.fractions[0] == pytest.approx(0.2, abs=0.02)
+
+    independent = optimize_kelly_portfolio([0.6, 0.6], [0.5, 0.5], np.eye(2), [None, None],
+                                           kelly_fraction=1.0, scenarios=20_000, time_budget=5.0)
+    correlated = optimize_kelly_portfolio([0.6, 0.6], [0.5, 0.5], np.ones((2, 2)), [None, None],
+                                          kelly_fraction=1.0, scenarios=20_000, time_budget=5.0)
+    assert independent.fractions.sum() > 0.35
+    assert correlated.fractions.sum() == pytest.approx(0.2, abs=0.02)
+
+
+def test_portfolio_kelly_respects_limits_and_picks_sides():
+    rng = np.random.default_rng(1)
+    n = 60
+    p_yes = rng.uniform(0.05, 0.95, n)
+    price = np.clip(p_yes + rng.normal(0, 0.1, n), 0.02, 0.98)
+    categories = [i % 3 for i in range(n)]
+
+    result = optimize_kelly_portfolio(
+        p_yes, price, np.eye(n), categories, kelly_fraction=0.5,
+        max_position=0.02, category_limits={0: 0.05, 1: 0.5, 2: 0.5},
+        max_total=0.2, max_drawdown=0.05, max_iterations=50
+    )
+
+    assert result.iterations <= 50
+    assert (result.fractions >= 0).all() and (result.fractions <= 0.02 + 1e-12).all()
+    assert result.fractions[np.array(categories) == 0].sum() <= 0.05 + 1e-9
+    assert result.fractions.sum() <= 0.2 + 1e-9
+    assert result.drawdown_at_confidence <= 0.05 + 1e-9
+    assert result.sides == ["yes" if p >= c else "no" for p, c in zip(p_yes, price)]
+
+
+def test_batch_assessment_matches_single_trade_assessment(monkeypatch):
+    pytest.importorskip("kalshi")
+    import uuid
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.dialects.postgresql import UUID
+    from sqlalchemy.ext.compiler import compiles
+    from sqlalchemy.orm import sessionmaker
+
+    @compiles(UUID, "sqlite")
+    def compile_uuid_sqlite(type_, compiler, **kw):  # pragma: no cover
+        return "BLOB"
+
+    import app.core.risk_manager as risk_manager_module
+    from app.models.database import Base
+    from app.models.schemas import Market, Position, Trade
+
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine, tables=[Market.__table__, Trade.__table__, Position.__table__])
+    SessionLocal = sessionmaker(bind=engine)
+    db = SessionLocal()
+    markets = {name: Market(market_id=uuid.uuid4(), title=name, category=category)
+               for name, category in (("rain", "weather"), ("snow", "weather"), ("vote", "politics"))}
+    db.add_all(markets.values())
+    db.commit()
+    ids = {name: market.market_id for name, market in markets.items()}
+    db.close()
+
+    monkeypatch.setattr(risk_manager_module, "SessionLocal", SessionLocal)
+    monkeypatch.setattr(risk_manager_module.kalshi_client, "get_balance", lambda: {"total_balance": 1000})
+    manager = risk_manager_module.RiskManager()
+    manager.risk_simulator.seed = 7
+    manager.register_fill(position_id=1, market_id=ids["rain"], side="yes", count=400, price=0.5, category="weather")
+    # The batch path looks categories up by string id, which sqlite's UUID type cannot bind
+    manager.market_categories.update({str(ids[name]): market.category for name, market in markets.items()})
+
+    candidates = [
+        {"market_id": ids["snow"], "side": "yes", "count": 20, "price": 0.4, "expected_return": 0.1, "win_probability": 0.7},
+        {"market_id": ids["vote"], "side": "no", "count": 300, "price": 0.3, "expected_return": 0.2, "win_probability": 0.8},
+        {"market_id": ids["rain"], "side": "yes", "count": 50, "price": 0.5, "expected_return": 0.1, "win_probability": 0.65},
+        {"market_id": ids["vote"], "side": "yes", "count": 10, "price": 0.5, "expected_return": 0.05, "win_probability": 0.5},
+    ]
+    simulations = []
+    trades_impact = manager.risk_simulator.trades_impact
+    monkeypatch.setattr(manager.risk_simulator, "trades_impact",
+                        lambda *args: simulations.append(args) or trades_impact(*args))
+    batch = manager.assess_trades_batch(candidates)
+
+    assert len(simulations) == 1
+    assert len(batch) == len(candidates)
+    for candidate, result in zip(candidates, batch):
+        single = manager.assess_trade_risk(**candidate)
+        assert result.assessment.approved == single.approved
+        assert result.assessment.risk_level == single.risk_level
+        assert [(check.passed, check.level) for check in result.assessment.risk_checks] == \
+            [(check.passed, check.level) for check in single.risk_checks]
+        tail = result.assessment.risk_checks[-1]
+        assert tail.message.startswith("Simulated tail loss")
+        assert tail.details["cvar_after"] == pytest.approx(single.risk_checks[-1].details["cvar_after"])
+    assert not all(result.assessment.approved for result in batch)
+
+
+def test_batch_assessment_rejects_every_candidate_on_internal_error(monkeypatch):
+    pytest.importorskip("kalshi")
+    import app.core.risk_manager as risk_manager_module
+
+    manager = risk_manager_module.risk_manager
+    monkeypatch.setattr(manager, "_check_daily_loss_limit", lambda: 1 / 0)
+
+    results = manager.assess_trades_batch([
+        {"market_id": "RAIN", "side": "yes", "count": 5, "price": 0.5},
+        {"market_id": "SNOW", "side": "no", "count": 2, "price": 0.2},
+    ])
+
+    assert [(r.market_id, r.requested_count, r.recommended_count) for r in results] == [("RAIN", 5, 0), ("SNOW", 2, 0)]
+    assert all(not r.assessment.approved and r.assessment.risk_level.value == "critical" for r in results)
+
+
+def test_allocation_endpoint_prices_and_optimizes_off_the_event_loop(monkeypatch):
+    pytest.importorskip("kalshi")
+    pytest.importorskip("jwt")
+    import asyncio
+    import threading
+    from types import SimpleNamespace
+
+    from app.api.endpoints import trading
+
+    threads = {}
+
+    def get_market_price(market_id):
+        threads.setdefault("price", set()).add(threading.get_ident())
+        return {"price": 0.4}
+
+    def optimize(candidates, user_risk_profile, user_id):
+        threads["optimize"] = threading.get_ident()
+        return {"allocations": [{"market_id": c["market_id"], "price": c["price"]} for c in candidates]}
+
+    monkeypatch.setattr(trading.kalshi_client, "get_market_price", get_market_price)
+    monkeypatch.setattr(trading.risk_manager, "optimize_portfolio_allocation", optimize)
+    request = trading.PortfolioAllocationRequest(candidates=[
+        {"market_id": "RAIN", "probability": 0.6}, {"market_id": "RAIN", "probability": 0.6},
+        {"market_id": "SNOW", "price": 0.3, "probability": 0.5},
+    ])
+
+    async def call():
+        threads["loop"] = threading.get_ident()
+        return await trading.optimize_portfolio_allocation(
+            request, current_user=SimpleNamespace(id=None, risk_profile="moderate")
+        )
+
+    result = asyncio.run(call())
+
+    assert [a["price"] for a in result["allocations"]] == [0.4, 0.4, 0.3]
+    assert threads["loop"] not in threads["price"] | {threads["optimize"]}
@@ -0,0 +1,116 @@
+from datetime import datetime
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import app.core.backtest as backtest
+from app.core.backtest import BacktestConfig, PriceMatrix
+from app.core.sweep import (
+    ParameterSpace, _set_path, config_from_params, export_sweep_config, load_sweep_config,
+    replayed_params, run_sweep, sweep_report
+)
+
+
+def mean_reverting_matrix(bars=1800, markets=4, seed=0):
+    rng = np.random.default_rng(seed)
+    deviation = np.zeros((bars, markets))
+    for t in range(1, bars):
+        deviation[t] = 0.9 * deviation[t - 1] + rng.normal(0, 0.03, markets)
+    return PriceMatrix(
+        market_ids=[f"m{i}" for i in range(markets)],
+        start=datetime(2024, 1, 1),
+        bar_seconds=300,
+        prices=np.clip(0.5 + deviation, 0.05, 0.95)
+    )
+
+
+def test_parameter_space_grid_and_samples():
+    space = ParameterSpace({"backtest.lookback": [12, 24], "statistical.rsi_period": [7, 14, 21]})
+    grid = space.grid()
+    assert len(grid) == 6
+    assert {"backtest.lookback": 24, "statistical.rsi_period": 7} in grid
+
+    samples = ParameterSpace({
+        "backtest.min_edge": ("uniform", 0.01, 0.05),
+        "backtest.fee_rate": ("loguniform", 0.001, 0.1),
+        "backtest.lookback": ("int", 5, 8),
+        "signal.score_scale": [10.0, 25.0],
+    }).sample(200, seed=1)
+    assert all(0.01 <= s["backtest.min_edge"] <= 0.05 for s in samples)
+    assert all(0.001 <= s["backtest.fee_rate"] <= 0.1 for s in samples)
+    assert {s["backtest.lookback"] for s in samples} == {5, 6, 7, 8}
+    with pytest.raises(ValueError):
+        ParameterSpace({"backtest.min_edge": ("uniform", 0.01, 0.05)}).grid()
+
+
+def test_config_from_params_routes_paths():
+    base = BacktestConfig(signal="statistical", params={"window": 60})
+    config = config_from_params({
+        "backtest.min_edge": 0.05,
+        "signal.window": 30,
+        "statistical.rsi_period": 9,
+        "ml_models.random_forest_params.max_depth": 4,
+    }, base)
+    assert config.min_edge == 0.05
+    assert config.params == {"window": 30, "statistical": {"rsi_period": 9}}
+    assert base.params == {"window": 60}
+
+
+def test_successive_halving_shares_signals_and_ranks(monkeypatch):
+    calls = []
+    original = backtest.compute_signal
+
+    def counting_compute_signal(prices, config):
+        calls.append((config.signal_key, prices.size))
+        return original(prices, config)
+
+    monkeypatch.setattr(backtest, "compute_signal", counting_compute_signal)
+    matrix = mean_reverting_matrix()
+    candidates = ParameterSpace({
+        "backtest.signal": ["mean_reversion", "momentum"],
+        "backtest.min_edge": [0.01, 0.03, 0.05],
+        "backtest.half_spread": [0.0, 0.005, 0.01],
+    }).grid()
+
+    results = run_sweep(matrix, candidates, BacktestConfig(lookback=30, decision_interval=6),
+                        eta=3, rungs=3, workers=1)
+
+    # 18 configs -> 6 -> 2 over 1/9, 1/3 and all of the history
+    assert [sum(r.rung == rung for r in results) for rung in range(3)] == [12, 4, 2]
+    assert results[0].rung == 2 and results[0].bars == matrix.prices.shape[0]
+    assert results[0].score >= results[1].score
+    # Mean reversion wins on a mean-reverting series
+    assert results[0].params["backtest.signal"] == "mean_reversion"
+    # One signal per market and signal key per rung, not one per config
+    rung_keys = {(key, size) for key, size in calls}
+    assert len(calls) == len(rung_keys) * len(matrix.market_ids)
+
+    report = sweep_report(results)
+    assert [entry["rank"] for entry in report["ranking"]] == list(range(1, 19))
+
+
+def test_export_and_apply_config(tmp_path):
+    from app.core.sweep import SweepResult
+
+    result = SweepResult(params={"statistical.rsi_period": 9, "ensemble.base_weights.statistical": 0.5},
+                         score=1.5, rung=2, bars=100)
+    path = str(tmp_path / "best.json")
+    export_sweep_config(result, path)
+    config = load_sweep_config(path)
+    # Ensemble weights are not replayed, so the sweep has no best value for them
+    assert config["params"] == {"statistical.rsi_period": 9}
+    assert replayed_params({"signal.window": 5, "ml_models.random_forest_params.max_depth": 4}) == {"signal.window": 5}
+
+    class Analyzer:
+        def __init__(self):
+            self.rsi_period = 14
+            self.base_weights = {"statistical": 0.35}
+
+    analyzer = Analyzer()
+    _set_path(analyzer, ["rsi_period"], 9)
+    _set_path(analyzer, ["base_weights", "statistical"], 0.5)
+    assert analyzer.rsi_period == 9 and analyzer.base_weights == {"statistical": 0.5}